@@ -1,4 +1,6 @@
-from models.plan import ProfitLossPlan
+import time
+
+from models.plan import ProfitLossPlan, TRAILING_TYPES
 from controllers.trade_controller import TradeController
 
 
@@ -14,13 +16,50 @@ class PlanController:
         """
         self.data_manager = data_manager
         self.trade_controller = TradeController(data_manager)
+        # 移动/阶梯计划的状态写入按间隔合并落盘
+        self.state_flush_interval = 30.0
+        self._dirty_plans = {}
+        self._last_flush = time.monotonic()
+    
+    def _find_position(self, position_id):
+        """按代码或名称查找持仓记录（dict），不存在或已清仓时返回 None"""
+        key = str(position_id or '')
+        for position in self.data_manager.get_positions():
+            if key and key in (str(position.get('code', '')), str(position.get('name', ''))):
+                try:
+                    if float(position.get('quantity', 0) or 0) > 0:
+                        return position
+                except (TypeError, ValueError):
+                    pass
+                return None
+        return None
+    
+    @staticmethod
+    def _cost_price(position):
+        try:
+            return float(position.get('cost_price', 0) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def _store_plan(self, plan, position):
+        """计划以 dict 写入存储，带上代码/名称/成本价，便于计划列表与命令行显示"""
+        record = plan.to_dict()
+        record.update({
+            'code': str(position.get('code', '')),
+            'name': str(position.get('name', '')),
+            'quantity': str(position.get('quantity', '')),
+            'cost_price': str(position.get('cost_price', '')),
+            'created_at': plan.created_date,
+        })
+        self.data_manager.add_plan(record)
+        return plan
     
     def create_price_plan(self, position_id, take_profit_price=None, stop_loss_price=None, auto_execute=False):
         """
         创建价格触发的止盈止损计划
         
         参数:
-        position_id: 持仓ID
+        position_id: 持仓代码或名称
         take_profit_price: 止盈价格
         stop_loss_price: 止损价格
         auto_execute: 是否自动执行
@@ -28,31 +67,21 @@ class PlanController:
         返回:
         ProfitLossPlan: 止盈止损计划对象
         """
-        # 验证持仓是否存在
-        position = self.data_manager.get_position_by_id(position_id)
+        position = self._find_position(position_id)
         if not position:
             raise ValueError("持仓不存在")
         
-        # 创建计划
-        plan = ProfitLossPlan(position_id, 'price')
+        plan = ProfitLossPlan(str(position.get('code', '')), 'price')
         plan.set_price_trigger(take_profit_price, stop_loss_price)
         plan.auto_execute = auto_execute
-        
-        # 保存计划
-        self.data_manager.add_plan(plan)
-        
-        # 将计划ID添加到持仓中
-        position.add_plan(plan.id)
-        self.data_manager.update_position(position)
-        
-        return plan
+        return self._store_plan(plan, position)
     
     def create_percentage_plan(self, position_id, take_profit_ratio=None, stop_loss_ratio=None, auto_execute=False):
         """
         创建百分比触发的止盈止损计划
         
         参数:
-        position_id: 持仓ID
+        position_id: 持仓代码或名称
         take_profit_ratio: 止盈百分比 (如0.1表示10%)
         stop_loss_ratio: 止损百分比 (如0.05表示5%)
         auto_execute: 是否自动执行
@@ -60,52 +89,179 @@ class PlanController:
         返回:
         ProfitLossPlan: 止盈止损计划对象
         """
-        # 验证持仓是否存在
-        position = self.data_manager.get_position_by_id(position_id)
+        position = self._find_position(position_id)
         if not position:
             raise ValueError("持仓不存在")
         
-        # 创建计划
-        plan = ProfitLossPlan(position_id, 'percentage')
+        plan = ProfitLossPlan(str(position.get('code', '')), 'percentage')
         plan.set_percentage_trigger(take_profit_ratio, stop_loss_ratio)
         plan.auto_execute = auto_execute
+        return self._store_plan(plan, position)
+    
+    def create_trailing_plan(self, position_id, trail_ratio=None, atr_multiple=None, atr_value=None,
+                             stop_loss_ratio=None, auto_execute=False):
+        """
+        创建移动止损计划（按回撤比例或 ATR 倍数）
+        
+        参数:
+        position_id: 持仓代码或名称
+        trail_ratio: 自最高价回撤比例 (如0.08表示8%)
+        atr_multiple: 自最高价回撤的 ATR 倍数，与 trail_ratio 二选一
+        atr_value: 创建时的 ATR，为空时使用指标引擎中的最新值
+        stop_loss_ratio: 初始止损比例
+        auto_execute: 是否自动执行
+        
+        返回:
+        ProfitLossPlan: 止盈止损计划对象
+        """
+        if not trail_ratio and not atr_multiple:
+            raise ValueError("需要设置回撤比例或ATR倍数")
+        position = self._find_position(position_id)
+        if not position:
+            raise ValueError("持仓不存在")
+        
+        code = str(position.get('code', ''))
+        cost_price = self._cost_price(position)
+        plan = ProfitLossPlan(code, 'trailing_atr' if atr_multiple else 'trailing_percent')
+        if atr_multiple and not atr_value:
+            atr_value = self._latest_atr(code)
+        plan.set_trailing_trigger(trail_ratio, atr_multiple, atr_value, stop_loss_ratio)
+        plan.auto_execute = auto_execute
+        plan.update_tick(cost_price, cost_price, atr_value)
+        plan.dirty = False
+        return self._store_plan(plan, position)
+    
+    def create_ratchet_plan(self, position_id, step_ratio, stop_loss_ratio=None, auto_execute=False):
+        """
+        创建阶梯止盈计划：每上涨 step_ratio 抬高一级，回落到上一级锁定价时触发
         
-        # 保存计划
-        self.data_manager.add_plan(plan)
+        参数:
+        position_id: 持仓代码或名称
+        step_ratio: 每级涨幅 (如0.05表示5%)
+        stop_loss_ratio: 尚未抬升时的止损比例
+        auto_execute: 是否自动执行
         
-        # 将计划ID添加到持仓中
-        position.add_plan(plan.id)
-        self.data_manager.update_position(position)
+        返回:
+        ProfitLossPlan: 止盈止损计划对象
+        """
+        position = self._find_position(position_id)
+        if not position:
+            raise ValueError("持仓不存在")
         
+        cost_price = self._cost_price(position)
+        plan = ProfitLossPlan(str(position.get('code', '')), 'ratchet')
+        plan.set_ratchet_trigger(step_ratio, stop_loss_ratio)
+        plan.auto_execute = auto_execute
+        plan.update_tick(cost_price, cost_price)
+        plan.dirty = False
+        return self._store_plan(plan, position)
+    
+    @staticmethod
+    def _load_plan(record):
+        """存储中的计划 dict -> ProfitLossPlan；计划对话框保存的计划按固定价位处理"""
+        if record.get('trigger_type'):
+            return ProfitLossPlan.from_dict({'position_id': record.get('code', ''), 'take_profit_price': None,
+                                             'stop_loss_price': None, 'take_profit_ratio': None,
+                                             'stop_loss_ratio': None, 'status': 'ACTIVE', 'auto_execute': False,
+                                             'created_date': record.get('created_at', ''), **record})
+        from utils.valuation import plan_levels
+        plan = ProfitLossPlan(str(record.get('code', '')), 'price')
+        plan.id = record.get('id', plan.id)
+        plan.set_price_trigger(*plan_levels(record))
         return plan
     
-    def check_and_execute_plans(self, current_prices):
+    def _latest_atr(self, code):
+        """指标引擎中该股票的最新 ATR，没有时返回 None"""
+        from utils.indicators import DEFAULT_ENGINE
+        snap = DEFAULT_ENGINE.snapshot(code)
+        if snap is None:
+            return None
+        return snap.get('atr') or None
+    
+    def track_prices(self, current_prices):
         """
-        检查并执行止盈止损计划
+        用最新价推进有效计划的跟踪状态，并检查是否触发
+        
+        移动/阶梯计划每个价格只做 O(1) 的高水位更新，无需回放历史；
+        变化的状态立即写入内存中的计划记录，落盘由 flush_plan_states 合并。
         
         参数:
         current_prices: 当前价格字典 {stock_code: price}
-        """
-        plans = self.data_manager.get_plans()
-        active_plans = [plan for plan in plans if plan.status == 'ACTIVE']
         
-        for plan in active_plans:
-            position = self.data_manager.get_position_by_id(plan.position_id)
-            if not position or position.status != 'HOLDING':
+        返回:
+        list: 触发的 (计划对象, 持仓记录, 价格, 'TAKE_PROFIT' / 'STOP_LOSS')
+        """
+        triggered_plans = []
+        for record in self.data_manager.get_plans():
+            if record.get('status', 'ACTIVE') != 'ACTIVE':
                 continue
-            
-            current_price = current_prices.get(position.stock_code)
+            position = self._find_position(record.get('code') or record.get('position_id') or record.get('name'))
+            if not position:
+                continue
+            code = str(position.get('code', ''))
+            current_price = current_prices.get(code)
             if not current_price:
                 continue
+            plan = self._load_plan(record)
+            cost_price = float(record.get('cost_price') or 0) or self._cost_price(position)
             
-            # 检查是否触发止盈止损
-            triggered, trigger_type = plan.check_trigger(current_price, position.buy_price)
+            if plan.trigger_type in TRAILING_TYPES:
+                atr = self._latest_atr(code) if plan.trigger_type == 'trailing_atr' else None
+                plan.update_tick(current_price, cost_price, atr)
+                if plan.dirty:
+                    self._dirty_plans[plan.id] = plan.state()
+                    self.data_manager.update_plan_states({plan.id: plan.state()}, save=False)
+                    plan.dirty = False
+            
+            triggered, trigger_type = plan.check_trigger(current_price, cost_price)
             if triggered:
-                if plan.auto_execute:
-                    self._execute_plan(plan, position, current_price, trigger_type)
-                else:
-                    # 这里可以发出提醒信号，但不自动执行
-                    print(f"股票 {position.stock_code} 触发{'止盈' if trigger_type == 'TAKE_PROFIT' else '止损'}条件，当前价格: {current_price}")
+                triggered_plans.append((plan, position, current_price, trigger_type))
+        return triggered_plans
+    
+    def check_and_execute_plans(self, current_prices):
+        """
+        检查并执行止盈止损计划
+        
+        状态变化先记在内存，按 state_flush_interval 合并写入，触发执行时立即写入。
+        
+        参数:
+        current_prices: 当前价格字典 {stock_code: price}
+        
+        返回:
+        list: 本次触发的 (计划ID, 代码, 'TAKE_PROFIT' / 'STOP_LOSS')
+        """
+        fired = []
+        for plan, position, current_price, trigger_type in self.track_prices(current_prices):
+            code = str(position.get('code', ''))
+            fired.append((plan.id, code, trigger_type))
+            if plan.auto_execute:
+                self._execute_plan(plan, position, current_price, trigger_type)
+            else:
+                # 这里可以发出提醒信号，但不自动执行
+                print(f"股票 {code} 触发{'止盈' if trigger_type == 'TAKE_PROFIT' else '止损'}条件，当前价格: {current_price}")
+        
+        self.flush_plan_states()
+        return fired
+    
+    def flush_plan_states(self, force=False):
+        """
+        把累积的移动/阶梯计划状态一次写入存储
+        
+        参数:
+        force: 忽略间隔立即写入（如退出前）
+        
+        返回:
+        bool: 是否发生写入
+        """
+        if not self._dirty_plans:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.state_flush_interval:
+            return False
+        self.data_manager.update_plan_states(self._dirty_plans)
+        self._dirty_plans = {}
+        self._last_flush = now
+        return True
     
     def _execute_plan(self, plan, position, current_price, trigger_type):
         """
@@ -113,17 +269,21 @@ class PlanController:
         
         参数:
         plan: 止盈止损计划
-        position: 持仓
+        position: 持仓记录
         current_price: 当前价格
         trigger_type: 触发类型 ('TAKE_PROFIT' 或 'STOP_LOSS')
         """
         # 标记计划为已执行
         plan.execute()
-        self.data_manager.update_plan(plan)
+        self._dirty_plans.pop(plan.id, None)
+        updates = {'status': plan.status}
+        if plan.trigger_type in TRAILING_TYPES:
+            updates['state'] = plan.state()
+        self.data_manager.update_plan(plan.id, updates)
         
         print(f"{'止盈' if trigger_type == 'TAKE_PROFIT' else '止损'}计划已触发，"
-              f"股票: {position.stock_code}, 当前价格: {current_price}, "
-              f"建议卖出数量: {position.quantity}")
+              f"股票: {position.get('code', '')}, 当前价格: {current_price}, "
+              f"建议卖出数量: {position.get('quantity', '')}")
     
     def cancel_plan(self, plan_id):
         """
@@ -132,15 +292,7 @@ class PlanController:
         参数:
         plan_id: 计划ID
         """
-        plan = self.data_manager.get_plan_by_id(plan_id)
-        if not plan:
+        if not any(p.get('id') == plan_id for p in self.data_manager.get_plans()):
             raise ValueError("计划不存在")
-        
-        plan.cancel()
-        self.data_manager.update_plan(plan)
-        
-        # 从持仓中移除计划ID
-        position = self.data_manager.get_position_by_id(plan.position_id)
-        if position:
-            position.remove_plan(plan_id)
-            self.data_manager.update_position(position)
\ No newline at end of file
+        self._dirty_plans.pop(plan_id, None)
+        self.data_manager.update_plan(plan_id, {'status': 'CANCELLED'})
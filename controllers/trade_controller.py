@@ -1,6 +1,7 @@
 from models.trade import Trade
-from models.position import Position
 from utils.data_manager import DataManager
+from typing import Dict, Optional, Tuple
+import numpy as np
 import uuid
 
 
@@ -43,6 +44,220 @@ class FixedPlusRatioCommission(CommissionStrategy):
         return max(total_fee, 5.0)
 
 
+# A股费率表：(市场, 品种) -> 规则；佣金由券商决定，其余为交易所/税务规定
+#   commission_rate/min_commission: 佣金比例与单笔最低佣金（双向）
+#   stamp_duty_rate: 印花税（仅卖出，基金类免征）
+#   transfer_fee_rate: 过户费（双向，按成交金额，基金类免收）
+DEFAULT_FEE_SCHEDULE = {
+    ('sh', 'stock'): {'commission_rate': 0.00025, 'min_commission': 5.0,
+                      'stamp_duty_rate': 0.0005, 'transfer_fee_rate': 0.00001},
+    ('sz', 'stock'): {'commission_rate': 0.00025, 'min_commission': 5.0,
+                      'stamp_duty_rate': 0.0005, 'transfer_fee_rate': 0.00001},
+    ('bj', 'stock'): {'commission_rate': 0.00025, 'min_commission': 5.0,
+                      'stamp_duty_rate': 0.0005, 'transfer_fee_rate': 0.0},
+    ('sh', 'fund'): {'commission_rate': 0.00025, 'min_commission': 5.0,
+                     'stamp_duty_rate': 0.0, 'transfer_fee_rate': 0.0},
+    ('sz', 'fund'): {'commission_rate': 0.00025, 'min_commission': 5.0,
+                     'stamp_duty_rate': 0.0, 'transfer_fee_rate': 0.0},
+    # 无法识别代码（如只记录了名称）时只收佣金，与原有估算一致
+    ('', ''): {'commission_rate': 0.00025, 'min_commission': 5.0,
+               'stamp_duty_rate': 0.0, 'transfer_fee_rate': 0.0},
+}
+
+SELL_SIDES = ('卖出', 'SELL', 'sell', 'S', 's')
+FEE_FIELDS = ('commission_rate', 'min_commission', 'stamp_duty_rate', 'transfer_fee_rate')
+
+
+def classify_code(code: str) -> Tuple[str, str]:
+    """
+    按代码识别市场与品种
+
+    参数:
+    code: 证券代码，如 sh600519、sz159995、588000
+
+    返回:
+    (市场 sh/sz/bj, 品种 stock/fund)；无法识别时返回 ('', '')
+    """
+    text = str(code or '').strip().lower()
+    market = text[:2] if text[:2] in ('sh', 'sz', 'bj') else ''
+    digits = text[2:] if market else text
+    if len(digits) != 6 or not digits.isdigit():
+        return '', ''
+    if not market:
+        market = 'sh' if digits[0] in '569' else ('bj' if digits[0] in '48' else 'sz')
+    if market == 'sh':
+        # 50/51/52/56/58 开头为上交所基金（ETF/LOF）
+        return market, 'fund' if digits[:2] in ('50', '51', '52', '56', '58') else 'stock'
+    if market == 'sz':
+        return market, 'fund' if digits[:2] in ('15', '16', '18') else 'stock'
+    return market, 'stock'
+
+
+class FeeScheduleCommission(CommissionStrategy):
+    """按费率表计算交易费用（佣金+印花税+过户费），支持数组批量计算"""
+    
+    def __init__(self, schedule: Optional[Dict] = None, commission_rate: Optional[float] = None,
+                 min_commission: Optional[float] = None):
+        """
+        初始化费率表策略
+        
+        参数:
+        schedule: 费率表，默认 DEFAULT_FEE_SCHEDULE
+        commission_rate: 覆盖所有规则的佣金比例（券商协商费率）
+        min_commission: 覆盖所有规则的最低佣金
+        """
+        self.schedule = {}
+        for key, rule in (schedule or DEFAULT_FEE_SCHEDULE).items():
+            rule = dict(rule)
+            if commission_rate is not None:
+                rule['commission_rate'] = commission_rate
+            if min_commission is not None:
+                rule['min_commission'] = min_commission
+            self.schedule[key] = rule
+        self._keys = list(self.schedule)
+        # 规则表转为矩阵：行为规则，列为 FEE_FIELDS
+        self._table = np.array([[self.schedule[k].get(f, 0.0) for f in FEE_FIELDS] for k in self._keys],
+                               dtype=np.float64)
+        self._default = self._keys.index(('', '')) if ('', '') in self.schedule else 0
+    
+    def rule_for(self, code: str = '') -> Dict[str, float]:
+        """返回代码适用的费率规则"""
+        return self.schedule.get(classify_code(code), self.schedule[self._keys[self._default]])
+    
+    def _rule_index(self, code: str) -> int:
+        key = classify_code(code)
+        return self._keys.index(key) if key in self.schedule else self._default
+    
+    def rule_table(self, codes=None, count: Optional[int] = None) -> np.ndarray:
+        """
+        每个代码的费率行
+        
+        参数:
+        codes: 证券代码数组，None 表示全部按默认规则
+        count: codes 为 None 时的行数
+        
+        返回:
+        np.ndarray: 形状 (N, 4)，列顺序同 FEE_FIELDS
+        """
+        if codes is None:
+            return np.repeat(self._table[self._default][None, :], count or 0, axis=0)
+        # 代码种类远少于记录数：只对去重后的代码做识别，再按下标展开
+        uniq, inverse = np.unique(np.asarray(codes, dtype=str), return_inverse=True)
+        return self._table[np.array([self._rule_index(c) for c in uniq], dtype=np.intp)[inverse]]
+    
+    def calculate(self, price, quantity, side='buy', code=''):
+        """
+        计算单笔交易费用
+        
+        参数:
+        price: 价格
+        quantity: 数量
+        side: 买卖方向（买入/卖出 或 BUY/SELL）
+        code: 证券代码，用于匹配费率规则
+        
+        返回:
+        费用合计
+        """
+        rule = self.rule_for(code)
+        amount = float(price) * float(quantity)
+        if amount <= 0:
+            return 0.0
+        fee = max(amount * rule['commission_rate'], rule['min_commission'])
+        fee += amount * rule['transfer_fee_rate']
+        if side in SELL_SIDES:
+            fee += amount * rule['stamp_duty_rate']
+        return fee
+    
+    def calculate_batch(self, prices, quantities, sides, codes=None):
+        """
+        批量计算交易费用
+        
+        参数:
+        prices: 价格数组
+        quantities: 数量数组
+        sides: 买卖方向数组（字符串，或 1 买入 / -1 卖出）
+        codes: 证券代码数组，None 表示全部按默认规则
+        
+        返回:
+        np.ndarray: 每笔费用
+        """
+        amounts = np.asarray(prices, dtype=np.float64) * np.asarray(quantities, dtype=np.float64)
+        sides = np.asarray(sides)
+        if sides.dtype.kind in 'USO':
+            is_sell = np.isin(sides, SELL_SIDES)
+        else:
+            is_sell = sides < 0
+        table = self.rule_table(codes, len(amounts))
+        fees = np.maximum(amounts * table[:, 0], table[:, 1])
+        fees += amounts * table[:, 3]
+        fees += np.where(is_sell, amounts * table[:, 2], 0.0)
+        return np.where(amounts > 0, fees, 0.0)
+    
+    def calculate_grid(self, prices, quantities, side, codes):
+        """
+        情景矩阵的交易费用（按最后一维的证券广播）
+
+        参数:
+        prices: 价格数组，形状 (..., N)
+        quantities: 数量，可广播到 prices
+        side: 买卖方向（所有格子相同）
+        codes: N 个证券代码
+
+        返回:
+        np.ndarray: 与 prices 同形状的费用
+        """
+        table = self.rule_table(list(codes))
+        amounts = np.asarray(prices, dtype=np.float64) * np.asarray(quantities, dtype=np.float64)
+        fees = np.maximum(amounts * table[:, 0], table[:, 1])
+        fees += amounts * table[:, 3]
+        if side in SELL_SIDES:
+            fees += amounts * table[:, 2]
+        return np.where(amounts > 0, fees, 0.0)
+
+    def totals_by_code(self, codes, prices, quantities, sides, only_side: Optional[str] = '买入') -> Dict[str, float]:
+        """
+        按代码汇总费用
+        
+        参数:
+        codes, prices, quantities, sides: 同 calculate_batch
+        only_side: 只汇总该方向（买入/卖出），None 表示全部
+        
+        返回:
+        dict: 代码 -> 费用合计
+        """
+        codes = np.asarray(codes, dtype=str)
+        if len(codes) == 0:
+            return {}
+        fees = self.calculate_batch(prices, quantities, sides, codes)
+        if only_side is not None:
+            sides = np.asarray(sides)
+            fees = np.where(sides == only_side, fees, 0.0)
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        sums = np.bincount(inverse, weights=fees, minlength=len(uniq))
+        counts = np.bincount(inverse, weights=(fees > 0), minlength=len(uniq))
+        return {str(c): float(v) for c, v, n in zip(uniq, sums, counts) if n}
+
+
+# 全局默认费率表，估值、回测与各对话框共用
+DEFAULT_COMMISSION = FeeScheduleCommission()
+
+
+def buy_fee_totals(data_manager) -> Dict[str, float]:
+    """
+    按代码汇总交易历史中记录的买入费用（仅供展示：持仓成本价由交易历史投影，已含这些费用）
+    
+    取自持仓投影（utils.position_ledger）随检查点持久化的累计值，只应用新增的交易，不重扫全部历史。
+    
+    参数:
+    data_manager: DataManager 实例
+    
+    返回:
+    dict: 代码 -> 买入费用合计
+    """
+    from utils.position_ledger import PositionLedger
+    return PositionLedger.shared(data_manager).buy_fees()
+
+
 class TradeController:
     """交易控制器"""
     
@@ -54,15 +269,17 @@ class TradeController:
         data_manager: 数据管理器实例
         """
         self.data_manager = data_manager
-        self.commission_strategy = FixedPlusRatioCommission()
+        self.commission_strategy = DEFAULT_COMMISSION
     
-    def _calculate_commission(self, price, quantity):
+    def _calculate_commission(self, price, quantity, side='BUY', code=''):
         """计算手续费"""
+        if isinstance(self.commission_strategy, FeeScheduleCommission):
+            return self.commission_strategy.calculate(price, quantity, side, code)
         return self.commission_strategy.calculate(price, quantity)
     
     def execute_buy(self, stock_code, stock_name, price, quantity, trade_date=None):
         """
-        执行买入操作
+        执行买入操作（持仓由交易历史投影得出，见 PositionLedger.record）
         
         参数:
         stock_code: 股票代码
@@ -74,26 +291,22 @@ class TradeController:
         返回:
         Trade: 交易记录对象
         """
+        from utils.trade_commands import buy
         # 计算手续费
-        commission = self._calculate_commission(price, quantity)
-        
-        # 创建交易记录
-        trade = Trade(stock_code, stock_name, 'BUY', price, quantity, trade_date, commission)
-        
-        # 保存交易记录
-        self.data_manager.add_trade(trade)
-        
-        # 更新或创建持仓
-        self._update_position_from_buy(trade)
+        commission = self._calculate_commission(price, quantity, '买入', stock_code)
         
-        return trade
+        # 追加交易记录并更新持仓
+        result = buy(self.data_manager, stock_code, quantity, price, stock_name,
+                     date=str(trade_date)[:10] if trade_date else None, commission=commission)
+        record = result['record']
+        return Trade(record['code'], record['name'], 'BUY', price, quantity, trade_date, record['commission'])
     
     def execute_sell(self, position_id, price, quantity, trade_date=None):
         """
-        执行卖出操作
+        执行卖出操作（持仓由交易历史投影得出，见 PositionLedger.record）
         
         参数:
-        position_id: 持仓ID
+        position_id: 持仓的股票代码或名称
         price: 卖出价格
         quantity: 卖出数量
         trade_date: 交易日期
@@ -101,71 +314,15 @@ class TradeController:
         返回:
         Trade: 交易记录对象
         """
-        # 验证持仓
-        position = self.data_manager.get_position_by_id(position_id)
-        if not position:
-            raise ValueError("持仓不存在")
-        
-        if position.quantity < quantity:
-            raise ValueError("持仓数量不足")
-        
-        # 计算手续费
-        commission = self._calculate_commission(price, quantity)
-        
-        # 创建交易记录
-        trade = Trade(position.stock_code, position.stock_name, 'SELL', 
-                     price, quantity, trade_date, commission)
-        
-        # 保存交易记录
-        self.data_manager.add_trade(trade)
-        
-        # 更新持仓
-        self._update_position_from_sell(position_id, quantity)
-        
-        return trade
-    
-    def _update_position_from_buy(self, trade):
-        """根据买入交易更新持仓"""
-        # 查找是否已存在该股票的持仓
-        existing_position = None
-        for position in self.data_manager.get_positions():
-            if (position.stock_code == trade.stock_code and 
-                position.status == 'HOLDING'):
-                existing_position = position
-                break
-        
-        if existing_position:
-            # 更新现有持仓
-            # 计算新的平均成本价
-            total_cost = (existing_position.buy_price * existing_position.quantity) + \
-                        (trade.price * trade.quantity) + trade.commission
-            total_quantity = existing_position.quantity + trade.quantity
-            new_avg_price = total_cost / total_quantity
-            
-            existing_position.buy_price = new_avg_price
-            existing_position.quantity = total_quantity
-            existing_position.commission += trade.commission
-            self.data_manager.update_position(existing_position)
-        else:
-            # 创建新持仓
-            position = Position(
-                trade.stock_code,
-                trade.stock_name,
-                trade.price,
-                trade.quantity,
-                trade.trade_date
-            )
-            position.commission = trade.commission
-            self.data_manager.add_position(position)
-    
-    def _update_position_from_sell(self, position_id, quantity):
-        """根据卖出交易更新持仓"""
-        position = self.data_manager.get_position_by_id(position_id)
-        if position:
-            position.update_quantity(-quantity)
-            if position.status == 'SOLD':
-                # 如果持仓已清空，移除所有关联的止盈止损计划
-                for plan_id in position.plans:
-                    self.data_manager.remove_plan(plan_id)
-                position.plans = []
-            self.data_manager.update_position(position)
\ No newline at end of file
+        from utils.trade_commands import sell
+        # 验证持仓、计算手续费并追加交易记录
+        commission = self._calculate_commission(price, quantity, '卖出', position_id)
+        result = sell(self.data_manager, position_id, quantity, price,
+                      date=str(trade_date)[:10] if trade_date else None, commission=commission)
+        record = result['record']
+        if result['position'] is None:
+            # 如果持仓已清空，移除所有关联的止盈止损计划
+            for plan in list(self.data_manager.get_plans()):
+                if plan.get('code') == record['code']:
+                    self.data_manager.delete_plan(plan.get('id'))
+        return Trade(record['code'], record['name'], 'SELL', price, quantity, trade_date, record['commission'])
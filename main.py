@@ -1,13 +1,23 @@
-import json
-from datetime import datetime
-from utils.data_manager import DataManager
-from controllers.trade_controller import TradeController
-from controllers.plan_controller import PlanController
-from utils.calculator import calculate_position_profit, calculate_total_profit
+import sys
 
 
 def main():
-    """主程序入口"""
+    """主程序入口：带参数时执行非交互子命令（python main.py --help），否则进入交互菜单"""
+    if len(sys.argv) > 1:
+        # 子命令路径只导入所需模块，便于在 shell 循环中调用
+        from utils.trade_commands import main as run_command
+        sys.exit(run_command(sys.argv[1:]))
+    interactive_main()
+
+
+def interactive_main():
+    """交互菜单"""
+    from utils.data_manager import DataManager
+    from controllers.trade_controller import TradeController
+    from controllers.plan_controller import PlanController
+    from utils.calculator import calculate_position_profit, calculate_total_profit
+    from utils.price_board import PriceBoard
+    
     print("=== 股票交易记录系统 ===")
     
     # 初始化数据管理器
@@ -225,10 +235,18 @@ def main():
                     continue
                 
                 current_prices = {}
+                # 共享行情看板可用时，直接回车即采用看板价格
+                board = PriceBoard.attach()
+                board_prices = board.read_many([p.stock_code for p in holding_positions]) if board else {}
                 print("请输入各股票的当前价格:")
                 for pos in holding_positions:
+                    board_price = board_prices.get(pos.stock_code, (None,))[0]
+                    hint = f" [看板 {board_price}]" if board_price else ""
                     while True:
-                        price_input = input(f"{pos.stock_name}({pos.stock_code}): ").strip()
+                        price_input = input(f"{pos.stock_name}({pos.stock_code}){hint}: ").strip()
+                        if not price_input and board_price:
+                            current_prices[pos.stock_code] = board_price
+                            break
                         if price_input:
                             try:
                                 current_prices[pos.stock_code] = float(price_input)
@@ -237,6 +255,8 @@ def main():
                                 print("请输入有效的数字")
                         else:
                             print("价格不能为空，请重新输入")
+                if board:
+                    board.close()
                 
                 # 检查计划但不自动执行
                 plan_controller.check_and_execute_plans(current_prices)
@@ -1,7 +1,12 @@
+import math
 import uuid
 from datetime import datetime
 
 
+# 需要跟踪高水位状态的触发类型
+TRAILING_TYPES = ('trailing_percent', 'trailing_atr', 'ratchet')
+
+
 class ProfitLossPlan:
     """止盈止损计划模型"""
     
@@ -11,7 +16,12 @@ class ProfitLossPlan:
         
         参数:
         position_id: 关联的持仓ID
-        trigger_type: 触发类型 ('price' 或 'percentage')
+        trigger_type: 触发类型
+            'price'            固定价格
+            'percentage'       相对买入价的固定比例
+            'trailing_percent' 移动止损：高水位回撤 trail_ratio 触发
+            'trailing_atr'     移动止损：高水位回撤 atr_multiple 倍 ATR 触发
+            'ratchet'          阶梯止盈：每上涨 step_ratio 抬高一级，回落到上一级锁定价触发
         """
         self.id = str(uuid.uuid4())
         self.position_id = position_id
@@ -23,6 +33,95 @@ class ProfitLossPlan:
         self.status = 'ACTIVE'  # ACTIVE/EXECUTED/CANCELLED
         self.auto_execute = False  # 是否自动执行
         self.created_date = datetime.now().isoformat()
+        # 移动/阶梯类参数
+        self.trail_ratio = None
+        self.atr_multiple = None
+        self.atr_value = None
+        self.step_ratio = None
+        # 移动/阶梯类状态：高水位、当前止损价、阶梯级数；dirty 表示有未落盘的变化
+        self.high_water = None
+        self.trail_stop = None
+        self.ratchet_level = 0
+        self.dirty = False
+    
+    def set_trailing_trigger(self, trail_ratio=None, atr_multiple=None, atr_value=None, stop_loss_ratio=None):
+        """
+        设置移动止损
+        
+        参数:
+        trail_ratio: 自高水位回撤比例（trailing_percent）
+        atr_multiple: 自高水位回撤的 ATR 倍数（trailing_atr）
+        atr_value: 创建时的 ATR，行情评估时可用最新 ATR 覆盖
+        stop_loss_ratio: 初始止损比例（相对买入价），高水位尚未抬高止损前生效
+        """
+        if self.trigger_type not in ('trailing_percent', 'trailing_atr'):
+            raise ValueError("触发类型不是移动止损")
+        self.trail_ratio = trail_ratio
+        self.atr_multiple = atr_multiple
+        self.atr_value = atr_value
+        self.stop_loss_ratio = stop_loss_ratio
+    
+    def set_ratchet_trigger(self, step_ratio, stop_loss_ratio=None):
+        """
+        设置阶梯止盈
+        
+        参数:
+        step_ratio: 每级涨幅（相对买入价，如0.05表示每涨5%抬高一级）
+        stop_loss_ratio: 尚未抬升任何一级时的止损比例
+        """
+        if self.trigger_type != 'ratchet':
+            raise ValueError("触发类型不是ratchet")
+        self.step_ratio = step_ratio
+        self.stop_loss_ratio = stop_loss_ratio
+    
+    def update_tick(self, price, buy_price, atr=None):
+        """
+        用最新价更新高水位与止损价，O(1)，只在状态变化时标记 dirty
+        
+        参数:
+        price: 最新价
+        buy_price: 买入价
+        atr: 最新 ATR（trailing_atr 使用，None 时用创建时的 atr_value）
+        
+        返回:
+        bool: 状态是否变化
+        """
+        if self.trigger_type not in TRAILING_TYPES or not price:
+            return False
+        if self.trail_stop is None and self.stop_loss_ratio:
+            self.trail_stop = buy_price * (1 - self.stop_loss_ratio)
+            self.dirty = True
+        if self.high_water is not None and price <= self.high_water:
+            return False
+        self.high_water = price
+        self.dirty = True
+        if self.trigger_type == 'trailing_percent' and self.trail_ratio:
+            stop = price * (1 - self.trail_ratio)
+        elif self.trigger_type == 'trailing_atr' and self.atr_multiple:
+            atr = atr if atr else self.atr_value
+            stop = price - self.atr_multiple * atr if atr else None
+        elif self.trigger_type == 'ratchet' and self.step_ratio and buy_price:
+            # 达到第 k 级（买入价×(1+k×step)）后，止损锁定在第 k-1 级
+            level = math.floor((price / buy_price - 1) / self.step_ratio + 1e-9)
+            if level <= self.ratchet_level:
+                return True
+            self.ratchet_level = level
+            stop = buy_price * (1 + (level - 1) * self.step_ratio)
+        else:
+            stop = None
+        if stop is not None and (self.trail_stop is None or stop > self.trail_stop):
+            self.trail_stop = stop
+        return True
+    
+    def state(self):
+        """紧凑的持久化状态：[高水位, 止损价, 阶梯级数]"""
+        return [self.high_water, self.trail_stop, self.ratchet_level]
+    
+    def load_state(self, state):
+        if state:
+            self.high_water, self.trail_stop, self.ratchet_level = (list(state) + [None, None, 0])[:3]
+            self.ratchet_level = int(self.ratchet_level or 0)
+        self.dirty = False
     
     def set_price_trigger(self, take_profit_price=None, stop_loss_price=None):
         """设置价格触发条件"""
@@ -54,6 +153,10 @@ class ProfitLossPlan:
                 return True, 'TAKE_PROFIT'
             elif self.stop_loss_ratio and change_ratio <= -self.stop_loss_ratio:
                 return True, 'STOP_LOSS'
+        elif self.trigger_type in TRAILING_TYPES:
+            # 止损价已由 update_tick 随高水位抬升；高于买入价时属于锁定利润
+            if self.trail_stop and current_price <= self.trail_stop:
+                return True, 'TAKE_PROFIT' if self.trail_stop >= buy_price else 'STOP_LOSS'
         
         return False, None
     
@@ -77,7 +180,12 @@ class ProfitLossPlan:
             'stop_loss_ratio': self.stop_loss_ratio,
             'status': self.status,
             'auto_execute': self.auto_execute,
-            'created_date': self.created_date
+            'created_date': self.created_date,
+            'trail_ratio': self.trail_ratio,
+            'atr_multiple': self.atr_multiple,
+            'atr_value': self.atr_value,
+            'step_ratio': self.step_ratio,
+            'state': self.state() if self.trigger_type in TRAILING_TYPES else None
         }
     
     @classmethod
@@ -92,4 +200,9 @@ class ProfitLossPlan:
         plan.status = data['status']
         plan.auto_execute = data['auto_execute']
         plan.created_date = data['created_date']
+        plan.trail_ratio = data.get('trail_ratio')
+        plan.atr_multiple = data.get('atr_multiple')
+        plan.atr_value = data.get('atr_value')
+        plan.step_ratio = data.get('step_ratio')
+        plan.load_state(data.get('state'))
         return plan
\ No newline at end of file
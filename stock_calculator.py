@@ -1,4 +1,25 @@
-def calculate_stock_profit(buy_price, quantity, target_profit_percent):
+import sys
+import time
+
+import numpy as np
+
+from controllers.trade_controller import DEFAULT_COMMISSION, classify_code
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow 为可选依赖，缺失时用 pandas 写 CSV
+    pa = None
+    pa_csv = None
+
+
+# 批量模式每次读取与写出的行数
+BATCH_CHUNK_ROWS = 200000
+PROFIT_COLUMNS = ['每股止盈价格', '最终销售金额', '总手续费', '获利金额']
+SOLVE_COLUMNS = ['目标卖出价', '最终销售金额', '总手续费', '获利金额']
+
+
+def calculate_stock_profit(buy_price, quantity, target_profit_percent, code=''):
     """
     计算股票止盈信息
     
@@ -6,6 +27,7 @@ def calculate_stock_profit(buy_price, quantity, target_profit_percent):
     buy_price: 购买单价
     quantity: 购买数量
     target_profit_percent: 止盈百分比 (例如: 10 表示 10%)
+    code: 证券代码，用于匹配费率（印花税、过户费），为空时只计佣金
     
     返回:
     dict: 包含每股止盈价格、最终销售金额、获利金额
@@ -20,9 +42,9 @@ def calculate_stock_profit(buy_price, quantity, target_profit_percent):
     # 计算卖出总金额
     sell_amount = target_price * quantity
     
-    # 计算手续费 (0.023%的手续费，不满5块按5块计算)
-    buy_fee = max(5, buy_amount * 0.00023)
-    sell_fee = max(5, sell_amount * 0.00023)
+    # 计算手续费（统一费率表）
+    buy_fee = DEFAULT_COMMISSION.calculate(buy_price, quantity, '买入', code)
+    sell_fee = DEFAULT_COMMISSION.calculate(target_price, quantity, '卖出', code)
     total_fee = buy_fee + sell_fee
     
     # 计算获利金额
@@ -35,7 +57,230 @@ def calculate_stock_profit(buy_price, quantity, target_profit_percent):
         "获利金额": round(profit, 2)
     }
 
+
+def _codes_or_none(codes, count):
+    """代码参数统一为数组；空代码返回 None（只计佣金）"""
+    if codes is None or isinstance(codes, str):
+        return None if not codes else np.full(count, codes)
+    return np.asarray(codes, dtype=str)
+
+
+def calculate_stock_profit_batch(buy_prices, quantities, target_profit_percents, codes=None):
+    """
+    批量计算股票止盈信息（calculate_stock_profit 的数组版本）
+    
+    参数:
+    buy_prices: 购买单价数组
+    quantities: 购买数量数组
+    target_profit_percents: 止盈百分比数组 (例如: 10 表示 10%)
+    codes: 证券代码数组或单个代码，None 时只计佣金
+    
+    返回:
+    dict: 每股止盈价格、最终销售金额、总手续费、获利金额 -> 数组（已四舍五入到分）
+    """
+    buy_prices = np.asarray(buy_prices, dtype=np.float64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    target_prices = buy_prices * (1 + np.asarray(target_profit_percents, dtype=np.float64) / 100)
+    codes = _codes_or_none(codes, len(buy_prices))
+    
+    buy_amount = buy_prices * quantities
+    sell_amount = target_prices * quantities
+    buy_fee = DEFAULT_COMMISSION.calculate_batch(buy_prices, quantities, np.ones(len(buy_prices)), codes)
+    sell_fee = DEFAULT_COMMISSION.calculate_batch(target_prices, quantities, -np.ones(len(buy_prices)), codes)
+    total_fee = buy_fee + sell_fee
+    profit = sell_amount - buy_amount - total_fee
+    
+    return {
+        "每股止盈价格": np.round(target_prices, 2),
+        "最终销售金额": np.round(sell_amount, 2),
+        "总手续费": np.round(total_fee, 2),
+        "获利金额": np.round(profit, 2)
+    }
+
+
+def price_ticks(codes, count):
+    """最小报价单位：基金（ETF/LOF）0.001 元，股票及无法识别的代码 0.01 元"""
+    codes = _codes_or_none(codes, count)
+    if codes is None:
+        return np.full(count, 0.01)
+    uniq, inverse = np.unique(codes, return_inverse=True)
+    ticks = np.array([0.001 if classify_code(c)[1] == 'fund' else 0.01 for c in uniq])
+    return ticks[inverse]
+
+
+def solve_target_price_batch(buy_prices, quantities, net_profits, codes=None):
+    """
+    反解：扣除买卖双向费用后获利不少于 net_profits 所需的卖出价
+    
+    卖出费用是成交额的分段线性函数（佣金有最低收费），获利随成交额单调递增，
+    按两段分别解出成交额再取满足条件的一段，最后向上取到最小报价单位。
+    
+    参数:
+    buy_prices: 购买单价数组
+    quantities: 购买数量数组
+    net_profits: 期望的净获利金额数组（可为负，表示可接受的亏损）
+    codes: 证券代码数组或单个代码，None 时只计佣金
+    
+    返回:
+    dict: 目标卖出价、最终销售金额、总手续费、获利金额 -> 数组
+    """
+    buy_prices = np.asarray(buy_prices, dtype=np.float64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    net_profits = np.asarray(net_profits, dtype=np.float64)
+    n = len(buy_prices)
+    codes = _codes_or_none(codes, n)
+    table = DEFAULT_COMMISSION.rule_table(codes, n)
+    rate, minimum, stamp, transfer = table[:, 0], table[:, 1], table[:, 2], table[:, 3]
+    
+    buy_fee = DEFAULT_COMMISSION.calculate_batch(buy_prices, quantities, np.ones(n), codes)
+    need = net_profits + buy_prices * quantities + buy_fee        # 卖出成交额扣除卖出费用后需达到的金额
+    # 按比例收佣一段：A·(1-佣金-印花-过户) = need；否则按最低佣金：A·(1-印花-过户) - 最低 = need
+    proportional = need / (1 - rate - stamp - transfer)
+    flat = (need + minimum) / (1 - stamp - transfer)
+    amount = np.where(proportional * rate >= minimum, proportional, flat)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prices = np.where(quantities > 0, amount / quantities, np.nan)
+    ticks = price_ticks(codes, n)
+    # 先减去微小量再向上取整，避免恰好落在报价单位上时因浮点误差多进一格
+    prices = np.maximum(np.ceil(prices / ticks - 1e-9) * ticks, ticks)
+    
+    sell_amount = prices * quantities
+    sell_fee = DEFAULT_COMMISSION.calculate_batch(prices, quantities, -np.ones(n), codes)
+    total_fee = buy_fee + sell_fee
+    return {
+        "目标卖出价": np.round(prices, 3),
+        "最终销售金额": np.round(sell_amount, 2),
+        "总手续费": np.round(total_fee, 2),
+        "获利金额": np.round(sell_amount - buy_prices * quantities - total_fee, 2)
+    }
+
+
+def _read_batches(source, code=None):
+    """
+    分块读取 CSV：列为 单价, 数量, 止盈百分比或目标获利[, 代码]；表头、空行等非数字行跳过
+    
+    返回:
+    生成器，每次产出 (单价, 数量, 第三列, 代码) 数组
+    """
+    import pandas as pd
+    names = ['price', 'quantity', 'value', 'code']
+    reader = pd.read_csv(source, header=None, names=names, dtype={'code': str}, chunksize=BATCH_CHUNK_ROWS,
+                         skipinitialspace=True, low_memory=False)
+    for chunk in reader:
+        numbers = chunk[names[:3]]
+        if any(numbers[c].dtype.kind not in 'fiu' for c in names[:3]):
+            # 只有含表头或脏数据的块才逐列转换
+            numbers = numbers.apply(pd.to_numeric, errors='coerce')
+            valid = numbers.notna().all(axis=1).to_numpy()
+            chunk, numbers = chunk[valid], numbers[valid]
+        if not len(chunk):
+            continue
+        codes = chunk['code'].fillna(code or '').str.strip().to_numpy(dtype=str) if chunk['code'].notna().any() else code
+        yield (numbers['price'].to_numpy(np.float64), numbers['quantity'].to_numpy(np.float64),
+               numbers['value'].to_numpy(np.float64), codes)
+
+
+def _write_csv(frame, output, header):
+    """写出一块结果；有 pyarrow 时用其 CSV 写出器（比 DataFrame.to_csv 快一个数量级）"""
+    if pa_csv is None:
+        output.write(frame.to_csv(header=header, index=False, lineterminator='\n'))
+        return
+    if header:
+        output.write(','.join(frame.columns) + '\n')
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(pa.Table.from_pandas(frame, preserve_index=False), sink,
+                     pa_csv.WriteOptions(include_header=False))
+    output.write(sink.getvalue().to_pybytes().decode('utf-8'))
+
+
+def run_batch(source, output, solve=False, code=None):
+    """
+    批量模式：逐块读取、向量化计算、逐块写出 CSV
+    
+    参数:
+    source: 输入文本流或文件路径
+    output: 输出文本流
+    solve: True 时第三列为目标净获利，反解卖出价；否则为止盈百分比
+    code: 输入没有代码列时统一使用的证券代码
+    
+    返回:
+    int: 处理的行数
+    """
+    import pandas as pd
+    columns = SOLVE_COLUMNS if solve else PROFIT_COLUMNS
+    total = 0
+    for prices, quantities, values, codes in _read_batches(source, code):
+        if solve:
+            result = solve_target_price_batch(prices, quantities, values, codes)
+        else:
+            result = calculate_stock_profit_batch(prices, quantities, values, codes)
+        frame = pd.DataFrame({'购买单价': prices, '数量': quantities,
+                              ('目标获利' if solve else '止盈百分比'): values})
+        for column in columns:
+            frame[column] = result[column]
+        _write_csv(frame, output, total == 0)
+        total += len(prices)
+    return total
+
+
+def sell_ladder(buy_price, quantity, start=2.0, stop=20.0, step=2.0, code=''):
+    """
+    卖出阶梯：一手持仓在一组止盈百分比下的卖出价与获利
+    
+    返回:
+    dict: 止盈百分比及 calculate_stock_profit_batch 的各列
+    """
+    percents = np.arange(start, stop + step / 2, step)
+    result = calculate_stock_profit_batch(np.full(len(percents), buy_price), np.full(len(percents), quantity),
+                                          percents, code or None)
+    result = dict(result)
+    result['止盈百分比'] = percents
+    return result
+
+
+def batch_main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog='stock_calculator.py', description='股票止盈计算器（批量模式）')
+    sub = parser.add_subparsers(dest='command', required=True)
+    batch = sub.add_parser('batch', help='从 CSV 文件或标准输入批量计算：单价,数量,止盈百分比[,代码]')
+    batch.add_argument('input', nargs='?', default='-', help='输入 CSV，- 表示标准输入')
+    batch.add_argument('-o', '--output', default='-', help='输出 CSV，- 表示标准输出')
+    batch.add_argument('--solve', action='store_true', help='第三列为目标净获利，反解所需卖出价')
+    batch.add_argument('--code', default=None, help='输入没有代码列时统一使用的证券代码')
+    ladder = sub.add_parser('ladder', help='一手持仓的卖出阶梯表')
+    ladder.add_argument('price', type=float, help='购买单价')
+    ladder.add_argument('quantity', type=float, help='购买数量')
+    ladder.add_argument('--start', type=float, default=2.0, help='起始止盈百分比')
+    ladder.add_argument('--stop', type=float, default=20.0, help='结束止盈百分比')
+    ladder.add_argument('--step', type=float, default=2.0, help='步长')
+    ladder.add_argument('--code', default='', help='证券代码')
+    args = parser.parse_args(argv)
+    
+    if args.command == 'ladder':
+        result = sell_ladder(args.price, args.quantity, args.start, args.stop, args.step, args.code)
+        print("止盈百分比,每股止盈价格,最终销售金额,总手续费,获利金额")
+        for i in range(len(result['止盈百分比'])):
+            print(f"{result['止盈百分比'][i]:.2f},{result['每股止盈价格'][i]:.2f},{result['最终销售金额'][i]:.2f},"
+                  f"{result['总手续费'][i]:.2f},{result['获利金额'][i]:.2f}")
+        return
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8-sig', newline='')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    start = time.perf_counter()
+    try:
+        count = run_batch(source, output, args.solve, args.code)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(f"已处理 {count} 行，耗时 {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
 def main():
+    if len(sys.argv) > 1:
+        # python stock_calculator.py batch|ladder ...
+        batch_main(sys.argv[1:])
+        return
     print("=== 股票止盈计算器 ===")
     
     try:
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.equity_curve import PointInTimeEngine
+
+
+def _sequential(types, quantities, prices):
+    """逐笔移动加权平均的参照实现"""
+    quantity = cost = realised = 0.0
+    for side, q, p in zip(types, quantities, prices):
+        if side == '买入':
+            quantity += q
+            cost += q * p
+        else:
+            average = cost / quantity
+            realised += q * p - average * q
+            cost -= average * q
+            quantity -= q
+    return quantity, cost, realised
+
+
+def test_long_partial_sell_sequence_stays_finite():
+    types, quantities, prices = [], [], []
+    for i in range(1100):
+        types += ['买入', '卖出']
+        quantities += [1000 if i == 0 else 500, 500]
+        prices += [10.0 + i % 7, 10.5 + i % 5]
+    dates = (np.datetime64('2020-01-01') + np.arange(len(types))).astype(str)
+    engine = PointInTimeEngine(['sh600000'] * len(types), ['测试'] * len(types), dates, types, prices, quantities)
+
+    assert np.isfinite(engine.cost).all() and np.isfinite(engine.realised).all()
+    quantity, cost, realised = _sequential(types, quantities, prices)
+    holding = engine.holdings_at(dates[-1])['sh600000']
+    assert holding['quantity'] == quantity
+    assert np.isclose(holding['cost'], cost, rtol=1e-9)
+    assert np.isclose(holding['realised'], realised, rtol=1e-9)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.plan_controller import PlanController
+from utils.data_manager import DataManager
+from utils.valuation import plan_levels
+
+
+def _data_manager(tmp_path):
+    dm = DataManager(str(tmp_path / 'trading_data.json'))
+    dm.add_position({'code': 'sh600000', 'name': '浦发银行', 'quantity': '1000',
+                     'cost_price': '10.0000', 'current_price': '10.0'})
+    return dm
+
+
+def test_trailing_stop_fires_through_controller(tmp_path):
+    dm = _data_manager(tmp_path)
+    controller = PlanController(dm)
+    plan = controller.create_trailing_plan('sh600000', trail_ratio=0.1, auto_execute=True)
+    record = dm.get_plans()[0]
+    assert isinstance(record, dict) and record['id'] == plan.id and record['code'] == 'sh600000'
+
+    for price in (10.5, 11.0, 12.0, 11.5):
+        assert controller.check_and_execute_plans({'sh600000': price}) == []
+    # 高水位 12.0，回撤 10% 的止损价 10.8
+    assert plan_levels(dm.get_plans()[0]) == (0.0, 12.0 * 0.9)
+
+    fired = controller.check_and_execute_plans({'sh600000': 10.7})
+    assert fired == [(plan.id, 'sh600000', 'TAKE_PROFIT')]
+    assert dm.get_plans()[0]['status'] == 'EXECUTED'
+
+    reloaded = DataManager(str(tmp_path / 'trading_data.json'))
+    assert reloaded.get_plans()[0]['state'][:2] == [12.0, 12.0 * 0.9]
+
+
+def test_ratchet_state_survives_new_controller(tmp_path):
+    dm = _data_manager(tmp_path)
+    PlanController(dm).create_ratchet_plan('浦发银行', step_ratio=0.05, stop_loss_ratio=0.05)
+    controller = PlanController(dm)
+    controller.check_and_execute_plans({'sh600000': 11.05})
+    controller.flush_plan_states(force=True)
+
+    # 新的控制器从存储恢复阶梯级数：第 2 级锁定在第 1 级 10.5
+    controller = PlanController(DataManager(str(tmp_path / 'trading_data.json')))
+    assert controller.check_and_execute_plans({'sh600000': 10.6}) == []
+    fired = controller.check_and_execute_plans({'sh600000': 10.5})
+    assert [f[2] for f in fired] == ['TAKE_PROFIT']
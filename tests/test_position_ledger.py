@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_manager import DataManager
+from utils.position_ledger import PositionLedger
+from utils.trade_commands import buy, sell
+
+
+def _data_manager(tmp_path):
+    dm = DataManager(str(tmp_path / 'trading_data.json'))
+    dm.replace_positions([
+        {'code': 'sh600000', 'name': '浦发银行', 'quantity': '1000', 'cost_price': '10.0000', 'current_price': '10.0'},
+        {'code': 'sz000001', 'name': '平安银行', 'quantity': '500', 'cost_price': '12.0000', 'current_price': '12.0'},
+    ])
+    return dm
+
+
+def test_trades_project_positions_from_opening_balance(tmp_path):
+    dm = _data_manager(tmp_path)
+    buy(dm, 'sh600000', 1000, 11.0, date='2026-01-05', commission=5.0)
+    sell(dm, 'sh600000', 500, 12.0, date='2026-01-06', commission=5.0)
+
+    positions = dm.get_positions()
+    assert [p['code'] for p in positions] == ['sh600000', 'sz000001']
+    # 期初 1000@10 + 1000@11 + 5 费用，卖出 500 后按均价结转
+    assert positions[0]['quantity'] == '1500'
+    assert positions[0]['cost_price'] == f"{(10000 + 11000 + 5) / 2000:.4f}"
+    assert positions[1] == {'code': 'sz000001', 'name': '平安银行', 'quantity': '500',
+                            'cost_price': '12.0000', 'current_price': '12.0'}
+    assert dm.get_opening_balances() == {'sh600000': {'name': '浦发银行', 'quantity': 1000.0, 'cost': 10000.0}}
+
+    reloaded = DataManager(str(tmp_path / 'trading_data.json'))
+    ledger = PositionLedger.shared(reloaded)
+    assert [item['code'] for item in ledger.verify()] == ['sz000001']
+    assert ledger.project_positions() == reloaded.get_positions()
+
+
+def test_sell_out_removes_position_and_new_buy_appends(tmp_path):
+    dm = _data_manager(tmp_path)
+    result = sell(dm, '平安银行', 500, 13.0, commission=5.0)
+    assert result['position'] is None
+    buy(dm, '600036', 100, 10.0, name='招商银行', commission=0.0)
+
+    assert [p['code'] for p in dm.get_positions()] == ['sh600000', 'sh600036']
+    assert dm.get_positions()[1]['current_price'] == '10.0000'
+    ledger = PositionLedger.shared(dm)
+    assert abs(ledger.realised()['sz000001'] - (500 * 1.0 - 5.0)) < 1e-9
+
+    assert ledger.delete(len(dm.get_history()) - 1)
+    assert [p['code'] for p in dm.get_positions()] == ['sh600000']
+
+
+def test_cli_buys_share_the_ledger_cost_basis(tmp_path):
+    from utils.valuation import value_positions
+    dm = DataManager(str(tmp_path / 'trading_data.json'))
+    first = buy(dm, '600000', 100, 10.0)['record']
+    second = buy(dm, '600000', 100, 11.0)['record']
+
+    cost = 100 * 10.0 + 100 * 11.0 + first['commission'] + second['commission']
+    assert dm.get_positions()[0]['cost_price'] == f"{cost / 200:.4f}"
+    assert PositionLedger.shared(dm).verify() == []
+    # 估值不再另加买入费用
+    row = value_positions(dm, prices={'sh600000': 11.0})[0]
+    assert abs(row['cost_total'] - 200 * float(f"{cost / 200:.4f}")) < 1e-9
+
+
+def test_resume_opens_only_the_partitions_it_needs(tmp_path):
+    from controllers.trade_controller import buy_fee_totals
+    dm = DataManager(str(tmp_path / 'trading_data.json'))
+    dm.add_history_many([{'date': f"2026-0{month}-{day:02d}", 'type': '买入', 'code': 'sh600000', 'name': '浦发银行',
+                          'price': '10', 'quantity': '100', 'commission': '5'}
+                         for month in range(1, 5) for day in range(1, 21)])
+    assert len(dm.archive.names()) == 4
+    PositionLedger(dm, checkpoint_every=70).sync()
+
+    reloaded = DataManager(str(tmp_path / 'trading_data.json'))
+    assert len(reloaded.history_view()) == 80
+    assert not any(reloaded.archive.is_loaded(n) for n in reloaded.archive.names())
+    assert buy_fee_totals(reloaded) == {'sh600000': 400.0}
+    assert [reloaded.archive.is_loaded(n) for n in reloaded.archive.names()] == [False, False, False, True]
+    assert list(reloaded.history_view()) == reloaded.get_history()
@@ -1,5 +1,16 @@
 #-*- coding:utf-8 -*-    --------------Ashare 股票行情数据双核心版( https://github.com/mpquant/Ashare ) 
-import json,requests,datetime;      import pandas as pd  #
+import json,requests,datetime,os;      import pandas as pd  #
+
+#行情代理：设置环境变量 ASHARE_PROXY=http://host:8765 或调用 set_proxy()，所有请求先走 utils.quote_proxy
+PROXY_URL=os.environ.get('ASHARE_PROXY','').rstrip('/')
+def set_proxy(url):                                                      #url为空则直连
+    global PROXY_URL;   PROXY_URL=(url or '').rstrip('/')
+
+def get_price_proxy(code, end_date='', count=10, frequency='1d'):      #经缓存代理获取
+    from utils.quote_proxy import payload_to_frame
+    end_date=end_date.strftime('%Y-%m-%d') if isinstance(end_date,datetime.date) else (end_date or '')
+    r=requests.get(f'{PROXY_URL}/price',params={'code':code,'end_date':end_date,'count':count,'frequency':frequency},timeout=10)
+    r.raise_for_status();   return payload_to_frame(json.loads(r.content))
 
 #腾讯日线
 def get_price_day_tx(code, end_date='', count=10, frequency='1d'):     #日线获取  
@@ -52,10 +63,14 @@ def get_price_sina(code, end_date='', count=10, frequency='60m'):    #新浪全
     if (end_date!='') & (frequency in ['240m','1200m','7200m']): return df[df.index<=end_date][-mcount:]   #日线带结束时间先返回              
     return df
 
-def get_price(code, end_date='',count=10, frequency='1d', fields=[]):        #对外暴露只有唯一函数，这样对用户才是最友好的  
+def get_price(code, end_date='',count=10, frequency='1d', fields=[], use_proxy=True):        #对外暴露只有唯一函数，这样对用户才是最友好的  
     xcode= code.replace('.XSHG','').replace('.XSHE','')                      #证券代码编码兼容处理 
     xcode='sh'+xcode if ('XSHG' in code)  else  'sz'+xcode  if ('XSHE' in code)  else code     
 
+    if  use_proxy and PROXY_URL:         #配置了代理先走代理，代理不可用再直连
+         try:    return get_price_proxy(xcode,end_date=end_date,count=count,frequency=frequency)
+         except Exception: pass
+
     if  frequency in ['1d','1w','1M']:   #1d日线  1w周线  1M月线
          try:    return get_price_sina( xcode, end_date=end_date,count=count,frequency=frequency)   #主力
          except: return get_price_day_tx(xcode,end_date=end_date,count=count,frequency=frequency)   #备用                    
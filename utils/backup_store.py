@@ -0,0 +1,364 @@
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+# 增量文件：魔数、版本、公共前缀长度、公共后缀长度、旧内容总长、压缩区长度
+_DELTA_HEADER = struct.Struct('<4sHQQQQ')
+DELTA_MAGIC = b'BKDL'
+DELTA_VERSION = 1
+_CHUNK = 1 << 20
+
+
+def _common_prefix(a, b, limit: int) -> int:
+    """两个文件对象从头开始相同的字节数（分块比较，块内二分定位）"""
+    a.seek(0)
+    b.seek(0)
+    matched = 0
+    while matched < limit:
+        size = min(_CHUNK, limit - matched)
+        x, y = a.read(size), b.read(size)
+        if x == y and len(x) == size:
+            matched += size
+            continue
+        lo, hi = 0, min(len(x), len(y))
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if x[:mid] == y[:mid]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return matched + lo
+    return matched
+
+
+def _common_suffix(a, b, len_a: int, len_b: int, limit: int) -> int:
+    """两个文件对象从尾部开始相同的字节数"""
+    matched = 0
+    while matched < limit:
+        size = min(_CHUNK, limit - matched)
+        a.seek(len_a - matched - size)
+        b.seek(len_b - matched - size)
+        x, y = a.read(size), b.read(size)
+        if x == y:
+            matched += size
+            continue
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if x[size - mid:] == y[size - mid:]:
+                lo = mid
+            else:
+                hi = mid - 1
+        return matched + lo
+    return matched
+
+
+class BackupStore:
+    """
+    数据文件的多代滚动备份
+
+    保存新版本时不再整份复制：
+      - 上一版本通过硬链接（不支持时改为原子重命名）成为最新一代完整备份，不拷贝字节；
+      - 同时生成“由新版本还原上一版本”的反向增量（公共前缀/后缀长度 + zlib 压缩的差异段），
+        数据文件每条记录一行、修改大多集中在局部，增量通常只有几百字节；
+      - 更早的各代只保留增量，超过 generations 代的自动删除。
+    还原时先取完整备份，再依次应用增量得到更早的版本，直到解析成功。
+    """
+
+    def __init__(self, data_file: str, backup_dir: str, generations: int = 10):
+        """
+        参数:
+            data_file: 数据文件路径
+            backup_dir: 备份目录
+            generations: 保留的版本数（1 份完整 + generations-1 份增量）
+        """
+        self.data_file = data_file
+        self.backup_dir = backup_dir
+        self.generations = max(1, generations)
+        stem = os.path.splitext(os.path.basename(data_file))[0]
+        self._stem = stem
+        self._pattern = re.compile(re.escape(stem) + r'\.(\d+)\.(json|delta)$')
+        self.stats = {'bytes_read': 0, 'bytes_written': 0, 'commits': 0}
+
+    def _path(self, seq: int, kind: str) -> str:
+        return os.path.join(self.backup_dir, f"{self._stem}.{seq:06d}.{kind}")
+
+    def generations_on_disk(self) -> Dict[str, List[int]]:
+        """现有备份的版本号 {'json': [...], 'delta': [...]}（升序）"""
+        found = {'json': [], 'delta': []}
+        try:
+            names = os.listdir(self.backup_dir)
+        except OSError:
+            return found
+        for name in names:
+            m = self._pattern.match(name)
+            if m:
+                found[m.group(2)].append(int(m.group(1)))
+        found['json'].sort()
+        found['delta'].sort()
+        return found
+
+    def footprint(self) -> int:
+        """备份目录占用字节数（硬链接的完整备份与数据文件共享存储，按一份计）"""
+        total = 0
+        live = os.stat(self.data_file) if os.path.exists(self.data_file) else None
+        for kind, seqs in self.generations_on_disk().items():
+            for seq in seqs:
+                st = os.stat(self._path(seq, kind))
+                if live is not None and (st.st_dev, st.st_ino) == (live.st_dev, live.st_ino):
+                    continue
+                total += st.st_size
+        return total
+
+    # ---- 写入 ----
+
+    def _make_delta(self, old_path: str, new_path: str) -> bytes:
+        """由 new 还原 old 所需的增量"""
+        len_old = os.path.getsize(old_path)
+        len_new = os.path.getsize(new_path)
+        with open(old_path, 'rb') as a, open(new_path, 'rb') as b:
+            limit = min(len_old, len_new)
+            prefix = _common_prefix(a, b, limit)
+            suffix = _common_suffix(a, b, len_old, len_new, limit - prefix)
+            a.seek(prefix)
+            middle = a.read(len_old - prefix - suffix)
+        # 前缀/后缀两端各读了两份，中段只读旧文件
+        self.stats['bytes_read'] += 2 * (prefix + suffix) + len(middle)
+        packed = zlib.compress(middle, 6)
+        return _DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, prefix, suffix, len_old, len(packed)) + packed
+
+    def commit(self, temp_file: str) -> bool:
+        """
+        用已写好的临时文件替换数据文件，并把被替换的版本滚动进备份
+
+        参数:
+            temp_file: 新版本的临时文件（与数据文件同一文件系统）
+
+        返回:
+            bool: 是否成功替换
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        self.stats['bytes_written'] += os.path.getsize(temp_file)
+        if os.path.exists(self.data_file):
+            on_disk = self.generations_on_disk()
+            seq = max(on_disk['json'] + on_disk['delta'] + [0]) + 1
+            try:
+                delta = self._make_delta(self.data_file, temp_file)
+                tmp = self._path(seq, 'delta') + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(delta)
+                os.replace(tmp, self._path(seq, 'delta'))
+                self.stats['bytes_written'] += len(delta)
+            except OSError:
+                pass
+            full = self._path(seq, 'json')
+            try:
+                os.link(self.data_file, full)
+            except OSError:
+                os.replace(self.data_file, full)   # 不支持硬链接时改为重命名
+            os.replace(temp_file, self.data_file)
+            self._prune(seq)
+        else:
+            os.replace(temp_file, self.data_file)
+        self.stats['commits'] += 1
+        return True
+
+    def _prune(self, newest: int):
+        """只保留最新一份完整备份和最近 generations-1 代增量"""
+        on_disk = self.generations_on_disk()
+        for seq in on_disk['json']:
+            if seq != newest:
+                self._remove(self._path(seq, 'json'))
+        # 版本 newest 的增量（由当前数据文件还原 newest）与完整备份重复，但下次保存后成为链的第一环
+        keep_from = newest - self.generations + 1
+        for seq in on_disk['delta']:
+            if seq < keep_from:
+                self._remove(self._path(seq, 'delta'))
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # ---- 还原 ----
+
+    @staticmethod
+    def apply_delta(newer: bytes, delta: bytes) -> bytes:
+        """由较新版本和增量还原较早版本"""
+        magic, version, prefix, suffix, len_old, packed_len = _DELTA_HEADER.unpack_from(delta)
+        if magic != DELTA_MAGIC or version != DELTA_VERSION:
+            raise ValueError("增量格式不匹配")
+        middle = zlib.decompress(delta[_DELTA_HEADER.size:_DELTA_HEADER.size + packed_len])
+        old = newer[:prefix] + middle + (newer[len(newer) - suffix:] if suffix else b'')
+        if len(old) != len_old:
+            raise ValueError("增量与基准版本不一致")
+        return old
+
+    def versions(self):
+        """
+        从新到旧依次产出 (版本号, 内容)
+
+        先是最新的完整备份，之后用增量逐代还原；某一环损坏时停止。
+        """
+        on_disk = self.generations_on_disk()
+        if not on_disk['json']:
+            return
+        seq = on_disk['json'][-1]
+        try:
+            with open(self._path(seq, 'json'), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return
+        yield seq, content
+        deltas = set(on_disk['delta'])
+        # 增量 k 由版本 k+1 还原版本 k
+        seq -= 1
+        while seq in deltas:
+            try:
+                with open(self._path(seq, 'delta'), 'rb') as f:
+                    content = self.apply_delta(content, f.read())
+            except (OSError, ValueError, struct.error, zlib.error):
+                return
+            yield seq, content
+            seq -= 1
+
+    def referenced(self, pattern: bytes) -> set:
+        """
+        所有保留版本中匹配 pattern（字节正则）的字符串，用于判断外部文件是否仍被某一代备份引用
+
+        返回:
+            set: 匹配到的字符串（utf-8 解码）
+        """
+        regex = re.compile(pattern)
+        found = set()
+        for _, content in self.versions():
+            found.update(m.decode('utf-8') for m in regex.findall(content))
+        return found
+
+    def restore(self, seq: int) -> bool:
+        """把指定版本写回数据文件（当前数据文件先作为新一代备份保存）"""
+        for found, content in self.versions():
+            if found == seq:
+                tmp = self.data_file + '.restore'
+                with open(tmp, 'wb') as f:
+                    f.write(content)
+                return self.commit(tmp)
+        return False
+
+    def restore_latest(self) -> Optional[Tuple[int, dict]]:
+        """
+        找到最新一个可以解析的备份版本并写回数据文件
+
+        返回:
+            (版本号, 数据) 或 None（没有可用备份）
+        """
+        for seq, content in self.versions():
+            try:
+                data = json.loads(content.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                continue
+            tmp = self.data_file + '.restore'
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, self.data_file)
+            return seq, data
+        return None
+
+
+def simulate_year(history_rows: int = 20000, days: int = 250, mutations_per_day: int = 4,
+                  generations: int = 10) -> Dict[str, float]:
+    """
+    模拟一年交易：每个交易日若干次修改（追加成交、更新价格），比较整份复制与滚动增量
+
+    返回:
+        dict: file_bytes 数据文件大小、copy_written/copy_read 整份复制方案每次修改的写/读字节、
+              written/read 本方案每次修改的写/读字节、footprint 本方案备份占用、copy_footprint 单代复制占用、
+              commit_ms 每次保存平均耗时
+    """
+    import random
+    import tempfile
+    from utils.data_manager import DataManager
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        dm = DataManager(os.path.join(tmp, 'trading_data.json'), backup_generations=generations)
+        dm.data['positions'] = [{'code': f'sh6000{i:02d}', 'name': f'股票{i}', 'quantity': '1000',
+                                 'cost_price': '10.0000', 'current_price': '10.0000'} for i in range(20)]
+        for i in range(history_rows):
+            dm.data['history'].append({'date': f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}', 'type': '买入',
+                                       'code': f'sh6000{i % 20:02d}', 'name': f'股票{i % 20}',
+                                       'price': '10.00', 'quantity': '100', 'amount': '1000.00'})
+        dm.save_data()
+        dm.backups.stats = {'bytes_read': 0, 'bytes_written': 0, 'commits': 0}
+        data_written = copied = 0
+        start = time.perf_counter()
+        for day in range(days):
+            for k in range(mutations_per_day):
+                if k % 2 == 0:
+                    dm.data['history'].append({'date': f'2025-{1 + day // 21 % 12:02d}-{1 + day % 28:02d}',
+                                               'type': rng.choice(['买入', '卖出']), 'code': 'sh600001',
+                                               'name': '股票1', 'price': f'{rng.uniform(5, 20):.2f}',
+                                               'quantity': '100', 'amount': '1000.00'})
+                else:
+                    dm.data['last_prices'][f'sh6000{rng.randrange(20):02d}'] = round(rng.uniform(5, 20), 3)
+                copied += os.path.getsize(dm.data_file)   # 整份复制方案：每次先读写一份旧文件
+                dm.save_data()
+                data_written += os.path.getsize(dm.data_file)
+        elapsed = time.perf_counter() - start
+        n = days * mutations_per_day
+        stats = dm.backups.stats
+        file_bytes = os.path.getsize(dm.data_file)
+        return {
+            'file_bytes': file_bytes,
+            'copy_written': (data_written + copied) / n,
+            'copy_read': copied / n,
+            'written': stats['bytes_written'] / n,
+            'read': stats['bytes_read'] / n,
+            'footprint': dm.backups.footprint(),
+            'copy_footprint': file_bytes,
+            'commit_ms': elapsed / n * 1000,
+        }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='数据文件滚动备份')
+    parser.add_argument('command', choices=['list', 'restore', 'bench'])
+    parser.add_argument('seq', nargs='?', type=int, help='restore 的版本号')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        r = simulate_year()
+        print(f"数据文件 {r['file_bytes'] / 1024:.0f} KB")
+        print(f"整份复制：每次修改写 {r['copy_written'] / 1024:.0f} KB、读 {r['copy_read'] / 1024:.0f} KB，"
+              f"备份占用 {r['copy_footprint'] / 1024:.0f} KB（仅 1 代）")
+        print(f"滚动增量：每次修改写 {r['written'] / 1024:.1f} KB、读 {r['read'] / 1024:.0f} KB，"
+              f"备份占用 {r['footprint'] / 1024:.0f} KB，平均保存 {r['commit_ms']:.1f} ms")
+        return
+    from utils.data_manager import DataManager
+    store = DataManager().backups
+    if args.command == 'list':
+        for seq, content in store.versions():
+            try:
+                data = json.loads(content.decode('utf-8'))
+                summary = f"持仓 {len(data.get('positions', []))}，历史 {len(data.get('history', []))}"
+            except (UnicodeDecodeError, ValueError):
+                summary = "无法解析"
+            print(f"{seq:6d}  {len(content) / 1024:8.0f} KB  {summary}")
+    elif args.seq is None or not store.restore(args.seq):
+        print("未找到该版本")
+    else:
+        print(f"已恢复版本 {args.seq}")
+
+
+if __name__ == '__main__':
+    # python -m utils.backup_store list | restore <版本号> | bench
+    main()
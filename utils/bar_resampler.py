@@ -0,0 +1,215 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# 可由 1 分钟线精确合成的周期 -> 每根包含的交易分钟数（全天 240 分钟）
+DERIVED_MINUTES = {'5m': 5, '15m': 15, '30m': 30, '60m': 60, '1d': 240}
+COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+# 1 分钟线只有腾讯接口，成交量单位为手；新浪的 5m~1d 线为股。合成时按此换算，与原周期接口一致
+MINUTE_VOLUME_SCALE = 100.0
+
+# 交易时段（自 0 点起的分钟数）：09:30~11:30、13:00~15:00
+_AM_OPEN, _AM_CLOSE, _PM_OPEN = 9 * 60 + 30, 11 * 60 + 30, 13 * 60
+
+
+def session_minutes(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    K 线时间 -> 当日第几个交易分钟（1~240，按收盘时刻标记）
+
+    09:31 为 1，11:30 为 120，13:01 为 121，15:00 为 240；
+    09:30 及之前的集合竞价分钟记为 0，归入第一根；13:00 并入下午第一分钟。
+    """
+    tod = np.asarray(index.hour * 60 + index.minute, dtype=np.int64)
+    morning = np.clip(tod - _AM_OPEN, 0, 120)
+    afternoon = np.clip(tod - _PM_OPEN, 1, 120) + 120
+    return np.where(tod <= _AM_CLOSE, morning, afternoon)
+
+
+def _bucket_label(days: np.ndarray, buckets: np.ndarray, k: int) -> pd.DatetimeIndex:
+    """周期序号 -> 该根 K 线的收盘时刻（日线为当天日期）"""
+    if k == 240:
+        return pd.DatetimeIndex(days)
+    end = buckets * k
+    tod = np.where(end <= 120, _AM_OPEN + end, _PM_OPEN + end - 120)
+    return pd.DatetimeIndex(days + tod.astype('timedelta64[m]'))
+
+
+def resample(minute_bars: pd.DataFrame, frequency: str, live_day=None,
+             volume_scale: float = 1.0) -> pd.DataFrame:
+    """
+    把 1 分钟线合成为更粗周期（向量化，按 A 股交易时段对齐）
+
+    参数:
+        minute_bars: 按时间升序的 1 分钟线，列含 open/close/high/low/volume
+        frequency: 5m/15m/30m/60m/1d
+        live_day: 仍在交易中的日期（datetime64[D]），该日最后一根允许尚未走完，
+            但须从该根的第一个交易分钟起连续覆盖到最新分钟
+        volume_scale: 成交量换算系数（分钟线单位 -> 输出单位），如手 -> 股为 100
+
+    返回:
+        DataFrame：只包含可精确合成的 K 线（从最近一个缺口之后开始），
+        volume 为分钟线成交量之和乘以 volume_scale
+    """
+    k = DERIVED_MINUTES[frequency]
+    if minute_bars.empty:
+        return pd.DataFrame(columns=COLUMNS, dtype=float)
+    index = pd.DatetimeIndex(minute_bars.index)
+    minutes = session_minutes(index)
+    days = index.normalize().values.astype('datetime64[D]')
+    buckets = np.maximum(1, -(-minutes // k))
+    keys = (days.astype(np.int64) << 16) | buckets
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+    ends = np.concatenate((starts[1:], [len(keys)]))
+
+    o = minute_bars['open'].to_numpy(np.float64)
+    c = minute_bars['close'].to_numpy(np.float64)
+    h = minute_bars['high'].to_numpy(np.float64)
+    l = minute_bars['low'].to_numpy(np.float64)
+    v = minute_bars['volume'].to_numpy(np.float64) * volume_scale
+    # 完整性：每根需覆盖 k 个交易分钟（竞价分钟 0 不计数）
+    filled = np.add.reduceat((minutes >= 1).astype(np.int64), starts)
+    complete = filled >= k
+    bar_days = days[starts]
+    if live_day is not None and len(complete) and bar_days[-1] == live_day:
+        # 盘中最新一根尚未走完，与行情接口返回一致；缓存缺少该根开头的分钟时不能合成
+        last = minutes[starts[-1]:]
+        traded = last[last >= 1]
+        complete[-1] = (len(traded) > 0 and traded[0] == (buckets[starts[-1]] - 1) * k + 1
+                        and len(traded) == traded[-1] - traded[0] + 1)
+    # 只保留最近一个缺口之后的连续完整区间
+    gaps = np.flatnonzero(~complete)
+    first = gaps[-1] + 1 if len(gaps) else 0
+
+    frame = pd.DataFrame({
+        'open': o[starts], 'close': c[ends - 1],
+        'high': np.maximum.reduceat(h, starts), 'low': np.minimum.reduceat(l, starts),
+        'volume': np.add.reduceat(v, starts),
+    }, index=_bucket_label(bar_days, buckets[starts], k))[COLUMNS]
+    frame.index.name = ''
+    return frame.iloc[first:]
+
+
+class BarResampler:
+    """
+    get_price 前置的 K 线缓存：粗周期优先由已缓存的 1 分钟线合成
+
+    每只股票缓存最近的 1 分钟线；请求 5m~1d 且不带 end_date 时，
+    若分钟线足够新且能合成出所需根数，直接返回合成结果，否则：
+      - 所需分钟数不超过 minute_fetch_limit 时刷新一次 1 分钟线（同时服务所有周期）；
+      - 仍有缺口（需要更早的数据）时才按原周期请求网络。
+    合成结果的成交量由手换算为股（MINUTE_VOLUME_SCALE），与按原周期请求的结果单位一致。
+    """
+
+    def __init__(self, fetch: Optional[Callable] = None, max_age: float = 60.0,
+                 minute_fetch_limit: int = 320, max_minutes: int = 4800):
+        """
+        参数:
+            fetch: 底层行情函数，签名同 utils.Ashare.get_price，默认延迟导入
+            max_age: 分钟线缓存有效期（秒），超过后需刷新才能合成
+            minute_fetch_limit: 单次刷新 1 分钟线的最大根数
+            max_minutes: 每只股票最多缓存的分钟线根数
+        """
+        self._fetch = fetch
+        self.max_age = max_age
+        self.minute_fetch_limit = minute_fetch_limit
+        self.max_minutes = max_minutes
+        self._minutes: Dict[str, pd.DataFrame] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'network': 0, 'derived': 0, 'minute_refresh': 0, 'gap_fallback': 0}
+
+    def _network(self, code, end_date, count, frequency, use_proxy):
+        if self._fetch is None:
+            from utils.Ashare import get_price as fetch
+            self._fetch = fetch
+        self._stats['network'] += 1
+        return self._fetch(code, end_date=end_date, count=count, frequency=frequency, use_proxy=use_proxy)
+
+    def _store_minutes(self, code: str, df: pd.DataFrame, now: float):
+        if df is None or df.empty:
+            return
+        with self._lock:
+            old = self._minutes.get(code)
+            merged = df[COLUMNS] if old is None else pd.concat([old, df[COLUMNS]])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+            self._minutes[code] = merged.iloc[-self.max_minutes:]
+            self._fetched_at[code] = now
+
+    def _derive(self, code: str, frequency: str, count: int, now: float) -> Optional[pd.DataFrame]:
+        """缓存足够新且能覆盖 count 根时返回合成结果，否则返回 None"""
+        with self._lock:
+            bars = self._minutes.get(code)
+            fetched_at = self._fetched_at.get(code, 0.0)
+        if bars is None or now - fetched_at > self.max_age:
+            return None
+        today = np.datetime64(time.strftime('%Y-%m-%d', time.localtime(now)), 'D')
+        derived = resample(bars, frequency, live_day=today, volume_scale=MINUTE_VOLUME_SCALE)
+        return derived.iloc[-count:] if len(derived) >= count else None
+
+    def get_price(self, code, end_date='', count=10, frequency='1d', fields=[], use_proxy=True):
+        """与 utils.Ashare.get_price 相同的接口"""
+        now = time.time()
+        self._stats['requests'] += 1
+        if frequency == '1m':
+            df = self._network(code, end_date, count, frequency, use_proxy)
+            if not end_date:
+                self._store_minutes(code, df, now)
+            return df
+        if end_date or frequency not in DERIVED_MINUTES:
+            return self._network(code, end_date, count, frequency, use_proxy)
+
+        derived = self._derive(code, frequency, count, now)
+        if derived is not None:
+            self._stats['derived'] += 1
+            return derived
+        needed = count * DERIVED_MINUTES[frequency] + 1
+        if needed <= self.minute_fetch_limit:
+            # 一次分钟线刷新可同时满足该股票所有粗周期
+            try:
+                minutes = self._network(code, '', needed, '1m', use_proxy)
+                self._stats['minute_refresh'] += 1
+                self._store_minutes(code, minutes, now)
+                derived = self._derive(code, frequency, count, now)
+                if derived is not None:
+                    return derived
+            except Exception:
+                pass
+        self._stats['gap_fallback'] += 1
+        return self._network(code, end_date, count, frequency, use_proxy)
+
+    def invalidate(self, code: Optional[str] = None):
+        """清除分钟线缓存（code 为空时全部清除）"""
+        with self._lock:
+            if code is None:
+                self._minutes.clear()
+                self._fetched_at.clear()
+            else:
+                self._minutes.pop(code, None)
+                self._fetched_at.pop(code, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        请求统计
+
+        返回:
+            dict: requests 总请求数、network 实际网络请求数、derived 由分钟线合成的次数、
+                  minute_refresh 为合成而刷新分钟线的次数、gap_fallback 回退原周期请求的次数、
+                  avoided 节省的网络请求数
+        """
+        stats = dict(self._stats)
+        stats['avoided'] = stats['requests'] - stats['network']
+        return stats
+
+
+# 进程内共享的默认实例
+DEFAULT_RESAMPLER = BarResampler()
+
+
+def get_price(code, end_date='', count=10, frequency='1d', fields=[], use_proxy=True):
+    """带本地合成缓存的 get_price，接口与 utils.Ashare.get_price 相同"""
+    return DEFAULT_RESAMPLER.get_price(code, end_date=end_date, count=count, frequency=frequency,
+                                       fields=fields, use_proxy=use_proxy)
@@ -0,0 +1,335 @@
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.risk_metrics import DEFAULT_YEARS, align_closes, lookback_start
+
+
+FORMAT_VERSION = 1
+# RiskMetrics 日度衰减因子，半衰期约 11 个交易日
+DEFAULT_DECAY = 0.94
+
+
+# A 股收盘时刻；之前当天的日线仍在变化，不计入矩阵
+_CLOSE_HOUR = 15
+
+
+def settled_day(now: Optional[float] = None) -> np.datetime64:
+    """已收盘的最后一天：15:00 之前为昨天，之后为今天"""
+    local = time.localtime(time.time() if now is None else now)
+    today = np.datetime64(time.strftime('%Y-%m-%d', local), 'D')
+    return today if local.tm_hour >= _CLOSE_HOUR else today - 1
+
+
+def watched_codes(data_manager) -> List[str]:
+    """持仓与止盈止损计划涉及的代码（保持首次出现的顺序）"""
+    codes = [str(p.get('code', '')) for p in data_manager.get_positions()]
+    codes += [str(p.get('code', '')) for p in data_manager.get_plans()]
+    return list(dict.fromkeys(c for c in codes if c))
+
+
+class EwmaCovariance:
+    """
+    指数加权（零均值，RiskMetrics）的日收益协方差矩阵
+
+    S_t = λ·S_{t-1} + (1-λ)·r_t r_tᵀ，协方差为 S_t / (1-λ^t)。每根新日线是一次
+    O(N²) 的秩一更新；整体重算是一次矩阵乘法，结果与逐日更新完全一致。
+    只应用已收盘的日线（settled_day），盘中尚未走完的当天日线不会被提前计入。
+    新加入的股票只回填它所在的行和列（O(N·T)）。状态保存在数据目录的 covariance.npz。
+    """
+
+    def __init__(self, path: str = '', decay: float = DEFAULT_DECAY):
+        """
+        参数:
+            path: 持久化文件路径，空串表示不落盘
+            decay: 衰减因子 λ
+        """
+        self.path = path
+        self.decay = decay
+        self.codes: List[str] = []
+        self._sums = np.zeros((0, 0))
+        self._weight = 0.0
+        self._last_day: Optional[np.datetime64] = None
+        self._last_close = np.zeros(0)
+        self._loaded = False
+        self.last_updates = 0
+
+    @classmethod
+    def shared(cls, data_manager) -> 'EwmaCovariance':
+        """与数据文件同目录、同一 DataManager 共用的估计器"""
+        estimator = getattr(data_manager, '_covariance', None)
+        if estimator is None:
+            data_file = getattr(data_manager, 'data_file', '')
+            estimator = cls(os.path.join(os.path.dirname(data_file), 'covariance.npz') if data_file else '')
+            data_manager._covariance = estimator
+        return estimator
+
+    # ---- 持久化 ----
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as f:
+                if int(f['version']) != FORMAT_VERSION or float(f['decay']) != self.decay:
+                    return
+                self.codes = [str(c) for c in f['codes']]
+                self._sums = f['sums'].astype(np.float64)
+                self._weight = float(f['weight'])
+                self._last_close = f['last_close'].astype(np.float64)
+                last_day = int(f['last_day'])
+                self._last_day = np.datetime64(last_day, 'D') if last_day >= 0 else None
+        except (OSError, KeyError, ValueError):
+            self.codes, self._sums, self._weight, self._last_day = [], np.zeros((0, 0)), 0.0, None
+
+    def save(self) -> bool:
+        """原子写入状态文件"""
+        if not self.path:
+            return False
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(
+                    f, version=np.int64(FORMAT_VERSION), decay=np.float64(self.decay),
+                    codes=np.array(self.codes, dtype=str), sums=self._sums, weight=np.float64(self._weight),
+                    last_close=self._last_close,
+                    last_day=np.int64(self._last_day.astype(np.int64) if self._last_day is not None else -1))
+            os.replace(tmp, self.path)
+            return True
+        except OSError:
+            return False
+
+    # ---- 更新 ----
+
+    def update(self, day, closes: Dict[str, float]) -> bool:
+        """
+        应用一根新日线（秩一更新，O(N²)）
+
+        参数:
+            day: 日线日期
+            closes: 代码 -> 收盘价；缺少的股票视为停牌（收益为 0）
+
+        返回:
+            bool: 是否更新（日期不晚于上次更新或当天尚未收盘时忽略）
+        """
+        self._load()
+        day = np.datetime64(str(day)[:10], 'D')
+        if (self._last_day is not None and day <= self._last_day) or day > settled_day():
+            return False
+        price = np.array([closes.get(c, np.nan) for c in self.codes], dtype=np.float64)
+        self._step(day, np.where(np.isfinite(price), price, self._last_close))
+        return True
+
+    def _step(self, day: np.datetime64, price: np.ndarray):
+        if self._last_day is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = price / self._last_close - 1
+            returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+            lam = self.decay
+            self._sums *= lam
+            self._sums += (1 - lam) * np.outer(returns, returns)
+            self._weight = lam * self._weight + (1 - lam)
+            self.last_updates += 1
+        self._last_close = price
+        self._last_day = day
+
+    def sync(self, closes: Dict[str, Tuple[np.ndarray, np.ndarray]], codes: Optional[Iterable[str]] = None,
+             years: int = DEFAULT_YEARS) -> 'EwmaCovariance':
+        """
+        让矩阵追上已缓存的日线：新股票回填所在行列，上次之后的新日线逐根秩一更新
+
+        参数:
+            closes: 代码 -> (日期数组, 收盘价数组)，一般来自 DailyCloseCache.cached
+            codes: 需要覆盖的股票，默认沿用现有股票
+            years: 没有状态或回填时使用的回看年数
+        """
+        self._load()
+        self.last_updates = 0
+        wanted = [c for c in (codes if codes is not None else self.codes) if c in closes]
+        if not self.codes or self._last_day is None:
+            return self.recompute(closes, wanted, years)
+        added = [c for c in wanted if c not in self.codes]
+        if added:
+            self._backfill(closes, added, years)
+        # 上次之后、已收盘的新日线：用与整体重算相同的对齐网格
+        grid, matrix = align_closes(closes, self.codes, start=self._last_day, end=settled_day())
+        if len(grid) and grid[0] == self._last_day:
+            grid, matrix = grid[1:], matrix[1:]
+        for day, row in zip(grid, matrix):
+            self._step(day, np.where(np.isfinite(row), row, self._last_close))
+        if added or len(grid):
+            self.save()
+        return self
+
+    def recompute(self, closes: Dict[str, Tuple[np.ndarray, np.ndarray]], codes: Iterable[str],
+                  years: int = DEFAULT_YEARS) -> 'EwmaCovariance':
+        """整体重算（仅在首次或手动要求时调用）：一次加权矩阵乘法"""
+        self._load()
+        self.codes = [c for c in dict.fromkeys(codes) if c in closes]
+        grid, matrix = align_closes(closes, self.codes, start=lookback_start(years), end=settled_day())
+        self._sums = np.zeros((len(self.codes), len(self.codes)))
+        self._weight = 0.0
+        self._last_day = None
+        self._last_close = np.full(len(self.codes), np.nan)
+        if len(grid):
+            returns, scale = self._weighted_returns(matrix)
+            self._sums = returns.T @ returns
+            self._weight = 1 - self.decay ** len(scale)
+            self._last_day = grid[-1]
+            self._last_close = matrix[-1]
+        self.last_updates = max(0, len(grid) - 1)
+        self.save()
+        return self
+
+    def _weighted_returns(self, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """逐日收益乘以 sqrt((1-λ)·λ^(距今天数))，S = XᵀX 即为加权和"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = matrix[1:] / matrix[:-1] - 1
+        returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+        age = np.arange(len(returns))[::-1]
+        scale = np.sqrt((1 - self.decay) * self.decay ** age)
+        return returns * scale[:, None], scale
+
+    def _backfill(self, closes: Dict[str, Tuple[np.ndarray, np.ndarray]], added: List[str], years: int):
+        """为新股票回填协方差行列，窗口截止到现有状态的最后一天"""
+        codes = self.codes + added
+        grid, matrix = align_closes(closes, codes, start=lookback_start(years), end=self._last_day)
+        n, k = len(self.codes), len(added)
+        sums = np.zeros((n + k, n + k))
+        sums[:n, :n] = self._sums
+        if len(grid) > 1:
+            returns, scale = self._weighted_returns(matrix)
+            # 窗口长度不同时按权重和折算到现有状态的口径
+            ratio = self._weight / (1 - self.decay ** len(scale)) if self._weight else 1.0
+            cross = returns[:, n:].T @ returns * ratio
+            sums[n:, :] = cross
+            sums[:, n:] = cross.T
+            last = matrix[-1, n:]
+        else:
+            last = np.full(k, np.nan)
+        self.codes = codes
+        self._sums = sums
+        self._last_close = np.concatenate((self._last_close, last))
+
+    # ---- 查询 ----
+
+    def covariance(self) -> np.ndarray:
+        """日收益协方差矩阵"""
+        self._load()
+        return self._sums / self._weight if self._weight else np.zeros_like(self._sums)
+
+    def correlation(self) -> np.ndarray:
+        """相关系数矩阵（没有波动的股票对应行为 NaN，对角线为 1）"""
+        self._load()
+        std = np.sqrt(np.clip(np.diag(self._sums), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self._sums / np.outer(std, std)
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+    def volatility(self, periods: int = 252) -> np.ndarray:
+        """各股票年化波动率"""
+        return np.sqrt(np.clip(np.diag(self.covariance()), 0, None) * periods)
+
+    @property
+    def last_day(self) -> Optional[str]:
+        return str(self._last_day) if self._last_day is not None else None
+
+
+def cluster_order(corr: np.ndarray, threshold: float = 0.8) -> Tuple[List[List[int]], List[int]]:
+    """
+    按相关系数做平均连接的层次聚类
+
+    参数:
+        corr: 相关系数矩阵
+        threshold: 簇间平均相关系数不低于该值时合并
+
+    返回:
+        (簇列表（每簇为下标列表，按簇大小降序）, 热力图行列顺序（同簇相邻）)
+    """
+    n = len(corr)
+    similarity = np.nan_to_num(np.asarray(corr, dtype=np.float64), nan=0.0)
+    clusters: List[List[int]] = [[i] for i in range(n)]
+    # 簇间平均相关 = 相关系数块之和 / 元素数
+    block = similarity.copy()
+    sizes = np.ones(n)
+    alive = np.ones(n, dtype=bool)
+    np.fill_diagonal(block, -np.inf)
+    while alive.sum() > 1:
+        mean = block / np.outer(sizes, sizes)
+        mean[~alive, :] = -np.inf
+        mean[:, ~alive] = -np.inf
+        i, j = np.unravel_index(int(np.argmax(mean)), mean.shape)
+        if mean[i, j] < threshold:
+            break
+        block[i, :] += block[j, :]
+        block[:, i] += block[:, j]
+        block[i, i] = -np.inf
+        sizes[i] += sizes[j]
+        alive[j] = False
+        clusters[i] = clusters[i] + clusters[j]
+        clusters[j] = []
+    result = sorted((c for c in clusters if c), key=len, reverse=True)
+    return result, [i for c in result for i in c]
+
+
+def effective_bets(corr: np.ndarray, weights: Optional[np.ndarray] = None) -> float:
+    """
+    有效独立持仓数：相关矩阵特征值的参与率 (Σλ)² / Σλ²
+
+    给出权重时先按权重缩放（集中在少数高相关持仓时接近 1）
+    """
+    corr = np.nan_to_num(np.asarray(corr, dtype=np.float64), nan=0.0)
+    if not len(corr):
+        return 0.0
+    if weights is not None:
+        w = np.asarray(weights, dtype=np.float64)
+        w = w / w.sum() if w.sum() > 0 else w
+        corr = corr * np.sqrt(np.outer(w, w)) * len(w)
+    eig = np.clip(np.linalg.eigvalsh(corr), 0, None)
+    total = float((eig ** 2).sum())
+    return float(eig.sum() ** 2 / total) if total > 0 else 0.0
+
+
+def benchmark(symbols: int = 500, years: int = DEFAULT_YEARS) -> Dict[str, Any]:
+    """
+    基准：symbols 只股票 years 年日线的整体重算与一根新日线的增量更新
+
+    返回:
+        dict: recompute 重算秒数、update 单根更新秒数、max_error 增量与重算的最大偏差
+    """
+    rng = np.random.default_rng(0)
+    # 网格止于已收盘的最后一天，否则盘中运行时最后一根会被 update 当作未收盘而忽略
+    end = settled_day()
+    grid = np.arange(lookback_start(years), end + 1, dtype='datetime64[D]')
+    grid = grid[np.is_busday(grid)]
+    factor = rng.normal(0, 0.01, len(grid))
+    codes = [f"sh{600000 + i}" for i in range(symbols)]
+    closes = {c: (grid, 20 * np.cumprod(1 + factor * rng.uniform(0.5, 1.5) + rng.normal(0, 0.01, len(grid))))
+              for c in codes}
+    head = {c: (d[:-1], v[:-1]) for c, (d, v) in closes.items()}
+
+    estimator = EwmaCovariance()
+    start = time.perf_counter()
+    estimator.recompute(head, codes)
+    recompute = time.perf_counter() - start
+    start = time.perf_counter()
+    applied = estimator.update(grid[-1], {c: float(v[-1]) for c, (_, v) in closes.items()})
+    update = time.perf_counter() - start
+    assert applied, f"增量更新未生效：{grid[-1]}"
+    reference = EwmaCovariance().recompute(closes, codes)
+    error = float(np.abs(estimator.covariance() - reference.covariance()).max())
+    return {'recompute': recompute, 'update': update, 'max_error': error}
+
+
+if __name__ == '__main__':
+    # python -m utils.covariance
+    result = benchmark()
+    print(f"500 只 5 年整体重算 {result['recompute']:.3f}s，新日线增量更新 {result['update'] * 1000:.1f}ms，"
+          f"与重算最大偏差 {result['max_error']:.2e}")
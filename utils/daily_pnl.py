@@ -0,0 +1,353 @@
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from controllers.trade_controller import SELL_SIDES
+
+
+FORMAT_VERSION = 3
+# 新增记录超过该数量时改用向量化整表重建，比逐笔应用更快
+REBUILD_THRESHOLD = 50000
+VALUE_FIELDS = ('realised', 'fees', 'turnover', 'trades')
+# 单只股票的滚动状态：数量、成本总额、最后交易日（自 1970-01-01 的天数）、笔数、成交额合计、数量合计
+_QTY, _COST, _LAST_DAY, _COUNT, _AMOUNT, _SHARES = range(6)
+
+
+def _fingerprint(record: Dict[str, Any]) -> int:
+    key = '|'.join(str(record.get(f, '')) for f in ('date', 'type', 'code', 'price', 'quantity'))
+    return zlib.crc32(key.encode('utf-8'))
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _day_number(date) -> Optional[int]:
+    try:
+        return int(np.datetime64(str(date)[:10], 'D').astype(np.int64))
+    except ValueError:
+        return None
+
+
+class DailyPnlTable:
+    """
+    按（交易日, 代码）物化的已实现盈亏表：已实现盈亏、费用、成交额、笔数
+
+    成本口径与 PointInTimeEngine 一致（每只股票按日期排序，移动加权平均，卖出按均价结转）。
+    追加交易时只应用新增记录；历史被删除/改写时按每只股票的笔数与金额校验和
+    找出变化的股票，只重放这些股票。表与滚动状态保存在数据目录的 daily_pnl.npz，
+    打开分析对话框或按月/年汇总只读取这张表，耗时与天数成正比。
+    """
+
+    def __init__(self, data_manager, path: Optional[str] = None):
+        """
+        参数:
+            data_manager: 数据管理器实例
+            path: 持久化文件路径，默认与数据文件同目录；空串表示不落盘
+        """
+        self.data_manager = data_manager
+        if path is None:
+            data_file = getattr(data_manager, 'data_file', '')
+            path = os.path.join(os.path.dirname(data_file), 'daily_pnl.npz') if data_file else ''
+        self.path = path
+        self._rows: Dict[tuple, List[float]] = {}
+        self._state: Dict[str, List[float]] = {}
+        self._applied = 0
+        self._fingerprint = 0
+        self._rewrites = None
+        # 已应用的归档分区清单与当前分区进度：清单不变时追加只需看当前分区，不必解压归档
+        self._segments: Optional[tuple] = None
+        self._recent = 0
+        self._recent_fingerprint = 0
+        self._frame: Optional[pd.DataFrame] = None
+        self._loaded = False
+        self.last_replayed = 0
+
+    @classmethod
+    def shared(cls, data_manager) -> 'DailyPnlTable':
+        """同一 DataManager 共用一张表"""
+        table = getattr(data_manager, '_daily_pnl', None)
+        if table is None:
+            table = cls(data_manager)
+            data_manager._daily_pnl = table
+        return table
+
+    # ---- 持久化 ----
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path:
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as f:
+                if int(f['version']) != FORMAT_VERSION:
+                    return
+                codes = [str(c) for c in f['codes']]
+                values = f['values']
+                self._rows = {(int(d), codes[c]): list(v) for d, c, v in zip(f['day'], f['code'], values)}
+                state_codes = [str(c) for c in f['state_codes']]
+                self._state = {c: list(s) for c, s in zip(state_codes, f['state'])}
+                self._applied = int(f['applied'])
+                self._fingerprint = int(f['fingerprint'])
+                self._segments = tuple(str(n) for n in f['segments'])
+                self._recent = int(f['recent'])
+                self._recent_fingerprint = int(f['recent_fingerprint'])
+        except (OSError, KeyError, ValueError):
+            self._rows, self._state, self._applied, self._fingerprint = {}, {}, 0, 0
+            self._segments = None
+
+    def save(self) -> bool:
+        """原子写入表文件"""
+        if not self.path:
+            return False
+        codes = sorted({code for _, code in self._rows} | set(self._state))
+        index = {c: i for i, c in enumerate(codes)}
+        keys = list(self._rows)
+        state_codes = list(self._state)
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(
+                    f, version=np.int64(FORMAT_VERSION), codes=np.array(codes, dtype=str),
+                    day=np.array([d for d, _ in keys], dtype=np.int64),
+                    code=np.array([index[c] for _, c in keys], dtype=np.int32),
+                    values=np.array([self._rows[k] for k in keys], dtype=np.float64).reshape(-1, len(VALUE_FIELDS)),
+                    state_codes=np.array(state_codes, dtype=str),
+                    state=np.array([self._state[c] for c in state_codes], dtype=np.float64).reshape(-1, 6),
+                    applied=np.int64(self._applied), fingerprint=np.int64(self._fingerprint),
+                    segments=np.array(self._segments or (), dtype=str), recent=np.int64(self._recent),
+                    recent_fingerprint=np.int64(self._recent_fingerprint))
+            os.replace(tmp, self.path)
+            return True
+        except OSError:
+            return False
+
+    # ---- 维护 ----
+
+    def _apply(self, record: Dict[str, Any], dirty: Set[str]):
+        code = str(record.get('code', ''))
+        day = _day_number(record.get('date', ''))
+        if day is None:
+            return
+        state = self._state.get(code)
+        if state is None:
+            state = self._state[code] = [0.0, 0.0, float(day), 0.0, 0.0, 0.0]
+        price = _to_float(record.get('price'))
+        quantity = _to_float(record.get('quantity'))
+        fee = _to_float(record.get('commission'))
+        state[_COUNT] += 1
+        state[_AMOUNT] += price * quantity
+        state[_SHARES] += quantity
+        if code in dirty:
+            return
+        if day < state[_LAST_DAY]:
+            # 补录了更早日期的交易：该股票之后的均价都会变化，稍后整只重放
+            dirty.add(code)
+            return
+        state[_LAST_DAY] = day
+        realised = 0.0
+        if record.get('type') in SELL_SIDES:
+            held = state[_QTY]
+            sold = min(quantity, held) if held > 0 else 0.0
+            avg = state[_COST] / held if held > 0 else 0.0
+            realised = sold * (price - avg) - fee
+            # 超卖时数量归零，与 PositionLedger 一致
+            state[_QTY] = max(held - quantity, 0.0)
+            state[_COST] = state[_COST] - avg * sold if state[_QTY] > 0 else 0.0
+        else:
+            state[_QTY] += quantity
+            state[_COST] += price * quantity + fee
+        row = self._rows.get((day, code))
+        if row is None:
+            row = self._rows[(day, code)] = [0.0, 0.0, 0.0, 0.0]
+        row[0] += realised
+        row[1] += fee
+        row[2] += price * quantity
+        row[3] += 1
+
+    def _rebuild(self):
+        """整表向量化重建（复用 PointInTimeEngine 的逐笔结果）"""
+        from utils.equity_curve import PointInTimeEngine
+        engine = PointInTimeEngine.from_data_manager(self.data_manager)
+        self._rows, self._state = {}, {}
+        if len(engine):
+            day = engine.days.astype(np.int64)
+            key = (engine.code_id.astype(np.int64) << 32) + (day - day.min())
+            starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+            amount = engine.prices * engine.trade_quantity
+            values = np.column_stack((
+                np.add.reduceat(engine.trade_realised, starts), np.add.reduceat(engine.fees, starts),
+                np.add.reduceat(amount, starts), np.diff(np.append(starts, len(key))).astype(np.float64)))
+            codes = [str(c) for c in engine.codes]
+            for d, c, v in zip(day[starts].tolist(), engine.code_id[starts].tolist(), values.tolist()):
+                self._rows[(d, codes[c])] = v
+            ends = engine.ends - 1
+            counts = engine.ends - engine.starts
+            amounts = np.add.reduceat(amount, engine.starts)
+            shares = np.add.reduceat(engine.trade_quantity, engine.starts)
+            for i, code in enumerate(codes):
+                self._state[code] = [float(engine.quantity[ends[i]]), float(engine.cost[ends[i]]),
+                                     float(day[ends[i]]), float(counts[i]), float(amounts[i]), float(shares[i])]
+        self.last_replayed = len(engine)
+
+    def _replay_codes(self, codes: Set[str]):
+        """只重放指定股票（按日期稳定排序），其余股票的行保持不变"""
+        from utils.history_index import HistoryIndex
+        history = self.data_manager.get_history()
+        postings = HistoryIndex.shared(self.data_manager).postings()
+        self._rows = {k: v for k, v in self._rows.items() if k[1] not in codes}
+        for code in codes:
+            self._state.pop(code, None)
+            idx = postings.get(code)
+            if idx is None:
+                continue
+            records = sorted((history[i] for i in idx.tolist()), key=lambda h: str(h.get('date', ''))[:10])
+            for h in records:
+                self._apply(h, set())
+            self.last_replayed += len(records)
+
+    def _changed_codes(self) -> Optional[Set[str]]:
+        """历史被改写后，按笔数与金额校验和比较出变化的股票；无法判断时返回 None"""
+        from utils.equity_curve import _to_days
+        from utils.history_index import HistoryIndex
+        index = HistoryIndex.shared(self.data_manager)
+        valid = ~np.isnat(_to_days(index.column('date')))   # 日期无效的记录不入表
+        codes = index.column('code')[valid]
+        if not len(codes):
+            return set(self._state)
+        uniq, inverse = np.unique(codes, return_inverse=True)
+        prices = index.column('price')[valid]
+        quantities = index.column('quantity')[valid]
+        counts = np.bincount(inverse)
+        amounts = np.bincount(inverse, weights=prices * quantities)
+        shares = np.bincount(inverse, weights=quantities)
+        changed = set(self._state) - set(uniq.tolist())
+        for code, count, amount, share in zip(uniq.tolist(), counts.tolist(), amounts.tolist(), shares.tolist()):
+            state = self._state.get(code)
+            if state is None or state[_COUNT] != count or \
+                    abs(state[_AMOUNT] - amount) > 1e-6 * max(1.0, abs(amount)) or \
+                    abs(state[_SHARES] - share) > 1e-6 * max(1.0, abs(share)):
+                changed.add(code)
+        return changed if len(changed) <= max(1, len(uniq) // 2) else None
+
+    def _sources(self):
+        """(归档分区清单, 当前分区记录)；没有归档的数据管理器整体视为当前分区"""
+        archive = getattr(self.data_manager, 'archive', None)
+        if archive:
+            return tuple(archive.names()), self.data_manager.data.get('history', [])
+        return (), self.data_manager.get_history()
+
+    def _mark(self, segments: tuple, recent: List[Dict[str, Any]]):
+        self._segments = segments
+        self._recent = len(recent)
+        self._recent_fingerprint = _fingerprint(recent[-1]) if recent else 0
+        self._rewrites = getattr(self.data_manager, 'history_rewrites', 0)
+        self._frame = None
+
+    def sync(self) -> 'DailyPnlTable':
+        """让表追上当前历史，有变化时落盘"""
+        self._load()
+        self.last_replayed = 0
+        segments, recent = self._sources()
+        rewrites = getattr(self.data_manager, 'history_rewrites', 0)
+        if self._segments == segments and self._rewrites in (None, rewrites) and self._recent <= len(recent) and \
+                (self._recent == 0 or _fingerprint(recent[self._recent - 1]) == self._recent_fingerprint):
+            # 归档未变、当前分区只有追加：不触碰归档分区
+            if self._recent == len(recent):
+                self._rewrites = rewrites
+                return self
+            added = recent[self._recent:]
+            if not self._applied or len(added) > REBUILD_THRESHOLD:
+                self._rebuild()
+            else:
+                dirty: Set[str] = set()
+                for h in added:
+                    self._apply(h, dirty)
+                self.last_replayed = len(added)
+                if dirty:
+                    self._replay_codes(dirty)
+            self._applied += len(added)
+            self._fingerprint = _fingerprint(recent[-1]) if recent else self._fingerprint
+            self._mark(segments, recent)
+            self.save()
+            return self
+
+        history = self.data_manager.get_history()
+        appended = (self._applied <= len(history) and
+                    (self._applied == 0 or _fingerprint(history[self._applied - 1]) == self._fingerprint) and
+                    (self._rewrites is None or self._rewrites == rewrites))
+        if appended and (not self._applied or len(history) - self._applied > REBUILD_THRESHOLD):
+            self._rebuild()
+        elif appended:
+            dirty = set()
+            for h in history[self._applied:]:
+                self._apply(h, dirty)
+            self.last_replayed = len(history) - self._applied
+            if dirty:
+                self._replay_codes(dirty)
+        else:
+            # 删除记录或归档换序：按校验和只重放变化的股票（归档换序时通常没有）
+            changed = self._changed_codes() if self._state else None
+            if changed is None:
+                self._rebuild()
+            elif changed:
+                self._replay_codes(changed)
+        self._applied = len(history)
+        self._fingerprint = _fingerprint(history[-1]) if history else 0
+        self._mark(segments, recent)
+        self.save()
+        return self
+
+    # ---- 查询 ----
+
+    def frame(self) -> pd.DataFrame:
+        """逐（日期, 代码）的表：date、code、realised、fees、turnover、trades"""
+        self.sync()
+        if self._frame is None:
+            keys = list(self._rows)
+            values = np.array([self._rows[k] for k in keys], dtype=np.float64).reshape(-1, len(VALUE_FIELDS))
+            frame = pd.DataFrame(values, columns=list(VALUE_FIELDS))
+            frame.insert(0, 'code', [c for _, c in keys])
+            frame.insert(0, 'date', np.array([d for d, _ in keys], dtype='datetime64[D]'))
+            self._frame = frame.sort_values(['date', 'code'], kind='stable').reset_index(drop=True)
+        return self._frame
+
+    def daily(self, start=None, end=None, code: Optional[str] = None) -> pd.DataFrame:
+        """按日汇总（可限定日期范围与代码），按日期索引"""
+        frame = self.frame()
+        mask = np.ones(len(frame), dtype=bool)
+        if start:
+            mask &= frame['date'].to_numpy() >= np.datetime64(str(start)[:10])
+        if end:
+            mask &= frame['date'].to_numpy() <= np.datetime64(str(end)[:10])
+        if code:
+            mask &= frame['code'].to_numpy() == code
+        return frame[mask].groupby('date')[list(VALUE_FIELDS)].sum()
+
+    def aggregate(self, period: str = 'M') -> pd.DataFrame:
+        """
+        按月（'M'）或年（'Y'）汇总
+
+        返回:
+            DataFrame：索引为 YYYY-MM 或 YYYY，列为 realised、fees、turnover、trades
+        """
+        frame = self.frame()
+        width = 7 if period == 'M' else 4
+        labels = frame['date'].to_numpy().astype('datetime64[D]').astype(str).astype(f'U{width}')
+        return frame.groupby(labels)[list(VALUE_FIELDS)].sum()
+
+    def by_code(self) -> pd.DataFrame:
+        """按代码汇总"""
+        return self.frame().groupby('code')[list(VALUE_FIELDS)].sum()
+
+    def totals(self) -> Dict[str, float]:
+        values = self.frame()[list(VALUE_FIELDS)].sum()
+        return {field: float(values[field]) for field in VALUE_FIELDS}
@@ -1,50 +1,84 @@
 import json
 import os
 import shutil
-from typing import Dict, List, Any, Optional
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterator
+
+from utils.backup_store import BackupStore
+from utils.history_archive import HistoryArchive, HistoryView, month_of
 
 
 class DataManager:
     """数据管理器，负责读写JSON数据文件"""
     
-    def __init__(self, data_file='data/trading_data.json'):
+    def __init__(self, data_file='data/trading_data.json', backup_generations=10):
         """
         初始化数据管理器
         
         参数:
             data_file: 数据文件路径，相对于项目根目录
+            backup_generations: 滚动备份保留的版本数
         """
         # 确保路径是相对于项目根目录的绝对路径
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.data_file = os.path.join(base_dir, data_file)
-        self.temp_file = os.path.join(base_dir, 'data/trading_data_temp.json')
-        self.backup_file = os.path.join(base_dir, 'data/trading_data_backup.json')
+        data_dir = os.path.dirname(self.data_file)
+        self.temp_file = os.path.join(data_dir, 'trading_data_temp.json')
+        # 旧版单代备份，只在还原时作为最后手段读取
+        self.backup_file = os.path.join(data_dir, 'trading_data_backup.json')
+        self.backups = BackupStore(self.data_file, os.path.join(data_dir, 'backups'), backup_generations)
         
         # 确保数据目录存在
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+        os.makedirs(data_dir, exist_ok=True)
         
         # 加载数据
+        self._data_dir = data_dir
+        self._load_state()
+        # 交易历史版本号，每次增删递增，供索引/缓存判断是否失效
+        self.history_version = 0
+        # 历史被删除/改写（非追加）的次数，持仓投影据此判断能否只应用增量
+        self.history_rewrites = 0
+        # transaction() 嵌套深度；大于 0 时 save_data 只标记待保存
+        self._transaction_depth = 0
+        self._pending_save = False
+    
+    def _load_state(self):
+        """读入数据文件并建立归档分区视图"""
         self.data = self._load_data()
         # 兼容老文件：补充缺失的键
         self.data.setdefault('positions', [])
         self.data.setdefault('history', [])
         self.data.setdefault('plans', [])
         self.data.setdefault('last_prices', {})  # 代码->最近一次成功价格
+        # 已结束月份的交易历史按月压缩存放在 data/history/，主文件只保留当前分区和分区清单
+        self.data.setdefault('history_segments', [])
+        # 各分区的记录数，按下标取记录时据此定位分区而不必解压全部分区
+        self.data.setdefault('history_segment_sizes', {})
+        self.archive = HistoryArchive(os.path.join(self._data_dir, 'history'), self.data['history_segments'],
+                                      self.data['history_segment_sizes'])
+        self._history_all = None
+        self._history_all_version = None
+        self._history_view = None
+        self._history_view_version = None
     
     def _load_data(self) -> Dict[str, Any]:
         """从JSON文件加载数据"""
         try:
             with open(self.data_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except FileNotFoundError:
-            # 如果文件不存在，返回默认空数据结构
-            return self._create_default_data()
-        except json.JSONDecodeError:
-            # 如果JSON解析错误，尝试恢复备份
-            if os.path.exists(self.backup_file):
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError) as e:
+            # 文件损坏（或保存中途丢失）时，从滚动备份中找最新一个可解析的版本
+            restored = self.backups.restore_latest()
+            if restored is not None:
+                seq, data = restored
+                print(f"数据文件{'缺失' if isinstance(e, FileNotFoundError) else '损坏'}，已从备份版本 {seq} 恢复")
+                return data
+            if not isinstance(e, FileNotFoundError) and os.path.exists(self.backup_file):
                 shutil.copy2(self.backup_file, self.data_file)
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
+            # 如果文件不存在，返回默认空数据结构
             return self._create_default_data()
     
     def _create_default_data(self) -> Dict[str, Any]:
@@ -58,38 +92,220 @@ class DataManager:
     
     def save_data(self) -> bool:
         """
-        安全保存数据到JSON文件
+        安全保存数据到JSON文件（处于 transaction() 中时推迟到事务结束）
         
         返回:
             bool: 保存是否成功
         """
+        if self._transaction_depth:
+            self._pending_save = True
+            return True
         try:
+            # 0. 已结束月份的记录先写入只读分区，随本次主文件一起生效
+            self.archive_closed_months()
+            
             # 1. 保存到临时文件
             with open(self.temp_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-            
-            # 2. 备份原文件（如果存在）
-            if os.path.exists(self.data_file):
-                shutil.copy2(self.data_file, self.backup_file)
+                self._write_json(f)
             
-            # 3. 替换原文件
-            shutil.move(self.temp_file, self.data_file)
-            
-            return True
+            # 2. 原文件滚动进备份（硬链接 + 反向增量，不整份复制），再原子替换
+            committed = self.backups.commit(self.temp_file)
+            # 3. 新清单已生效，清理被替换或未提交的分区文件；保留中的备份版本仍引用的分区留到其过期
+            self.archive.cleanup(self._backup_segments() if self.archive.orphans() else ())
+            return committed
         except Exception as e:
-            # 恢复备份文件（如果存在）
-            if os.path.exists(self.backup_file):
-                shutil.copy2(self.backup_file, self.data_file)
+            # 替换是最后一步，失败时原文件保持不变，只需清理临时文件
+            if os.path.exists(self.temp_file):
+                try:
+                    os.remove(self.temp_file)
+                except OSError:
+                    pass
             print(f"保存数据时发生错误: {str(e)}")
             return False
     
+    def _backup_segments(self) -> set:
+        """保留中的各代备份清单里引用的分区文件名"""
+        return self.backups.referenced(rb'\d{4}-\d{2}\.\d{3}\.json\.gz')
+    
+    @contextmanager
+    def transaction(self):
+        """
+        把块内的多次修改合并为一次保存
+
+        块内各修改方法照常返回，只在最外层正常退出时保存一次；块内抛出异常时不写盘，
+        并丢弃内存中的修改（重新读入数据文件），各派生缓存按历史改写处理。
+        保存失败时抛出 OSError。
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self._pending_save = False
+                self._load_state()
+                self.history_version += 1
+                self.history_rewrites += 1
+            raise
+        self._transaction_depth -= 1
+        if not self._transaction_depth and self._pending_save:
+            self._pending_save = False
+            if not self.save_data():
+                raise OSError("保存数据失败")
+    
+    def _write_json(self, f):
+        """
+        写出数据：列表每条记录占一行
+
+        indent 参数会让 json 退回纯 Python 编码器，百万级历史时比逐条用 C 编码器慢数倍；
+        每条一行既保持可读，也便于比较差异。
+        """
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        items = list(self.data.items())
+        f.write('{\n')
+        for i, (key, value) in enumerate(items):
+            f.write(f'  {encode(key)}: ')
+            if isinstance(value, list) and value:
+                f.write('[\n    ' + ',\n    '.join(map(encode, value)) + '\n  ]')
+            else:
+                f.write(encode(value))
+            f.write(',\n' if i < len(items) - 1 else '\n')
+        f.write('}\n')
+    
     def get_positions(self) -> List[Dict[str, Any]]:
         """获取所有持仓数据（不依赖派生字段，如market_value/commission）"""
         return self.data.get('positions', [])
     
     def get_history(self) -> List[Dict[str, Any]]:
-        """获取所有交易历史数据（每笔含commission可选）"""
-        return self.data.get('history', [])
+        """
+        获取所有交易历史数据（每笔含commission可选）
+
+        有归档分区时按月份顺序拼接分区与当前分区（首次调用时解压分区），
+        历史不变时返回同一个列表对象。只需部分日期时用 iter_history，只打开相关分区；
+        只按下标取少量记录时用 history_view。
+        """
+        recent = self.data.get('history', [])
+        if not self.archive:
+            return recent
+        if self._history_all is None or self._history_all_version != self.history_version:
+            combined = []
+            for name in self.archive.names():
+                combined.extend(self.archive.load(name))
+            combined.extend(recent)
+            self._history_all = combined
+            self._history_all_version = self.history_version
+        return self._history_all
+    
+    def history_view(self) -> HistoryView:
+        """
+        与 get_history() 下标一致的只读序列视图，按下标取记录时只打开所在的归档分区
+
+        历史不变时返回同一个视图对象。
+        """
+        if self._history_view is None or self._history_view_version != self.history_version:
+            self._history_view = HistoryView(self.archive, self.data.get('history', []))
+            self._history_view_version = self.history_version
+        return self._history_view
+    
+    def archive_closed_months(self, current_month: Optional[str] = None) -> int:
+        """
+        把当前分区中已结束月份的记录写入只读压缩分区（保存时自动调用）
+
+        参数:
+            current_month: 当前月份 YYYY-MM，默认取本地日期
+
+        返回:
+            int: 移出当前分区的记录数
+        """
+        current_month = current_month or time.strftime('%Y-%m')
+        recent = self.data.get('history', [])
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        keep = []
+        for h in recent:
+            month = month_of(h)
+            if month is not None and month < current_month:
+                groups.setdefault(month, []).append(h)
+            else:
+                keep.append(h)
+        if not groups:
+            return 0
+        for month in sorted(groups):
+            # 补入的旧记录并入该月已有分区，不为每次保存另起一个小分区
+            self.archive.merge(month, groups[month])
+        self.data['history'] = keep
+        self.data['history_segments'] = self.archive.names()
+        # 记录顺序变为按月分区排列
+        self.history_version += 1
+        self.history_rewrites += 1
+        return len(recent) - len(keep)
+    
+    def iter_history(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     code: Optional[str] = None, chunk_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        按条件分块遍历交易历史
+
+        参数:
+            start_date: 起始日期（含），格式 YYYY-MM-DD
+            end_date: 结束日期（含），格式 YYYY-MM-DD
+            code: 仅返回该代码的记录
+            chunk_size: 每块记录数
+
+        返回:
+            生成器，每次产出一个记录列表
+        """
+        def sources():
+            # 只打开日期范围涉及的分区；未缓存的分区读完即释放
+            for name in self.archive.names(start_date, end_date):
+                yield self.archive.load(name, cache=self.archive.is_loaded(name))
+            yield self.data.get('history', [])
+        
+        chunk = []
+        for h in (h for records in sources() for h in records):
+            if code and h.get('code') != code:
+                continue
+            if start_date or end_date:
+                date = str(h.get('date', ''))[:10]
+                if (start_date and date < start_date) or (end_date and date > end_date):
+                    continue
+            chunk.append(h)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def iter_history_months(self, end_date: Optional[str] = None,
+                            code: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        按月份升序逐月产出交易历史，每月内按日期稳定排序（日期不规范的记录最先产出）
+
+        每次只载入一个月的归档分区，当前分区只按月份分组引用，内存占用与单月记录数相当；
+        用于历史顺序与日期不一致时仍需按日期回放的场景。
+
+        参数:
+            end_date: 结束日期（含），格式 YYYY-MM-DD
+            code: 仅返回该代码的记录
+        """
+        def wanted(h):
+            if code and h.get('code') != code:
+                return False
+            return not end_date or str(h.get('date', ''))[:10] <= end_date
+        
+        current: Dict[str, List[Dict[str, Any]]] = {}
+        for h in self.data.get('history', []):
+            if wanted(h):
+                current.setdefault(month_of(h) or '', []).append(h)
+        months = sorted(set(current) | {n[:7] for n in self.archive.names(end_date=end_date)})
+        for month in months:
+            records = []
+            if month:
+                for name in self.archive.names(f'{month}-01', f'{month}-31'):
+                    records.extend(h for h in self.archive.load(name, cache=self.archive.is_loaded(name))
+                                   if wanted(h))
+            records.extend(current.get(month, []))
+            if records:
+                records.sort(key=lambda h: str(h.get('date', ''))[:10])
+                yield records
     
     def get_plans(self) -> List[Dict[str, Any]]:
         """获取所有止盈止损计划"""
@@ -99,21 +315,48 @@ class DataManager:
         """获取最近一次成功的价格缓存"""
         return self.data.get('last_prices', {})
     
-    def update_last_prices(self, mapping: Dict[str, float]) -> bool:
-        """合并并保存最近价格缓存"""
+    def update_last_prices(self, mapping: Dict[str, float], save: bool = True) -> bool:
+        """合并最近价格缓存；save=False 时仅更新内存，由调用方择机落盘"""
         if not mapping:
             return True
         self.data.setdefault('last_prices', {}).update({k: float(v) for k, v in mapping.items() if k})
-        return self.save_data()
+        return self.save_data() if save else True
     
     def add_position(self, position: Dict[str, Any]) -> bool:
         self.data.setdefault('positions', []).append(position)
         return self.save_data()
     
+    def get_opening_balances(self) -> Dict[str, Dict[str, Any]]:
+        """期初余额：代码 -> {'name', 'quantity', 'cost'}，即没有交易历史的持仓在首笔交易前的数量与成本总额"""
+        return self.data.get('opening_balances', {})
+    
+    def add_opening_balances(self, balances: Dict[str, Dict[str, Any]], save: bool = True) -> bool:
+        """登记期初余额（已登记的代码不覆盖）；save=False 时仅更新内存"""
+        if not balances:
+            return True
+        current = self.data.setdefault('opening_balances', {})
+        for code, balance in balances.items():
+            current.setdefault(code, dict(balance))
+        return self.save_data() if save else True
+    
+    def replace_positions(self, positions: List[Dict[str, Any]]) -> bool:
+        """整体替换持仓（如按交易历史重建后）"""
+        self.data['positions'] = list(positions)
+        return self.save_data()
+    
     def add_history(self, history: Dict[str, Any]) -> bool:
         self.data.setdefault('history', []).append(history)
+        self.history_version += 1
         return self.save_data()
     
+    def add_history_many(self, records: List[Dict[str, Any]]) -> bool:
+        """批量追加交易历史，整批只保存一次"""
+        if not records:
+            return True
+        self.data.setdefault('history', []).extend(records)
+        self.history_version += 1
+        return self.save_data()
+
     def add_plan(self, plan: Dict[str, Any]) -> bool:
         self.data.setdefault('plans', []).append(plan)
         return self.save_data()
@@ -126,6 +369,15 @@ class DataManager:
                 return self.save_data()
         return False
     
+    def update_plan_states(self, states: Dict[str, Any], save: bool = True) -> bool:
+        """批量写入计划的跟踪状态 {plan_id: state}，整批只保存一次；save=False 时仅更新内存"""
+        if not states:
+            return True
+        for p in self.data.get('plans', []):
+            if p.get('id') in states:
+                p['state'] = states[p['id']]
+        return self.save_data() if save else True
+    
     def delete_plan(self, plan_id: str) -> bool:
         plans = self.data.get('plans', [])
         idx = next((i for i, p in enumerate(plans) if p.get('id') == plan_id), -1)
@@ -151,7 +403,21 @@ class DataManager:
         return False
     
     def delete_history(self, index: int) -> bool:
-        if 0 <= index < len(self.data['history']):
+        """按 get_history() 下标删除；位于归档分区时写时复制替换该分区"""
+        if index < 0:
+            return False
+        for name in self.archive.names():
+            records = self.archive.load(name)
+            if index < len(records):
+                remaining = records[:index] + records[index + 1:]
+                self.archive.replace(name, remaining)
+                self.data['history_segments'] = self.archive.names()
+                break
+            index -= len(records)
+        else:
+            if index >= len(self.data['history']):
+                return False
             del self.data['history'][index]
-            return self.save_data()
-        return False
\ No newline at end of file
+        self.history_version += 1
+        self.history_rewrites += 1
+        return self.save_data()
\ No newline at end of file
@@ -0,0 +1,415 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from controllers.trade_controller import SELL_SIDES
+from utils.history_index import HistoryIndex
+
+
+# 日线缓存单只股票最多请求的根数（约 12 年）
+MAX_DAILY_BARS = 3000
+CURVE_COLUMNS = ['market_value', 'cost', 'realised', 'unrealised', 'pnl', 'drawdown', 'drawdown_ratio']
+
+
+def _segment_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """分段累加：starts 为每段起点的布尔掩码"""
+    total = np.cumsum(values)
+    seg = np.cumsum(starts) - 1
+    base = (total - values)[starts]
+    return total - base[seg]
+
+
+# 成本递推按对数区间分块：块内累计对数跌幅不超过该值，exp 不会上溢
+_LOG_BLOCK = 500.0
+
+
+def _affine_scan(a: np.ndarray, b: np.ndarray, episode: np.ndarray) -> np.ndarray:
+    """
+    分段求解 c_t = a_t * c_{t-1} + b_t（0 <= a_t <= 1，每段起点 c 从 0 开始）
+
+    块内以块起点为对数基准做向量化前缀和；多次部分卖出使累计对数跌幅超过 _LOG_BLOCK 时
+    另起一块，块间只顺序传递一个期初成本，避免 exp(-log_a) 上溢。
+    前缀和按组独立累加，不用全局 cumsum 相减，数量级悬殊的块之间不会互相吞掉精度。
+    """
+    def group_cumsum(values, group_starts):
+        return pd.Series(values).groupby(np.cumsum(group_starts)).cumsum().to_numpy()
+
+    log_step = np.log(np.where(a > 0, a, 1.0))
+    log_a = group_cumsum(log_step, episode)
+    block = np.floor(-log_a / _LOG_BLOCK).astype(np.int64)
+    starts = episode.copy()
+    starts[1:] |= block[1:] != block[:-1]
+    base = (log_a - log_step)[starts]
+    block_id = np.cumsum(starts) - 1
+    rel = log_a - base[block_id]
+    scale = np.exp(rel)
+    local = scale * group_cumsum(b * np.exp(-rel), starts)
+    first = np.flatnonzero(starts)
+    carried = np.flatnonzero(starts & ~episode)
+    if len(carried):
+        # 期初成本：上一块的期末成本（块数很少，顺序传递）
+        opening = np.zeros(len(first))
+        block_end = np.append(first[1:], len(a)) - 1
+        for k in np.searchsorted(first, carried):
+            end = block_end[k - 1]
+            opening[k] = local[end] + scale[end] * opening[k - 1]
+        local = local + scale * opening[block_id]
+    return local
+
+
+def _to_days(dates: np.ndarray) -> np.ndarray:
+    try:
+        return dates.astype('datetime64[D]')   # 规范的 YYYY-MM-DD 直接转换
+    except ValueError:
+        return pd.to_datetime(pd.Series(dates), errors='coerce').values.astype('datetime64[D]')
+
+
+class PointInTimeEngine:
+    """
+    任意日期的持仓重建
+
+    交易按（代码, 日期, 录入顺序）排序后一次性向量化计算每笔之后的
+    持仓数量、成本总额（移动加权平均，卖出按均价结转）与累计已实现盈亏。
+    每笔交易之后的状态都保存下来，相当于逐笔检查点：查询某日持仓只需
+    对（代码, 日期）组合键做一次二分，查询整条日线则对整个日期网格批量二分。
+    """
+
+    def __init__(self, codes, names, dates, types, prices, quantities, fees=None):
+        """
+        参数:
+            codes/names/dates/types/prices/quantities/fees: 与历史记录一一对应的列数组，
+                dates 为 YYYY-MM-DD 字符串或 datetime64
+        """
+        days = dates if np.issubdtype(np.asarray(dates).dtype, np.datetime64) else _to_days(np.asarray(dates))
+        days = np.asarray(days, dtype='datetime64[D]')
+        keep = ~np.isnat(days)
+        codes = np.asarray(codes)[keep]
+        names = np.asarray(names)[keep]
+        days = days[keep]
+        prices = np.asarray(prices, dtype=np.float64)[keep]
+        quantities = np.asarray(quantities, dtype=np.float64)[keep]
+        fees = np.zeros(len(prices)) if fees is None else np.asarray(fees, dtype=np.float64)[keep]
+        is_sell = np.isin(np.asarray(types)[keep], SELL_SIDES)
+
+        self.codes, code_id = np.unique(codes, return_inverse=True)
+        # 每只股票取最后一笔记录的名称
+        last = len(codes) - 1 - np.unique(code_id[::-1], return_index=True)[1]
+        self.names = [str(name) for name in names[last]]
+        day_num = days.astype(np.int64)
+        order = np.lexsort((np.arange(len(days)), day_num, code_id))
+        code_id, day_num = code_id[order], day_num[order]
+        prices, quantities, fees, is_sell = prices[order], quantities[order], fees[order], is_sell[order]
+        n = len(order)
+
+        group_start = np.zeros(n, dtype=bool)
+        group_start[:1] = True
+        group_start[1:] = code_id[1:] != code_id[:-1]
+        self.starts = np.flatnonzero(group_start)
+        self.ends = np.append(self.starts[1:], n)
+
+        signed = np.where(is_sell, -quantities, quantities)
+        # 数量在 0 处截断（超卖不留空头）：q_t = S_t - min(0, 段内 S 的前缀最小值)
+        running = _segment_cumsum(signed, group_start)
+        floor = pd.Series(running).groupby(np.cumsum(group_start)).cummin().to_numpy()
+        qty_after = running - np.minimum(floor, 0.0)
+        qty_before = np.concatenate(([0.0], qty_after[:-1]))
+        qty_before[group_start] = 0.0
+        # 成本递推 c_t = a_t * c_{t-1} + b_t：买入 a=1、b=成交额+费用；卖出 a=剩余/原有、b=0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(qty_before > 0, np.clip(qty_after, 0, None) / qty_before, 0.0)
+        a = np.where(is_sell, ratio, 1.0)
+        b = np.where(is_sell, 0.0, prices * quantities + fees)
+        # 清仓（a=0）后下一笔开始新的持仓周期
+        episode = group_start.copy()
+        episode[1:] |= a[:-1] == 0
+        cost = _affine_scan(a, b, episode)
+        cost[a == 0] = 0.0
+        cost_before = np.concatenate(([0.0], cost[:-1]))
+        cost_before[episode] = 0.0
+        sold = np.where(is_sell, np.minimum(quantities, np.clip(qty_before, 0, None)), 0.0)
+        # 卖出前数量为 0 时不计入已实现，与 PositionLedger 口径一致
+        released = np.where(qty_before > 0, cost_before * (1 - a), 0.0)
+        realised = np.where(is_sell, sold * prices - released - fees, 0.0)
+
+        self.keys = (code_id.astype(np.int64) << 32) + (day_num - day_num.min() if n else day_num)
+        self._day0 = int(day_num.min()) if n else 0
+        self.days = day_num.astype('datetime64[D]')
+        self.code_id = code_id
+        self.prices = prices
+        self.quantity = qty_after
+        self.cost = cost
+        # 逐笔数值（每日已实现盈亏表直接按日汇总）
+        self.trade_quantity = quantities
+        self.trade_realised = realised
+        self.fees = fees
+        self.realised = _segment_cumsum(realised, group_start)
+        self.first_day = self.days.min() if n else None
+
+    @classmethod
+    def from_data_manager(cls, data_manager) -> 'PointInTimeEngine':
+        """由 HistoryIndex 的列数组构建，历史版本不变时复用"""
+        def build(index: HistoryIndex):
+            return cls(index.column('code'), index.column('name'), index.column('date'),
+                       index.column('type'), index.column('price'), index.column('quantity'),
+                       index.column('commission'))
+        return HistoryIndex.shared(data_manager).derived('point_in_time', build)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def _lookup(self, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(代码数, 日期数) 的最后一笔交易下标及有效掩码"""
+        offsets = np.asarray(days, dtype='datetime64[D]').astype(np.int64) - self._day0
+        code_ids = np.arange(len(self.codes), dtype=np.int64)
+        query = (code_ids[:, None] << 32) + np.clip(offsets, -1, None)[None, :]
+        idx = np.searchsorted(self.keys, query, side='right') - 1
+        valid = (idx >= self.starts[:, None]) & (offsets[None, :] >= 0)
+        return np.where(valid, idx, 0), valid
+
+    def holdings_at(self, date) -> Dict[str, Dict[str, float]]:
+        """
+        某日收盘后的持仓
+
+        参数:
+            date: YYYY-MM-DD 或 datetime64
+
+        返回:
+            dict: 代码 -> {'name', 'quantity', 'cost', 'realised'}（含已清仓但有已实现盈亏的股票）
+        """
+        if not len(self):
+            return {}
+        idx, valid = self._lookup(np.array([np.datetime64(str(date)[:10], 'D')]))
+        result = {}
+        for i in np.flatnonzero(valid[:, 0]):
+            j = idx[i, 0]
+            result[str(self.codes[i])] = {'name': self.names[i], 'quantity': float(self.quantity[j]),
+                                          'cost': float(self.cost[j]), 'realised': float(self.realised[j])}
+        return result
+
+    def daily_curve(self, closes: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+                    start=None, end=None, latest_prices: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+        """
+        逐日权益曲线（一次批量计算）
+
+        参数:
+            closes: 代码 -> (日期数组 datetime64[D], 收盘价数组)，缺失时用最近成交价估值
+            start/end: 日期范围，默认从第一笔交易到今天
+            latest_prices: 最新价，覆盖最后一天的估值
+
+        返回:
+            DataFrame（按日期索引）：market_value 市值、cost 持仓成本、realised 累计已实现、
+            unrealised 浮动盈亏、pnl 总盈亏、drawdown 自高点回撤额、drawdown_ratio 回撤占至今最大投入成本的比例
+        """
+        if not len(self):
+            return pd.DataFrame(columns=CURVE_COLUMNS, dtype=float)
+        closes = closes or {}
+        first = np.datetime64(str(start)[:10], 'D') if start else self.first_day
+        last = np.datetime64(str(end)[:10], 'D') if end else np.datetime64(time.strftime('%Y-%m-%d'), 'D')
+        close_days = [d for d, _ in closes.values() if len(d)]
+        if close_days:
+            grid = np.union1d(np.concatenate(close_days), self.days)
+            grid = grid[(grid >= first) & (grid <= last)]
+        else:
+            grid = np.arange(first, last + 1, dtype='datetime64[D]')
+            grid = grid[np.is_busday(grid)]
+        if not len(grid):
+            return pd.DataFrame(columns=CURVE_COLUMNS, dtype=float)
+
+        idx, valid = self._lookup(grid)
+        quantity = np.where(valid, self.quantity[idx], 0.0)
+        cost = np.where(valid, self.cost[idx], 0.0)
+        realised = np.where(valid, self.realised[idx], 0.0)
+        price = np.where(valid, self.prices[idx], np.nan)   # 没有收盘价时用最近成交价
+        for i, code in enumerate(self.codes):
+            series = closes.get(str(code))
+            if series is None or not len(series[0]):
+                continue
+            days, values = series
+            pos = np.searchsorted(days, grid, side='right') - 1
+            price[i] = np.where(pos >= 0, values[np.clip(pos, 0, None)], price[i])
+        if latest_prices:
+            for i, code in enumerate(self.codes):
+                if latest_prices.get(str(code)):
+                    price[i, -1] = float(latest_prices[str(code)])
+
+        market = np.nansum(np.where(quantity > 0, quantity, 0.0) * price, axis=0)
+        cost_total = cost.sum(axis=0)
+        realised_total = realised.sum(axis=0)
+        unrealised = market - cost_total
+        pnl = realised_total + unrealised
+        peak = np.maximum.accumulate(pnl)
+        drawdown = pnl - peak
+        capital = np.maximum.accumulate(cost_total)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown_ratio = np.where(capital > 0, drawdown / capital, 0.0)
+        return pd.DataFrame({
+            'market_value': market, 'cost': cost_total, 'realised': realised_total,
+            'unrealised': unrealised, 'pnl': pnl, 'drawdown': drawdown, 'drawdown_ratio': drawdown_ratio,
+        }, index=pd.DatetimeIndex(grid, name='date'))
+
+
+class DailyCloseCache:
+    """
+    日线收盘价的本地缓存（npz 单文件）
+
+    每只股票每天最多请求一次，经 utils.bar_resampler.get_price 获取；
+    请求失败时保留已有数据，估值退回最近成交价。
+    """
+
+    def __init__(self, path: str, fetch: Optional[Callable] = None):
+        """
+        参数:
+            path: 缓存文件路径
+            fetch: 行情函数，签名同 utils.Ashare.get_price，默认延迟导入 bar_resampler.get_price
+        """
+        self.path = path
+        self._fetch = fetch
+        self._series: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._fetched: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with np.load(self.path, allow_pickle=False) as f:
+                codes = [str(c) for c in f['codes']]
+                fetched = [str(d) for d in f['fetched']]
+                for i, code in enumerate(codes):
+                    self._series[code] = (f[f'd{i}'].astype('datetime64[D]'), f[f'c{i}'].astype(np.float64))
+                    self._fetched[code] = fetched[i]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self) -> bool:
+        """原子写入缓存文件"""
+        with self._lock:
+            codes = list(self._series)
+            arrays = {'codes': np.array(codes, dtype=str),
+                      'fetched': np.array([self._fetched.get(c, '') for c in codes], dtype=str)}
+            for i, code in enumerate(codes):
+                days, values = self._series[code]
+                arrays[f'd{i}'] = days.astype(np.int64)
+                arrays[f'c{i}'] = values
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, self.path)
+            return True
+        except OSError:
+            return False
+
+    def cached(self, codes: Iterable[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """只读取本地已有的收盘价，不访问网络"""
+        self._load()
+        with self._lock:
+            return {c: self._series[c] for c in codes if c in self._series}
+
+    def refresh(self, codes: Iterable[str], since=None, workers: int = 8) -> int:
+        """
+        更新今天尚未更新过的股票（按股票并行请求）
+
+        参数:
+            codes: 证券代码
+            since: 需要覆盖的最早日期，决定请求根数
+            workers: 并行请求数
+
+        返回:
+            int: 成功更新的股票数
+        """
+        self._load()
+        if self._fetch is None:
+            from utils.bar_resampler import get_price
+            self._fetch = get_price
+        today = time.strftime('%Y-%m-%d')
+        count = MAX_DAILY_BARS
+        first = None
+        if since is not None:
+            first = np.datetime64(str(since)[:10], 'D')
+            count = min(MAX_DAILY_BARS, int(np.busday_count(first, np.datetime64(today, 'D'))) + 5)
+        pending = []
+        with self._lock:
+            for code in dict.fromkeys(codes):
+                cached = self._series.get(code)
+                fresh = self._fetched.get(code) == today and cached is not None and \
+                    (first is None or (len(cached[0]) and cached[0][0] <= first) or len(cached[0]) >= count)
+                if not fresh:
+                    pending.append(code)
+        if not pending:
+            return 0
+        fetch_one = lambda code: self._refresh_one(code, max(count, 1), today)
+        if workers > 1 and len(pending) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(workers, len(pending)), thread_name_prefix='daily-close') as pool:
+                return sum(pool.map(fetch_one, pending))
+        return sum(map(fetch_one, pending))
+
+    def _refresh_one(self, code: str, count: int, today: str) -> bool:
+        try:
+            df = self._fetch(code, count=count, frequency='1d')
+        except Exception:
+            return False
+        if df is None or df.empty:
+            return False
+        days = pd.DatetimeIndex(df.index).values.astype('datetime64[D]')
+        values = df['close'].to_numpy(np.float64)
+        with self._lock:
+            cached = self._series.get(code)
+            if cached is not None:
+                keep = cached[0] < days[0]
+                days = np.concatenate((cached[0][keep], days))
+                values = np.concatenate((cached[1][keep], values))
+            self._series[code] = (days, values)
+            self._fetched[code] = today
+        return True
+
+
+def default_close_cache(data_manager) -> DailyCloseCache:
+    """与数据文件同目录的日线缓存（同一 DataManager 共用）"""
+    cache = getattr(data_manager, '_close_cache', None)
+    if cache is None:
+        base = os.path.dirname(getattr(data_manager, 'data_file', '') or 'data/')
+        cache = DailyCloseCache(os.path.join(base, 'daily_closes.npz'))
+        data_manager._close_cache = cache
+    return cache
+
+
+def benchmark(symbols: int = 200, years: int = 10, trades: int = 100000) -> Dict[str, float]:
+    """
+    基准：symbols 只股票、years 年日线、trades 笔交易
+
+    返回:
+        dict: build 构建秒数、curve 计算日线曲线秒数、days 曲线天数
+    """
+    rng = np.random.default_rng(0)
+    end = np.datetime64('2025-12-31', 'D')
+    grid = np.arange(end - 365 * years, end + 1, dtype='datetime64[D]')
+    grid = grid[np.is_busday(grid)]
+    codes = np.array([f"sh{600000 + i}" for i in range(symbols)])
+    trade_code = codes[rng.integers(0, symbols, trades)]
+    trade_day = np.sort(grid[rng.integers(0, len(grid), trades)])
+    sides = np.where(rng.random(trades) < 0.4, '卖出', '买入')
+    prices = rng.uniform(5, 50, trades)
+    quantities = 100.0 * rng.integers(1, 10, trades)
+    closes = {c: (grid, np.cumprod(1 + rng.normal(0, 0.02, len(grid))) * 20) for c in codes}
+
+    start = time.perf_counter()
+    engine = PointInTimeEngine(trade_code, trade_code, trade_day, sides, prices, quantities)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    curve = engine.daily_curve(closes, end=end)
+    elapsed = time.perf_counter() - start
+    return {'build': built, 'curve': elapsed, 'days': float(len(curve))}
+
+
+if __name__ == '__main__':
+    # python -m utils.equity_curve
+    result = benchmark()
+    print(f"构建 {result['build']:.3f}s，{result['days']:.0f} 天日线曲线 {result['curve']:.3f}s")
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，缺失时只支持 CSV
+    pa = None
+    pq = None
+
+
+# 各数据集导出列与类型（类型用于 Parquet/Arrow 的固定 schema）
+DATASETS = {
+    'history': [('date', 'string'), ('type', 'string'), ('code', 'string'), ('name', 'string'),
+                ('price', 'float64'), ('quantity', 'float64'), ('amount', 'float64')],
+    'positions': [('code', 'string'), ('name', 'string'), ('quantity', 'float64'),
+                  ('cost_price', 'float64'), ('current_price', 'float64')],
+    'plans': [('id', 'string'), ('code', 'string'), ('name', 'string'), ('quantity', 'float64'),
+              ('cost_price', 'float64'), ('take_profit_price', 'float64'), ('take_profit_ratio', 'float64'),
+              ('stop_loss_price', 'float64'), ('stop_loss_ratio', 'float64'), ('buy_fee_total', 'float64'),
+              ('created_at', 'string')],
+    'snapshots': [('date', 'string'), ('code', 'string'), ('name', 'string'), ('quantity', 'float64'),
+                  ('cost_total', 'float64'), ('avg_cost', 'float64')],
+}
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+
+def _coerce(value: Any, type_: str) -> Any:
+    if type_ == 'float64':
+        try:
+            return float(value) if value not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+    return None if value is None else str(value)
+
+
+def _filter_small(records: List[Dict[str, Any]], code: Optional[str]) -> Iterator[List[Dict[str, Any]]]:
+    rows = [r for r in records if not code or r.get('code') == code]
+    if rows:
+        yield rows
+
+
+def iter_snapshots(data_manager, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   code: Optional[str] = None, chunk_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按交易日回放历史，产出每个有成交日期收盘后的持仓快照（当日所有未清仓的股票各一行）
+
+    成本按移动平均计算：买入累加成本，卖出按平均成本等比例减少。
+    历史需按日期有序遍历；起始日期之前的记录只参与回放，不输出。
+    """
+    holdings: Dict[str, List[Any]] = {}  # code -> [quantity, cost_total, name]
+    chunk: List[Dict[str, Any]] = []
+    current_date = None
+
+    def flush_day():
+        if start_date and current_date < start_date:
+            return
+        for c in sorted(holdings):
+            qty, cost, name = holdings[c]
+            if qty <= 0 or (code and c != code):
+                continue
+            chunk.append({'date': current_date, 'code': c, 'name': name, 'quantity': qty,
+                          'cost_total': round(cost, 2), 'avg_cost': round(cost / qty, 4)})
+
+    def records():
+        return (h for c in data_manager.iter_history(end_date=end_date, code=code, chunk_size=chunk_size) for h in c)
+
+    # 历史通常已按日期追加，此时直接流式回放；乱序时逐月载入并排序（分区按月划分，内存只占一个月）
+    last = ''
+    ordered = True
+    for h in records():
+        date = str(h.get('date', ''))[:10]
+        if date < last:
+            ordered = False
+            break
+        last = date
+    stream = records() if ordered else (h for month in data_manager.iter_history_months(end_date, code)
+                                        for h in month)
+    for h in stream:
+        date = str(h.get('date', ''))[:10]
+        if date != current_date:
+            if current_date is not None:
+                flush_day()
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            current_date = date
+        c = str(h.get('code', ''))
+        qty = float(h.get('quantity', 0) or 0)
+        price = float(h.get('price', 0) or 0)
+        state = holdings.setdefault(c, [0.0, 0.0, str(h.get('name', ''))])
+        if h.get('type') == '买入':
+            state[0] += qty
+            state[1] += price * qty
+        elif state[0] > 0:
+            sold = min(qty, state[0])
+            state[1] -= state[1] * sold / state[0]
+            state[0] -= sold
+        if state[0] <= 0:
+            # 清仓后不再出现在之后的快照中
+            del holdings[c]
+    if current_date is not None:
+        flush_day()
+    if chunk:
+        yield chunk
+
+
+def iter_dataset(data_manager, dataset: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 code: Optional[str] = None, chunk_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+    """按数据集名称返回分块记录迭代器；日期与代码过滤下推到 DataManager"""
+    if dataset == 'history':
+        return data_manager.iter_history(start_date, end_date, code, chunk_size)
+    if dataset == 'positions':
+        return _filter_small(data_manager.get_positions(), code)
+    if dataset == 'plans':
+        return _filter_small(data_manager.get_plans(), code)
+    if dataset == 'snapshots':
+        return iter_snapshots(data_manager, start_date, end_date, code, chunk_size)
+    raise ValueError(f"未知数据集: {dataset}")
+
+
+def _arrow_schema(columns):
+    types = {'string': pa.string(), 'float64': pa.float64()}
+    return pa.schema([(name, types[t]) for name, t in columns])
+
+
+def _to_arrow_batch(chunk, columns, schema):
+    arrays = [pa.array([_coerce(r.get(name), t) for r in chunk], type=schema.field(name).type)
+              for name, t in columns]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export(data_manager, dataset: str, path: str, fmt: Optional[str] = None,
+           start_date: Optional[str] = None, end_date: Optional[str] = None,
+           code: Optional[str] = None, chunk_size: int = 10000) -> int:
+    """
+    流式导出数据集
+
+    参数:
+        data_manager: DataManager 实例
+        dataset: history/positions/plans/snapshots
+        path: 输出文件路径
+        fmt: csv/parquet/arrow，默认按扩展名判断
+        start_date, end_date: 日期范围（含），仅对 history/snapshots 生效
+        code: 仅导出该代码
+        chunk_size: 每块记录数，内存占用与之成正比
+
+    返回:
+        int: 导出行数
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"未知数据集: {dataset}")
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower().lstrip('.')
+        fmt = {'parquet': 'parquet', 'pq': 'parquet', 'arrow': 'arrow', 'feather': 'arrow'}.get(ext, 'csv')
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    if fmt != 'csv' and pa is None:
+        raise ValueError("导出 Parquet/Arrow 需要安装 pyarrow")
+
+    columns = DATASETS[dataset]
+    names = [name for name, _ in columns]
+    chunks = iter_dataset(data_manager, dataset, start_date, end_date, code, chunk_size)
+    count = 0
+    if fmt == 'csv':
+        # utf-8-sig 便于 Excel 直接打开中文
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for chunk in chunks:
+                writer.writerows([r.get(name, '') for name in names] for r in chunk)
+                count += len(chunk)
+        return count
+
+    schema = _arrow_schema(columns)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema)
+    try:
+        for chunk in chunks:
+            writer.write_batch(_to_arrow_batch(chunk, columns, schema))
+            count += len(chunk)
+    finally:
+        writer.close()
+    return count
+
+
+def main():
+    from utils.data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description='导出交易数据')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('output', help='输出文件（.csv/.parquet/.arrow）')
+    parser.add_argument('--format', choices=FORMATS, default=None)
+    parser.add_argument('--start', default=None, help='起始日期 YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--code', default=None)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = export(DataManager(), args.dataset, args.output, args.format,
+                   args.start, args.end, args.code, args.chunk_size)
+    print(f"已导出 {count} 行到 {args.output}，耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    # python -m utils.exporter history out.parquet --start 2025-01-01 --code sh588000
+    main()
@@ -0,0 +1,241 @@
+import gzip
+import json
+import os
+import re
+import stat
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# 分区文件名：YYYY-MM.序号.json.gz，同一月份可有多个分区（如补导入的旧记录）
+SEGMENT_RE = re.compile(r'^(\d{4}-\d{2})\.(\d{3})\.json\.gz$')
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}')
+
+
+def month_of(record: Dict[str, Any]) -> Optional[str]:
+    """记录所属月份 YYYY-MM；日期不规范时返回 None（留在当前分区）"""
+    date = str(record.get('date', ''))
+    return date[:7] if _MONTH_RE.match(date) else None
+
+
+class HistoryArchive:
+    """
+    按月分区、压缩存放的已结束月份交易历史
+
+    每个分区是一个 gzip 压缩的 JSON 数组，写入后设为只读、不再修改；
+    删除其中的记录或补入该月的旧记录时另写一个新分区替换（写时复制）。
+    哪些分区有效由主数据文件中的清单决定：先写分区，再保存带新清单的主文件，
+    中途失败时主文件仍保留原记录，清单外的分区文件会被忽略并清理。
+    """
+
+    def __init__(self, directory: str, manifest: Optional[Iterable[str]] = None,
+                 sizes: Optional[Dict[str, int]] = None):
+        """
+        参数:
+            directory: 分区目录
+            manifest: 有效分区文件名列表（来自主数据文件）
+            sizes: 分区名 -> 记录数（来自主数据文件，原地维护）；缺少的分区在首次用到时读取一次补上
+        """
+        self.directory = directory
+        self._names: List[str] = sorted(n for n in (manifest or []) if SEGMENT_RE.match(n))
+        self._cache: Dict[str, List[Dict[str, Any]]] = {}
+        self._sizes: Dict[str, int] = sizes if sizes is not None else {}
+
+    def names(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[str]:
+        """按月份升序的分区名；给出日期范围时只返回可能包含该范围记录的分区"""
+        if not start_date and not end_date:
+            return list(self._names)
+        lo = str(start_date)[:7] if start_date else ''
+        hi = str(end_date)[:7] if end_date else '9999-99'
+        return [n for n in self._names if lo <= n[:7] <= hi]
+
+    def __bool__(self) -> bool:
+        return bool(self._names)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self, name: str, cache: bool = True) -> List[Dict[str, Any]]:
+        """读取分区（默认缓存，分区不可变所以无需失效）"""
+        records = self._cache.get(name)
+        if records is None:
+            with gzip.open(self._path(name), 'rt', encoding='utf-8') as f:
+                records = json.load(f)
+            if cache:
+                self._cache[name] = records
+            self._sizes[name] = len(records)
+        return records
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._cache
+
+    def size(self, name: str) -> int:
+        """分区的记录数（清单中已有时不打开分区）"""
+        if name not in self._sizes:
+            self.load(name, cache=False)
+        return self._sizes[name]
+
+    def _forget(self, names: Iterable[str]):
+        for n in names:
+            self._cache.pop(n, None)
+            self._sizes.pop(n, None)
+
+    def _write(self, month: str, records: List[Dict[str, Any]]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        used = {int(m.group(2)) for m in map(SEGMENT_RE.match, os.listdir(self.directory))
+                if m and m.group(1) == month}
+        name = f"{month}.{max(used | {0}) + 1:03d}.json.gz"
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        tmp = self._path(name) + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write('[\n' + ',\n'.join(map(encode, records)) + '\n]\n')
+        os.replace(tmp, self._path(name))
+        os.chmod(self._path(name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        self._cache[name] = records
+        self._sizes[name] = len(records)
+        return name
+
+    def add(self, month: str, records: List[Dict[str, Any]]) -> str:
+        """为某月写一个新的只读分区，返回分区名（需随主文件清单一起保存才生效）"""
+        name = self._write(month, records)
+        self._names = sorted(self._names + [name])
+        return name
+
+    def merge(self, month: str, records: List[Dict[str, Any]]) -> str:
+        """
+        把某月的记录并入该月已有分区（写时复制为一个新分区）；该月还没有分区时新建
+
+        返回:
+            str: 新分区名（需随主文件清单一起保存才生效）
+        """
+        existing = [n for n in self._names if n[:7] == month]
+        if not existing:
+            return self.add(month, records)
+        combined = [h for n in existing for h in self.load(n, cache=self.is_loaded(n))] + list(records)
+        name = self._write(month, combined)
+        self._names = sorted([n for n in self._names if n not in existing] + [name])
+        self._forget(existing)
+        return name
+
+    def replace(self, name: str, records: List[Dict[str, Any]]) -> Optional[str]:
+        """写时复制：用新分区替换旧分区（records 为空时直接移除），返回新分区名"""
+        new_name = self._write(name[:7], records) if records else None
+        self._names = sorted([n for n in self._names if n != name] + ([new_name] if new_name else []))
+        self._forget([name])
+        return new_name
+
+    def orphans(self) -> List[str]:
+        """目录中不在当前清单里的分区文件名"""
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return []
+        keep = set(self._names)
+        return [n for n in files if SEGMENT_RE.match(n) and n not in keep]
+
+    def cleanup(self, protected: Iterable[str] = ()):
+        """
+        删除不在清单中的分区文件（上次保存中断留下的或已被替换的）
+
+        参数:
+            protected: 仍被其他清单（如保留中的备份版本）引用、不能删除的分区名
+        """
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            return
+        keep = set(self._names) | set(protected)
+        for name in files:
+            if (SEGMENT_RE.match(name) and name not in keep) or name.endswith('.json.gz.tmp'):
+                path = self._path(name)
+                try:
+                    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+                    os.remove(path)
+                except OSError:
+                    pass
+        for name in list(self._cache):
+            if name not in self._names:
+                del self._cache[name]
+
+    def disk_bytes(self) -> int:
+        return sum(os.path.getsize(self._path(n)) for n in self._names if os.path.exists(self._path(n)))
+
+
+class HistoryView:
+    """
+    交易历史的只读序列视图（与 DataManager.get_history() 下标一致）
+
+    按下标或区间取记录时只打开涉及的归档分区，长度由清单中的分区记录数得出，不必解压全部分区。
+    视图对应创建时的历史版本，历史变化后应重新获取。
+    """
+
+    def __init__(self, archive: HistoryArchive, recent: List[Dict[str, Any]]):
+        self._archive = archive
+        self._names = archive.names()
+        # 各分区及当前分区的起始下标
+        self._starts = [0] + list(accumulate(archive.size(n) for n in self._names))
+        self._recent = recent
+
+    def __len__(self) -> int:
+        return self._starts[-1] + len(self._recent)
+
+    def _part(self, i: int) -> List[Dict[str, Any]]:
+        return self._archive.load(self._names[i]) if i < len(self._names) else self._recent
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            records = []
+            i = bisect_right(self._starts, start) - 1
+            while start < stop:
+                base = self._starts[i]
+                part = self._part(i)
+                take = part[start - base:stop - base]
+                records.extend(take)
+                start = base + len(part)
+                i += 1
+            return records
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('history index out of range')
+        i = bisect_right(self._starts, index) - 1
+        return self._part(i)[index - self._starts[i]]
+
+    def __iter__(self):
+        for i in range(len(self._names) + 1):
+            yield from self._part(i)
+
+
+def main():
+    """python -m utils.history_archive：把已结束月份移入分区并报告前后的加载/保存耗时"""
+    import gc
+    import time
+    from utils.data_manager import DataManager
+
+    start = time.perf_counter()
+    dm = DataManager()
+    load_before = time.perf_counter() - start
+    size_before = os.path.getsize(dm.data_file)
+    start = time.perf_counter()
+    moved = dm.archive_closed_months()
+    dm.save_data()
+    migrate = time.perf_counter() - start
+    start = time.perf_counter()
+    dm.save_data()
+    save_after = time.perf_counter() - start
+    del dm
+    gc.collect()
+    start = time.perf_counter()
+    dm = DataManager()
+    load_after = time.perf_counter() - start
+    print(f"归档 {moved} 条（{len(dm.archive.names())} 个分区，压缩后 {dm.archive.disk_bytes() / 1024:.0f} KB），耗时 {migrate:.2f}s")
+    print(f"主文件 {size_before / 1024:.0f} KB -> {os.path.getsize(dm.data_file) / 1024:.0f} KB；"
+          f"启动加载 {load_before:.2f}s -> {load_after:.3f}s，保存 {save_after:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+
+# 可排序字段；数值字段用 float64，其余按字符串排序
+NUMERIC_FIELDS = ('price', 'quantity', 'amount', 'commission')
+SORT_FIELDS = ('date', 'type', 'code', 'name', 'price', 'quantity', 'amount')
+
+
+class HistoryIndex:
+    """
+    交易历史的列式索引，在存储层完成排序与过滤
+
+    按需把某一列抽取为 NumPy 数组并缓存，DataManager.history_version 变化时失效。
+    查询结果是记录下标数组（无排序无过滤时为 None，表示原始顺序），
+    界面只按下标取出可见行，不必为每条记录创建控件。
+    """
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self._version = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._postings: Optional[Dict[str, np.ndarray]] = None
+        self._derived: Dict[str, Any] = {}
+
+    @classmethod
+    def shared(cls, data_manager) -> 'HistoryIndex':
+        """同一 DataManager 共用一个索引，列数组只构建一次"""
+        index = getattr(data_manager, '_history_index', None)
+        if index is None:
+            index = cls(data_manager)
+            data_manager._history_index = index
+        return index
+
+    def _ensure_fresh(self):
+        version = getattr(self.data_manager, 'history_version', None)
+        if version != self._version:
+            self._columns = {}
+            self._postings = None
+            self._derived = {}
+            self._version = version
+
+    def derived(self, name: str, build: Callable[['HistoryIndex'], Any]) -> Any:
+        """缓存由列数组派生的结果（如按代码汇总的手续费），历史变化时一并失效"""
+        self._ensure_fresh()
+        if name not in self._derived:
+            self._derived[name] = build(self)
+        return self._derived[name]
+
+    def __len__(self) -> int:
+        view = getattr(self.data_manager, 'history_view', None)
+        return len(view() if view else self.data_manager.get_history())
+
+    def column(self, field: str) -> np.ndarray:
+        """返回某一字段的列数组（惰性构建）"""
+        self._ensure_fresh()
+        arr = self._columns.get(field)
+        if arr is not None:
+            return arr
+        history = self.data_manager.get_history()
+        if field in NUMERIC_FIELDS:
+            values = []
+            for h in history:
+                try:
+                    if field == 'amount' and h.get('amount') in (None, ''):
+                        values.append(float(h.get('price', 0) or 0) * float(h.get('quantity', 0) or 0))
+                    else:
+                        values.append(float(h.get(field, 0) or 0))
+                except (TypeError, ValueError):
+                    values.append(0.0)
+            arr = np.array(values, dtype=np.float64)
+        elif field == 'date':
+            arr = np.array([str(h.get('date', ''))[:10] for h in history], dtype='U10')
+        else:
+            arr = np.array([str(h.get(field, '')) for h in history], dtype=str)
+        self._columns[field] = arr
+        return arr
+
+    def postings(self) -> Dict[str, np.ndarray]:
+        """代码 -> 该代码全部记录下标（升序），一次分组构建，按代码过滤时直接取用"""
+        self._ensure_fresh()
+        if self._postings is None:
+            codes = self.column('code')
+            uniq, inverse = np.unique(codes, return_inverse=True)
+            order = np.argsort(inverse, kind='stable')
+            bounds = np.searchsorted(inverse[order], np.arange(len(uniq) + 1))
+            self._postings = {str(c): order[bounds[i]:bounds[i + 1]] for i, c in enumerate(uniq)}
+        return self._postings
+
+    def code_names(self) -> Dict[str, str]:
+        """历史中出现过的代码 -> 名称（取首次出现的名称）"""
+        history = self.data_manager.get_history()
+        return {code: str(history[int(rows[0])].get('name', '')) for code, rows in self.postings().items() if len(rows)}
+
+    def rows_for_codes(self, codes: Iterable[str]) -> np.ndarray:
+        """多个代码的记录下标（升序）"""
+        postings = self.postings()
+        parts = [postings[c] for c in codes if c in postings]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def select(self, sort_field: Optional[str] = None, descending: bool = False,
+               code: Optional[str] = None, start_date: Optional[str] = None,
+               end_date: Optional[str] = None, codes: Optional[Iterable[str]] = None) -> Optional[np.ndarray]:
+        """
+        过滤并排序交易历史
+
+        参数:
+            sort_field: 排序字段，None 表示保持原始顺序
+            descending: 是否降序
+            code: 仅保留该代码
+            start_date, end_date: 日期范围（含）
+            codes: 仅保留这些代码（走代码倒排表，不扫描全表）
+
+        返回:
+            记录下标数组；既不过滤也不排序时返回 None
+        """
+        idx = None
+        if code or codes is not None:
+            idx = self.rows_for_codes(([code] if code else []) + list(codes or []))
+        if start_date or end_date:
+            dates = self.column('date') if idx is None else self.column('date')[idx]
+            date_mask = np.ones(len(dates), dtype=bool)
+            if start_date:
+                date_mask &= dates >= start_date
+            if end_date:
+                date_mask &= dates <= end_date
+            idx = np.flatnonzero(date_mask) if idx is None else idx[date_mask]
+        if sort_field in SORT_FIELDS:
+            keys = self.column(sort_field)
+            if idx is not None:
+                keys = keys[idx]
+            order = np.argsort(keys, kind='stable')
+            if descending:
+                order = order[::-1]
+            idx = order if idx is None else idx[order]
+        return idx
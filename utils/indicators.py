@@ -0,0 +1,405 @@
+import argparse
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+def _ema_closed_form(values: np.ndarray, alpha: float, start: float) -> float:
+    """
+    指数平滑的闭式解：ema_n = (1-a)^n * start + a * Σ (1-a)^(n-i) * x_i
+
+    一次点积完成历史初始化，与逐条递推结果一致。
+    """
+    n = len(values)
+    if n == 0:
+        return start
+    decay = 1.0 - alpha
+    weights = decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    return float(decay ** n * start + alpha * np.dot(weights, values))
+
+
+class SMA:
+    """简单移动平均，滑动窗口累加和，每次更新 O(1)"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+
+    def seed(self, values: Iterable[float]):
+        tail = np.asarray(values, dtype=np.float64)[-self.window:]
+        self._values = deque(tail.tolist(), maxlen=self.window)
+        self._sum = float(tail.sum())
+
+    def update(self, value: float) -> Optional[float]:
+        if len(self._values) == self.window:
+            self._sum -= self._values[0]
+        self._values.append(value)
+        self._sum += value
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return len(self._values) == self.window
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._sum / len(self._values) if self._values else None
+
+
+class EMA:
+    """指数移动平均（alpha = 2/(span+1)），以第一个值为初值"""
+
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self._value = None
+        self.count = 0
+
+    def seed(self, values: Iterable[float]):
+        arr = np.asarray(values, dtype=np.float64)
+        if len(arr) == 0:
+            return
+        self._value = _ema_closed_form(arr[1:], self.alpha, float(arr[0]))
+        self.count = len(arr)
+
+    def update(self, value: float) -> float:
+        self._value = value if self._value is None else self._value + self.alpha * (value - self._value)
+        self.count += 1
+        return self._value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.span
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+
+class ATR:
+    """平均真实波幅（Wilder 平滑，前 window 根取算术平均作初值）"""
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self._value = None
+        self._prev_close = None
+        self._warmup = []
+
+    def seed(self, high, low, close):
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) == 0:
+            return
+        prev = np.concatenate(([np.nan], close[:-1]))
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+        tr[0] = high[0] - low[0]
+        self._prev_close = float(close[-1])
+        if len(tr) < self.window:
+            self._warmup = tr.tolist()
+            self._value = None
+            return
+        self._warmup = []
+        start = float(tr[:self.window].mean())
+        self._value = _ema_closed_form(tr[self.window:], 1.0 / self.window, start)
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        if self._prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        if self._value is None:
+            self._warmup.append(tr)
+            if len(self._warmup) == self.window:
+                self._value = sum(self._warmup) / self.window
+                self._warmup = []
+        else:
+            self._value += (tr - self._value) / self.window
+        return self._value
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    @property
+    def value(self) -> Optional[float]:
+        return self._value
+
+
+class RollingVolatility:
+    """对数收益率的滚动标准差（样本标准差），维护窗口内的和与平方和"""
+
+    # 每隔若干次更新按窗口重算一次，消除浮点累计误差
+    RESYNC_EVERY = 4096
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self._returns = deque(maxlen=window)
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._prev = None
+        self._updates = 0
+
+    def seed(self, closes: Iterable[float]):
+        arr = np.asarray(closes, dtype=np.float64)
+        if len(arr) == 0:
+            return
+        self._prev = float(arr[-1])
+        rets = np.diff(np.log(arr[-(self.window + 1):])) if len(arr) > 1 else np.empty(0)
+        self._returns = deque(rets.tolist(), maxlen=self.window)
+        self._resync()
+
+    def _resync(self):
+        self._sum = math.fsum(self._returns)
+        self._sumsq = math.fsum(r * r for r in self._returns)
+
+    def update(self, close: float) -> Optional[float]:
+        if self._prev is not None and self._prev > 0 and close > 0:
+            r = math.log(close / self._prev)
+            if len(self._returns) == self.window:
+                old = self._returns[0]
+                self._sum -= old
+                self._sumsq -= old * old
+            self._returns.append(r)
+            self._sum += r
+            self._sumsq += r * r
+            self._updates += 1
+            if self._updates % self.RESYNC_EVERY == 0:
+                self._resync()
+        self._prev = close
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return len(self._returns) == self.window
+
+    @property
+    def value(self) -> Optional[float]:
+        n = len(self._returns)
+        if n < 2:
+            return None
+        var = (self._sumsq - self._sum * self._sum / n) / (n - 1)
+        return math.sqrt(max(var, 0.0))
+
+
+class HighWaterMark:
+    """高水位线（区间最高价）与当前回撤"""
+
+    def __init__(self):
+        self.high = None
+        self.last = None
+
+    def seed(self, highs: Iterable[float], last: Optional[float] = None):
+        arr = np.asarray(highs, dtype=np.float64)
+        if len(arr) == 0:
+            return
+        self.high = float(arr.max())
+        self.last = float(arr[-1]) if last is None else float(last)
+
+    def update(self, high: float, close: Optional[float] = None) -> float:
+        self.high = high if self.high is None else max(self.high, high)
+        self.last = high if close is None else close
+        return self.high
+
+    def reset(self, value: Optional[float] = None):
+        self.high = value
+        self.last = value
+
+    @property
+    def drawdown(self) -> Optional[float]:
+        """当前价相对高水位的回撤比例（0.05 表示回撤 5%）"""
+        if not self.high or self.last is None:
+            return None
+        return 1.0 - self.last / self.high
+
+
+class IndicatorSet:
+    """
+    单只股票的一组指标：SMA、EMA、ATR、滚动波动率、高水位
+
+    历史数据用 seed_frame 一次性向量化初始化，新 K 线用 update_bar 增量更新。
+    """
+
+    def __init__(self, sma_window: int = 20, ema_span: int = 20, atr_window: int = 14, vol_window: int = 20):
+        self.sma = SMA(sma_window)
+        self.ema = EMA(ema_span)
+        self.atr = ATR(atr_window)
+        self.vol = RollingVolatility(vol_window)
+        self.hwm = HighWaterMark()
+        self.last_time = None
+        self.last_close = None
+
+    def seed_frame(self, df):
+        """用 get_price 返回的 DataFrame 初始化全部指标"""
+        if df is None or len(df) == 0:
+            return
+        close = df['close'].to_numpy(np.float64)
+        high = df['high'].to_numpy(np.float64)
+        low = df['low'].to_numpy(np.float64)
+        self.sma.seed(close)
+        self.ema.seed(close)
+        self.atr.seed(high, low, close)
+        self.vol.seed(close)
+        self.hwm.seed(high, close[-1])
+        self.last_time = df.index[-1]
+        self.last_close = float(close[-1])
+
+    def update_bar(self, high: float, low: float, close: float, bar_time=None):
+        """追加一根新 K 线，所有指标 O(1) 更新"""
+        self.sma.update(close)
+        self.ema.update(close)
+        self.atr.update(high, low, close)
+        self.vol.update(close)
+        self.hwm.update(high, close)
+        self.last_close = close
+        if bar_time is not None:
+            self.last_time = bar_time
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        atr = self.atr.value
+        return {
+            'close': self.last_close,
+            'sma': self.sma.value,
+            'ema': self.ema.value,
+            'atr': atr,
+            'atr_ratio': atr / self.last_close if atr is not None and self.last_close else None,
+            'volatility': self.vol.value,
+            'high_water': self.hwm.high,
+            'drawdown': self.hwm.drawdown,
+        }
+
+
+class IndicatorEngine:
+    """
+    多只股票的指标引擎
+
+    on_bars 接收同一只股票的 K 线 DataFrame（可重复传入重叠区间），
+    首次调用向量化初始化，之后只对时间戳更新的 K 线增量更新。
+    盘中未走完的最后一根会随下次行情更新而变化，因此只把已完成的 K 线计入指标。
+    引擎在后台取数线程与界面线程间共享，更新与读取快照都在同一把锁内进行。
+    """
+
+    def __init__(self, **params):
+        self.params = params
+        self._sets: Dict[str, IndicatorSet] = {}
+        self._lock = threading.Lock()
+
+    def get(self, code: str) -> Optional[IndicatorSet]:
+        return self._sets.get(code)
+
+    def snapshot(self, code: str) -> Optional[Dict[str, Optional[float]]]:
+        """该股票指标的一致快照（加锁读取，可跨线程使用）；没有时返回 None"""
+        with self._lock:
+            ind = self._sets.get(code)
+            return ind.snapshot() if ind is not None else None
+
+    def on_bars(self, code: str, df, include_last: bool = True) -> IndicatorSet:
+        """
+        参数:
+            code: 证券代码
+            df: get_price 返回的 K 线（按时间升序）
+            include_last: 最后一根是否已完成（盘中最新一根传 False）
+        """
+        bars = df if include_last else df.iloc[:-1]
+        with self._lock:
+            ind = self._sets.get(code)
+            if ind is None:
+                ind = IndicatorSet(**self.params)
+                ind.seed_frame(bars)
+                self._sets[code] = ind
+                return ind
+            if ind.last_time is not None:
+                bars = bars[bars.index > ind.last_time]
+            for t, high, low, close in zip(bars.index, bars['high'].to_numpy(np.float64),
+                                           bars['low'].to_numpy(np.float64), bars['close'].to_numpy(np.float64)):
+                ind.update_bar(float(high), float(low), float(close), t)
+            return ind
+
+    def update(self, code: str, high: float, low: float, close: float, bar_time=None) -> IndicatorSet:
+        """直接推送一根新 K 线（行情推送场景）"""
+        with self._lock:
+            ind = self._sets.get(code)
+            if ind is None:
+                ind = self._sets[code] = IndicatorSet(**self.params)
+            ind.update_bar(high, low, close, bar_time)
+            return ind
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+
+# 进程内共享：计划对话框与计划评估器共用同一组已初始化的指标
+DEFAULT_ENGINE = IndicatorEngine()
+
+
+def load_daily(code: str, count: int = 60, engine: Optional[IndicatorEngine] = None) -> Optional[IndicatorSet]:
+    """
+    取日线并更新指标（经 utils.bar_resampler，缓存可覆盖时不请求网络）
+
+    可在后台线程调用：网络请求在锁外进行，写入引擎由 IndicatorEngine 加锁；
+    跨线程读取结果请用 engine.snapshot(code)。
+
+    返回:
+        IndicatorSet；行情获取失败时返回已有指标或 None
+    """
+    engine = engine or DEFAULT_ENGINE
+    try:
+        from utils.bar_resampler import get_price
+        df = get_price(code, frequency='1d', count=count)
+    except Exception:
+        return engine.get(code)
+    today = time.strftime('%Y-%m-%d')
+    include_last = len(df) > 0 and df.index[-1].strftime('%Y-%m-%d') != today
+    return engine.on_bars(code, df, include_last=include_last)
+
+
+def benchmark(symbols: int = 5000, history: int = 250, updates: int = 20) -> Dict[str, float]:
+    """
+    基准：symbols 只股票各用 history 根日线初始化，再逐根推送 updates 根新 K 线
+
+    返回:
+        dict: seed_seconds、update_seconds、updates_per_second
+    """
+    rng = np.random.default_rng(0)
+    import pandas as pd
+    index = pd.date_range('2024-01-01', periods=history + updates, freq='D')
+    closes = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, history + updates)), axis=1))
+    highs = closes * (1 + rng.uniform(0, 0.02, closes.shape))
+    lows = closes * (1 - rng.uniform(0, 0.02, closes.shape))
+    engine = IndicatorEngine()
+    start = time.perf_counter()
+    for i in range(symbols):
+        df = pd.DataFrame({'high': highs[i, :history], 'low': lows[i, :history], 'close': closes[i, :history]},
+                          index=index[:history])
+        engine.on_bars(f'sym{i}', df)
+    seeded = time.perf_counter()
+    for j in range(history, history + updates):
+        for i in range(symbols):
+            engine.update(f'sym{i}', highs[i, j], lows[i, j], closes[i, j], index[j])
+    done = time.perf_counter()
+    total = symbols * updates
+    return {'seed_seconds': seeded - start, 'update_seconds': done - seeded,
+            'updates_per_second': total / (done - seeded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增量技术指标基准测试')
+    parser.add_argument('--symbols', type=int, default=5000)
+    parser.add_argument('--history', type=int, default=250)
+    parser.add_argument('--updates', type=int, default=20)
+    args = parser.parse_args()
+    result = benchmark(args.symbols, args.history, args.updates)
+    print(f"{args.symbols} 只 x {args.history} 根初始化: {result['seed_seconds']:.2f}s")
+    print(f"{args.symbols} 只 x {args.updates} 根增量更新: {result['update_seconds']:.2f}s，"
+          f"{result['updates_per_second']:,.0f} 次/秒")
+
+
+if __name__ == '__main__':
+    # python -m utils.indicators --symbols 5000
+    main()
@@ -0,0 +1,482 @@
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from controllers.trade_controller import SELL_SIDES
+
+
+# 每应用这么多笔交易打一个检查点
+CHECKPOINT_EVERY = 100000
+# 内存中保留的检查点个数（越早的越少用，只在中段历史被改写时回退）
+MAX_CHECKPOINTS = 16
+CHECKPOINT_VERSION = 4
+
+# 单只股票的投影状态：[持仓数量, 持仓成本总额, 已实现盈亏, 名称, 累计买入费用]
+QTY, COST, REALISED, NAME, BUY_FEES = range(5)
+
+
+def _fingerprint(record: Dict[str, Any]) -> int:
+    """交易记录的指纹，用于确认检查点之前的历史未被改写"""
+    key = '|'.join(str(record.get(f, '')) for f in ('date', 'type', 'code', 'price', 'quantity'))
+    return zlib.crc32(key.encode('utf-8'))
+
+
+def _openings_key(balances: Dict[str, Dict[str, Any]]) -> int:
+    """期初余额的指纹；期初余额变化后，之前的检查点不再适用"""
+    return zlib.crc32(json.dumps(balances, sort_keys=True, ensure_ascii=False).encode('utf-8')) if balances else 0
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Checkpoint:
+    """期初余额加上前 count 笔交易应用后的持仓投影"""
+
+    __slots__ = ('count', 'fingerprint', 'openings', 'states')
+
+    def __init__(self, count: int, fingerprint: int, openings: int, states: Dict[str, list]):
+        self.count = count
+        self.fingerprint = fingerprint
+        self.openings = openings
+        self.states = states
+
+    def matches(self, history: List[Dict[str, Any]], openings: int) -> bool:
+        if self.openings != openings:
+            return False
+        if self.count == 0:
+            return True
+        return self.count <= len(history) and _fingerprint(history[self.count - 1]) == self.fingerprint
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': CHECKPOINT_VERSION, 'count': self.count, 'fingerprint': self.fingerprint,
+                'openings': self.openings, 'states': self.states}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional['Checkpoint']:
+        if not isinstance(data, dict) or data.get('version') != CHECKPOINT_VERSION:
+            return None
+        return cls(int(data['count']), int(data['fingerprint']), int(data['openings']),
+                   {code: list(state) for code, state in data['states'].items()})
+
+
+class PositionLedger:
+    """
+    由交易历史投影出的持仓（事件溯源）
+
+    从期初余额（没有交易历史的持仓在首笔交易前的数量与成本）开始，按历史顺序逐笔应用：
+    买入按移动加权平均累计成本（含记录中的 commission），卖出按当时均价结转成本并计入已实现盈亏，
+    清仓后成本归零。存储的持仓是投影的结果，买卖一律经 record() 写入。
+    新追加的交易只应用增量；历史中段被删除/改写时，从仍然有效的最近检查点重放，
+    重建耗时只与检查点之后的交易数有关。最近的检查点另存到数据目录，启动时复用。
+    """
+
+    def __init__(self, data_manager, checkpoint_every: int = CHECKPOINT_EVERY,
+                 checkpoint_file: Optional[str] = None):
+        """
+        参数:
+            data_manager: 数据管理器实例
+            checkpoint_every: 检查点间隔（交易笔数）
+            checkpoint_file: 检查点文件路径，默认与数据文件同目录；空串表示不落盘
+        """
+        self.data_manager = data_manager
+        self.checkpoint_every = checkpoint_every
+        if checkpoint_file is None:
+            data_file = getattr(data_manager, 'data_file', '')
+            checkpoint_file = os.path.join(os.path.dirname(data_file), 'ledger_checkpoint.json') if data_file else ''
+        self.checkpoint_file = checkpoint_file
+        self._states: Dict[str, list] = {}
+        self._applied = 0
+        self._fingerprint = 0
+        self._openings = 0
+        self._rewrites = None
+        self._checkpoints: List[Checkpoint] = []
+        self._persisted = 0
+        self.last_replayed = 0
+
+    @classmethod
+    def shared(cls, data_manager) -> 'PositionLedger':
+        """同一 DataManager 共用一个投影"""
+        ledger = getattr(data_manager, '_position_ledger', None)
+        if ledger is None:
+            ledger = cls(data_manager)
+            data_manager._position_ledger = ledger
+        return ledger
+
+    # ---- 投影维护 ----
+
+    def _opening_balances(self) -> Dict[str, Dict[str, Any]]:
+        getter = getattr(self.data_manager, 'get_opening_balances', None)
+        return getter() if getter else {}
+
+    def _restore(self, checkpoint: Optional[Checkpoint]):
+        if checkpoint is None:
+            self._states = {code: [_to_float(b.get('quantity')), _to_float(b.get('cost')), 0.0, str(b.get('name', '')), 0.0]
+                            for code, b in self._opening_balances().items()}
+            self._applied, self._fingerprint = 0, 0
+        else:
+            self._states = {code: list(state) for code, state in checkpoint.states.items()}
+            self._applied, self._fingerprint = checkpoint.count, checkpoint.fingerprint
+
+    def _load_persisted(self) -> Optional[Checkpoint]:
+        if not self.checkpoint_file:
+            return None
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return Checkpoint.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def _persist(self, checkpoint: Checkpoint):
+        """原子写入最近的检查点"""
+        if not self.checkpoint_file or checkpoint.count <= self._persisted:
+            return
+        tmp = self.checkpoint_file + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self.checkpoint_file)
+            self._persisted = checkpoint.count
+        except OSError:
+            pass
+
+    def _checkpoint(self):
+        checkpoint = Checkpoint(self._applied, self._fingerprint, self._openings,
+                                {code: list(state) for code, state in self._states.items()})
+        self._checkpoints.append(checkpoint)
+        del self._checkpoints[:-MAX_CHECKPOINTS]
+        return checkpoint
+
+    def _history(self):
+        """交易历史序列；DataManager 提供 history_view 时只打开用到的归档分区"""
+        view = getattr(self.data_manager, 'history_view', None)
+        return view() if view else self.data_manager.get_history()
+
+    def _apply(self, history, start: int, end: int):
+        """逐笔应用 history[start:end]，跨过检查点间隔时记录检查点"""
+        states = self._states
+        every = self.checkpoint_every
+        sell_sides = SELL_SIDES
+        created = None
+        h = None
+        for i, h in enumerate(history[start:end], start):
+            code = str(h.get('code', ''))
+            state = states.get(code)
+            if state is None:
+                state = states[code] = [0.0, 0.0, 0.0, str(h.get('name', '')), 0.0]
+            quantity = _to_float(h.get('quantity'))
+            price = _to_float(h.get('price'))
+            fee = _to_float(h.get('commission'))
+            if h.get('type') in sell_sides:
+                held = state[QTY]
+                sold = min(quantity, held) if held > 0 else 0.0
+                avg = state[COST] / held if held > 0 else 0.0
+                state[REALISED] += sold * (price - avg) - fee
+                # 超卖时数量归零、成本清零，不留空头，之后的买入从零开始计算均价
+                state[QTY] = max(held - quantity, 0.0)
+                state[COST] = state[COST] - avg * sold if state[QTY] > 0 else 0.0
+            else:
+                state[QTY] += quantity
+                state[COST] += price * quantity + fee
+                state[BUY_FEES] += fee
+            if every and (i + 1) % every == 0:
+                self._applied, self._fingerprint = i + 1, _fingerprint(h)
+                created = self._checkpoint()
+        if h is not None:
+            self._applied, self._fingerprint = end, _fingerprint(h)
+        self.last_replayed += max(0, end - start)
+        if created is not None:
+            self._persist(created)
+
+    def sync(self) -> 'PositionLedger':
+        """让投影追上当前历史：只追加时应用增量，否则从最近的有效检查点重放"""
+        history = self._history()
+        rewrites = getattr(self.data_manager, 'history_rewrites', 0)
+        openings = _openings_key(self._opening_balances())
+        self.last_replayed = 0
+        current = (self._rewrites == rewrites and self._openings == openings and self._applied <= len(history)
+                   and (self._applied == 0 or _fingerprint(history[self._applied - 1]) == self._fingerprint))
+        if not current:
+            candidates = [c for c in self._checkpoints if c.matches(history, openings)]
+            if not candidates and not self._checkpoints:
+                persisted = self._load_persisted()
+                if persisted is not None and persisted.matches(history, openings):
+                    candidates = [persisted]
+                    self._persisted = persisted.count
+            best = max(candidates, key=lambda c: c.count) if candidates else None
+            self._checkpoints = [c for c in self._checkpoints if best is not None and c.count <= best.count]
+            self._openings = openings
+            self._restore(best)
+            self._rewrites = rewrites
+        if self._applied < len(history):
+            self._apply(history, self._applied, len(history))
+        return self
+
+    def _adopt(self, balances: Dict[str, Dict[str, Any]]):
+        """
+        登记期初余额并直接并入当前投影与各检查点
+
+        这些代码此前从未出现在交易历史中，每个历史前缀上的状态都等于期初余额，无需重放。
+        """
+        self.data_manager.add_opening_balances(balances, save=False)
+        openings = _openings_key(self._opening_balances())
+        for states in [self._states] + [c.states for c in self._checkpoints]:
+            for code, b in balances.items():
+                states.setdefault(code, [_to_float(b['quantity']), _to_float(b['cost']), 0.0, str(b['name']), 0.0])
+        for checkpoint in self._checkpoints:
+            checkpoint.openings = openings
+        self._openings = openings
+        if self._persisted:
+            # 落盘的检查点指纹已过期，用当前状态替换
+            self._persisted = 0
+            self._persist(self._checkpoint())
+
+    def record(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        追加交易并按投影更新持仓（买卖写入的唯一入口）
+
+        交易涉及的代码若有存储持仓却不在投影中（没有交易历史的持仓），先把该持仓登记为期初余额。
+        交易历史、期初余额与持仓在同一事务中保存。
+
+        参数:
+            records: 交易记录（date、type、code、name、price、quantity、amount、commission）
+
+        返回:
+            list: 更新后的持仓
+        """
+        data_manager = self.data_manager
+        self.sync()
+        codes = {str(r.get('code', '')) for r in records}
+        balances = {}
+        for p in data_manager.get_positions():
+            code = str(p.get('code', ''))
+            quantity = _to_float(p.get('quantity'))
+            if code in codes and code not in self._states and code not in balances and quantity > 0:
+                balances[code] = {'name': str(p.get('name', '')), 'quantity': quantity,
+                                  'cost': quantity * _to_float(p.get('cost_price'))}
+        with data_manager.transaction():
+            if balances:
+                self._adopt(balances)
+            data_manager.add_history_many(records)
+            positions = self.project_positions()
+            data_manager.replace_positions(positions)
+        return positions
+
+    def delete(self, index: int) -> bool:
+        """按 get_history() 下标删除一笔交易，并按投影更新持仓"""
+        data_manager = self.data_manager
+        # 删除后可能从投影中消失的代码，其持仓也应随之移除
+        managed = set(self.states())
+        with data_manager.transaction():
+            if not data_manager.delete_history(index):
+                return False
+            data_manager.replace_positions(self.project_positions(managed))
+        return True
+
+    # ---- 查询 ----
+
+    def states(self) -> Dict[str, Tuple[float, float, float, str]]:
+        """代码 -> (数量, 成本总额, 已实现盈亏, 名称, 累计买入费用)"""
+        self.sync()
+        return {code: tuple(state) for code, state in self._states.items()}
+
+    def holdings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        当前仍持有的股票
+
+        返回:
+            dict: 代码 -> {'name', 'quantity', 'cost_price', 'realised'}
+        """
+        self.sync()
+        result = {}
+        for code, state in self._states.items():
+            quantity, cost, realised, name = state[:BUY_FEES]
+            if quantity > 0:
+                result[code] = {'name': name, 'quantity': quantity,
+                                'cost_price': cost / quantity, 'realised': realised}
+        return result
+
+    def realised(self) -> Dict[str, float]:
+        """代码 -> 已实现盈亏（含已清仓的股票）"""
+        self.sync()
+        return {code: state[REALISED] for code, state in self._states.items()}
+
+    def buy_fees(self) -> Dict[str, float]:
+        """代码 -> 交易历史中记录的买入费用合计（已计入成本；检查点随投影持久化，不必重扫历史）"""
+        self.sync()
+        return {code: state[BUY_FEES] for code, state in self._states.items() if state[BUY_FEES]}
+
+    def verify(self, positions: Optional[List[Dict[str, Any]]] = None,
+               cost_tolerance: float = 0.0005) -> List[Dict[str, Any]]:
+        """
+        比较存储的持仓与交易历史的投影
+
+        参数:
+            positions: 持仓记录，默认取 DataManager.get_positions()
+            cost_tolerance: 成本价允许的相对误差
+
+        返回:
+            list: 不一致项，每项含 code、reason（quantity/cost_price/not_in_history/missing_position）、
+                  stored_quantity、ledger_quantity、stored_cost、ledger_cost
+        """
+        if positions is None:
+            positions = self.data_manager.get_positions()
+        holdings = self.holdings()
+        drift = []
+        seen = set()
+        for p in positions:
+            code = str(p.get('code', ''))
+            seen.add(code)
+            stored_qty = _to_float(p.get('quantity'))
+            stored_cost = _to_float(p.get('cost_price'))
+            ledger = holdings.get(code)
+            item = {'code': code, 'name': p.get('name', ''), 'stored_quantity': stored_qty,
+                    'stored_cost': stored_cost,
+                    'ledger_quantity': ledger['quantity'] if ledger else 0.0,
+                    'ledger_cost': ledger['cost_price'] if ledger else 0.0}
+            if ledger is None:
+                item['reason'] = 'not_in_history' if code not in self._states else 'quantity'
+            elif abs(stored_qty - ledger['quantity']) > 1e-6:
+                item['reason'] = 'quantity'
+            elif abs(stored_cost - ledger['cost_price']) > cost_tolerance * max(abs(ledger['cost_price']), 1e-9):
+                item['reason'] = 'cost_price'
+            else:
+                continue
+            drift.append(item)
+        for code, ledger in holdings.items():
+            if code not in seen:
+                drift.append({'code': code, 'name': ledger['name'], 'reason': 'missing_position',
+                              'stored_quantity': 0.0, 'stored_cost': 0.0,
+                              'ledger_quantity': ledger['quantity'], 'ledger_cost': ledger['cost_price']})
+        return drift
+
+    def project_positions(self, managed: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """
+        按存储格式生成持仓列表：数量与成本来自投影，现价等其余字段沿用已有持仓
+
+        投影不认识的代码（既无交易历史也无期初余额）原样保留；已有持仓保持原顺序，新开仓排在最后。
+
+        参数:
+            managed: 另外按投影处理的代码（如刚删除其全部交易的代码），不在投影中即移除
+
+        返回:
+            list: 可直接替换 DataManager 持仓的记录
+        """
+        holdings = self.holdings()
+        last_prices = self.data_manager.get_last_prices() if hasattr(self.data_manager, 'get_last_prices') else {}
+
+        def project(existing, code, ledger):
+            record = dict(existing)
+            record.update({
+                'code': code,
+                'name': record.get('name') or ledger['name'],
+                'quantity': f"{ledger['quantity']:.0f}",
+                'cost_price': f"{ledger['cost_price']:.4f}",
+            })
+            if not record.get('current_price') and code in last_prices:
+                record['current_price'] = f"{float(last_prices[code]):.4f}"
+            return record
+
+        managed = set(managed)
+        positions = []
+        seen = set()
+        for p in self.data_manager.get_positions():
+            code = str(p.get('code', ''))
+            if code not in self._states and code not in managed:
+                positions.append(p)
+            elif code in holdings and code not in seen:
+                positions.append(project(p, code, holdings[code]))
+                seen.add(code)
+        for code, ledger in holdings.items():
+            if code not in seen:
+                positions.append(project({}, code, ledger))
+        return positions
+
+
+def benchmark(n_trades: int = 1000000, n_codes: int = 200, tail: int = 50000) -> Dict[str, float]:
+    """
+    重建耗时：无检查点全量重放 vs. 从检查点重放最后 tail 笔
+
+    返回:
+        dict: full 全量重建秒数、checkpoint 从检查点重建秒数、replayed 检查点后重放笔数
+    """
+    import random
+    import tempfile
+
+    rng = random.Random(7)
+    codes = [f"sh{600000 + i}" for i in range(n_codes)]
+    held = dict.fromkeys(codes, 0)
+    history = []
+    for i in range(n_trades):
+        code = codes[rng.randrange(n_codes)]
+        if held[code] >= 200 and rng.random() < 0.4:
+            quantity = 100 * rng.randint(1, held[code] // 100)
+            side = '卖出'
+            held[code] -= quantity
+        else:
+            quantity = 100 * rng.randint(1, 10)
+            side = '买入'
+            held[code] += quantity
+        history.append({'date': f"2020-01-{1 + i % 28:02d}", 'type': side, 'code': code, 'name': code,
+                        'price': f"{rng.uniform(5, 50):.2f}", 'quantity': str(quantity)})
+
+    class _Store:
+        data_file = ''
+        history_rewrites = 0
+
+        def get_history(self):
+            return history
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ledger_checkpoint.json')
+        start = time.perf_counter()
+        PositionLedger(_Store(), checkpoint_every=0, checkpoint_file='').sync()
+        full = time.perf_counter() - start
+
+        # 预先在 n_trades - tail 处落盘检查点，模拟上次运行留下的状态
+        store = _Store()
+        PositionLedger(store, checkpoint_every=n_trades - tail, checkpoint_file=path).sync()
+        start = time.perf_counter()
+        ledger = PositionLedger(store, checkpoint_every=n_trades - tail, checkpoint_file=path).sync()
+        resumed = time.perf_counter() - start
+    return {'full': full, 'checkpoint': resumed, 'replayed': float(ledger.last_replayed)}
+
+
+def main():
+    import argparse
+    from utils.data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description='由交易历史投影持仓')
+    parser.add_argument('command', choices=['verify', 'rebuild', 'bench'])
+    parser.add_argument('--trades', type=int, default=1000000, help='bench 的交易笔数')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        result = benchmark(args.trades)
+        print(f"{args.trades} 笔交易：全量重建 {result['full']:.2f}s，"
+              f"检查点重建 {result['checkpoint']:.3f}s（重放 {result['replayed']:.0f} 笔）")
+        return
+    data_manager = DataManager()
+    start = time.perf_counter()
+    ledger = PositionLedger.shared(data_manager).sync()
+    elapsed = time.perf_counter() - start
+    if args.command == 'verify':
+        drift = ledger.verify()
+        for item in drift:
+            print(f"{item['code']} {item['name']} {item['reason']}: 存储 {item['stored_quantity']:.0f}@{item['stored_cost']:.4f}"
+                  f" / 历史 {item['ledger_quantity']:.0f}@{item['ledger_cost']:.4f}")
+        print(f"投影耗时 {elapsed:.3f}s（重放 {ledger.last_replayed} 笔），不一致 {len(drift)} 项")
+    else:
+        positions = ledger.project_positions()
+        data_manager.replace_positions(positions)
+        print(f"已按交易历史重建 {len(positions)} 条持仓")
+
+
+if __name__ == '__main__':
+    # python -m utils.position_ledger verify
+    main()
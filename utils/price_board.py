@@ -0,0 +1,281 @@
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_BOARD_NAME = 'stock_note_price_board'
+
+_MAGIC = 0x50424431  # 'PBD1'
+_HEADER = struct.Struct('<IIII')  # magic, version, capacity, count
+_HEADER_SIZE = 64  # 头部按缓存行对齐
+# 头部偏移 16 起：写者进程号、心跳时间戳（写者存活判断）
+_WRITER = struct.Struct('<I4xd')
+_WRITER_OFFSET = 16
+# 写者超过该秒数没有心跳视为已退出（行情进程每轮至多休眠 1 秒）
+HEARTBEAT_TIMEOUT = 30.0
+# 槽位超过几个最长轮询间隔未更新视为缺失
+STALE_POLLS = 3
+DEFAULT_MAX_AGE = STALE_POLLS * 300.0
+
+# 每个槽位：序号(seqlock) + 代码 + 最新价 + 昨收/上一笔 + 时间戳
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('code', 'S16'),
+    ('last', '<f8'),
+    ('prev', '<f8'),
+    ('ts', '<f8'),
+])
+
+
+def _open_shm(name: str, create: bool, size: int = 0) -> shared_memory.SharedMemory:
+    if create:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # 3.13 以前读者也会被 resource_tracker 登记，进程退出时会误删共享内存
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    if sys.platform == 'win32':
+        # Windows 上共享内存随最后一个句柄关闭而消失，还能打开说明写者仍在
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class PriceBoard:
+    """
+    基于 multiprocessing.shared_memory 的行情看板
+
+    单一写者（行情进程）按槽位写入 (代码, 最新价, 上一笔, 时间戳, 序号)，任意数量的
+    GUI/CLI/监控进程以零拷贝方式读取。每个槽位用 seqlock 保护：写者先把序号加一成奇数，
+    写完字段后再加一成偶数；读者在前后两次读到相同的偶数序号时才接受这次读取，无需加锁。
+    写者在头部记录进程号并定期写心跳，读者据此判断看板是否仍在更新。
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        magic, _, capacity, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError("共享内存不是行情看板")
+        self.capacity = capacity
+        self.slots = np.ndarray((capacity,), dtype=SLOT_DTYPE, buffer=shm.buf, offset=_HEADER_SIZE)
+        self._index: Dict[str, int] = {}
+
+    @classmethod
+    def create(cls, name: str = DEFAULT_BOARD_NAME, capacity: int = 1024) -> 'PriceBoard':
+        """
+        创建看板（写者调用）；写者已退出的同名旧看板会被替换
+
+        写者进程仍在运行时抛出 RuntimeError，不会删除正在使用的看板。
+        """
+        size = _HEADER_SIZE + capacity * SLOT_DTYPE.itemsize
+        try:
+            old = _open_shm(name, create=False)
+        except FileNotFoundError:
+            old = None
+        if old is not None:
+            magic = _HEADER.unpack_from(old.buf, 0)[0] if old.size >= _HEADER_SIZE else 0
+            pid = _WRITER.unpack_from(old.buf, _WRITER_OFFSET)[0] if magic == _MAGIC else 0
+            if pid != os.getpid() and _pid_alive(pid):
+                old.close()
+                raise RuntimeError(f"行情看板 {name} 正由进程 {pid} 写入")
+            old.close()
+            try:
+                old.unlink()
+            except FileNotFoundError:
+                pass
+        shm = _open_shm(name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, 1, capacity, 0)
+        board = cls(shm, owner=True)
+        board.heartbeat()
+        return board
+
+    @classmethod
+    def attach(cls, name: str = DEFAULT_BOARD_NAME) -> Optional['PriceBoard']:
+        """连接已有看板（读者调用）；看板不存在时返回 None"""
+        try:
+            shm = _open_shm(name, create=False)
+        except FileNotFoundError:
+            return None
+        try:
+            return cls(shm, owner=False)
+        except ValueError:
+            shm.close()
+            return None
+
+    def heartbeat(self, ts: Optional[float] = None):
+        """写者心跳（仅写者调用）"""
+        _WRITER.pack_into(self._shm.buf, _WRITER_OFFSET, os.getpid(), time.time() if ts is None else ts)
+
+    def writer_alive(self, timeout: float = HEARTBEAT_TIMEOUT) -> bool:
+        """写者是否仍在更新看板：心跳在 timeout 秒内（进程被强制结束时共享内存会残留）"""
+        pid, beat = _WRITER.unpack_from(self._shm.buf, _WRITER_OFFSET)
+        return pid > 0 and time.time() - beat <= timeout
+
+    @property
+    def count(self) -> int:
+        return _HEADER.unpack_from(self._shm.buf, 0)[3]
+
+    def _slot_for_write(self, code: str) -> int:
+        idx = self._index.get(code)
+        if idx is not None:
+            return idx
+        count = self.count
+        if count >= self.capacity:
+            raise ValueError("行情看板已满")
+        self.slots['code'][count] = code.encode('ascii')[:16]
+        self._index[code] = count
+        # 先写代码再发布数量，读者看到新数量时代码已就绪
+        struct.pack_into('<I', self._shm.buf, 12, count + 1)
+        return count
+
+    def write(self, code: str, last: float, prev: float, ts: Optional[float] = None):
+        """
+        写入一只股票的行情（仅写者调用）
+
+        参数:
+            code: 股票代码
+            last: 最新价
+            prev: 上一笔/昨收价
+            ts: 时间戳（秒），默认当前时间
+        """
+        i = self._slot_for_write(code)
+        slot = self.slots[i:i + 1]
+        seq = int(slot['seq'][0])
+        slot['seq'] = seq + 1
+        slot['last'] = last
+        slot['prev'] = prev
+        slot['ts'] = now = time.time() if ts is None else ts
+        slot['seq'] = seq + 2
+        self.heartbeat(now)
+
+    def _refresh_index(self):
+        count = self.count
+        if count == len(self._index):
+            return
+        codes = self.slots['code'][:count]
+        self._index = {c.decode('ascii'): i for i, c in enumerate(codes)}
+
+    def read(self, code: str, retries: int = 100) -> Optional[Tuple[float, float, float, int]]:
+        """
+        读取一只股票的行情
+
+        返回:
+            (最新价, 上一笔价, 时间戳, 序号)；代码不存在或一直读到写入中时返回 None
+        """
+        if code not in self._index:
+            self._refresh_index()
+        i = self._index.get(code)
+        if i is None:
+            return None
+        seq = self.slots['seq']
+        for _ in range(retries):
+            s1 = int(seq[i])
+            if s1 & 1:
+                continue
+            row = self.slots[i]
+            last, prev, ts = float(row['last']), float(row['prev']), float(row['ts'])
+            if int(seq[i]) == s1:
+                return last, prev, ts, s1
+        return None
+
+    def read_many(self, codes, max_age: Optional[float] = None) -> Dict[str, Tuple[float, float, float, int]]:
+        """
+        批量读取；跳过不存在或未写入过的代码
+
+        参数:
+            max_age: 给出时同时跳过超过该秒数未更新的槽位（由调用方改为自行请求）
+        """
+        result = {}
+        oldest = time.time() - max_age if max_age is not None else None
+        for code in codes:
+            value = self.read(code)
+            if value and value[3] > 0 and (oldest is None or value[2] >= oldest):
+                result[code] = value
+        return result
+
+    def close(self):
+        """释放本进程的映射；写者同时删除共享内存"""
+        self.slots = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def serve(name: str = DEFAULT_BOARD_NAME, capacity: int = 1024, reload_interval: float = 30.0):
+    """
+    行情进程：按 QuoteScheduler 的优先级轮询持仓行情并写入看板
+
+    参数:
+        name: 共享内存名称
+        capacity: 看板槽位数
+        reload_interval: 重新读取持仓与计划的间隔（秒）
+    """
+    from utils.data_manager import DataManager
+    from utils.quote_scheduler import QuoteScheduler
+    from utils.Ashare import get_price
+
+    try:
+        board = PriceBoard.create(name, capacity)
+    except RuntimeError as e:
+        print(e)
+        return
+    scheduler = QuoteScheduler()
+    last_reload = 0.0
+    print(f"行情看板已启动: {name} ({capacity} 槽位)")
+    try:
+        while True:
+            now = time.time()
+            if now - last_reload >= reload_interval:
+                dm = DataManager()
+                scheduler.set_universe(dm.get_positions(), dm.get_plans())
+                scheduler.seed_prices(dm.get_last_prices())
+                last_reload = now
+            for code in scheduler.due_codes(now):
+                try:
+                    df = get_price(code, frequency='1m', count=2)
+                    live = float(df['close'].iloc[-1])
+                    prev = float(df['close'].iloc[-2]) if len(df) >= 2 else live
+                except Exception:
+                    scheduler.mark_failed(code)
+                    continue
+                board.write(code, live, prev)
+                scheduler.observe(code, live)
+            board.heartbeat()
+            time.sleep(min(1.0, max(0.05, scheduler.next_wakeup())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        board.close()
+
+
+if __name__ == '__main__':
+    # python -m utils.price_board  启动共享行情进程
+    serve()
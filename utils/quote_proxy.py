@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+
+# 各周期缓存有效期（秒）：分钟线接近实时快照，日线以上变化慢
+DEFAULT_TTLS = {
+    '1m': 3.0,
+    '5m': 15.0,
+    '15m': 30.0,
+    '30m': 60.0,
+    '60m': 60.0,
+    '1d': 300.0,
+    '1w': 3600.0,
+    '1M': 3600.0,
+}
+# 指定了过去的结束日期时，K线不会再变化
+HISTORICAL_TTL = 24 * 3600.0
+
+
+def frame_to_payload(df: pd.DataFrame) -> Dict[str, Any]:
+    """将 get_price 返回的 DataFrame 序列化为 JSON 友好的结构"""
+    return {
+        'index': [ts.isoformat() for ts in pd.to_datetime(df.index)],
+        'columns': list(df.columns),
+        'data': df.values.tolist(),
+    }
+
+
+def payload_to_frame(payload: Dict[str, Any]) -> pd.DataFrame:
+    """frame_to_payload 的逆过程，还原为与 get_price 相同格式的 DataFrame"""
+    df = pd.DataFrame(payload['data'], columns=payload['columns'], dtype='float')
+    df.index = pd.to_datetime(payload['index'])
+    df.index.name = ''
+    return df
+
+
+def _default_upstream(code, end_date, count, frequency):
+    # 粗周期优先由已取得的 1 分钟线本地合成，只有缺口才请求新浪/腾讯
+    from utils.bar_resampler import get_price
+    return get_price(code, end_date=end_date, count=count, frequency=frequency, use_proxy=False)
+
+
+class QuoteProxy:
+    """
+    行情缓存代理
+
+    多台机器共用一个代理访问新浪/腾讯接口：按 (代码, 周期, 数量, 结束日期) 缓存结果，
+    有效期随周期不同；相同请求在上游返回前只会发出一次，其余请求等待同一结果。
+    """
+
+    def __init__(self, upstream: Optional[Callable] = None, ttls: Optional[Dict[str, float]] = None,
+                 max_workers: int = 8):
+        """
+        初始化代理
+
+        参数:
+            upstream: 上游获取函数 fetch(code, end_date, count, frequency) -> DataFrame，
+                      默认为 utils.Ashare.get_price（直连）
+            ttls: 各周期缓存有效期（秒），缺省使用 DEFAULT_TTLS
+            max_workers: 并发上游请求数上限
+        """
+        self.upstream = upstream or _default_upstream
+        # 独立线程池，避免与同进程内其他阻塞任务争用默认执行器
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quote-upstream')
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self.client_requests = 0
+        self.upstream_requests = 0
+        self.upstream_errors = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def _ttl(self, frequency: str, end_date: str) -> float:
+        if end_date and end_date.split(' ')[0] < datetime.date.today().isoformat():
+            return HISTORICAL_TTL
+        return self.ttls.get(frequency, 60.0)
+
+    async def get(self, code: str, end_date: str = '', count: int = 10, frequency: str = '1d') -> Dict[str, Any]:
+        """获取行情（缓存 -> 合并在途请求 -> 上游）"""
+        self.client_requests += 1
+        key = (code, frequency, int(count), end_date or '')
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached and cached[0] > now:
+            self.cache_hits += 1
+            return cached[1]
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.upstream_requests += 1
+            df = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.upstream, code, end_date, int(count), frequency)
+            payload = frame_to_payload(df)
+            self._cache[key] = (time.monotonic() + self._ttl(frequency, end_date), payload)
+            future.set_result(payload)
+            return payload
+        except Exception as e:
+            self.upstream_errors += 1
+            future.set_exception(e)
+            # 避免"Future exception was never retrieved"告警
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def purge_expired(self):
+        """清理过期缓存"""
+        now = time.monotonic()
+        for key in [k for k, (expire, _) in self._cache.items() if expire <= now]:
+            del self._cache[key]
+
+    @property
+    def amplification(self) -> float:
+        """上游请求放大系数 = 上游请求数 / 客户端请求数（越小越省）"""
+        return self.upstream_requests / self.client_requests if self.client_requests else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'client_requests': self.client_requests,
+            'upstream_requests': self.upstream_requests,
+            'upstream_errors': self.upstream_errors,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'cached_keys': len(self._cache),
+            'amplification': round(self.amplification, 4),
+            'resampler': self._resampler_stats(),
+        }
+
+    def _resampler_stats(self) -> Optional[Dict[str, int]]:
+        if self.upstream is not _default_upstream:
+            return None
+        from utils.bar_resampler import DEFAULT_RESAMPLER
+        return DEFAULT_RESAMPLER.stats()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.split(' ')
+            if len(parts) < 2 or parts[0] != 'GET':
+                await self._respond(writer, 405, {'error': 'method not allowed'})
+                return
+            url = urlsplit(parts[1])
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == '/stats':
+                await self._respond(writer, 200, self.stats())
+            elif url.path == '/price' and query.get('code'):
+                try:
+                    payload = await self.get(query['code'], query.get('end_date', ''),
+                                             int(query.get('count', 10)), query.get('frequency', '1d'))
+                    await self._respond(writer, 200, payload)
+                except Exception as e:
+                    await self._respond(writer, 502, {'error': str(e)})
+            else:
+                await self._respond(writer, 404, {'error': 'not found'})
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: Dict[str, Any]):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed', 502: 'Bad Gateway'}.get(status, '')
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + data)
+        await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, purge_interval: float = 60.0):
+        """启动 HTTP 服务并定期清理过期缓存"""
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"行情代理已启动: http://{host}:{port}  (统计: /stats)")
+        async with server:
+            while True:
+                await asyncio.sleep(purge_interval)
+                self.purge_expired()
+
+
+class StubUpstream:
+    """本地测试用的模拟上游：生成确定性的K线并记录调用次数"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, code, end_date, count, frequency):
+        self.calls += 1
+        time.sleep(self.delay)
+        base = sum(map(ord, code)) % 50 + 1.0
+        index = pd.date_range(end=datetime.datetime.now().replace(second=0, microsecond=0), periods=count, freq='min')
+        close = [base + i * 0.01 for i in range(count)]
+        df = pd.DataFrame({'open': close, 'close': close, 'high': close, 'low': close,
+                           'volume': [100.0] * count}, index=index)
+        df.index.name = ''
+        return df
+
+
+async def _selftest(clients: int, rounds: int, codes: int, port: int):
+    """模拟多台桌面在同一股票池上轮询，经 HTTP 访问代理并报告放大系数"""
+    import requests
+    from utils import Ashare
+
+    stub = StubUpstream()
+    proxy = QuoteProxy(upstream=stub)
+    server = await asyncio.start_server(proxy._handle, '127.0.0.1', port)
+    Ashare.set_proxy(f'http://127.0.0.1:{port}')
+    universe = [f'sh5880{i:02d}' for i in range(codes)]
+    loop = asyncio.get_running_loop()
+
+    def desktop():
+        for _ in range(rounds):
+            for code in universe:
+                Ashare.get_price(code, frequency='1m', count=2)
+
+    async with server:
+        start = time.perf_counter()
+        await asyncio.gather(*[loop.run_in_executor(None, desktop) for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+        response = await loop.run_in_executor(None, lambda: requests.get(f'http://127.0.0.1:{port}/stats', timeout=5))
+        stats = json.loads(response.content)
+    Ashare.set_proxy(None)
+    print(f"{clients} 个客户端 x {rounds} 轮 x {codes} 只，耗时 {elapsed:.2f}s")
+    print(f"上游实际调用 {stub.calls} 次，统计: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='A股行情缓存代理')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--selftest', action='store_true', help='在模拟上游前运行代理并报告放大系数')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--codes', type=int, default=10)
+    args = parser.parse_args()
+    if args.selftest:
+        asyncio.run(_selftest(args.clients, args.rounds, args.codes, args.port))
+    else:
+        asyncio.run(QuoteProxy().serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    # python -m utils.quote_proxy [--host 0.0.0.0] [--port 8765]
+    main()
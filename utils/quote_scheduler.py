@@ -0,0 +1,188 @@
+import math
+import time
+from typing import Dict, List, Any, Optional, Iterable
+
+
+# A股一个交易日约 4 小时 = 14400 秒
+TRADING_SECONDS_PER_DAY = 4 * 60 * 60
+
+
+class QuoteScheduler:
+    """
+    按优先级调度行情轮询
+
+    每只股票的轮询间隔由"现价到最近一个有效计划阈值的距离"决定，距离以近期波动率为单位衡量：
+    在随机游走假设下，价格走过距离 d 所需时间约为 (d / σ)²，因此轮询间隔取
+    (d / (z·σ))²，再裁剪到 [min_interval, max_interval]。所有股票的请求频率之和
+    超出全局预算时，按比例整体放大间隔。
+    """
+
+    def __init__(self, min_interval: float = 3.0, max_interval: float = 300.0,
+                 idle_interval: float = 60.0, budget_per_minute: float = 60.0,
+                 z_score: float = 3.0, default_daily_vol: float = 0.02,
+                 vol_decay: float = 0.94):
+        """
+        初始化调度器
+
+        参数:
+            min_interval: 最短轮询间隔（秒），临近触发的股票按此间隔轮询
+            max_interval: 最长轮询间隔（秒），远离阈值的股票按此间隔轮询
+            idle_interval: 没有有效计划的持仓的轮询间隔（秒）
+            budget_per_minute: 全局请求预算（次/分钟）
+            z_score: 安全系数，轮询间隔内价格移动 z 个标准差仍不应越过阈值
+            default_daily_vol: 尚无观测时使用的默认日波动率 (如0.02表示2%)
+            vol_decay: 波动率 EWMA 衰减系数
+        """
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.idle_interval = float(idle_interval)
+        self.budget_per_minute = float(budget_per_minute)
+        self.z_score = float(z_score)
+        self.vol_decay = float(vol_decay)
+        # 每秒方差（对数收益）
+        self.default_var_per_sec = default_daily_vol ** 2 / TRADING_SECONDS_PER_DAY
+
+        self.thresholds: Dict[str, List[float]] = {}   # 代码 -> 有效阈值价格列表
+        self.last_price: Dict[str, float] = {}
+        self.last_ts: Dict[str, float] = {}
+        self.var_per_sec: Dict[str, float] = {}
+        self.next_due: Dict[str, float] = {}
+        self.intervals: Dict[str, float] = {}
+        self.request_count = 0
+
+    def set_universe(self, positions: List[Dict[str, Any]], plans: List[Dict[str, Any]]):
+        """
+        根据持仓与计划设置调度范围
+
+        参数:
+            positions: DataManager.get_positions() 的结果
+            plans: DataManager.get_plans() 的结果
+        """
+        codes = [str(p.get('code', '')) for p in positions if p.get('code')]
+        name_to_code = {str(p.get('name', '')): str(p.get('code', '')) for p in positions}
+        thresholds: Dict[str, List[float]] = {code: [] for code in codes}
+        for plan in plans:
+            if plan.get('status', 'ACTIVE') != 'ACTIVE':
+                continue
+            code = str(plan.get('code', '') or name_to_code.get(str(plan.get('name', '')), ''))
+            if code not in thresholds:
+                continue
+            for key in ('take_profit_price', 'stop_loss_price'):
+                try:
+                    value = float(plan.get(key) or 0)
+                except (TypeError, ValueError):
+                    continue
+                if value > 0:
+                    thresholds[code].append(value)
+        self.thresholds = thresholds
+        # 移除已不在范围内的代码
+        for code in list(self.next_due):
+            if code not in thresholds:
+                self.next_due.pop(code, None)
+                self.intervals.pop(code, None)
+        now = time.time()
+        for code in codes:
+            self.next_due.setdefault(code, now)
+        self._recompute_intervals()
+
+    def seed_prices(self, prices: Dict[str, float]):
+        """用缓存价格初始化（不计入波动率）"""
+        for code, price in prices.items():
+            if code in self.thresholds and price and code not in self.last_price:
+                self.last_price[code] = float(price)
+        self._recompute_intervals()
+
+    def observe(self, code: str, price: float, ts: Optional[float] = None):
+        """
+        记录一次成功的行情，更新波动率估计与下次轮询时间
+
+        参数:
+            code: 股票代码
+            price: 最新价格
+            ts: 观测时间戳（秒），默认当前时间
+        """
+        if not price or price <= 0:
+            return
+        ts = time.time() if ts is None else ts
+        prev_price = self.last_price.get(code)
+        prev_ts = self.last_ts.get(code)
+        if prev_price and prev_ts is not None and ts > prev_ts:
+            r = math.log(price / prev_price)
+            sample = r * r / (ts - prev_ts)
+            var = self.var_per_sec.get(code, self.default_var_per_sec)
+            self.var_per_sec[code] = self.vol_decay * var + (1.0 - self.vol_decay) * sample
+        self.last_price[code] = float(price)
+        self.last_ts[code] = ts
+        self._recompute_intervals()
+        if code in self.intervals:
+            self.next_due[code] = ts + self.intervals[code]
+
+    def mark_failed(self, code: str, ts: Optional[float] = None):
+        """请求失败时按最短间隔重试，避免临近阈值的股票失去监控"""
+        ts = time.time() if ts is None else ts
+        if code in self.next_due:
+            self.next_due[code] = ts + max(self.min_interval, self.intervals.get(code, self.min_interval) / 2)
+
+    def distance_in_sigmas(self, code: str) -> Optional[float]:
+        """返回现价到最近阈值的距离（以每秒波动率为单位）；无阈值或无价格时返回 None"""
+        levels = self.thresholds.get(code)
+        price = self.last_price.get(code)
+        if not levels or not price:
+            return None
+        dist = min(abs(math.log(level / price)) for level in levels)
+        sigma = math.sqrt(self.var_per_sec.get(code, self.default_var_per_sec))
+        return dist / sigma if sigma > 0 else float('inf')
+
+    def _raw_interval(self, code: str) -> float:
+        d = self.distance_in_sigmas(code)
+        if d is None:
+            return self.idle_interval
+        interval = (d / self.z_score) ** 2
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _recompute_intervals(self):
+        raw = {code: self._raw_interval(code) for code in self.thresholds}
+        rate = sum(60.0 / v for v in raw.values() if v > 0)
+        scale = rate / self.budget_per_minute if self.budget_per_minute > 0 and rate > self.budget_per_minute else 1.0
+        self.intervals = {code: v * scale for code, v in raw.items()}
+
+    def due_codes(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        返回当前应当轮询的代码（最紧迫的在前）
+
+        参数:
+            now: 当前时间戳
+            limit: 单批最多返回数量
+        """
+        now = time.time() if now is None else now
+        due = [code for code, t in self.next_due.items() if t <= now]
+        due.sort(key=lambda c: self.intervals.get(c, self.idle_interval))
+        if limit is not None:
+            due = due[:limit]
+        self.request_count += len(due)
+        return due
+
+    def next_wakeup(self, now: Optional[float] = None) -> float:
+        """距离下一次有代码到期的秒数"""
+        now = time.time() if now is None else now
+        if not self.next_due:
+            return self.idle_interval
+        return max(0.0, min(self.next_due.values()) - now)
+
+    def requests_per_minute(self) -> float:
+        """当前调度方案下的预计请求频率（次/分钟）"""
+        return sum(60.0 / v for v in self.intervals.values() if v > 0)
+
+    def snapshot(self, codes: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """返回调度状态，便于界面或日志展示"""
+        codes = list(self.thresholds) if codes is None else list(codes)
+        result = []
+        for code in codes:
+            result.append({
+                'code': code,
+                'interval': self.intervals.get(code, self.idle_interval),
+                'distance_sigma': self.distance_in_sigmas(code),
+                'next_due': self.next_due.get(code),
+            })
+        result.sort(key=lambda x: x['interval'])
+        return result
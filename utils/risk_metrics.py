@@ -0,0 +1,254 @@
+import time
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# 计算 Beta 的默认基准：上证指数
+DEFAULT_INDEX = 'sh000001'
+TRADING_DAYS = 252
+DEFAULT_YEARS = 5
+
+
+def lookback_start(years: int = DEFAULT_YEARS) -> np.datetime64:
+    """回看 years 年的起始日期"""
+    return np.datetime64(time.strftime('%Y-%m-%d'), 'D') - int(365.25 * years)
+
+
+def align_closes(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], codes: Sequence[str],
+                 start=None, end=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把各股票的日线对齐到同一日期网格（停牌日沿用前收盘）
+
+    参数:
+        closes: 代码 -> (日期数组 datetime64[D], 收盘价数组)
+        codes: 列顺序
+        start/end: 日期范围
+
+    返回:
+        (日期网格, 价格矩阵[日期, 股票])；某股票首个收盘价之前用该收盘价回填（收益为 0），
+        完全没有数据的列为 NaN
+    """
+    series = [closes.get(code) for code in codes]
+    days = [s[0] for s in series if s is not None and len(s[0])]
+    if not days:
+        return np.array([], dtype='datetime64[D]'), np.empty((0, len(codes)))
+    grid = np.unique(np.concatenate(days).astype('datetime64[D]'))
+    if start is not None:
+        grid = grid[grid >= np.datetime64(str(start)[:10], 'D')]
+    if end is not None:
+        grid = grid[grid <= np.datetime64(str(end)[:10], 'D')]
+    matrix = np.full((len(grid), len(codes)), np.nan)
+    for j, s in enumerate(series):
+        if s is None or not len(s[0]):
+            continue
+        idx = np.searchsorted(s[0], grid, side='right') - 1
+        matrix[:, j] = np.asarray(s[1], dtype=np.float64)[np.clip(idx, 0, None)]
+    return grid, matrix
+
+
+def _max_drawdown(values: np.ndarray) -> Tuple[float, float, int]:
+    """(最大回撤比例, 最大回撤金额, 谷底下标)"""
+    peak = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(peak > 0, values / peak - 1, 0.0)
+    trough = int(ratio.argmin())
+    return float(-ratio[trough]), float(peak[trough] - values[trough]), trough
+
+
+def portfolio_risk(prices: np.ndarray, quantities: np.ndarray, index: Optional[np.ndarray] = None,
+                   confidence: float = 0.95, risk_free: float = 0.02,
+                   periods: int = TRADING_DAYS) -> Dict[str, Any]:
+    """
+    按当前持仓数量回看的组合风险（全部为矩阵运算）
+
+    参数:
+        prices: 对齐后的价格矩阵[日期, 股票]，不可含 NaN
+        quantities: 每只股票的持仓数量
+        index: 与 prices 同一日期网格的基准收盘价，用于 Beta
+        confidence: VaR 置信度
+        risk_free: 年化无风险利率（Sharpe）
+        periods: 每年交易日数
+
+    返回:
+        dict: value 当前市值、volatility 年化波动率、var_historical / var_parametric /
+        expected_shortfall 一日 VaR 与尾部期望损失（金额）、max_drawdown 最大回撤比例、
+        max_drawdown_amount、sharpe、beta、days 样本天数、contribution 各股票风险贡献占比
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    values = prices @ quantities
+    value = float(values[-1]) if len(values) else 0.0
+    result: Dict[str, Any] = {
+        'value': value, 'volatility': 0.0, 'var_historical': 0.0, 'var_parametric': 0.0,
+        'expected_shortfall': 0.0, 'max_drawdown': 0.0, 'max_drawdown_amount': 0.0,
+        'sharpe': 0.0, 'beta': float('nan'), 'days': int(len(values)),
+        'contribution': np.zeros(len(quantities)),
+    }
+    if len(values) < 3 or value <= 0:
+        return result
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = prices[1:] / prices[:-1] - 1
+        portfolio = values[1:] / values[:-1] - 1
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    portfolio = np.nan_to_num(portfolio, nan=0.0, posinf=0.0, neginf=0.0)
+
+    # 参数法：当前权重下的协方差二次型 σ² = wᵀΣw
+    weights = quantities * prices[-1] / value
+    centered = returns - returns.mean(axis=0)
+    cov_w = centered.T @ (centered @ weights) / (len(returns) - 1)
+    variance = float(weights @ cov_w)
+    sigma = float(np.sqrt(max(variance, 0.0)))
+    z = NormalDist().inv_cdf(confidence)
+    mean = float(returns.mean(axis=0) @ weights)
+    result['volatility'] = float(sigma * np.sqrt(periods))
+    result['var_parametric'] = max(0.0, (z * sigma - mean) * value)
+    if variance > 0:
+        result['contribution'] = weights * cov_w / variance
+
+    # 历史法：按持仓数量回看的组合日收益分位数
+    cutoff = np.quantile(portfolio, 1 - confidence)
+    result['var_historical'] = max(0.0, -float(cutoff) * value)
+    tail = portfolio[portfolio <= cutoff]
+    result['expected_shortfall'] = max(0.0, -float(tail.mean()) * value) if len(tail) else 0.0
+
+    result['max_drawdown'], result['max_drawdown_amount'], _ = _max_drawdown(values)
+    std = float(portfolio.std(ddof=1))
+    if std > 0:
+        result['sharpe'] = float((portfolio.mean() * periods - risk_free) / (std * np.sqrt(periods)))
+
+    if index is not None:
+        index = np.asarray(index, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            market = index[1:] / index[:-1] - 1
+        valid = np.isfinite(market)
+        if valid.sum() > 2:
+            m = market[valid] - market[valid].mean()
+            p = portfolio[valid] - portfolio[valid].mean()
+            denominator = float(m @ m)
+            if denominator > 0:
+                result['beta'] = float(m @ p) / denominator
+    return result
+
+
+def symbol_betas(prices: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """
+    各股票相对基准的 Beta（一次矩阵运算）
+
+    参数:
+        prices: 对齐后的价格矩阵[日期, 股票]
+        index: 同一日期网格的基准收盘价
+
+    返回:
+        np.ndarray: 每只股票的 Beta，样本不足时为 NaN
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    index = np.asarray(index, dtype=np.float64)
+    betas = np.full(prices.shape[1] if prices.ndim == 2 else 0, np.nan)
+    if len(index) < 4:
+        return betas
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = prices[1:] / prices[:-1] - 1
+        market = index[1:] / index[:-1] - 1
+    valid = np.isfinite(market)
+    returns = np.nan_to_num(returns[valid], nan=0.0, posinf=0.0, neginf=0.0)
+    m = market[valid] - market[valid].mean()
+    denominator = float(m @ m)
+    if denominator > 0:
+        betas = (m @ (returns - returns.mean(axis=0))) / denominator
+    return betas
+
+
+def portfolio_risk_from_data_manager(data_manager, years: int = DEFAULT_YEARS, index_code: str = DEFAULT_INDEX,
+                                     confidence: float = 0.95) -> Dict[str, Any]:
+    """
+    用当前持仓与本地日线缓存计算组合风险（不访问网络）
+
+    参数:
+        data_manager: 数据管理器实例
+        years: 回看年数
+        index_code: Beta 基准代码
+        confidence: VaR 置信度
+
+    返回:
+        dict: portfolio_risk 的结果，另含 codes 参与计算的股票、missing 缺少日线的股票、
+        start / end 样本起止日期
+    """
+    from utils.equity_curve import default_close_cache
+    holdings: Dict[str, float] = {}
+    for p in data_manager.get_positions():
+        try:
+            quantity = float(p.get('quantity', 0) or 0)
+        except (TypeError, ValueError):
+            continue
+        code = str(p.get('code', ''))
+        if code and quantity > 0:
+            holdings[code] = holdings.get(code, 0.0) + quantity
+    cache = default_close_cache(data_manager)
+    closes = cache.cached(list(holdings) + [index_code])
+    codes = [c for c in holdings if c in closes]
+    grid, matrix = align_closes(closes, codes + [index_code], start=lookback_start(years))
+    usable = ~np.isnan(matrix[:, :len(codes)]).all(axis=0) if len(grid) else np.zeros(len(codes), dtype=bool)
+    codes = [c for c, ok in zip(codes, usable) if ok]
+    prices = matrix[:, np.flatnonzero(usable)] if len(grid) else np.empty((0, 0))
+    index = matrix[:, -1] if len(grid) and not np.isnan(matrix[:, -1]).all() else None
+    result = portfolio_risk(prices, np.array([holdings[c] for c in codes]), index, confidence=confidence)
+    result['codes'] = codes
+    result['missing'] = [c for c in holdings if c not in codes]
+    result['start'] = str(grid[0]) if len(grid) else ''
+    result['end'] = str(grid[-1]) if len(grid) else ''
+    return result
+
+
+def required_codes(data_manager, index_code: str = DEFAULT_INDEX) -> List[str]:
+    """风险计算需要的日线代码：当前持仓加基准"""
+    codes: Iterable[str] = (str(p.get('code', '')) for p in data_manager.get_positions())
+    return list(dict.fromkeys([c for c in codes if c] + [index_code]))
+
+
+def benchmark(symbols: int = 500, years: int = DEFAULT_YEARS) -> Dict[str, float]:
+    """
+    基准：symbols 只股票 years 年日线（数据已缓存时）从读取缓存文件到全部指标
+
+    返回:
+        dict: align 对齐秒数、metrics 计算指标秒数、total 含读取缓存的总秒数、days 样本天数
+    """
+    rng = np.random.default_rng(0)
+    end = np.datetime64('2025-12-31', 'D')
+    grid = np.arange(end - int(365.25 * years), end + 1, dtype='datetime64[D]')
+    grid = grid[np.is_busday(grid)]
+    closes = {}
+    for i in range(symbols + 1):
+        # 随机停牌与晚上市，检验对齐
+        days = grid[rng.integers(0, 60):]
+        days = days[rng.random(len(days)) > 0.02]
+        closes[f"sh{600000 + i}"] = (days, np.cumprod(1 + rng.normal(0, 0.02, len(days))) * 20)
+    codes = list(closes)
+    quantities = 100.0 * rng.integers(1, 50, symbols)
+
+    import os
+    import tempfile
+    from utils.equity_curve import DailyCloseCache
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'daily_closes.npz')
+        cache = DailyCloseCache(path)
+        cache._series = closes
+        cache.save()
+        begin = time.perf_counter()
+        closes = DailyCloseCache(path).cached(codes)
+        start = time.perf_counter()
+        _, matrix = align_closes(closes, codes)
+        aligned = time.perf_counter() - start
+        start = time.perf_counter()
+        portfolio_risk(matrix[:, :symbols], quantities, matrix[:, symbols])
+        elapsed = time.perf_counter() - start
+    return {'align': aligned, 'metrics': elapsed, 'total': time.perf_counter() - begin, 'days': float(len(matrix))}
+
+
+if __name__ == '__main__':
+    # python -m utils.risk_metrics
+    result = benchmark()
+    print(f"对齐 {result['align']:.3f}s，{result['days']:.0f} 天 × 500 只指标 {result['metrics']:.3f}s，"
+          f"含读取缓存共 {result['total']:.3f}s")
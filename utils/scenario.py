@@ -0,0 +1,262 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from controllers.trade_controller import DEFAULT_COMMISSION, FeeScheduleCommission
+
+
+# 单次广播的格子数上限（情景 × 持仓），超过时按情景分块，控制临时数组内存
+CHUNK_CELLS = 2_000_000
+SCENARIO_MODES = ('uniform', 'beta', 'random')
+
+
+class Book:
+    """情景计算用的持仓列数组：代码、名称、数量、现价、持仓成本（含买入费用）"""
+
+    def __init__(self, codes: Sequence[str], names: Sequence[str], quantities, prices, costs):
+        self.codes = [str(c) for c in codes]
+        self.names = [str(n) for n in names]
+        self.quantities = np.asarray(quantities, dtype=np.float64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.costs = np.asarray(costs, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_data_manager(cls, data_manager) -> 'Book':
+        """
+        当前持仓；现价与主界面一致（最近价格缓存优先，其次持仓现价），都没有时用成本价，
+        持仓成本为成本价 × 数量（成本价已含买入费用）
+
+        参数:
+            data_manager: 数据管理器实例
+        """
+        from utils.valuation import position_price
+        last_prices = data_manager.get_last_prices()
+        rows = []
+        for p in data_manager.get_positions():
+            try:
+                quantity = float(p.get('quantity', 0) or 0)
+                cost_price = float(p.get('cost_price', 0) or 0)
+                price = position_price(p, last_prices) or cost_price
+            except (TypeError, ValueError):
+                continue
+            if quantity <= 0:
+                continue
+            code = str(p.get('code', ''))
+            rows.append((code, str(p.get('name', code)), quantity, price,
+                         cost_price * quantity))
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        return cls(*columns)
+
+
+def uniform_shocks(low: float = -0.10, high: float = 0.10, steps: int = 21) -> np.ndarray:
+    """所有持仓同涨同跌：形状 (情景, 1) 的冲击幅度"""
+    return np.linspace(low, high, steps)[:, None]
+
+
+def beta_shocks(index_moves: Sequence[float], betas: np.ndarray) -> np.ndarray:
+    """按指数涨跌 × 各股票 Beta：形状 (情景, 持仓)；Beta 未知时按 1"""
+    betas = np.where(np.isfinite(betas), betas, 1.0)
+    return np.asarray(index_moves, dtype=np.float64)[:, None] * betas[None, :]
+
+
+def random_shocks(covariance: np.ndarray, scenarios: int = 10000, horizon: int = 1,
+                  seed: Optional[int] = 0) -> np.ndarray:
+    """
+    按协方差矩阵抽样的相关冲击：形状 (情景, 持仓)
+
+    参数:
+        covariance: 日收益协方差矩阵
+        scenarios: 情景数
+        horizon: 持有天数（按 √t 放大）
+        seed: 随机种子
+    """
+    covariance = np.nan_to_num(np.asarray(covariance, dtype=np.float64), nan=0.0)
+    try:
+        root = np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        # 协方差只是半正定（停牌、完全共线）时改用特征分解
+        values, vectors = np.linalg.eigh(covariance)
+        root = vectors * np.sqrt(np.clip(values, 0, None))
+    # 冲击幅度用单精度抽样与相乘已足够，耗时约减半
+    normal = np.random.default_rng(seed).standard_normal((scenarios, len(covariance)), dtype=np.float32)
+    return normal @ (root.T * np.sqrt(horizon)).astype(np.float32)
+
+
+def evaluate(book: Book, shocks: np.ndarray, commission: FeeScheduleCommission = DEFAULT_COMMISSION,
+             keep_matrix: bool = False) -> Dict[str, Any]:
+    """
+    在情景网格上对全部持仓估值（清仓口径：市值扣除卖出费用，减去持仓成本）
+
+    参数:
+        book: 持仓
+        shocks: 冲击幅度，形状 (情景, 持仓) 或 (情景, 1)
+        commission: 费用策略
+        keep_matrix: 是否返回逐持仓的盈亏矩阵
+
+    返回:
+        dict: value / fees / pnl 每个情景的市值、卖出费用、清仓盈亏（形状 (情景,)），
+        change 相对当前价格的盈亏变化，base 当前价格下的清仓盈亏，
+        worst_position 每个持仓在所有情景中的最差盈亏，matrix（keep_matrix 时）
+    """
+    shocks = np.asarray(shocks, dtype=np.float64)
+    if shocks.ndim == 1:
+        shocks = shocks[:, None]
+    count, n = len(shocks), len(book)
+    base_fees = commission.calculate_grid(book.prices, book.quantities, '卖出', book.codes)
+    base = float((book.prices * book.quantities - base_fees - book.costs).sum())
+    result: Dict[str, Any] = {
+        'value': np.zeros(count), 'fees': np.zeros(count), 'pnl': np.zeros(count),
+        'base': base, 'worst_position': np.full(n, np.inf),
+    }
+    if keep_matrix:
+        result['matrix'] = np.zeros((count, n))
+    if not n:
+        result['change'] = np.zeros(count)
+        result['worst_position'] = np.zeros(0)
+        return result
+    step = max(1, CHUNK_CELLS // n)
+    for start in range(0, count, step):
+        block = shocks[start:start + step]
+        prices = book.prices * (1 + block)                       # 广播为 (情景, 持仓)
+        value = prices * book.quantities
+        fees = commission.calculate_grid(prices, book.quantities, '卖出', book.codes)
+        pnl = value - fees - book.costs
+        rows = slice(start, start + len(block))
+        result['value'][rows] = value.sum(axis=1)
+        result['fees'][rows] = fees.sum(axis=1)
+        result['pnl'][rows] = pnl.sum(axis=1)
+        np.minimum(result['worst_position'], pnl.min(axis=0), out=result['worst_position'])
+        if keep_matrix:
+            result['matrix'][rows] = pnl
+    result['change'] = result['pnl'] - base
+    return result
+
+
+def summarize(result: Dict[str, Any], confidence: float = 0.95) -> Dict[str, float]:
+    """情景结果的统计：最差/最好/中位的盈亏变化及分位数损失"""
+    change = result['change']
+    if not len(change):
+        return {'worst': 0.0, 'best': 0.0, 'median': 0.0, 'loss_quantile': 0.0}
+    return {'worst': float(change.min()), 'best': float(change.max()), 'median': float(np.median(change)),
+            'loss_quantile': float(-np.quantile(change, 1 - confidence))}
+
+
+def build_shocks(data_manager, book: Book, mode: str, low: float, high: float, steps: int,
+                 scenarios: int = 10000, horizon: int = 1) -> np.ndarray:
+    """
+    按模式生成冲击网格
+
+    参数:
+        mode: uniform 统一涨跌 / beta 按指数涨跌 × Beta / random 按协方差随机抽样
+        low/high/steps: uniform、beta 的涨跌范围与档数
+        scenarios/horizon: random 的情景数与持有天数
+    """
+    if mode == 'uniform':
+        return uniform_shocks(low, high, steps)
+    from utils.equity_curve import default_close_cache
+    from utils.risk_metrics import DEFAULT_INDEX, align_closes, lookback_start, symbol_betas
+    closes = default_close_cache(data_manager).cached(book.codes + [DEFAULT_INDEX])
+    if mode == 'beta':
+        betas = np.full(len(book), np.nan)
+        if DEFAULT_INDEX in closes:
+            _, matrix = align_closes(closes, book.codes + [DEFAULT_INDEX], start=lookback_start(1))
+            if len(matrix):
+                betas = symbol_betas(matrix[:, :-1], matrix[:, -1])
+        return beta_shocks(np.linspace(low, high, steps), betas)
+    from utils.covariance import EwmaCovariance
+    estimator = EwmaCovariance.shared(data_manager).sync(closes, book.codes)
+    covariance = np.zeros((len(book), len(book)))
+    index = {c: i for i, c in enumerate(estimator.codes)}
+    known = [i for i, c in enumerate(book.codes) if c in index]
+    if known:
+        picked = [index[book.codes[i]] for i in known]
+        covariance[np.ix_(known, known)] = estimator.covariance()[np.ix_(picked, picked)]
+    return random_shocks(covariance, scenarios, horizon)
+
+
+def benchmark(scenarios: int = 10000, positions: int = 1000) -> Dict[str, float]:
+    """
+    基准：scenarios 个相关随机情景 × positions 个持仓
+
+    返回:
+        dict: shocks 生成冲击秒数、evaluate 估值秒数
+    """
+    rng = np.random.default_rng(0)
+    codes = [f"sh{600000 + i}" if i % 2 else f"sz{1 + i:06d}" for i in range(positions)]
+    prices = rng.uniform(5, 50, positions)
+    quantities = 100.0 * rng.integers(1, 50, positions)
+    book = Book(codes, codes, quantities, prices, prices * quantities * rng.uniform(0.8, 1.2, positions))
+    factor = rng.normal(0, 1, (positions, 3)) * 0.01
+    covariance = factor @ factor.T + np.diag(rng.uniform(1e-5, 4e-4, positions))
+    start = time.perf_counter()
+    shocks = random_shocks(covariance, scenarios)
+    generated = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluate(book, shocks)
+    return {'shocks': generated, 'evaluate': time.perf_counter() - start}
+
+
+def _format_rows(result: Dict[str, Any], shocks: np.ndarray, mode: str) -> List[Dict[str, Any]]:
+    if mode == 'random':
+        order = np.argsort(result['change'])
+        picks = order[np.linspace(0, len(order) - 1, min(11, len(order))).astype(int)]
+    else:
+        picks = np.arange(len(shocks))
+    rows = []
+    for i in picks:
+        row = shocks[i]
+        rows.append({'scenario': int(i), 'shock': float(row.mean()), 'value': float(result['value'][i]),
+                     'fees': float(result['fees'][i]), 'pnl': float(result['pnl'][i]),
+                     'change': float(result['change'][i])})
+    return rows
+
+
+def main():
+    import argparse
+    import json
+    from utils.data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description='持仓情景分析（价格冲击网格）')
+    parser.add_argument('command', choices=['grid', 'bench'])
+    parser.add_argument('--mode', choices=SCENARIO_MODES, default='uniform',
+                        help='uniform 统一涨跌 / beta 指数涨跌×Beta / random 按协方差抽样')
+    parser.add_argument('--low', type=float, default=-10.0, help='最小涨跌幅（%%）')
+    parser.add_argument('--high', type=float, default=10.0, help='最大涨跌幅（%%）')
+    parser.add_argument('--steps', type=int, default=21, help='涨跌档数')
+    parser.add_argument('--scenarios', type=int, default=10000, help='random 的情景数；bench 的情景数')
+    parser.add_argument('--horizon', type=int, default=1, help='random 的持有天数')
+    parser.add_argument('--positions', type=int, default=1000, help='bench 的持仓数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        result = benchmark(args.scenarios, args.positions)
+        print(f"{args.scenarios} 个情景 × {args.positions} 个持仓：生成冲击 {result['shocks']:.3f}s，"
+              f"估值 {result['evaluate']:.3f}s")
+        return
+    data_manager = DataManager()
+    book = Book.from_data_manager(data_manager)
+    shocks = build_shocks(data_manager, book, args.mode, args.low / 100, args.high / 100, args.steps,
+                          args.scenarios, args.horizon)
+    result = evaluate(book, shocks)
+    rows = _format_rows(result, shocks, args.mode)
+    stats = summarize(result)
+    if args.json:
+        print(json.dumps({'mode': args.mode, 'positions': len(book), 'scenarios': len(shocks),
+                          'base': result['base'], 'summary': stats, 'rows': rows}, ensure_ascii=False, indent=2))
+        return
+    print(f"{len(book)} 个持仓，{len(shocks)} 个情景，当前清仓盈亏 {result['base']:,.2f}")
+    print(f"{'平均冲击':>8} {'市值':>14} {'卖出费用':>10} {'清仓盈亏':>14} {'变化':>14}")
+    for row in rows:
+        print(f"{row['shock'] * 100:>7.2f}% {row['value']:>14,.2f} {row['fees']:>10,.2f} "
+              f"{row['pnl']:>14,.2f} {row['change']:>14,.2f}")
+    print(f"最差 {stats['worst']:,.2f}  最好 {stats['best']:,.2f}  95% 分位损失 {stats['loss_quantile']:,.2f}")
+
+
+if __name__ == '__main__':
+    # python -m utils.scenario grid --mode beta --low -10 --high 10
+    main()
@@ -0,0 +1,118 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, List, Set, Tuple
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # pypinyin 为可选依赖，缺失时按 GB2312 区位推算声母
+    lazy_pinyin = None
+    Style = None
+
+
+# GB2312 一级汉字按拼音排序，各声母首字的区位码（高字节*256+低字节）
+_GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'),
+    (0xB7A2, 'f'), (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'),
+    (0xC0AC, 'l'), (0xC2E8, 'm'), (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'),
+    (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'), (0xCBFA, 't'), (0xCDDA, 'w'),
+    (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+_GB2312_BOUNDS = [b for b, _ in _GB2312_INITIALS]
+_GB2312_END = 0xD7FA
+
+
+@lru_cache(maxsize=65536)
+def _char_initial(ch: str) -> str:
+    """单个字符的拼音首字母；字母数字原样小写，无法识别的字符返回空串"""
+    if ch.isascii():
+        return ch.lower() if ch.isalnum() else ''
+    try:
+        raw = ch.encode('gb2312')
+    except UnicodeEncodeError:
+        return ''
+    if len(raw) != 2:
+        return ''
+    code = raw[0] * 256 + raw[1]
+    if code < _GB2312_BOUNDS[0] or code > _GB2312_END:
+        return ''  # 二级汉字按部首排序，无法推算
+    pos = bisect_left(_GB2312_BOUNDS, code + 1) - 1
+    return _GB2312_INITIALS[pos][1]
+
+
+def pinyin_initials(text: str) -> str:
+    """名称的拼音首字母串，如 科创50 -> kc50"""
+    if lazy_pinyin is not None:
+        # 整词转换，多音字按词组取音（银行 -> yh）
+        letters = ''.join(lazy_pinyin(str(text), style=Style.FIRST_LETTER))
+        return ''.join(ch.lower() for ch in letters if ch.isascii() and ch.isalnum())
+    return ''.join(_char_initial(ch) for ch in str(text))
+
+
+class SearchIndex:
+    """
+    持仓与交易历史的前缀搜索索引
+
+    键为代码（含/不含交易所前缀）、名称及名称拼音首字母，统一小写后排序存放，
+    查询时二分定位前缀区间，耗时只与匹配数有关，与历史记录条数无关。
+    历史中的代码与名称来自 HistoryIndex 的代码倒排表，只在历史版本变化时重建。
+    """
+
+    def __init__(self):
+        self._keys: List[str] = []
+        self._codes: List[str] = []
+        self.names: Dict[str, str] = {}
+
+    def build(self, entries: Iterable[Tuple[str, str]]):
+        """
+        重建索引
+
+        参数:
+            entries: (代码, 名称) 序列，可重复
+        """
+        pairs: Set[Tuple[str, str]] = set()
+        names: Dict[str, str] = {}
+        for code, name in entries:
+            code = str(code or '').strip()
+            name = str(name or '').strip()
+            if not code and not name:
+                continue
+            ref = code or name
+            names.setdefault(ref, name)
+            keys = {code.lower(), name.lower(), pinyin_initials(name)}
+            if code[:2].lower() in ('sh', 'sz', 'bj'):
+                keys.add(code[2:])
+            pairs.update((k, ref) for k in keys if k)
+        ordered = sorted(pairs)
+        self._keys = [k for k, _ in ordered]
+        self._codes = [c for _, c in ordered]
+        self.names = names
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def search(self, text: str, limit: int = 0) -> List[str]:
+        """
+        前缀查询
+
+        参数:
+            text: 代码、名称或拼音首字母前缀，不区分大小写
+            limit: 最多返回的代码数，0 表示不限
+
+        返回:
+            匹配的代码列表（按命中键的顺序去重）
+        """
+        prefix = str(text or '').strip().lower()
+        if not prefix:
+            return []
+        result: List[str] = []
+        seen = set()
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            code = self._codes[i]
+            if code not in seen:
+                seen.add(code)
+                result.append(code)
+                if limit and len(result) >= limit:
+                    break
+            i += 1
+        return result
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import os
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+
+
+# 券商导出对账单常见列名 -> history 字段
+COLUMN_ALIASES = {
+    'date': ['成交日期', '交易日期', '发生日期', '日期', '交收日期', 'date'],
+    'time': ['成交时间', '时间', 'time'],
+    'type': ['买卖标志', '买卖方向', '操作', '业务名称', '委托类别', '交易类别', '摘要', 'type'],
+    'code': ['证券代码', '股票代码', '代码', 'code'],
+    'name': ['证券名称', '股票名称', '名称', 'name'],
+    'price': ['成交价格', '成交均价', '成交价', '价格', 'price'],
+    'quantity': ['成交数量', '成交股数', '发生数量', '数量', 'quantity'],
+    'amount': ['成交金额', '发生金额', '金额', 'amount'],
+    'trade_id': ['成交编号', '合同编号', '委托编号', 'trade_id'],
+}
+
+
+def _resolve_columns(header: List[str]) -> Dict[str, int]:
+    """根据表头定位各字段所在列"""
+    cleaned = [str(h or '').strip() for h in header]
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in cleaned:
+                mapping[field] = cleaned.index(alias)
+                break
+    missing = [f for f in ('date', 'type', 'code', 'price', 'quantity') if f not in mapping]
+    if missing:
+        raise ValueError(f"对账单缺少必要列: {', '.join(missing)}")
+    return mapping
+
+
+@lru_cache(maxsize=65536)
+def normalize_code(raw: str) -> str:
+    """将 6 位证券代码补全交易所前缀（sh/sz/bj），已有前缀的保持不变"""
+    code = str(raw).strip().strip('="').lower()
+    if code[:2] in ('sh', 'sz', 'bj'):
+        return code
+    code = code.split('.')[0].zfill(6)
+    if code[0] in '569':
+        return 'sh' + code
+    if code[0] in '48':
+        return 'bj' + code
+    return 'sz' + code
+
+
+@lru_cache(maxsize=65536)
+def normalize_date(raw: str) -> str:
+    """统一日期格式为 YYYY-MM-DD（支持 20250903、2025/9/3、2025-09-03 14:00 等）"""
+    text = str(raw).strip().split(' ')[0].split('T')[0]
+    if text.isdigit() and len(text) == 8:
+        return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    parts = text.replace('/', '-').replace('.', '-').split('-')
+    if len(parts) == 3:
+        return f"{int(parts[0]):04d}-{int(parts[1]):02d}-{int(parts[2]):02d}"
+    raise ValueError(f"无法识别的日期: {raw}")
+
+
+@lru_cache(maxsize=65536)
+def normalize_type(raw: str) -> Optional[str]:
+    """买卖方向归一为 买入/卖出；红利、转账等非成交记录返回 None"""
+    text = str(raw).strip()
+    if '买' in text or text.upper() in ('B', 'BUY'):
+        return '买入'
+    if '卖' in text or text.upper() in ('S', 'SELL'):
+        return '卖出'
+    return None
+
+
+def _to_float(raw) -> float:
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        if raw is None or raw == '':
+            return 0.0
+        return float(str(raw).replace(',', '').strip())
+
+
+def record_key(record: Dict[str, Any]) -> int:
+    """
+    交易记录去重键：规范化字段元组的哈希值
+
+    只在单次导入过程内比较，因此使用进程内的 hash() 即可，每条只占一个整数。
+    """
+    return hash((
+        str(record.get('date', '')),
+        str(record.get('type', '')),
+        str(record.get('code', '')),
+        round(float(record.get('price', 0) or 0), 4),
+        round(float(record.get('quantity', 0) or 0)),
+        str(record.get('trade_id', '')),
+    ))
+
+
+def iter_csv_rows(path: str, encoding: Optional[str] = None) -> Iterator[List[str]]:
+    """逐行读取CSV/TXT（券商导出多为 GBK 编码，制表符或逗号分隔）"""
+    encodings = [encoding] if encoding else ['utf-8-sig', 'gbk']
+    for enc in encodings:
+        try:
+            with open(path, 'r', encoding=enc, newline='') as f:
+                sample = f.read(4096)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("无法识别对账单编码")
+    delimiter = '\t' if sample.count('\t') > sample.count(',') else ','
+    with open(path, 'r', encoding=enc, newline='') as f:
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def iter_excel_rows(path: str) -> Iterator[List[Any]]:
+    """以只读流式方式逐行读取 Excel（需要 openpyxl）"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("读取Excel对账单需要安装 openpyxl")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        wb.close()
+
+
+def iter_statement(path: str, encoding: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    流式解析对账单，逐条产出 history 格式的记录
+
+    参数:
+        path: 对账单路径（.csv/.txt/.xlsx）
+        encoding: CSV 编码，默认自动识别
+
+    返回:
+        生成器，每项为 {date, type, code, name, price, quantity, amount[, trade_id]}
+    """
+    ext = os.path.splitext(path)[1].lower()
+    rows = iter_excel_rows(path) if ext in ('.xlsx', '.xlsm') else iter_csv_rows(path, encoding)
+    columns = None
+    for row in rows:
+        if columns is None:
+            # 跳过表头之前的说明行
+            try:
+                columns = _resolve_columns(row)
+            except ValueError:
+                continue
+            continue
+        if not row or all(c in (None, '') for c in row):
+            continue
+        try:
+            type_ = normalize_type(row[columns['type']])
+            if type_ is None:
+                continue
+            price = _to_float(row[columns['price']])
+            quantity = abs(_to_float(row[columns['quantity']]))
+            if quantity <= 0:
+                continue
+            amount = abs(_to_float(row[columns['amount']])) if 'amount' in columns else 0.0
+            record = {
+                'date': normalize_date(row[columns['date']]),
+                'type': type_,
+                'code': normalize_code(row[columns['code']]),
+                'name': str(row[columns['name']] or '').strip() if 'name' in columns else '',
+                'price': price,
+                'quantity': quantity,
+                'amount': amount or round(price * quantity, 2),
+            }
+            if 'trade_id' in columns and row[columns['trade_id']] not in (None, ''):
+                record['trade_id'] = str(row[columns['trade_id']]).strip()
+        except (ValueError, IndexError):
+            continue
+        yield record
+    if columns is None:
+        raise ValueError("未找到对账单表头")
+
+
+def import_records(data_manager, records: Iterable[Dict[str, Any]], batch_size: int = 250000,
+                   dry_run: bool = False) -> Dict[str, int]:
+    """
+    去重后分批写入交易历史
+
+    同一键在已有记录中出现 k 次时，只导入新数据中该键的第 k+1 次及以后的出现，
+    因此重复导入同一对账单不会产生重复，同日同价的多笔成交也不会被误删。
+
+    参数:
+        data_manager: DataManager 实例
+        records: 记录迭代器（通常来自 iter_statement）
+        batch_size: 每批条数，每批只保存一次
+        dry_run: 只统计不写入
+
+    返回:
+        dict: {'read', 'imported', 'duplicates', 'batches'}
+    """
+    existing = Counter(record_key(h) for h in data_manager.get_history())
+    seen = Counter()
+    stats = {'read': 0, 'imported': 0, 'duplicates': 0, 'batches': 0}
+    batch = []
+    for record in records:
+        stats['read'] += 1
+        key = record_key(record)
+        seen[key] += 1
+        if seen[key] <= existing.get(key, 0):
+            stats['duplicates'] += 1
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            if not dry_run:
+                data_manager.add_history_many(batch)
+            stats['imported'] += len(batch)
+            stats['batches'] += 1
+            batch = []
+    if batch:
+        if not dry_run:
+            data_manager.add_history_many(batch)
+        stats['imported'] += len(batch)
+        stats['batches'] += 1
+    return stats
+
+
+def import_statement(data_manager, path: str, batch_size: int = 250000, dry_run: bool = False,
+                     encoding: Optional[str] = None) -> Dict[str, int]:
+    """解析并导入一份对账单，返回统计信息"""
+    return import_records(data_manager, iter_statement(path, encoding), batch_size, dry_run)
+
+
+def main():
+    from utils.data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description='导入券商对账单到交易历史')
+    parser.add_argument('files', nargs='+', help='CSV/TXT/XLSX 对账单')
+    parser.add_argument('--batch-size', type=int, default=250000)
+    parser.add_argument('--encoding', default=None)
+    parser.add_argument('--dry-run', action='store_true', help='只解析和去重，不写入')
+    args = parser.parse_args()
+
+    data_manager = DataManager()
+    for path in args.files:
+        start = time.perf_counter()
+        stats = import_statement(data_manager, path, args.batch_size, args.dry_run, args.encoding)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: 读取 {stats['read']} 条，导入 {stats['imported']} 条，"
+              f"重复 {stats['duplicates']} 条，{stats['batches']} 批，耗时 {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    # python -m utils.statement_importer 对账单.csv [--dry-run]
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import shutil
+import sys
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+# (键, 表头, 显示宽度)；数值列右对齐
+COLUMNS = [
+    ('name', '名称', 10), ('code', '代码', 9), ('quantity', '数量', 9), ('cost_price', '成本价', 9),
+    ('price', '现价', 9), ('change_ratio', '涨跌%', 8), ('market_value', '市值', 12),
+    ('profit', '浮动盈亏', 11), ('profit_ratio', '收益率%', 8), ('to_take_profit', '距止盈%', 8),
+    ('to_stop_loss', '距止损%', 8), ('updated', '更新', 8),
+]
+LEFT_ALIGNED = ('name', 'code')
+SORT_KEYS = {'value': 'market_value', 'profit': 'profit', 'change': 'change_ratio', 'code': 'code'}
+HEADER_LINES = 3
+
+RED, GREEN, DIM, RESET = '\x1b[31m', '\x1b[32m', '\x1b[2m', '\x1b[0m'
+
+
+def display_width(text: str) -> int:
+    """终端显示宽度（中文等宽字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def fit(text: str, width: int, right: bool = False) -> str:
+    """按显示宽度截断并补齐"""
+    out, used = [], 0
+    for ch in text:
+        w = 2 if unicodedata.east_asian_width(ch) in 'WF' else 1
+        if used + w > width:
+            break
+        out.append(ch)
+        used += w
+    pad = ' ' * (width - used)
+    return pad + ''.join(out) if right else ''.join(out) + pad
+
+
+class Screen:
+    """
+    差量刷新的终端画面
+
+    画面按 (行, 列) 划分单元格，只为内容或颜色变化的单元格输出光标定位与文本，
+    整帧拼成一次写出；终端尺寸变化时整屏重绘。
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._cells: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        self._size: Optional[Tuple[int, int]] = None
+        self.cells_written = 0
+
+    def start(self):
+        # 备用屏幕缓冲区 + 隐藏光标，退出时恢复原终端内容
+        self.stream.write('\x1b[?1049h\x1b[?25l\x1b[2J')
+        self.stream.flush()
+
+    def stop(self):
+        self.stream.write(RESET + '\x1b[?25h\x1b[?1049l')
+        self.stream.flush()
+
+    def draw(self, cells: Dict[Tuple[int, int], Tuple[str, str]], size: Tuple[int, int]):
+        """
+        参数:
+            cells: (行, 起始列) -> (已按宽度补齐的文本, 颜色转义码或空串)，行列从 0 开始
+            size: 终端 (列数, 行数)
+        """
+        parts = []
+        if size != self._size:
+            parts.append('\x1b[2J')
+            self._cells = {}
+            self._size = size
+        previous = self._cells
+        for key, value in cells.items():
+            if previous.get(key) != value:
+                text, color = value
+                parts.append(f"\x1b[{key[0] + 1};{key[1] + 1}H{color}{text}{RESET if color else ''}")
+                self.cells_written += 1
+        # 本帧不再出现的单元格（行数减少）用空白覆盖
+        for key, (text, _) in previous.items():
+            if key not in cells:
+                parts.append(f"\x1b[{key[0] + 1};{key[1] + 1}H{' ' * display_width(text)}")
+        self._cells = dict(cells)
+        if parts:
+            self.stream.write(''.join(parts))
+            self.stream.flush()
+
+
+class QuoteStream:
+    """
+    asyncio 行情流
+
+    由 QuoteScheduler 决定每只股票何时到期（临近计划价位的更频繁），到期代码并发请求；
+    请求经 QuoteProxy 合并在途请求与短期缓存，并发数由其线程池限制。
+    """
+
+    def __init__(self, fetch: Callable, scheduler, on_quote: Callable[[str, float, float], None]):
+        """
+        参数:
+            fetch: 协程函数 fetch(code) -> (现价, 上一笔)
+            scheduler: QuoteScheduler 实例（已设置股票池）
+            on_quote: 收到行情时的回调 (code, 现价, 上一笔)
+        """
+        self.fetch = fetch
+        self.scheduler = scheduler
+        self.on_quote = on_quote
+        self.inflight: Set[str] = set()
+        self.requests = 0
+        self.errors = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _fetch_one(self, code: str):
+        try:
+            live, prev = await self.fetch(code)
+            self.scheduler.observe(code, live)
+            self.on_quote(code, live, prev)
+        except Exception:
+            self.errors += 1
+            self.scheduler.mark_failed(code)
+        finally:
+            self.inflight.discard(code)
+
+    async def run(self):
+        while True:
+            for code in self.scheduler.due_codes():
+                if code in self.inflight:
+                    continue
+                self.inflight.add(code)
+                self.requests += 1
+                task = asyncio.create_task(self._fetch_one(code))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            await asyncio.sleep(min(max(self.scheduler.next_wakeup(), 0.05), 1.0))
+
+
+class Dashboard:
+    """持仓看板：行情回调只记录价格，渲染按固定帧率把变化的单元格写到终端"""
+
+    def __init__(self, data_manager, screen: Screen, sort: str = 'value'):
+        from utils.valuation import plan_levels, position_price
+        self.data_manager = data_manager
+        self.screen = screen
+        self.sort_key = SORT_KEYS.get(sort, 'market_value')
+        self.positions = [p for p in data_manager.get_positions() if p.get('code')]
+        last_prices = data_manager.get_last_prices()
+        self.prices: Dict[str, float] = {}
+        self.prev: Dict[str, float] = {}
+        for p in self.positions:
+            try:
+                self.prices[str(p['code'])] = position_price(p, last_prices)
+            except (TypeError, ValueError):
+                continue
+        self.updated: Dict[str, float] = {}
+        # 计划价位按代码（或名称）对应到持仓
+        name_to_code = {str(p.get('name', '')): str(p.get('code', '')) for p in self.positions}
+        self.levels: Dict[str, Tuple[float, float]] = {}
+        for plan in data_manager.get_plans():
+            if plan.get('status', 'ACTIVE') != 'ACTIVE':
+                continue
+            code = str(plan.get('code', '') or name_to_code.get(str(plan.get('name', '')), ''))
+            if code:
+                self.levels[code] = plan_levels(plan)
+        self.dirty = True
+
+    def on_quote(self, code: str, live: float, prev: float):
+        if self.prices.get(code) != live or self.prev.get(code) != prev:
+            self.prices[code] = live
+            self.prev[code] = prev
+            self.dirty = True
+        self.updated[code] = time.time()
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """按当前价格估值全部持仓（与主界面同一估值函数）"""
+        from utils.valuation import plan_distance, value_position
+        rows = []
+        for p in self.positions:
+            code = str(p.get('code', ''))
+            try:
+                v = value_position(p, self.prices.get(code, 0.0), self.prev.get(code))
+            except (TypeError, ValueError):
+                continue
+            take_profit, stop_loss = self.levels.get(code, (0.0, 0.0))
+            v['to_take_profit'] = plan_distance(v['price'], take_profit)
+            v['to_stop_loss'] = plan_distance(v['price'], stop_loss)
+            v['updated'] = self.updated.get(code)
+            rows.append(v)
+        reverse = self.sort_key != 'code'
+        rows.sort(key=lambda r: r[self.sort_key], reverse=reverse)
+        return rows
+
+    @staticmethod
+    def _cell_text(key: str, row: Dict[str, Any]) -> str:
+        value = row.get(key)
+        if value is None:
+            return '-'
+        if key in ('name', 'code'):
+            return str(value)
+        if key == 'quantity':
+            return f"{value:.0f}"
+        if key in ('cost_price', 'price'):
+            return f"{value:.4f}" if value < 10 else f"{value:.2f}"
+        if key in ('market_value', 'profit'):
+            return f"{value:+,.2f}" if key == 'profit' else f"{value:,.2f}"
+        if key == 'updated':
+            return time.strftime('%H:%M:%S', time.localtime(value))
+        return f"{value:+.2f}"
+
+    @staticmethod
+    def _cell_color(key: str, row: Dict[str, Any]) -> str:
+        # A股习惯：涨红跌绿
+        if key in ('price', 'change_ratio'):
+            value = row['change_ratio']
+        elif key in ('profit', 'profit_ratio'):
+            value = row['profit']
+        elif key == 'to_take_profit' and row.get(key) is not None:
+            return RED if row[key] <= 0 else ''
+        elif key == 'to_stop_loss' and row.get(key) is not None:
+            return GREEN if row[key] >= 0 else ''
+        else:
+            return ''
+        return RED if value > 0 else (GREEN if value < 0 else '')
+
+    def render(self, stream_stats: str = ''):
+        """生成整帧单元格并交给 Screen 差量输出"""
+        width, height = shutil.get_terminal_size((120, 40))
+        rows = self.rows()
+        total_value = sum(r['market_value'] for r in rows)
+        total_profit = sum(r['profit'] for r in rows)
+        cells: Dict[Tuple[int, int], Tuple[str, str]] = {}
+        summary = (f"持仓看板 {time.strftime('%Y-%m-%d %H:%M:%S')}  {len(rows)} 只  "
+                   f"市值 {total_value:,.2f}  浮动盈亏 {total_profit:+,.2f}")
+        color = RED if total_profit > 0 else (GREEN if total_profit < 0 else '')
+        cells[(0, 0)] = (fit(summary, width), color)
+        cells[(1, 0)] = (fit(stream_stats, width), DIM)
+        col = 0
+        offsets = []
+        for key, title, w in COLUMNS:
+            if col + w > width:
+                break
+            offsets.append((key, col, w))
+            cells[(2, col)] = (fit(title, w, key not in LEFT_ALIGNED), '')
+            col += w + 1
+        visible = max(0, height - HEADER_LINES - 1)
+        for i, row in enumerate(rows[:visible]):
+            for key, start, w in offsets:
+                cells[(HEADER_LINES + i, start)] = (fit(self._cell_text(key, row), w, key not in LEFT_ALIGNED),
+                                                    self._cell_color(key, row))
+        if len(rows) > visible:
+            cells[(height - 1, 0)] = (fit(f"… 另有 {len(rows) - visible} 只未显示（按 {self.sort_key} 排序）", width), DIM)
+        self.screen.draw(cells, (width, height))
+        self.dirty = False
+
+
+class _DemoUpstream:
+    """演示/离线测试用上游：围绕持仓价格随机游走，带网络延迟"""
+
+    def __init__(self, prices: Dict[str, float], delay: float = 0.05, seed: int = 0):
+        import random
+        self.prices = {code: price or 10.0 for code, price in prices.items()}
+        self.delay = delay
+        self.random = random.Random(seed)
+
+    def __call__(self, code, end_date, count, frequency):
+        import pandas as pd
+        time.sleep(self.delay)
+        prev = self.prices.get(code, 10.0)
+        live = round(prev * (1 + self.random.gauss(0, 0.002)), 3)
+        self.prices[code] = live
+        index = pd.date_range(end=pd.Timestamp.now().floor('min'), periods=2, freq='min')
+        return pd.DataFrame({'open': [prev, live], 'close': [prev, live], 'high': [prev, live],
+                             'low': [prev, live], 'volume': [100.0, 100.0]}, index=index)
+
+
+async def run_dashboard(data_manager, fps: float = 2.0, concurrency: int = 8, budget: float = 600.0,
+                        idle: float = 15.0, sort: str = 'value', duration: float = 0.0, demo: bool = False,
+                        screen: Optional[Screen] = None) -> Dict[str, Any]:
+    """
+    运行看板直到 duration 秒（0 表示直到 Ctrl+C）
+
+    参数:
+        data_manager: 数据管理器实例（只读，不写回价格）
+        fps: 每秒最多重绘次数
+        concurrency: 并发行情请求数
+        budget: 全局请求预算（次/分钟），交给 QuoteScheduler 分配
+        idle: 没有计划的持仓的刷新间隔（秒）；有计划的按到价位的距离自适应
+        sort: 排序方式 value/profit/change/code
+        duration: 运行秒数
+        demo: 使用模拟行情（无网络环境）
+        screen: 输出画面，默认标准输出
+
+    返回:
+        dict: requests、errors、frames、cells 写出的单元格数
+    """
+    from utils.quote_proxy import QuoteProxy
+    from utils.quote_scheduler import QuoteScheduler
+
+    screen = screen or Screen()
+    dashboard = Dashboard(data_manager, screen, sort)
+    upstream = _DemoUpstream(dict(dashboard.prices)) if demo else None
+    proxy = QuoteProxy(upstream=upstream, max_workers=concurrency)
+
+    async def fetch(code: str) -> Tuple[float, float]:
+        payload = await proxy.get(code, count=2, frequency='1m')
+        close = payload['columns'].index('close')
+        data = payload['data']
+        live = float(data[-1][close])
+        return live, float(data[-2][close]) if len(data) >= 2 else live
+
+    scheduler = QuoteScheduler(min_interval=1.0, idle_interval=idle, budget_per_minute=budget)
+    scheduler.set_universe(dashboard.positions, data_manager.get_plans())
+    scheduler.seed_prices(dashboard.prices)
+    stream = QuoteStream(fetch, scheduler, dashboard.on_quote)
+    streamer = asyncio.create_task(stream.run())
+    frames = 0
+    started = time.monotonic()
+    screen.start()
+    try:
+        last_second = -1
+        while not duration or time.monotonic() - started < duration:
+            second = int(time.time())
+            # 行情有变化或时钟跳秒时才重绘；重绘内容仍按单元格差量输出
+            if dashboard.dirty or second != last_second:
+                stats = (f"请求 {stream.requests}  在途 {len(stream.inflight)}  失败 {stream.errors}  "
+                         f"缓存命中 {proxy.cache_hits}  预计 {scheduler.requests_per_minute():.0f} 次/分  "
+                         f"{'模拟行情  ' if demo else ''}Ctrl+C 退出")
+                dashboard.render(stats)
+                frames += 1
+                last_second = second
+            await asyncio.sleep(1.0 / max(fps, 0.1))
+    finally:
+        streamer.cancel()
+        screen.stop()
+    return {'requests': stream.requests, 'errors': stream.errors, 'frames': frames, 'cells': screen.cells_written}
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--fps', type=float, default=2.0, help='每秒最多重绘次数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发行情请求数')
+    parser.add_argument('--budget', type=float, default=600.0, help='行情请求预算（次/分钟）')
+    parser.add_argument('--idle', type=float, default=15.0, help='无计划持仓的刷新间隔（秒）')
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='value', help='排序方式')
+    parser.add_argument('--duration', type=float, default=0.0, help='运行秒数，0 表示直到 Ctrl+C')
+    parser.add_argument('--demo', action='store_true', help='使用模拟行情（无网络时演示）')
+
+
+def run(data_manager, args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        return asyncio.run(run_dashboard(data_manager, args.fps, args.concurrency, args.budget, args.idle,
+                                         args.sort, args.duration, args.demo))
+    except KeyboardInterrupt:
+        return {}
+
+
+def main():
+    from utils.data_manager import DataManager
+    parser = argparse.ArgumentParser(description='终端持仓看板（无图形界面的服务器上使用）')
+    add_arguments(parser)
+    args = parser.parse_args()
+    result = run(DataManager(), args)
+    if result:
+        print(f"请求 {result['requests']} 次（失败 {result['errors']}），重绘 {result['frames']} 帧，"
+              f"输出 {result['cells']} 个单元格")
+
+
+if __name__ == '__main__':
+    # python -m utils.terminal_dashboard [--demo] [--fps 2]；也可 python main.py dashboard
+    main()
@@ -0,0 +1,474 @@
+import argparse
+import json
+import shlex
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _normalize(code: str) -> str:
+    """6 位代码补全交易所前缀，与对账单导入一致"""
+    from utils.statement_importer import normalize_code
+    text = str(code or '').strip()
+    return normalize_code(text) if text else text
+
+
+def _find_position(data_manager, code: str) -> Optional[Dict[str, Any]]:
+    """按代码（或名称）查找持仓"""
+    for p in data_manager.get_positions():
+        if str(p.get('code', '')) == code or str(p.get('name', '')) == code:
+            return p
+    return None
+
+
+# ---- 写操作 ----
+
+def buy(data_manager, code: str, quantity: float, price: float, name: str = '',
+        date: Optional[str] = None, commission: Optional[float] = None) -> Dict[str, Any]:
+    """
+    买入：经持仓投影追加交易记录，持仓数量与成本价（按移动加权平均，含买入费用）由投影得出
+
+    参数:
+        data_manager: 数据管理器实例
+        code: 证券代码（6 位代码自动补全前缀）
+        quantity: 买入数量
+        price: 买入价格
+        name: 证券名称，默认沿用已有持仓
+        date: 成交日期 YYYY-MM-DD，默认今天
+        commission: 手续费，默认按费率表计算
+
+    返回:
+        dict: record 交易记录、position 更新后的持仓
+    """
+    from controllers.trade_controller import DEFAULT_COMMISSION
+    from utils.position_ledger import PositionLedger
+    if quantity <= 0 or price <= 0:
+        raise ValueError("价格和数量必须大于 0")
+    code = _normalize(code)
+    position = _find_position(data_manager, code)
+    name = name or (str(position.get('name', '')) if position else '') or code
+    fee = DEFAULT_COMMISSION.calculate(price, quantity, '买入', code) if commission is None else commission
+    record = {'date': date or time.strftime('%Y-%m-%d'), 'type': '买入', 'code': code, 'name': name,
+              'price': price, 'quantity': quantity, 'amount': round(price * quantity, 2),
+              'commission': round(fee, 2)}
+    if code not in data_manager.get_last_prices():
+        # 还没有行情的新代码以成交价作为最近价格，随交易一起保存
+        data_manager.update_last_prices({code: price}, save=False)
+    PositionLedger.shared(data_manager).record([record])
+    return {'record': record, 'position': dict(_find_position(data_manager, code) or {})}
+
+
+def sell(data_manager, code: str, quantity: float, price: float, date: Optional[str] = None,
+         commission: Optional[float] = None) -> Dict[str, Any]:
+    """
+    卖出：经持仓投影追加交易记录，持仓由投影得出，卖完时移除该持仓
+
+    参数:
+        data_manager: 数据管理器实例
+        code: 证券代码或名称
+        quantity: 卖出数量
+        price: 卖出价格
+        date: 成交日期 YYYY-MM-DD，默认今天
+        commission: 手续费，默认按费率表计算
+
+    返回:
+        dict: record 交易记录、position 剩余持仓（已清仓为 None）
+    """
+    from controllers.trade_controller import DEFAULT_COMMISSION
+    from utils.position_ledger import PositionLedger
+    if quantity <= 0 or price <= 0:
+        raise ValueError("价格和数量必须大于 0")
+    position = _find_position(data_manager, _normalize(code)) or _find_position(data_manager, code)
+    if position is None:
+        raise ValueError(f"没有 {code} 的持仓")
+    held = _to_float(position.get('quantity'))
+    if quantity > held:
+        raise ValueError(f"持仓数量不足：{position.get('name', code)} 持有 {held:.0f}")
+    code = str(position.get('code', ''))
+    fee = DEFAULT_COMMISSION.calculate(price, quantity, '卖出', code) if commission is None else commission
+    record = {'date': date or time.strftime('%Y-%m-%d'), 'type': '卖出', 'code': code,
+              'name': str(position.get('name', '')), 'price': price, 'quantity': quantity,
+              'amount': round(price * quantity, 2), 'commission': round(fee, 2)}
+    PositionLedger.shared(data_manager).record([record])
+    position = _find_position(data_manager, code)
+    return {'record': record, 'position': dict(position) if position is not None else None}
+
+
+def set_plan(data_manager, code: str, take_profit_price: Optional[float] = None,
+             take_profit_ratio: Optional[float] = None, stop_loss_price: Optional[float] = None,
+             stop_loss_ratio: Optional[float] = None) -> Dict[str, Any]:
+    """
+    为持仓设置止盈止损计划（与计划对话框相同的记录格式，替换同名旧计划）
+
+    价格与比例只给其一时按成本价换算另一个。
+
+    参数:
+        data_manager: 数据管理器实例
+        code: 证券代码或名称
+        take_profit_price / stop_loss_price: 止盈 / 止损价格
+        take_profit_ratio / stop_loss_ratio: 止盈 / 止损比例（0.06 表示 6%）
+
+    返回:
+        dict: 保存的计划
+    """
+    from datetime import datetime
+    from controllers.trade_controller import buy_fee_totals
+    position = _find_position(data_manager, _normalize(code)) or _find_position(data_manager, code)
+    if position is None:
+        raise ValueError(f"没有 {code} 的持仓")
+    if not any(v for v in (take_profit_price, take_profit_ratio, stop_loss_price, stop_loss_ratio)):
+        raise ValueError("至少需要设置一个止盈或止损条件")
+    code = str(position.get('code', ''))
+    name = str(position.get('name', '')) or code
+    cost_price = _to_float(position.get('cost_price'))
+    if take_profit_price and not take_profit_ratio and cost_price > 0:
+        take_profit_ratio = take_profit_price / cost_price - 1
+    elif take_profit_ratio and not take_profit_price:
+        take_profit_price = cost_price * (1 + take_profit_ratio)
+    if stop_loss_price and not stop_loss_ratio and cost_price > 0:
+        stop_loss_ratio = 1 - stop_loss_price / cost_price
+    elif stop_loss_ratio and not stop_loss_price:
+        stop_loss_price = cost_price * (1 - stop_loss_ratio)
+    plan = {
+        'id': f'plan-{name}',
+        'code': code,
+        'name': name,
+        'quantity': _to_float(position.get('quantity')),
+        'cost_price': cost_price,
+        'take_profit_price': round(take_profit_price or 0.0, 4),
+        'take_profit_ratio': round(take_profit_ratio or 0.0, 4),
+        'stop_loss_price': round(stop_loss_price or 0.0, 4),
+        'stop_loss_ratio': round(stop_loss_ratio or 0.0, 4),
+        'buy_fee_total': float(buy_fee_totals(data_manager).get(code, 0.0)),
+        'created_at': datetime.now().isoformat(),
+    }
+    existing = data_manager.find_latest_plan_by_name(name)
+    if existing:
+        data_manager.delete_plan(existing.get('id'))
+    data_manager.add_plan(plan)
+    return plan
+
+
+# ---- 查询 ----
+
+def list_positions(data_manager) -> List[Dict[str, Any]]:
+    """
+    持仓明细：按最近价格估值，口径与主窗口状态栏一致（见 utils.valuation）
+
+    返回:
+        list: 每项含 code、name、quantity、cost_price、price、market_value、buy_fees、profit；
+        buy_fees 为交易历史中的买入费用，已计入成本价
+    """
+    from controllers.trade_controller import buy_fee_totals
+    from utils.valuation import value_positions
+    rows = []
+    fees = buy_fee_totals(data_manager)
+    for v in value_positions(data_manager):
+        rows.append({'code': v['code'], 'name': v['name'], 'quantity': v['quantity'], 'cost_price': v['cost_price'],
+                     'price': v['price'], 'market_value': round(v['market_value'], 2),
+                     'buy_fees': round(fees.get(v['code'], 0.0), 2),
+                     'profit': round(v['profit'], 2)})
+    return rows
+
+
+def list_history(data_manager, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 code: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    交易记录（只打开日期范围涉及的归档分区）
+
+    参数:
+        start_date / end_date: 日期范围（含）
+        code: 仅该代码
+        limit: 只保留最后 limit 条
+
+    返回:
+        list: 交易记录
+    """
+    records = deque(maxlen=limit) if limit else []
+    for chunk in data_manager.iter_history(start_date, end_date, _normalize(code) if code else None):
+        records.extend(chunk)
+    return list(records)
+
+
+def check_plans(data_manager, prices: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    检查止盈止损计划是否触发（只报告，不下单）
+
+    移动止损/阶梯止盈计划先用本次价格推进高水位与止损价并保存，再按推进后的价位判断。
+
+    参数:
+        prices: 代码 -> 价格；未给出的代码依次取共享行情看板、最近价格缓存、持仓现价
+
+    返回:
+        list: 每个有效计划一项，含 code、name、price、source、take_profit_price、stop_loss_price、
+        triggered（'止盈' / '止损' / ''）
+    """
+    from controllers.plan_controller import PlanController
+    from models.plan import TRAILING_TYPES
+    from utils.valuation import plan_levels
+    prices = {_normalize(k): float(v) for k, v in (prices or {}).items()}
+    plans = [p for p in data_manager.get_plans() if p.get('status', 'ACTIVE') == 'ACTIVE']
+    name_to_code = {str(p.get('name', '')): str(p.get('code', '')) for p in data_manager.get_positions()}
+    codes = [str(p.get('code', '') or name_to_code.get(str(p.get('name', '')), '')) for p in plans]
+    board_prices: Dict[str, Any] = {}
+    missing = [c for c in codes if c and c not in prices]
+    if missing:
+        from utils.price_board import DEFAULT_MAX_AGE, PriceBoard
+        board = PriceBoard.attach()
+        if board:
+            # 行情进程已退出或槽位过旧时不用看板价格
+            if board.writer_alive():
+                board_prices = board.read_many(missing, max_age=DEFAULT_MAX_AGE)
+            board.close()
+    positions = {str(p.get('code', '')): p for p in data_manager.get_positions()}
+    last_prices = data_manager.get_last_prices()
+    resolved = []
+    for plan, code in zip(plans, codes):
+        if code in prices:
+            price, source = prices[code], 'argument'
+        elif code in board_prices:
+            price, source = float(board_prices[code][0]), 'board'
+        elif code in last_prices:
+            price, source = _to_float(last_prices[code]), 'last_price'
+        else:
+            price, source = (_to_float(positions[code].get('current_price')) if code in positions else 0.0), 'position'
+        resolved.append((plan, code, price, source))
+    tracked = {code: price for plan, code, price, _ in resolved
+               if price > 0 and plan.get('trigger_type') in TRAILING_TYPES}
+    if tracked:
+        controller = PlanController(data_manager)
+        controller.track_prices(tracked)
+        controller.flush_plan_states(force=True)
+    results = []
+    for plan, code, price, source in resolved:
+        take_profit, stop_loss = plan_levels(plan)
+        triggered = ''
+        if price > 0 and take_profit > 0 and price >= take_profit:
+            triggered = '止盈'
+        elif price > 0 and stop_loss > 0 and price <= stop_loss:
+            # 移动止损已抬到成本价之上时属于锁定利润，与 PlanController 的判断一致
+            locked = plan.get('trigger_type') in TRAILING_TYPES and stop_loss >= _to_float(plan.get('cost_price'))
+            triggered = '止盈' if locked else '止损'
+        results.append({'code': code, 'name': str(plan.get('name', '')), 'price': price, 'source': source,
+                        'take_profit_price': round(take_profit, 4), 'stop_loss_price': round(stop_loss, 4),
+                        'triggered': triggered})
+    return results
+
+
+def profit_summary(data_manager) -> Dict[str, Any]:
+    """
+    盈亏汇总：已实现部分来自每日已实现盈亏表，浮动部分按当前持仓
+
+    返回:
+        dict: realised、fees、turnover、trades、unrealised、market_value、positions
+    """
+    from utils.daily_pnl import DailyPnlTable
+    totals = DailyPnlTable.shared(data_manager).totals()
+    positions = list_positions(data_manager)
+    result: Dict[str, Any] = {key: round(value, 2) for key, value in totals.items()}
+    result['trades'] = int(totals.get('trades', 0))
+    result['unrealised'] = round(sum(p['profit'] for p in positions), 2)
+    result['market_value'] = round(sum(p['market_value'] for p in positions), 2)
+    result['positions'] = positions
+    return result
+
+
+# ---- 命令行 ----
+
+class CommandError(Exception):
+    """命令参数或执行错误"""
+
+
+class _Parser(argparse.ArgumentParser):
+    """批量文件中的参数错误抛出异常（整批回滚），而不是直接退出进程"""
+
+    def error(self, message):
+        raise CommandError(message)
+
+
+def _price_pair(text: str):
+    code, sep, price = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"价格格式应为 代码=价格: {text}")
+    return code.strip(), float(price)
+
+
+def build_parser(parser_class=argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """子命令解析器；--json 可放在子命令前或后"""
+    common = parser_class(add_help=False)
+    common.add_argument('--json', action='store_true', default=argparse.SUPPRESS, help='以 JSON 输出')
+    parser = parser_class(prog='main.py', description='股票交易记录（非交互命令）；不带参数运行进入交互菜单')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    parser.add_argument('--data', default='data/trading_data.json', help='数据文件，相对项目根目录')
+    sub = parser.add_subparsers(dest='command', required=True, parser_class=parser_class)
+
+    p = sub.add_parser('buy', parents=[common], help='买入')
+    p.add_argument('code')
+    p.add_argument('quantity', type=float)
+    p.add_argument('price', type=float)
+    p.add_argument('--name', default='')
+    p.add_argument('--date', default=None, help='成交日期 YYYY-MM-DD，默认今天')
+    p.add_argument('--commission', type=float, default=None, help='手续费，默认按费率表计算')
+
+    p = sub.add_parser('sell', parents=[common], help='卖出')
+    p.add_argument('code', help='代码或名称')
+    p.add_argument('quantity', type=float)
+    p.add_argument('price', type=float)
+    p.add_argument('--date', default=None)
+    p.add_argument('--commission', type=float, default=None)
+
+    p = sub.add_parser('plan', parents=[common], help='设置止盈止损计划（百分比按 6 表示 6%%）')
+    p.add_argument('code', help='代码或名称')
+    p.add_argument('--tp', type=float, default=None, help='止盈价格')
+    p.add_argument('--tp-pct', type=float, default=None, help='止盈百分比')
+    p.add_argument('--sl', type=float, default=None, help='止损价格')
+    p.add_argument('--sl-pct', type=float, default=None, help='止损百分比')
+
+    sub.add_parser('positions', parents=[common], help='查看持仓')
+
+    p = sub.add_parser('history', parents=[common], help='查看交易记录')
+    p.add_argument('--start', default=None, help='起始日期 YYYY-MM-DD')
+    p.add_argument('--end', default=None, help='结束日期 YYYY-MM-DD')
+    p.add_argument('--code', default=None)
+    p.add_argument('--limit', type=int, default=None, help='只显示最后 N 条')
+
+    p = sub.add_parser('check-plans', parents=[common], help='检查止盈止损条件（不下单）')
+    p.add_argument('--price', type=_price_pair, action='append', default=[], metavar='代码=价格',
+                   help='指定当前价，可重复；未指定的取行情看板或最近价格')
+
+    sub.add_parser('pnl', parents=[common], help='盈亏汇总')
+
+    p = sub.add_parser('batch', parents=[common], help='执行命令文件（每行一条，# 注释），整批一次保存')
+    p.add_argument('file', help='命令文件，- 表示标准输入')
+
+    from utils.terminal_dashboard import add_arguments
+    add_arguments(sub.add_parser('dashboard', help='终端持仓看板（实时行情，Ctrl+C 退出）'))
+    return parser
+
+
+def execute(data_manager, args: argparse.Namespace) -> Any:
+    """执行一条已解析的命令，返回可序列化为 JSON 的结果"""
+    if args.command == 'buy':
+        return buy(data_manager, args.code, args.quantity, args.price, args.name, args.date, args.commission)
+    if args.command == 'sell':
+        return sell(data_manager, args.code, args.quantity, args.price, args.date, args.commission)
+    if args.command == 'plan':
+        return set_plan(data_manager, args.code, args.tp, args.tp_pct / 100 if args.tp_pct else None,
+                        args.sl, args.sl_pct / 100 if args.sl_pct else None)
+    if args.command == 'positions':
+        return list_positions(data_manager)
+    if args.command == 'history':
+        return list_history(data_manager, args.start, args.end, args.code, args.limit)
+    if args.command == 'check-plans':
+        return check_plans(data_manager, dict(args.price))
+    if args.command == 'pnl':
+        return profit_summary(data_manager)
+    raise CommandError(f"未知命令: {args.command}")
+
+
+def run_batch(data_manager, lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    逐行执行命令，全部在一个事务中完成：只在最后保存一次，任一行出错则整批不生效
+
+    返回:
+        list: 每条命令 {'line', 'command', 'result'}
+    """
+    parser = build_parser(_Parser)
+    results = []
+    with data_manager.transaction():
+        for number, line in enumerate(lines, 1):
+            try:
+                argv = shlex.split(line, comments=True)
+                if not argv:
+                    continue
+                if argv[0] in ('batch', 'dashboard'):
+                    raise CommandError(f"{argv[0]} 不能在批量文件中使用")
+                args = parser.parse_args(argv)
+                results.append({'line': number, 'command': args.command, 'result': execute(data_manager, args)})
+            except (CommandError, ValueError) as e:
+                raise CommandError(f"第 {number} 行: {e}") from e
+    return results
+
+
+def format_text(command: str, result: Any) -> str:
+    """命令结果的文本形式"""
+    if command in ('buy', 'sell'):
+        r = result['record']
+        text = f"{r['type']} {r['name']}({r['code']}) {r['quantity']:.0f} @ {r['price']} 手续费 {r['commission']:.2f}"
+        p = result['position']
+        return text + (f"，持仓 {p['quantity']} 成本价 {p['cost_price']}" if p else "，已清仓")
+    if command == 'plan':
+        return (f"计划 {result['name']}({result['code']})：止盈 {result['take_profit_price']}"
+                f"（{result['take_profit_ratio'] * 100:.2f}%） 止损 {result['stop_loss_price']}"
+                f"（{result['stop_loss_ratio'] * 100:.2f}%）")
+    if command == 'positions':
+        if not result:
+            return "当前没有持仓"
+        return '\n'.join(f"{p['name']}({p['code']}) 数量 {p['quantity']:.0f} 成本价 {p['cost_price']:.4f} "
+                         f"现价 {p['price']:.4f} 市值 {p['market_value']:.2f} 浮动盈亏 {p['profit']:+.2f}"
+                         for p in result)
+    if command == 'history':
+        if not result:
+            return "当前没有交易记录"
+        return '\n'.join(f"{h.get('date', '')} {h.get('type', '')} {h.get('name', '')}({h.get('code', '')}) "
+                         f"{_to_float(h.get('quantity')):.0f} @ {h.get('price', '')}" for h in result)
+    if command == 'check-plans':
+        if not result:
+            return "当前没有止盈止损计划"
+        return '\n'.join(f"{r['name']}({r['code']}) 现价 {r['price']:.4f} 止盈 {r['take_profit_price']} "
+                         f"止损 {r['stop_loss_price']} {('触发' + r['triggered']) if r['triggered'] else '未触发'}"
+                         for r in result)
+    if command == 'pnl':
+        return (f"已实现盈亏: {result['realised']:.2f} 元（费用 {result['fees']:.2f}，{result['trades']} 笔）\n"
+                f"浮动盈亏: {result['unrealised']:.2f} 元（市值 {result['market_value']:.2f}）\n"
+                f"合计: {result['realised'] + result['unrealised']:.2f} 元")
+    return str(result)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口，返回退出码（0 成功，1 执行失败）"""
+    from utils.data_manager import DataManager
+    args = build_parser().parse_args(argv)
+    data_manager = DataManager(args.data)
+    if args.command == 'dashboard':
+        from utils.terminal_dashboard import run
+        run(data_manager, args)
+        return 0
+    try:
+        if args.command == 'batch':
+            source = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+            try:
+                results = run_batch(data_manager, source)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            if args.json:
+                print(json.dumps(results, ensure_ascii=False))
+            else:
+                for item in results:
+                    print(format_text(item['command'], item['result']))
+                print(f"已执行 {len(results)} 条命令")
+            return 0
+        with data_manager.transaction():
+            result = execute(data_manager, args)
+    except (CommandError, ValueError, OSError) as e:
+        if args.json:
+            print(json.dumps({'error': str(e)}, ensure_ascii=False))
+        else:
+            print(f"错误: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, ensure_ascii=False) if args.json else format_text(args.command, result))
+    return 0
+
+
+if __name__ == '__main__':
+    # python -m utils.trade_commands positions --json（也可通过 python main.py positions）
+    sys.exit(main())
@@ -0,0 +1,117 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.plan import TRAILING_TYPES
+
+
+def value_position(position: Dict[str, Any], price: float, prev_close: Optional[float] = None) -> Dict[str, Any]:
+    """
+    单个持仓在给定价格下的估值（主界面持仓表、状态栏与终端看板共用）
+
+    成本总额 = 成本价 × 数量；持仓由交易历史投影得出（见 utils.position_ledger），成本价已含买入费用，
+    不再另加。浮动盈亏 = 市值 - 成本总额。
+
+    参数:
+        position: 持仓记录（code、name、quantity、cost_price）
+        price: 现价
+        prev_close: 上一笔/昨收，用于当前涨跌；缺省视为与现价相同
+
+    返回:
+        dict: code、name、quantity、cost_price、price、prev_close、change_ratio 当前涨跌%、
+        cost_diff 现价-成本价、cost_diff_ratio 成本涨跌%、market_value、cost_total、
+        profit、profit_ratio 收益率%
+
+    数量、成本价无法解析时抛出 ValueError。
+    """
+    quantity = float(position.get('quantity', 0) or 0)
+    cost_price = float(position.get('cost_price', 0) or 0)
+    price = float(price)
+    prev_close = price if prev_close is None else float(prev_close)
+    cost_diff = price - cost_price
+    market_value = price * quantity
+    cost_total = cost_price * quantity
+    profit = market_value - cost_total
+    return {
+        'code': str(position.get('code', '')),
+        'name': str(position.get('name', '')),
+        'quantity': quantity,
+        'cost_price': cost_price,
+        'price': price,
+        'prev_close': prev_close,
+        'change_ratio': (price - prev_close) / prev_close * 100.0 if prev_close > 0 else 0.0,
+        'cost_diff': cost_diff,
+        'cost_diff_ratio': cost_diff / cost_price * 100.0 if cost_price > 0 else 0.0,
+        'market_value': market_value,
+        'cost_total': cost_total,
+        'profit': profit,
+        'profit_ratio': profit / cost_total * 100.0 if cost_total > 0 else 0.0,
+    }
+
+
+def position_price(position: Dict[str, Any], last_prices: Dict[str, float]) -> float:
+    """无实时行情时的计算用价：最近价格缓存优先，其次持仓记录的现价"""
+    return float(last_prices.get(str(position.get('code', '')), position.get('current_price', 0) or 0))
+
+
+def value_positions(data_manager, prices: Optional[Dict[str, float]] = None,
+                    prev_closes: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    全部持仓的估值
+
+    参数:
+        data_manager: 数据管理器实例
+        prices: 代码 -> 实时价，缺少的代码用 position_price
+        prev_closes: 代码 -> 上一笔/昨收
+
+    返回:
+        list: value_position 的结果，跳过无法解析的持仓
+    """
+    positions = data_manager.get_positions()
+    last_prices = data_manager.get_last_prices()
+    prices = prices or {}
+    prev_closes = prev_closes or {}
+    rows = []
+    for p in positions:
+        code = str(p.get('code', ''))
+        try:
+            price = prices[code] if code in prices else position_price(p, last_prices)
+            rows.append(value_position(p, price, prev_closes.get(code)))
+        except (TypeError, ValueError):
+            continue
+    return rows
+
+
+def plan_levels(plan: Dict[str, Any]) -> Tuple[float, float]:
+    """
+    计划的止盈价、止损价；只设置了比例时按计划成本价换算，未设置为 0
+
+    移动止损/阶梯止盈计划（trigger_type 为 trailing_percent、trailing_atr、ratchet）没有固定止盈价，
+    止损价取跟踪状态中随高水位抬升后的价位。
+
+    返回:
+        (止盈价, 止损价)
+    """
+    def number(key):
+        try:
+            return float(plan.get(key) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    cost_price = number('cost_price')
+    take_profit = number('take_profit_price') or (cost_price * (1 + number('take_profit_ratio'))
+                                                  if number('take_profit_ratio') else 0.0)
+    stop_loss = number('stop_loss_price') or (cost_price * (1 - number('stop_loss_ratio'))
+                                              if number('stop_loss_ratio') else 0.0)
+    if plan.get('trigger_type') in TRAILING_TYPES:
+        state = plan.get('state') or []
+        try:
+            trail_stop = float(state[1]) if len(state) > 1 and state[1] is not None else 0.0
+        except (TypeError, ValueError):
+            trail_stop = 0.0
+        return 0.0, trail_stop or stop_loss
+    return take_profit, stop_loss
+
+
+def plan_distance(price: float, level: float) -> Optional[float]:
+    """现价到计划价位还需涨跌的百分比；未设置价位或无价格时为 None"""
+    if level <= 0 or price <= 0:
+        return None
+    return (level / price - 1) * 100.0
@@ -0,0 +1,99 @@
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import List, Optional, Tuple
+
+
+MAGIC = b'SNVS'
+VERSION = 1
+# 头部：魔数、版本、持仓行数、历史快照行数、历史总条数、文本区长度、数值区长度
+_HEADER = struct.Struct('<4sHIIIII')
+# 文本字段分隔符（单元分隔符，不会出现在界面文本中）
+_SEP = '\x1f'
+
+POSITION_TEXTS = 10   # 代码、名称、市值、持仓、成本、现价、涨跌、成本涨跌、盈亏、盈亏率
+POSITION_KEYS = 5     # 盈亏、盈亏率、市值、涨跌幅、成本涨跌幅（排序用数值）
+HISTORY_TEXTS = 7
+SUMMARY_KEYS = 6      # 保存时间、投入、现值、盈亏、持仓数、状态栏总盈利
+
+
+class ViewSnapshot:
+    """
+    主界面视图模型快照
+
+    保存最近一次渲染的持仓行（格式化文本 + 排序数值）、交易历史首屏行与汇总，
+    启动时在数据文件解析完成前直接绘制，随后由真实数据刷新覆盖。
+    文本区为 UTF-8 + zlib，数值区为 float64 原始字节，整体只有几 KB。
+    """
+
+    def __init__(self):
+        self.positions: List[Tuple[List[str], List[float]]] = []
+        self.history_rows: List[List[str]] = []
+        self.history_total = 0
+        self.total_invest = 0.0
+        self.total_market = 0.0
+        self.total_profit = 0.0
+        self.position_count = 0
+        self.status_profit = 0.0
+        self.saved_at = 0.0
+
+    def to_bytes(self) -> bytes:
+        texts = [t for row, _ in self.positions for t in row]
+        texts.extend(t for row in self.history_rows for t in row)
+        text_blob = zlib.compress(_SEP.join(texts).encode('utf-8'))
+        numbers = array('d', [self.saved_at or time.time(), self.total_invest, self.total_market,
+                              self.total_profit, float(self.position_count), self.status_profit])
+        for _, keys in self.positions:
+            numbers.extend(float(k) for k in keys)
+        num_blob = numbers.tobytes()
+        header = _HEADER.pack(MAGIC, VERSION, len(self.positions), len(self.history_rows),
+                              self.history_total, len(text_blob), len(num_blob))
+        return header + text_blob + num_blob
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'ViewSnapshot':
+        magic, version, n_pos, n_hist, hist_total, text_len, num_len = _HEADER.unpack_from(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("快照格式不匹配")
+        offset = _HEADER.size
+        text = zlib.decompress(raw[offset:offset + text_len]).decode('utf-8')
+        texts = text.split(_SEP) if text else []
+        numbers = array('d')
+        numbers.frombytes(raw[offset + text_len:offset + text_len + num_len])
+        if len(texts) != n_pos * POSITION_TEXTS + n_hist * HISTORY_TEXTS or \
+                len(numbers) != SUMMARY_KEYS + n_pos * POSITION_KEYS:
+            raise ValueError("快照数据不完整")
+        snap = cls()
+        (snap.saved_at, snap.total_invest, snap.total_market, snap.total_profit,
+         position_count, snap.status_profit) = numbers[:SUMMARY_KEYS]
+        snap.position_count = int(position_count)
+        for i in range(n_pos):
+            row = texts[i * POSITION_TEXTS:(i + 1) * POSITION_TEXTS]
+            start = SUMMARY_KEYS + i * POSITION_KEYS
+            snap.positions.append((row, list(numbers[start:start + POSITION_KEYS])))
+        base = n_pos * POSITION_TEXTS
+        snap.history_rows = [texts[base + i * HISTORY_TEXTS:base + (i + 1) * HISTORY_TEXTS] for i in range(n_hist)]
+        snap.history_total = hist_total
+        return snap
+
+    def save(self, path: str) -> bool:
+        """原子写入快照文件（先写临时文件再替换）"""
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(self.to_bytes())
+            os.replace(tmp, path)
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ViewSnapshot']:
+        """读取快照；文件不存在或损坏时返回 None"""
+        try:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except (OSError, ValueError, struct.error, zlib.error, UnicodeDecodeError):
+            return None
@@ -0,0 +1,93 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PyQt6.QtCore import Qt, QRectF
+from PyQt6.QtGui import QColor, QPainter
+from PyQt6.QtWidgets import QWidget
+
+
+class HeatMap(QWidget):
+    """相关系数热力图：正相关为红、负相关为蓝，格子足够大时显示数值"""
+
+    MARGIN = 8
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._labels: List[str] = []
+        self._values = np.zeros((0, 0))
+        self.setMinimumSize(320, 320)
+        self.setMouseTracking(True)
+
+    def set_data(self, labels: Sequence[str], values: np.ndarray, order: Optional[Sequence[int]] = None):
+        """
+        参数:
+            labels: 行列标签
+            values: 取值 -1~1 的方阵
+            order: 行列显示顺序（如聚类顺序）
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if order is not None:
+            order = list(order)
+            labels = [labels[i] for i in order]
+            values = values[np.ix_(order, order)]
+        self._labels = list(labels)
+        self._values = values
+        self.setToolTip('')
+        self.update()
+
+    @staticmethod
+    def _color(value: float) -> QColor:
+        if not np.isfinite(value):
+            return QColor('#EEEEEE')
+        v = max(-1.0, min(1.0, value))
+        fade = int(255 * (1 - abs(v)))
+        return QColor(255, fade, fade) if v >= 0 else QColor(fade, fade, 255)
+
+    def _layout(self):
+        n = len(self._labels)
+        metrics = self.fontMetrics()
+        label_width = max((metrics.horizontalAdvance(s) for s in self._labels), default=0) + 6
+        size = min(self.width() - label_width, self.height() - label_width) - 2 * self.MARGIN
+        cell = max(1.0, size / max(1, n))
+        return label_width, cell
+
+    def mouseMoveEvent(self, event):
+        n = len(self._labels)
+        if not n:
+            return
+        label_width, cell = self._layout()
+        x = int((event.position().x() - self.MARGIN - label_width) // cell)
+        y = int((event.position().y() - self.MARGIN - label_width) // cell)
+        if 0 <= x < n and 0 <= y < n:
+            self.setToolTip(f"{self._labels[y]} / {self._labels[x]}: {self._values[y, x]:.2f}")
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('#FFFFFF'))
+        n = len(self._labels)
+        if not n:
+            painter.setPen(QColor('#999999'))
+            painter.drawText(QRectF(self.rect()), Qt.AlignmentFlag.AlignCenter, '暂无数据')
+            return
+        label_width, cell = self._layout()
+        left = top = self.MARGIN + label_width
+        show_text = cell >= painter.fontMetrics().horizontalAdvance('-0.00') + 4
+        for i in range(n):
+            for j in range(n):
+                rect = QRectF(left + j * cell, top + i * cell, cell, cell)
+                value = self._values[i, j]
+                painter.fillRect(rect, self._color(value))
+                if show_text and np.isfinite(value):
+                    painter.setPen(QColor('#FFFFFF') if abs(value) > 0.6 else QColor('#333333'))
+                    painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f"{value:.2f}")
+        painter.setPen(QColor('#333333'))
+        if cell >= painter.fontMetrics().height() * 0.8:
+            for i, label in enumerate(self._labels):
+                painter.drawText(QRectF(self.MARGIN, top + i * cell, label_width - 4, cell),
+                                 Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, label)
+                painter.save()
+                painter.translate(left + (i + 0.5) * cell, top - 4)
+                painter.rotate(-90)
+                painter.drawText(QRectF(0, -cell / 2, label_width - 4, cell),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, label)
+                painter.restore()
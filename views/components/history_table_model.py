@@ -0,0 +1,184 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QColor
+from utils.history_index import HistoryIndex
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """
+    交易历史的惰性表格模型：按需分页取行，排序与过滤交给 HistoryIndex
+
+    不排序不过滤时经 DataManager.history_view 按下标取行，只打开可见行所在的归档分区。
+    """
+
+    HEADERS = ["日期", "类型", "名称", "简称", "成交价", "成交量", "成交金额"]
+    FIELDS = ['date', 'type', 'code', 'name', 'price', 'quantity', 'amount']
+    PAGE_SIZE = 500
+
+    def __init__(self, data_manager=None, parent=None):
+        super().__init__(parent)
+        self.data_manager = None
+        self.history_index = None
+        self._order = None      # 记录下标数组；None 表示原始顺序
+        self._total = 0
+        self._loaded = 0
+        self._sort_field = None
+        self._descending = False
+        self._filters = {}
+        self._snapshot = None    # 启动快照中的已格式化行，真实数据载入后清除
+        self._query_key = None   # 最近一次查询的 (存储, 历史版本, 排序, 过滤)，未变化时 reload 不重置
+        if data_manager is not None:
+            self.set_data_manager(data_manager)
+
+    def set_data_manager(self, data_manager):
+        self._snapshot = None
+        self.data_manager = data_manager
+        self.history_index = HistoryIndex.shared(data_manager)
+        self.reload()
+
+    def _current_key(self):
+        if self.data_manager is None:
+            return None
+        filters = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in self._filters.items()))
+        return (id(self.data_manager), getattr(self.data_manager, 'history_version', None),
+                self._sort_field, self._descending, filters)
+
+    def reload(self):
+        """
+        存储变化后重新查询（只重建下标，不取任何行）
+
+        历史版本、排序与过滤条件都未变化时直接返回，保留滚动位置、选中行与已取出的分页。
+        """
+        key = self._current_key()
+        if key is not None and key == self._query_key and self._snapshot is None:
+            return
+        self._query_key = key
+        self.beginResetModel()
+        if self.history_index is None:
+            self._order = None
+            self._total = 0
+        else:
+            self._order = self.history_index.select(self._sort_field, self._descending, **self._filters)
+            self._total = len(self.data_manager.history_view()) if self._order is None else len(self._order)
+        self._loaded = min(self.PAGE_SIZE, self._total)
+        self.endResetModel()
+
+    def set_snapshot(self, rows, total: int = 0):
+        """数据载入前先显示快照中的首屏行（只读，不可排序过滤）"""
+        self.beginResetModel()
+        self._query_key = None
+        self._snapshot = [list(r) for r in rows]
+        self._total = self._loaded = len(self._snapshot)
+        self.endResetModel()
+
+    def snapshot_rows(self, count: int):
+        """当前排序/过滤下前 count 行的显示文本，用于保存启动快照"""
+        rows = []
+        for row in range(min(count, self._total)):
+            if row >= self._loaded:
+                self.fetchMore()
+            rows.append([self.data(self.index(row, col)) or '' for col in range(len(self.FIELDS))])
+        return rows
+
+    def total(self) -> int:
+        return self._total
+
+    def set_filter(self, code=None, start_date=None, end_date=None, codes=None):
+        """设置过滤条件（在存储层执行）；codes 为代码列表，空列表表示无匹配"""
+        self._filters = {k: v for k, v in (('code', code), ('start_date', start_date),
+                                           ('end_date', end_date)) if v}
+        if codes is not None:
+            self._filters['codes'] = list(codes)
+        self.reload()
+
+    def source_index(self, row: int) -> int:
+        """界面行号 -> DataManager 历史下标"""
+        return int(self._order[row]) if self._order is not None else row
+
+    def find_row(self, source_index: int) -> int:
+        """DataManager 历史下标 -> 界面行号（必要时先加载到该行）；不在当前结果中返回 -1"""
+        if self._order is None:
+            row = source_index if 0 <= source_index < self._total else -1
+        else:
+            hits = (self._order == source_index).nonzero()[0]
+            row = int(hits[0]) if len(hits) else -1
+        if row >= self._loaded:
+            self.beginInsertRows(QModelIndex(), self._loaded, row)
+            self._loaded = row + 1
+            self.endInsertRows()
+        return row
+
+    def record(self, row: int):
+        if self._snapshot is not None:
+            return dict(zip(self.FIELDS, self._snapshot[row]))
+        return self.data_manager.history_view()[self.source_index(row)]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self._total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.PAGE_SIZE, self._total - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def _numeric(self, h, field):
+        try:
+            if field == 'amount':
+                price = float(h.get('price', 0) or 0)
+                quantity = float(h.get('quantity', 0) or 0)
+                return float(h.get('amount', price * quantity))
+            return float(h.get(field, 0) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self._loaded:
+            return None
+        col = index.column()
+        if role == Qt.ItemDataRole.DisplayRole and self._snapshot is not None:
+            return self._snapshot[index.row()][col]
+        if role == Qt.ItemDataRole.DisplayRole:
+            h = self.record(index.row())
+            field = self.FIELDS[col]
+            if col < 4:
+                return str(h.get(field, ''))
+            value = self._numeric(h, field)
+            if field == 'price':
+                return f"{value:.4f}" if value < 10 else f"{value:.2f}"
+            if field == 'quantity':
+                return f"{value:.0f}"
+            return f"{value:.2f}"
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if col == 1:
+                return Qt.AlignmentFlag.AlignCenter
+            if col >= 4:
+                return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            return Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter
+        if role == Qt.ItemDataRole.ForegroundRole and col == 1:
+            # 交易类型颜色
+            return QColor("#0000FF") if self.record(index.row()).get('type') == "买入" else QColor("#FF0000")
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """排序在存储层完成，只重建下标数组"""
+        if not 0 <= column < len(self.FIELDS):
+            return
+        self._sort_field = self.FIELDS[column]
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        if self._snapshot is None:
+            self.reload()
@@ -0,0 +1,129 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QColor, QPainter, QPainterPath, QPen
+from PyQt6.QtWidgets import QWidget
+
+
+class LineChart(QWidget):
+    """轻量折线图：按日期绘制若干条序列，点数多时按像素列取极值抽样"""
+
+    MARGIN_LEFT = 64
+    MARGIN_RIGHT = 12
+    MARGIN_TOP = 22
+    MARGIN_BOTTOM = 22
+
+    def __init__(self, title: str = '', parent=None):
+        super().__init__(parent)
+        self.title = title
+        self._labels: List[str] = []
+        self._series: List[Tuple[str, np.ndarray, QColor]] = []
+        self._fill: Optional[int] = None
+        self.setMinimumHeight(150)
+
+    def set_data(self, labels: Sequence[str], series: Sequence[Tuple[str, Sequence[float], str]],
+                 fill_index: Optional[int] = None):
+        """
+        参数:
+            labels: 横轴标签（日期字符串），与每条序列等长
+            series: (名称, 数值序列, 颜色) 列表
+            fill_index: 需要与零轴之间填充的序列下标（如回撤）
+        """
+        self._labels = list(labels)
+        self._series = [(name, np.asarray(values, dtype=np.float64), QColor(color)) for name, values, color in series]
+        self._fill = fill_index
+        self.update()
+
+    def clear(self):
+        self.set_data([], [])
+
+    def _plot_rect(self) -> QRectF:
+        return QRectF(self.MARGIN_LEFT, self.MARGIN_TOP,
+                      max(1, self.width() - self.MARGIN_LEFT - self.MARGIN_RIGHT),
+                      max(1, self.height() - self.MARGIN_TOP - self.MARGIN_BOTTOM))
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        magnitude = abs(value)
+        if magnitude >= 1e8:
+            return f"{value / 1e8:.2f}亿"
+        if magnitude >= 1e4:
+            return f"{value / 1e4:.1f}万"
+        return f"{value:.0f}"
+
+    @staticmethod
+    def _decimate(values: np.ndarray, columns: int) -> Tuple[np.ndarray, np.ndarray]:
+        """点数超过像素列数时每列保留最小/最大值，返回 (下标, 数值)"""
+        n = len(values)
+        if n <= columns * 2:
+            return np.arange(n), values
+        edges = np.linspace(0, n, columns + 1).astype(np.int64)
+        starts = edges[:-1][np.diff(edges) > 0]
+        lo = np.minimum.reduceat(values, starts)
+        hi = np.maximum.reduceat(values, starts)
+        idx = np.repeat(starts, 2)
+        return idx, np.column_stack((lo, hi)).ravel()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#FFFFFF'))
+        rect = self._plot_rect()
+        painter.setPen(QColor('#333333'))
+        painter.drawText(QRectF(0, 2, self.width(), self.MARGIN_TOP - 4),
+                         Qt.AlignmentFlag.AlignCenter, self.title)
+        if not self._labels or not self._series:
+            painter.setPen(QColor('#999999'))
+            painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, '暂无数据')
+            return
+
+        finite = [v[np.isfinite(v)] for _, v, _ in self._series]
+        finite = [v for v in finite if len(v)]
+        if not finite:
+            return
+        low = min(0.0, min(float(v.min()) for v in finite))
+        high = max(0.0, max(float(v.max()) for v in finite))
+        if high - low < 1e-9:
+            high = low + 1.0
+        n = len(self._labels)
+
+        def to_point(i, value):
+            x = rect.left() + (rect.width() * i / max(1, n - 1))
+            y = rect.bottom() - (value - low) / (high - low) * rect.height()
+            return QPointF(x, y)
+
+        # 坐标轴与零线
+        painter.setPen(QPen(QColor('#CCCCCC'), 1))
+        painter.drawRect(rect)
+        zero_y = to_point(0, 0.0).y()
+        painter.setPen(QPen(QColor('#999999'), 1, Qt.PenStyle.DashLine))
+        painter.drawLine(QPointF(rect.left(), zero_y), QPointF(rect.right(), zero_y))
+        painter.setPen(QColor('#666666'))
+        for value in (high, low):
+            y = to_point(0, value).y()
+            painter.drawText(QRectF(0, y - 8, self.MARGIN_LEFT - 4, 16),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, self._format_value(value))
+        bottom = QRectF(rect.left(), rect.bottom() + 2, rect.width(), self.MARGIN_BOTTOM - 2)
+        painter.drawText(bottom, Qt.AlignmentFlag.AlignLeft, self._labels[0])
+        painter.drawText(bottom, Qt.AlignmentFlag.AlignRight, self._labels[-1])
+
+        columns = max(1, int(rect.width()))
+        legend_x = rect.left() + 6
+        for k, (name, values, color) in enumerate(self._series):
+            idx, vals = self._decimate(np.nan_to_num(values), columns)
+            path = QPainterPath(to_point(idx[0], vals[0]))
+            for i, v in zip(idx[1:], vals[1:]):
+                path.lineTo(to_point(i, v))
+            if k == self._fill:
+                area = QPainterPath(path)
+                area.lineTo(to_point(idx[-1], 0.0))
+                area.lineTo(to_point(idx[0], 0.0))
+                area.closeSubpath()
+                fill = QColor(color)
+                fill.setAlpha(60)
+                painter.fillPath(area, fill)
+            painter.setPen(QPen(color, 1.5))
+            painter.drawPath(path)
+            painter.drawText(QPointF(legend_x, rect.top() + 14), name)
+            legend_x += painter.fontMetrics().horizontalAdvance(name) + 16
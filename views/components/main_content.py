@@ -1,14 +1,12 @@
 from PyQt6.QtWidgets import (QSplitter, QGroupBox, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QTableWidget, QAbstractItemView, 
+                             QPushButton, QTableWidget, QTableView, QAbstractItemView, 
                              QHeaderView, QTableWidgetItem, QWidget, QLabel)
 from PyQt6.QtCore import Qt as QtCoreQt
-from PyQt6.QtGui import QAction, QColor
-from views.dialogs.buy_dialog import BuyDialog
-from views.dialogs.sell_dialog import SellDialog
-from views.dialogs.plan_dialog import PlanDialog
-from views.dialogs.plan_detail_dialog import PlanDetailDialog
-from views.dialogs.profit_analysis_dialog import ProfitAnalysisDialog
-from utils.Ashare import get_price
+from PyQt6.QtGui import QAction, QBrush, QColor
+from views.components.history_table_model import HistoryTableModel
+from utils.search_index import SearchIndex
+from utils.view_snapshot import ViewSnapshot
+from utils.valuation import value_position
 
 
 class NumericTableWidgetItem(QTableWidgetItem):
@@ -21,6 +19,16 @@ class MainContent(QSplitter):
     def __init__(self, parent=None):
         super().__init__(QtCoreQt.Orientation.Vertical)
         self.parent = parent
+        # 最近一次轮询得到的上一笔价格，仅用缓存刷新时用于计算当前涨跌
+        self.prev_closes = {}
+        # 搜索框前缀索引；持仓或历史变化时惰性重建
+        self.search_index = SearchIndex()
+        self._search_key = None
+        self._search_text = ''
+        self._search_codes = None
+        # 最近一次渲染的持仓行参数与汇总，用于保存启动快照
+        self._rendered_positions = []
+        self._rendered_totals = (0.0, 0.0, 0.0)
         
         # 首先创建UI组件
         self.create_positions_section()
@@ -29,9 +37,8 @@ class MainContent(QSplitter):
         # 设置初始大小
         self.setSizes([400, 400])
         
-        # 初始禁用排序，加载后再开启
+        # 初始禁用排序，加载后再开启（历史表排序由模型在存储层完成，始终开启）
         self.positions_table.setSortingEnabled(False)
-        self.history_table.setSortingEnabled(False)
     
     def create_positions_section(self):
         """创建持仓区域"""
@@ -111,22 +118,24 @@ class MainContent(QSplitter):
         history_group = QGroupBox("交易记录历史")
         history_layout = QVBoxLayout(history_group)
         
-        # 交易历史表格
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(7)
-        self.history_table.setHorizontalHeaderLabels([
-            "日期", "类型", "名称", "简称", "成交价", "成交量", "成交金额"
-        ])
+        # 交易历史表格：惰性模型，只按需取可见行
+        self.history_model = HistoryTableModel(parent=self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         
         # 设置表格属性
         self.history_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.history_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.history_table.setAlternatingRowColors(True)
+        self.history_table.verticalHeader().setDefaultSectionSize(24)
         
         header = self.history_table.horizontalHeader()
         if header:
             header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
             header.setSectionsClickable(True)
+            # 不预先排序，保持原始顺序直到用户点击表头
+            header.setSortIndicator(-1, QtCoreQt.SortOrder.AscendingOrder)
+        self.history_table.setSortingEnabled(True)
         
         # 右键菜单
         self.history_table.setContextMenuPolicy(QtCoreQt.ContextMenuPolicy.CustomContextMenu)
@@ -139,29 +148,106 @@ class MainContent(QSplitter):
     def clear_tables(self):
         """清空表格"""
         self.positions_table.setRowCount(0)
-        self.history_table.setRowCount(0)
+        self._rendered_positions = []
     
-    def _build_buy_commission_map(self, history):
-        """根据交易记录构建每只股票买入手续费汇总（0.025%，最低5元）"""
-        code_to_fee = {}
-        for h in history:
-            try:
-                if str(h.get('type', '')) != "买入":
-                    continue
-                code = str(h.get('code', ''))
-                price = float(h.get('price', 0) or 0)
-                quantity = float(h.get('quantity', 0) or 0)
-                amount = price * quantity
-                fee = amount * 0.00025
-                if fee < 5.0:
-                    fee = 5.0
-                code_to_fee[code] = code_to_fee.get(code, 0.0) + fee
-            except Exception:
-                continue
-        return code_to_fee
+    # 快照中保存的交易历史行数（足够铺满首屏）
+    SNAPSHOT_HISTORY_ROWS = 200
+    
+    def capture_snapshot(self) -> ViewSnapshot:
+        """导出当前界面的视图模型（格式化文本 + 排序数值 + 汇总）"""
+        snap = ViewSnapshot()
+        snap.positions = [(list(texts), list(keys)) for texts, keys in self._rendered_positions]
+        snap.total_invest, snap.total_market, snap.total_profit = self._rendered_totals
+        if self._search_codes is None:
+            snap.history_rows = self.history_model.snapshot_rows(self.SNAPSHOT_HISTORY_ROWS)
+            snap.history_total = self.history_model.total()
+        return snap
+    
+    def paint_snapshot(self, snap: ViewSnapshot):
+        """按快照直接绘制持仓、汇总与交易历史首屏，不触碰数据文件"""
+        self.clear_tables()
+        self.positions_table.setSortingEnabled(False)
+        for texts, keys in snap.positions:
+            self.add_position_row(*texts, *keys)
+        self._set_totals(snap.total_invest, snap.total_market)
+        self.history_model.set_snapshot(snap.history_rows, snap.history_total)
+        self.positions_table.setSortingEnabled(True)
+    
+    def _set_totals(self, total_invest: float, total_market: float):
+        total_profit = total_market - total_invest
+        self._rendered_totals = (total_invest, total_market, total_profit)
+        sign = "+" if total_profit>0 else ("-" if total_profit<0 else "")
+        self.total_invest_label.setText(f"投入: ¥{total_invest:.2f}")
+        self.total_market_label.setText(f"现值: ¥{total_market:.2f}")
+        self.total_profit_label.setText(f"盈亏: {sign}{abs(total_profit):.2f}")
     
+    def _reload_history(self, data_manager):
+        """刷新交易历史模型（只重建下标，行在滚动时按需取出）"""
+        if self.history_model.data_manager is not data_manager:
+            self.history_model.set_data_manager(data_manager)
+        else:
+            self.history_model.reload()
+    
+    def _ensure_search_index(self, data_manager):
+        """持仓或历史版本变化时重建搜索索引（历史侧只取代码倒排表中的代码与名称）"""
+        positions = data_manager.get_positions()
+        key = (id(data_manager), getattr(data_manager, 'history_version', None),
+               tuple((p.get('code'), p.get('name')) for p in positions))
+        if key == self._search_key:
+            return
+        entries = [(p.get('code', ''), p.get('name', '')) for p in positions]
+        entries.extend(self.history_model.history_index.code_names().items())
+        self.search_index.build(entries)
+        self._search_key = key
+
+    def apply_search(self, text: str):
+        """
+        按代码/名称/拼音首字母前缀过滤持仓与交易历史，并定位到首个匹配行
+
+        参数:
+            text: 搜索框内容，空串表示取消过滤
+        """
+        data_manager = getattr(self.parent, 'data_manager', None)
+        if data_manager is None:
+            return
+        self._search_text = str(text or '').strip()
+        if not self._search_text:
+            self._search_codes = None
+            self.history_model.set_filter()
+        else:
+            self._ensure_search_index(data_manager)
+            self._search_codes = set(self.search_index.search(self._search_text))
+            self.history_model.set_filter(codes=self._search_codes)
+        self._filter_position_rows()
+        self.jump_to_search_result()
+
+    def _filter_position_rows(self):
+        """按当前搜索结果隐藏不匹配的持仓行"""
+        codes = self._search_codes
+        for row in range(self.positions_table.rowCount()):
+            code_item = self.positions_table.item(row, 0)
+            name_item = self.positions_table.item(row, 1)
+            hidden = codes is not None and not (
+                (code_item and code_item.text() in codes) or (name_item and name_item.text() in codes))
+            self.positions_table.setRowHidden(row, hidden)
+
+    def jump_to_search_result(self):
+        """选中下一个可见的持仓行（循环），历史表回到首个匹配行"""
+        if self._search_codes is None:
+            return
+        rows = [r for r in range(self.positions_table.rowCount()) if not self.positions_table.isRowHidden(r)]
+        if rows:
+            current = self.positions_table.currentRow()
+            row = next((r for r in rows if r > current), rows[0])
+            self.positions_table.selectRow(row)
+            self.positions_table.scrollToItem(self.positions_table.item(row, 0))
+        if self.history_model.rowCount() > 0:
+            self.history_table.selectRow(0)
+            self.history_table.scrollToTop()
+
     def _fetch_live_price_pair(self, code: str, fallback: float):
         """返回 (live_close, prev_close)。失败时用回退值和同值。"""
+        from utils.bar_resampler import get_price
         try:
             df = get_price(code, frequency='1m', count=2)
             live = float(df['close'].iloc[-1])
@@ -176,17 +262,12 @@ class MainContent(QSplitter):
         
         # 关闭排序以避免插入期抖动
         self.positions_table.setSortingEnabled(False)
-        self.history_table.setSortingEnabled(False)
         
         data_manager = getattr(self.parent, 'data_manager', None)
         if data_manager is None:
             return
         
-        # 预备历史与买入手续费映射
-        history = data_manager.get_history()
-        buy_fee_map = self._build_buy_commission_map(history)
-        
-        # 填充持仓（市值与手续费实时计算）
+        # 填充持仓（市值与盈亏实时计算）
         positions = data_manager.get_positions()
         
         total_invest = 0.0
@@ -195,86 +276,35 @@ class MainContent(QSplitter):
         for p in positions:
             try:
                 code = str(p.get('code', ''))
-                name = str(p.get('name', ''))
-                quantity = float(p.get('quantity', 0) or 0)
-                cost_price = float(p.get('cost_price', 0) or 0)
                 current_price_json = float(p.get('current_price', 0) or 0)
                 # 实时价与上一笔
                 live_price, prev_close = self._fetch_live_price_pair(code, current_price_json) if code else (current_price_json, current_price_json)
-                # 当前涨跌（相对上一笔/昨日，根据数据源）
-                change_now_ratio = ((live_price - prev_close) / prev_close * 100.0) if prev_close > 0 else 0.0
-                # 成本涨跌（现价相对成本）
-                cost_diff_amount = live_price - cost_price
-                cost_diff_ratio = (cost_diff_amount / cost_price * 100.0) if cost_price > 0 else 0.0
-                
-                market_value = live_price * quantity
-                commission_total = buy_fee_map.get(code or name, 0.0)
-                cost_total = cost_price * quantity + commission_total
-                profit_value = market_value - cost_total
-                profit_ratio_value = (profit_value / cost_total * 100.0) if cost_total > 0 else 0.0
-                
+                # 当前涨跌（相对上一笔/昨日，根据数据源）、成本涨跌与盈亏
+                texts, keys, cost_total, market_value = self._position_row(p, live_price, prev_close)
                 total_invest += cost_total
                 total_market += market_value
-                
-                # 文本
-                market_value_text = f"{market_value:.2f}"
-                quantity_text = f"{int(quantity) if quantity.is_integer() else quantity:.0f}"
-                cost_price_text = f"{cost_price:.4f}" if cost_price < 10 else f"{cost_price:.2f}"
-                current_price_text = f"{live_price:.4f}" if live_price < 10 else f"{live_price:.2f}"
-                change_now_text = ("▲" if change_now_ratio>0 else ("▼" if change_now_ratio<0 else "")) + f"{abs(change_now_ratio):.2f}%"
-                cost_diff_text = ("▲" if cost_diff_amount>0 else ("▼" if cost_diff_amount<0 else "")) + f"{abs(cost_diff_amount):.4f} ({abs(cost_diff_ratio):.2f}%)"
-                profit_text = ("+" if profit_value > 0 else ("-" if profit_value < 0 else "")) + f"{abs(profit_value):.2f}"
-                profit_ratio_text = ("+" if profit_ratio_value > 0 else ("-" if profit_ratio_value < 0 else "")) + f"{abs(profit_ratio_value):.2f}%"
-                
-                self.add_position_row(
-                    code, name,
-                    market_value_text, quantity_text, cost_price_text, current_price_text,
-                    change_now_text, cost_diff_text,
-                    profit_text, profit_ratio_text,
-                    profit_value, profit_ratio_value, market_value,
-                    change_now_ratio, cost_diff_ratio
-                )
+                self.add_position_row(*texts, *keys)
             except Exception:
                 continue
         
         # 更新统计栏
-        total_profit = total_market - total_invest
-        sign = "+" if total_profit>0 else ("-" if total_profit<0 else "")
-        self.total_invest_label.setText(f"投入: ¥{total_invest:.2f}")
-        self.total_market_label.setText(f"现值: ¥{total_market:.2f}")
-        self.total_profit_label.setText(f"盈亏: {sign}{abs(total_profit):.2f}")
+        self._set_totals(total_invest, total_market)
         
         # 启用持仓排序
         self.positions_table.setSortingEnabled(True)
+        self._filter_position_rows()
         
         # 填充历史
-        for h in history:
-            try:
-                date = str(h.get('date', ''))
-                type_ = str(h.get('type', ''))
-                code = str(h.get('code', ''))
-                name = str(h.get('name', ''))
-                price = float(h.get('price', 0) or 0)
-                quantity = float(h.get('quantity', 0) or 0)
-                amount = float(h.get('amount', price * quantity))
-                
-                self.add_history_row(date, type_, code, name, f"{price:.4f}" if price < 10 else f"{price:.2f}", f"{int(quantity) if quantity.is_integer() else quantity:.0f}", f"{amount:.2f}")
-            except Exception:
-                continue
-        
-        # 启用历史排序
-        self.history_table.setSortingEnabled(True)
+        self._reload_history(data_manager)
     
     def load_data_from_json_with_cache(self, use_cache_only: bool = False):
         """加载数据并可选仅使用缓存/JSON价格（不请求网络）"""
         self.clear_tables()
         self.positions_table.setSortingEnabled(False)
-        self.history_table.setSortingEnabled(False)
         data_manager = getattr(self.parent, 'data_manager', None)
         if data_manager is None:
             return
-        history = data_manager.get_history()
-        buy_fee_map = self._build_buy_commission_map(history)
+        self._reload_history(data_manager)
         positions = data_manager.get_positions()
         last_prices = data_manager.get_last_prices()
         total_invest = 0.0
@@ -282,87 +312,144 @@ class MainContent(QSplitter):
         for p in positions:
             try:
                 code = str(p.get('code', ''))
-                name = str(p.get('name', ''))
-                quantity = float(p.get('quantity', 0) or 0)
-                cost_price = float(p.get('cost_price', 0) or 0)
                 json_price = float(p.get('current_price', 0) or 0)
                 # 价格选择：优先缓存，其次JSON；若允许请求网络且有code，之后刷新时会异步覆盖
                 live_price = float(last_prices.get(code, json_price))
-                prev_close = live_price  # 无网络时无法取上一笔，置同值
-                change_now_ratio = 0.0
+                prev_close = float(self.prev_closes.get(code, live_price))  # 无网络时用最近轮询的上一笔，否则置同值
                 if not use_cache_only and code:
                     try:
-                        from utils.Ashare import get_price
+                        from utils.bar_resampler import get_price
                         df = get_price(code, frequency='1m', count=2)
                         prev_close = float(df['close'].iloc[-2]) if len(df) >= 2 else live_price
                         live_price = float(df['close'].iloc[-1])
                         # 更新缓存到内存（批量更新在主线程进行）
                     except Exception:
                         pass
-                if prev_close > 0:
-                    change_now_ratio = ((live_price - prev_close) / prev_close * 100.0)
-                cost_diff_amount = live_price - cost_price
-                cost_diff_ratio = (cost_diff_amount / cost_price * 100.0) if cost_price > 0 else 0.0
-                market_value = live_price * quantity
-                commission_total = buy_fee_map.get(code or name, 0.0)
-                cost_total = cost_price * quantity + commission_total
-                profit_value = market_value - cost_total
-                profit_ratio_value = (profit_value / cost_total * 100.0) if cost_total > 0 else 0.0
+                texts, keys, cost_total, market_value = self._position_row(p, live_price, prev_close)
                 total_invest += cost_total
                 total_market += market_value
-                market_value_text = f"{market_value:.2f}"
-                quantity_text = f"{int(quantity) if quantity.is_integer() else quantity:.0f}"
-                cost_price_text = f"{cost_price:.4f}" if cost_price < 10 else f"{cost_price:.2f}"
-                current_price_text = f"{live_price:.4f}" if live_price < 10 else f"{live_price:.2f}"
-                change_now_text = ("▲" if change_now_ratio>0 else ("▼" if change_now_ratio<0 else "")) + f"{abs(change_now_ratio):.2f}%"
-                cost_diff_text = ("▲" if cost_diff_amount>0 else ("▼" if cost_diff_amount<0 else "")) + f"{abs(cost_diff_amount):.4f} ({abs(cost_diff_ratio):.2f}%)"
-                profit_text = ("+" if profit_value > 0 else ("-" if profit_value < 0 else "")) + f"{abs(profit_value):.2f}"
-                profit_ratio_text = ("+" if profit_ratio_value > 0 else ("-" if profit_ratio_value < 0 else "")) + f"{abs(profit_ratio_value):.2f}%"
-                self.add_position_row(
-                    code, name,
-                    market_value_text, quantity_text, cost_price_text, current_price_text,
-                    change_now_text, cost_diff_text,
-                    profit_text, profit_ratio_text,
-                    profit_value, profit_ratio_value, market_value,
-                    change_now_ratio, cost_diff_ratio
-                )
+                self.add_position_row(*texts, *keys)
             except Exception:
                 continue
-        total_profit = total_market - total_invest
-        sign = "+" if total_profit>0 else ("-" if total_profit<0 else "")
-        self.total_invest_label.setText(f"投入: ¥{total_invest:.2f}")
-        self.total_market_label.setText(f"现值: ¥{total_market:.2f}")
-        self.total_profit_label.setText(f"盈亏: {sign}{abs(total_profit):.2f}")
+        self._set_totals(total_invest, total_market)
         self.positions_table.setSortingEnabled(True)
+        self._filter_position_rows()
+    
+    def _position_row(self, p, live_price: float, prev_close: float):
+        """
+        持仓行的显示文本与排序值
+
+        返回:
+            (texts, keys, cost_total, market_value)：texts 为 10 列文本，
+            keys 为 盈亏、盈亏率、市值、当前涨跌%、成本涨跌% 的数值
+        """
+        v = value_position(p, live_price, prev_close)
+        quantity, cost_price = v['quantity'], v['cost_price']
+        change_now_ratio, cost_diff_amount, cost_diff_ratio = v['change_ratio'], v['cost_diff'], v['cost_diff_ratio']
+        market_value, profit_value, profit_ratio_value = v['market_value'], v['profit'], v['profit_ratio']
+        texts = [
+            v['code'], v['name'],
+            f"{market_value:.2f}",
+            f"{int(quantity) if quantity.is_integer() else quantity:.0f}",
+            f"{cost_price:.4f}" if cost_price < 10 else f"{cost_price:.2f}",
+            f"{live_price:.4f}" if live_price < 10 else f"{live_price:.2f}",
+            ("▲" if change_now_ratio>0 else ("▼" if change_now_ratio<0 else "")) + f"{abs(change_now_ratio):.2f}%",
+            ("▲" if cost_diff_amount>0 else ("▼" if cost_diff_amount<0 else "")) + f"{abs(cost_diff_amount):.4f} ({abs(cost_diff_ratio):.2f}%)",
+            ("+" if profit_value > 0 else ("-" if profit_value < 0 else "")) + f"{abs(profit_value):.2f}",
+            ("+" if profit_ratio_value > 0 else ("-" if profit_ratio_value < 0 else "")) + f"{abs(profit_ratio_value):.2f}%",
+        ]
+        keys = [profit_value, profit_ratio_value, market_value, change_now_ratio, cost_diff_ratio]
+        return texts, keys, v['cost_total'], market_value
+    
+    def update_prices(self, codes) -> bool:
+        """
+        行情更新时只改写这些代码所在行的价格相关单元格与统计栏，不重建表格与交易历史
+
+        持仓或交易历史变化时仍由 load_data_from_json_with_cache 完整重载。
+
+        参数:
+            codes: 价格有变化的代码（价格取最近价格缓存，上一笔取 prev_closes）
+
+        返回:
+            bool: 有代码不在当前表格中（持仓已变化）时返回 False，由调用方完整重载
+        """
+        data_manager = getattr(self.parent, 'data_manager', None)
+        if data_manager is None:
+            return False
+        positions = {str(p.get('code', '')): p for p in data_manager.get_positions()}
+        rendered = {texts[0]: i for i, (texts, _keys) in enumerate(self._rendered_positions)}
+        rows = {}
+        for row in range(self.positions_table.rowCount()):
+            item = self.positions_table.item(row, 0)
+            if item is not None:
+                rows[item.text()] = row
+        # 不在持仓中的代码（如只有计划的代码）不影响表格
+        codes = [c for c in codes if c in positions]
+        if any(c not in rendered or c not in rows for c in codes):
+            return False
+        last_prices = data_manager.get_last_prices()
+        sorting = self.positions_table.isSortingEnabled()
+        # 改写排序值时关闭排序，避免行在写入中途移动
+        self.positions_table.setSortingEnabled(False)
+        try:
+            for code in codes:
+                p = positions[code]
+                live_price = float(last_prices.get(code, p.get('current_price', 0) or 0))
+                prev_close = float(self.prev_closes.get(code, live_price))
+                try:
+                    texts, keys, _cost_total, _market_value = self._position_row(p, live_price, prev_close)
+                except (TypeError, ValueError):
+                    continue
+                self._rendered_positions[rendered[code]] = (texts, keys)
+                row = rows[code]
+                items = [self.positions_table.item(row, col) for col in range(10)]
+                if any(item is None for item in items):
+                    return False
+                self._fill_position_items(items, texts, keys)
+        finally:
+            self.positions_table.setSortingEnabled(sorting)
+        total_market = sum(keys[2] for _texts, keys in self._rendered_positions)
+        total_profit = sum(keys[0] for _texts, keys in self._rendered_positions)
+        self._set_totals(total_market - total_profit, total_market)
+        return True
     
     def add_position_row(self, code, name, market_value, quantity, cost_price, current_price, change_now_text, cost_diff_text, profit, profit_ratio, profit_value=0.0, profit_ratio_value=0.0, market_value_numeric=0.0, change_now_ratio_value=0.0, cost_diff_ratio_value=0.0):
         """添加持仓行（支持数值排序；新增涨跌幅列带箭头）"""
+        texts = [code, name, market_value, quantity, cost_price, current_price, change_now_text, cost_diff_text, profit, profit_ratio]
+        keys = [profit_value, profit_ratio_value, market_value_numeric, change_now_ratio_value, cost_diff_ratio_value]
+        self._rendered_positions.append((texts, keys))
         row = self.positions_table.rowCount()
         self.positions_table.insertRow(row)
         
         # 创建表格项
-        items = [
-            QTableWidgetItem(code),
-            QTableWidgetItem(name),
-            NumericTableWidgetItem(market_value),
-            NumericTableWidgetItem(quantity),
-            NumericTableWidgetItem(cost_price),
-            NumericTableWidgetItem(current_price),
-            NumericTableWidgetItem(change_now_text),
-            NumericTableWidgetItem(cost_diff_text),
-            NumericTableWidgetItem(profit),
-            NumericTableWidgetItem(profit_ratio)
-        ]
+        items = [QTableWidgetItem(code), QTableWidgetItem(name)] + [NumericTableWidgetItem('') for _ in range(8)]
+        
+        # 对齐
+        items[0].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
+        items[1].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
+        for i in range(2, 10):
+            items[i].setTextAlignment(QtCoreQt.AlignmentFlag.AlignRight | QtCoreQt.AlignmentFlag.AlignVCenter)
+        self._fill_position_items(items, texts, keys)
+        
+        for i, item in enumerate(items):
+            self.positions_table.setItem(row, i, item)
+    
+    def _fill_position_items(self, items, texts, keys):
+        """写入持仓行各单元格的文本、排序值与颜色"""
+        profit_value, profit_ratio_value, market_value_numeric, change_now_ratio_value, cost_diff_ratio_value = keys
+        for item, text in zip(items, texts):
+            item.setText(str(text))
         
         # 设置排序值（市值、持仓、成本、现价、涨跌幅、盈亏、盈亏率）
         try:
             items[2].setData(QtCoreQt.ItemDataRole.UserRole, float(market_value_numeric))
         except Exception:
             try:
-                items[2].setData(QtCoreQt.ItemDataRole.UserRole, float(market_value))
+                items[2].setData(QtCoreQt.ItemDataRole.UserRole, float(texts[2]))
             except Exception:
                 items[2].setData(QtCoreQt.ItemDataRole.UserRole, 0.0)
-        for idx, val in [(3, quantity), (4, cost_price), (5, current_price)]:
+        for idx in (3, 4, 5):
+            val = texts[idx]
             try:
                 items[idx].setData(QtCoreQt.ItemDataRole.UserRole, float(val.replace(',', '')) if isinstance(val, str) else float(val))
             except Exception:
@@ -372,81 +459,19 @@ class MainContent(QSplitter):
         items[8].setData(QtCoreQt.ItemDataRole.UserRole, float(profit_value))
         items[9].setData(QtCoreQt.ItemDataRole.UserRole, float(profit_ratio_value))
         
-        # 对齐
-        items[0].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
-        items[1].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
-        for i in range(2, 10):
-            items[i].setTextAlignment(QtCoreQt.AlignmentFlag.AlignRight | QtCoreQt.AlignmentFlag.AlignVCenter)
-        
-        # 着色：当前价、当前涨跌、成本涨跌、盈亏/盈亏率
+        # 着色：当前价、当前涨跌、成本涨跌、盈亏/盈亏率（无涨跌时恢复默认颜色）
+        def color(value):
+            return QColor("#FF0000") if value > 0 else (QColor("#008000") if value < 0 else QBrush())
         # 当前涨跌基于 change_now_ratio_value
-        if change_now_ratio_value > 0:
-            items[5].setForeground(QColor("#FF0000"))
-            items[6].setForeground(QColor("#FF0000"))
-        elif change_now_ratio_value < 0:
-            items[5].setForeground(QColor("#008000"))
-            items[6].setForeground(QColor("#008000"))
+        items[5].setForeground(color(change_now_ratio_value))
+        items[6].setForeground(color(change_now_ratio_value))
         # 成本涨跌基于 cost_diff_ratio_value
-        if cost_diff_ratio_value > 0:
-            items[7].setForeground(QColor("#FF0000"))
-        elif cost_diff_ratio_value < 0:
-            items[7].setForeground(QColor("#008000"))
+        items[7].setForeground(color(cost_diff_ratio_value))
         # 盈亏颜色
-        if profit.startswith('+'):
-            items[8].setForeground(QColor("#FF0000"))
-            items[9].setForeground(QColor("#FF0000"))
-        elif profit.startswith('-'):
-            items[8].setForeground(QColor("#008000"))
-            items[9].setForeground(QColor("#008000"))
-        
-        for i, item in enumerate(items):
-            self.positions_table.setItem(row, i, item)
-    
-    def add_history_row(self, date, type_, code, name, price, quantity, amount):
-        """添加交易历史行（数值排序）"""
-        row = self.history_table.rowCount()
-        self.history_table.insertRow(row)
-        
-        items = [
-            QTableWidgetItem(date),
-            QTableWidgetItem(type_),
-            QTableWidgetItem(code),
-            QTableWidgetItem(name),
-            NumericTableWidgetItem(price),
-            NumericTableWidgetItem(quantity),
-            NumericTableWidgetItem(amount)
-        ]
-        
-        # 排序值
-        try:
-            items[4].setData(QtCoreQt.ItemDataRole.UserRole, float(price))
-        except Exception:
-            items[4].setData(QtCoreQt.ItemDataRole.UserRole, 0.0)
-        try:
-            items[5].setData(QtCoreQt.ItemDataRole.UserRole, float(quantity))
-        except Exception:
-            items[5].setData(QtCoreQt.ItemDataRole.UserRole, 0.0)
-        try:
-            items[6].setData(QtCoreQt.ItemDataRole.UserRole, float(amount))
-        except Exception:
-            items[6].setData(QtCoreQt.ItemDataRole.UserRole, 0.0)
-        
-        # 对齐
-        items[0].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
-        items[1].setTextAlignment(QtCoreQt.AlignmentFlag.AlignCenter)
-        items[2].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
-        items[3].setTextAlignment(QtCoreQt.AlignmentFlag.AlignLeft | QtCoreQt.AlignmentFlag.AlignVCenter)
-        for i in range(4, 7):
-            items[i].setTextAlignment(QtCoreQt.AlignmentFlag.AlignRight | QtCoreQt.AlignmentFlag.AlignVCenter)
-        
-        # 交易类型颜色
-        if type_ == "买入":
-            items[1].setForeground(QColor("#0000FF"))
-        else:
-            items[1].setForeground(QColor("#FF0000"))
-        
-        for i, item in enumerate(items):
-            self.history_table.setItem(row, i, item)
+        profit = str(texts[8])
+        sign = 1 if profit.startswith('+') else (-1 if profit.startswith('-') else 0)
+        items[8].setForeground(color(sign))
+        items[9].setForeground(color(sign))
     
     def _get_selected_position(self):
         """获取当前选中持仓的简要信息（名称、数量、成本价）"""
@@ -466,23 +491,47 @@ class MainContent(QSplitter):
     
     def on_new_buy(self):
         """新增买入"""
+        from views.dialogs.buy_dialog import BuyDialog
         dialog = BuyDialog(self.parent)
         if dialog.exec() == BuyDialog.DialogCode.Accepted:
-            self.parent.statusBar().show_message("买入交易已记录")
-            self.parent.refresh_data()
+            from utils.trade_commands import buy
+            if self._record_trade(buy, dialog.stock_code_input.text(), dialog.buy_quantity_input.text(),
+                                  dialog.buy_price_input.text(), dialog.fee_input.text(),
+                                  dialog.trade_date_input.date().toString("yyyy-MM-dd"),
+                                  name=dialog.stock_name_input.text().strip()):
+                self.parent.statusBar().show_message("买入交易已记录")
+                self.parent.refresh_data()
     
     def on_new_sell(self):
         """新增卖出（默认选中当前持仓）"""
+        from views.dialogs.sell_dialog import SellDialog
         selected = self._get_selected_position()
         dialog = SellDialog(self.parent)
         if selected:
             dialog.prefill_from_position(selected['name'], selected['quantity'], selected['current_price'])
         if dialog.exec() == SellDialog.DialogCode.Accepted:
-            self.parent.statusBar().show_message("卖出交易已记录")
-            self.parent.refresh_data()
+            from utils.trade_commands import sell
+            if self._record_trade(sell, dialog.position_combo.currentText(), dialog.sell_quantity_input.text(),
+                                  dialog.sell_price_input.text(), dialog.fee_input.text(),
+                                  dialog.trade_date_input.date().toString("yyyy-MM-dd")):
+                self.parent.statusBar().show_message("卖出交易已记录")
+                self.parent.refresh_data()
+    
+    def _record_trade(self, command, code, quantity, price, fee, date, **kwargs) -> bool:
+        """经持仓投影写入一笔买卖（utils.trade_commands.buy/sell），输入有误时提示并返回 False"""
+        from PyQt6.QtWidgets import QMessageBox
+        try:
+            command(self.parent.data_manager, code.strip(), float(quantity), float(price), date=date,
+                    commission=float(fee) if fee.strip() else None, **kwargs)
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self.parent, "交易未记录", str(e))
+            return False
+        return True
     
     def on_set_plan(self):
         """设置计划（默认选中当前持仓）"""
+        from views.dialogs.plan_dialog import PlanDialog
+        from views.dialogs.profit_analysis_dialog import ProfitAnalysisDialog
         selected = self._get_selected_position()
         dialog = PlanDialog(self.parent)
         if selected:
@@ -497,6 +546,7 @@ class MainContent(QSplitter):
     
     def on_profit_analysis(self):
         """盈利分析（根据 JSON 计算）"""
+        from views.dialogs.profit_analysis_dialog import ProfitAnalysisDialog
         dialog = ProfitAnalysisDialog(self.parent)
         dialog.load_from_data_manager(self.parent.data_manager)
         dialog.exec()
@@ -507,6 +557,7 @@ class MainContent(QSplitter):
     
     def show_plan_detail(self, row):
         """显示计划详情"""
+        from views.dialogs.plan_detail_dialog import PlanDetailDialog
         name_item = self.positions_table.item(row, 1) # Changed from 0 to 1 for name
         name = name_item.text() if name_item else ""
         dialog = PlanDetailDialog(self.parent)
@@ -518,6 +569,8 @@ class MainContent(QSplitter):
     
     def show_positions_context_menu(self, position):
         """显示持仓右键菜单"""
+        if getattr(self.parent, 'data_manager', None) is None:
+            return  # 启动快照阶段数据尚未载入
         from PyQt6.QtWidgets import QMenu
         menu = QMenu()
         
@@ -553,6 +606,8 @@ class MainContent(QSplitter):
     
     def show_history_context_menu(self, position):
         """显示交易历史右键菜单"""
+        if getattr(self.parent, 'data_manager', None) is None:
+            return  # 启动快照阶段数据尚未载入
         from PyQt6.QtWidgets import QMenu, QMessageBox
         menu = QMenu()
         
@@ -584,12 +639,15 @@ class MainContent(QSplitter):
     def delete_history_record(self):
         """删除交易记录"""
         from PyQt6.QtWidgets import QMessageBox
-        current_row = self.history_table.currentRow()
+        current_row = self.history_table.currentIndex().row()
         if current_row >= 0:
             reply = QMessageBox.question(self.parent, "确认删除", "确定要删除选中的交易记录吗？",
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
-                self.history_table.removeRow(current_row)
+                from utils.position_ledger import PositionLedger
+                ledger = PositionLedger.shared(self.parent.data_manager)
+                if ledger.delete(self.history_model.source_index(current_row)):
+                    self.parent.refresh_data()
     
     def view_history_detail(self):
         """查看交易详情"""
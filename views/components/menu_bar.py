@@ -1,9 +1,5 @@
 from PyQt6.QtWidgets import QMenuBar
 from PyQt6.QtGui import QAction
-from views.dialogs.buy_dialog import BuyDialog
-from views.dialogs.sell_dialog import SellDialog
-from views.dialogs.plan_dialog import PlanDialog
-from views.dialogs.profit_analysis_dialog import ProfitAnalysisDialog
 
 
 class MenuBar(QMenuBar):
@@ -29,6 +25,16 @@ class MenuBar(QMenuBar):
         
         file_menu.addSeparator()
         
+        import_action = QAction('导入对账单...', self)
+        import_action.triggered.connect(self.on_import_statement)
+        file_menu.addAction(import_action)
+        
+        export_action = QAction('导出数据...', self)
+        export_action.triggered.connect(self.on_export_data)
+        file_menu.addAction(export_action)
+        
+        file_menu.addSeparator()
+        
         exit_action = QAction('退出', self)
         exit_action.triggered.connect(self.parent.close)
         file_menu.addAction(exit_action)
@@ -49,6 +55,14 @@ class MenuBar(QMenuBar):
         analysis_action.triggered.connect(self.on_profit_analysis)
         view_menu.addAction(analysis_action)
         
+        correlation_action = QAction('持仓相关性', self)
+        correlation_action.triggered.connect(self.on_correlation)
+        view_menu.addAction(correlation_action)
+        
+        scenario_action = QAction('情景分析', self)
+        scenario_action.triggered.connect(self.on_scenario)
+        view_menu.addAction(scenario_action)
+        
         refresh_action = QAction('刷新', self)
         refresh_action.setShortcut('F5')
         refresh_action.triggered.connect(self.parent.refresh_data)
@@ -63,6 +77,7 @@ class MenuBar(QMenuBar):
     
     def on_new_buy(self):
         """新增买入"""
+        from views.dialogs.buy_dialog import BuyDialog
         dialog = BuyDialog(self.parent)
         if dialog.exec() == BuyDialog.DialogCode.Accepted:
             # 这里应该处理买入逻辑
@@ -71,14 +86,55 @@ class MenuBar(QMenuBar):
     
     def on_new_sell(self):
         """新增卖出"""
+        from views.dialogs.sell_dialog import SellDialog
         dialog = SellDialog(self.parent)
         if dialog.exec() == SellDialog.DialogCode.Accepted:
             # 这里应该处理卖出逻辑
             self.parent.statusBar().show_message("卖出交易已记录")
             self.parent.refresh_data()
     
+    def on_import_statement(self):
+        """导入券商对账单（CSV/Excel）"""
+        from PyQt6.QtWidgets import QFileDialog, QMessageBox
+        from utils.statement_importer import import_statement
+        path, _ = QFileDialog.getOpenFileName(self.parent, "选择对账单", "",
+                                              "对账单 (*.csv *.txt *.xlsx);;所有文件 (*)")
+        if not path:
+            return
+        try:
+            stats = import_statement(self.parent.data_manager, path)
+        except Exception as e:
+            QMessageBox.warning(self.parent, "导入失败", str(e))
+            return
+        QMessageBox.information(self.parent, "导入完成",
+                                f"读取 {stats['read']} 条，导入 {stats['imported']} 条，跳过重复 {stats['duplicates']} 条")
+        self.parent.statusBar().show_message("对账单已导入")
+        self.parent.refresh_data()
+    
+    def on_export_data(self):
+        """导出交易历史/持仓/计划/每日快照为 CSV 或 Parquet/Arrow"""
+        from PyQt6.QtWidgets import QFileDialog, QInputDialog, QMessageBox
+        from utils import exporter
+        labels = {'交易历史': 'history', '持仓': 'positions', '计划': 'plans', '每日持仓快照': 'snapshots'}
+        label, ok = QInputDialog.getItem(self.parent, "导出数据", "选择数据集:", list(labels), 0, False)
+        if not ok:
+            return
+        filters = "CSV (*.csv)"
+        if exporter.pa is not None:
+            filters += ";;Parquet (*.parquet);;Arrow (*.arrow)"
+        path, _ = QFileDialog.getSaveFileName(self.parent, "导出到", f"{labels[label]}.csv", filters)
+        if not path:
+            return
+        try:
+            count = exporter.export(self.parent.data_manager, labels[label], path)
+        except Exception as e:
+            QMessageBox.warning(self.parent, "导出失败", str(e))
+            return
+        self.parent.statusBar().show_message(f"已导出 {count} 行到 {path}")
+    
     def on_set_plan(self):
         """设置计划"""
+        from views.dialogs.plan_dialog import PlanDialog
         dialog = PlanDialog(self.parent)
         if dialog.exec() == PlanDialog.DialogCode.Accepted:
             # 这里应该处理计划设置逻辑
@@ -87,7 +143,26 @@ class MenuBar(QMenuBar):
     
     def on_profit_analysis(self):
         """盈利分析"""
+        from views.dialogs.profit_analysis_dialog import ProfitAnalysisDialog
         dialog = ProfitAnalysisDialog(self.parent)
+        if getattr(self.parent, 'data_manager', None) is not None:
+            dialog.load_from_data_manager(self.parent.data_manager)
+        dialog.exec()
+    
+    def on_correlation(self):
+        """持仓相关性热力图与聚类"""
+        from views.dialogs.correlation_dialog import CorrelationDialog
+        dialog = CorrelationDialog(self.parent)
+        if getattr(self.parent, 'data_manager', None) is not None:
+            dialog.load_from_data_manager(self.parent.data_manager)
+        dialog.exec()
+    
+    def on_scenario(self):
+        """持仓价格冲击情景"""
+        from views.dialogs.scenario_dialog import ScenarioDialog
+        dialog = ScenarioDialog(self.parent)
+        if getattr(self.parent, 'data_manager', None) is not None:
+            dialog.load_from_data_manager(self.parent.data_manager)
         dialog.exec()
     
     def show_about(self):
@@ -11,23 +11,39 @@ class Toolbar(QHBoxLayout):
         """创建工具栏"""
         search_label = QLabel("股票搜索:")
         self.stock_search_input = QLineEdit()
-        self.stock_search_input.setPlaceholderText("输入股票代码")
-        self.stock_search_input.setFixedWidth(120)
+        self.stock_search_input.setPlaceholderText("代码/名称/拼音首字母")
+        self.stock_search_input.setFixedWidth(160)
+        self.stock_search_input.setClearButtonEnabled(True)
+        self.stock_search_input.textChanged.connect(self.on_search_text_changed)
+        self.stock_search_input.returnPressed.connect(self.on_search_button_clicked)
         
         search_button = QPushButton("🔍")
         search_button.setFixedWidth(30)
+        search_button.clicked.connect(self.on_search_button_clicked)
         
-        add_button = QPushButton("+")
-        add_button.setFixedWidth(30)
+        self.add_button = QPushButton("+")
+        self.add_button.setFixedWidth(30)
         # 修复引用问题
-        add_button.clicked.connect(self.on_add_button_clicked)
+        self.add_button.clicked.connect(self.on_add_button_clicked)
         
         self.addWidget(search_label)
         self.addWidget(self.stock_search_input)
         self.addWidget(search_button)
-        self.addWidget(add_button)
+        self.addWidget(self.add_button)
         self.addStretch()
     
+    def on_search_text_changed(self, text):
+        """输入时即时过滤持仓与交易历史"""
+        main_content = getattr(self.parent, 'main_content', None)
+        if main_content is not None:
+            main_content.apply_search(text)
+    
+    def on_search_button_clicked(self):
+        """回车或点击搜索按钮时跳到下一个匹配的持仓"""
+        main_content = getattr(self.parent, 'main_content', None)
+        if main_content is not None:
+            main_content.jump_to_search_result()
+    
     def on_add_button_clicked(self):
         """处理添加按钮点击事件"""
         # 这里应该打开买入对话框
@@ -0,0 +1,167 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, QPushButton,
+                             QTabWidget, QTableWidget, QTableWidgetItem, QAbstractItemView,
+                             QHeaderView, QDoubleSpinBox)
+from PyQt6.QtCore import QObject, pyqtSignal
+import threading
+import numpy as np
+from views.components.heat_map import HeatMap
+
+
+class _CovarianceSignal(QObject):
+    """后台线程完成日线更新/重算后回到界面线程"""
+    ready = pyqtSignal()
+
+
+class CorrelationDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("持仓相关性")
+        self.setGeometry(180, 160, 640, 660)
+        self.data_manager = None
+        self._busy = False
+        self._signal = _CovarianceSignal(self)
+        self._signal.ready.connect(self._on_ready)
+
+        # 创建布局
+        layout = QVBoxLayout(self)
+
+        # 标题
+        title_label = QLabel("持仓相关性")
+        title_label.setStyleSheet("font-size: 16px; font-weight: bold; margin: 10px;")
+        layout.addWidget(title_label)
+
+        self.summary_label = QLabel("暂无日线数据")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        # 热力图与聚类
+        self.tabs = QTabWidget()
+        self.heat_map = HeatMap()
+        self.tabs.addTab(self.heat_map, "热力图")
+        self.cluster_table = QTableWidget()
+        self.cluster_table.setColumnCount(4)
+        self.cluster_table.setHorizontalHeaderLabels(["分组", "成员", "组内平均相关", "市值占比"])
+        self.cluster_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.cluster_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        header = self.cluster_table.horizontalHeader()
+        if header:
+            header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+            header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.tabs.addTab(self.cluster_table, "聚类")
+        layout.addWidget(self.tabs, 1)
+
+        # 创建按钮
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(QLabel("合并阈值:"))
+        self.threshold_spin = QDoubleSpinBox()
+        self.threshold_spin.setRange(0.0, 1.0)
+        self.threshold_spin.setSingleStep(0.05)
+        self.threshold_spin.setValue(0.8)
+        self.threshold_spin.valueChanged.connect(self._render)
+        button_layout.addWidget(self.threshold_spin)
+        button_layout.addStretch()
+        self.update_button = QPushButton("更新日线")
+        self.update_button.clicked.connect(lambda: self._start(recompute=False))
+        self.recompute_button = QPushButton("全部重算")
+        self.recompute_button.clicked.connect(lambda: self._start(recompute=True))
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.update_button)
+        button_layout.addWidget(self.recompute_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+    def load_from_data_manager(self, data_manager):
+        """用已缓存日线增量更新矩阵并显示，随后后台补齐当天日线"""
+        from utils.covariance import EwmaCovariance, watched_codes
+        from utils.equity_curve import default_close_cache
+        self.data_manager = data_manager
+        codes = watched_codes(data_manager)
+        EwmaCovariance.shared(data_manager).sync(default_close_cache(data_manager).cached(codes), codes)
+        self._render()
+        self._start(recompute=False)
+
+    def _start(self, recompute: bool):
+        """后台拉取日线；recompute 为 True 时按回看窗口整体重算"""
+        if self.data_manager is None or self._busy:
+            return
+        from utils.covariance import EwmaCovariance, watched_codes
+        from utils.equity_curve import default_close_cache
+        from utils.risk_metrics import lookback_start
+        estimator = EwmaCovariance.shared(self.data_manager)
+        cache = default_close_cache(self.data_manager)
+        codes = watched_codes(self.data_manager)
+        since = str(lookback_start())
+        signal = self._signal
+        self._busy = True
+        self.update_button.setEnabled(False)
+        self.recompute_button.setEnabled(False)
+
+        def work():
+            try:
+                if cache.refresh(codes, since=since):
+                    cache.save()
+                closes = cache.cached(codes)
+                if recompute:
+                    estimator.recompute(closes, codes)
+                else:
+                    estimator.sync(closes, codes)
+            finally:
+                try:
+                    signal.ready.emit()
+                except RuntimeError:
+                    pass  # 对话框已关闭
+        threading.Thread(target=work, daemon=True).start()
+
+    def _on_ready(self):
+        self._busy = False
+        self.update_button.setEnabled(True)
+        self.recompute_button.setEnabled(True)
+        self._render()
+
+    def _render(self):
+        """按当前阈值聚类，刷新概要、热力图与分组表"""
+        if self.data_manager is None:
+            return
+        from utils.covariance import EwmaCovariance, cluster_order, effective_bets
+        estimator = EwmaCovariance.shared(self.data_manager)
+        codes = list(estimator.codes)
+        if not codes or estimator.last_day is None:
+            self.summary_label.setText("暂无日线数据")
+            self.heat_map.set_data([], np.zeros((0, 0)))
+            self.cluster_table.setRowCount(0)
+            return
+        names, values = {}, {}
+        for p in self.data_manager.get_positions():
+            code = str(p.get('code', ''))
+            names[code] = str(p.get('name', code))
+            try:
+                values[code] = values.get(code, 0.0) + float(p.get('quantity', 0) or 0) * float(p.get('current_price', 0) or 0)
+            except (TypeError, ValueError):
+                continue
+        for plan in self.data_manager.get_plans():
+            names.setdefault(str(plan.get('code', '')), str(plan.get('name', '')))
+        labels = [names.get(c) or c for c in codes]
+        weights = np.array([max(values.get(c, 0.0), 0.0) for c in codes])
+        corr = estimator.correlation()
+        clusters, order = cluster_order(corr, self.threshold_spin.value())
+        self.heat_map.set_data(labels, corr, order)
+
+        total = weights.sum()
+        held = weights > 0
+        bets = effective_bets(corr[np.ix_(held, held)], weights[held]) if held.sum() > 1 else float(held.sum())
+        vol = estimator.volatility()
+        self.summary_label.setText(
+            f"截至 {estimator.last_day}，{len(codes)} 只（持仓与计划），衰减因子 {estimator.decay}；"
+            f"按市值加权的有效独立持仓约 {bets:.1f} 个，"
+            f"年化波动率 {np.nanmin(vol) * 100:.1f}% ~ {np.nanmax(vol) * 100:.1f}%")
+
+        self.cluster_table.setRowCount(len(clusters))
+        for row, members in enumerate(clusters):
+            block = corr[np.ix_(members, members)]
+            inner = f"{(block.sum() - len(members)) / (len(members) * (len(members) - 1)):.2f}" if len(members) > 1 else "-"
+            share = weights[members].sum() / total if total > 0 else 0.0
+            self.cluster_table.setItem(row, 0, QTableWidgetItem(f"{row + 1}"))
+            self.cluster_table.setItem(row, 1, QTableWidgetItem("、".join(labels[i] for i in members)))
+            self.cluster_table.setItem(row, 2, QTableWidgetItem(inner))
+            self.cluster_table.setItem(row, 3, QTableWidgetItem(f"{share * 100:.1f}%"))
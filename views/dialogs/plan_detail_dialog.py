@@ -1,5 +1,6 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QLabel, 
                              QHBoxLayout, QPushButton, QGroupBox)
+from controllers.trade_controller import DEFAULT_COMMISSION
 
 
 class PlanDetailDialog(QDialog):
@@ -31,10 +32,8 @@ class PlanDetailDialog(QDialog):
     def _format_price(self, p: float) -> str:
         return f"{p:.4f}" if p < 10 else f"{p:.2f}"
     
-    def _calc_sell_fee(self, target_price: float, quantity: float) -> float:
-        amount = target_price * quantity
-        fee = amount * 0.00025
-        return 5.0 if fee < 5.0 and quantity > 0 else fee
+    def _calc_sell_fee(self, target_price: float, quantity: float, code: str = '') -> float:
+        return DEFAULT_COMMISSION.calculate(target_price, quantity, '卖出', code)
     
     def load_for_name(self, name: str):
         dm = getattr(self.parent(), 'data_manager', None) if self.parent() else None
@@ -64,10 +63,11 @@ class PlanDetailDialog(QDialog):
         self.content_form.addRow("买入手续费:", QLabel(f"{buy_fee_total:.2f}"))
        
         
-        # 预计盈亏（含费用）
-        cost_total = cost_price * quantity + buy_fee_total
-        tp_sell_fee = self._calc_sell_fee(tp_price, quantity)
-        sl_sell_fee = self._calc_sell_fee(sl_price, quantity)
+        # 预计盈亏（含费用；成本价已含买入费用）
+        cost_total = cost_price * quantity
+        code = str(plan.get('code', '') or '')
+        tp_sell_fee = self._calc_sell_fee(tp_price, quantity, code)
+        sl_sell_fee = self._calc_sell_fee(sl_price, quantity, code)
         tp_income = tp_price * quantity - tp_sell_fee
         sl_income = sl_price * quantity - sl_sell_fee
         tp_profit = tp_income - cost_total
@@ -1,20 +1,94 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QFormLayout, QLineEdit, QComboBox,
-                             QHBoxLayout, QPushButton, QLabel, QGroupBox)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QDoubleValidator
+                             QHBoxLayout, QPushButton, QLabel, QGroupBox, QTableWidget,
+                             QTableWidgetItem, QAbstractItemView, QHeaderView)
+from PyQt6.QtCore import Qt, QTimer, QObject, pyqtSignal
+from PyQt6.QtGui import QDoubleValidator, QColor
+import threading
+import numpy as np
+from controllers.trade_controller import DEFAULT_COMMISSION, buy_fee_totals
+
+
+class _IndicatorSignal(QObject):
+    """后台线程取得指标后回到界面线程"""
+    ready = pyqtSignal(object)
+
+
+class PlanContext:
+    """计划对话框的持仓上下文：打开时一次性载入成本、数量与买入费用，之后只做数组运算
+
+    成本价已含买入费用（持仓由交易历史投影得出），buy_fee_total 只用于展示其中的买入费用。
+    """
+    
+    def __init__(self, name: str = '', code: str = '', quantity: float = 0.0, cost_price: float = 0.0,
+                 buy_fee_total: float = 0.0):
+        self.name = name
+        self.code = code
+        self.quantity = quantity
+        self.cost_price = cost_price
+        self.buy_fee_total = buy_fee_total
+    
+    @classmethod
+    def from_position(cls, data_manager, name: str, quantity: float, cost_price: float) -> 'PlanContext':
+        """按持仓名称解析代码并汇总买入费用（费用来自按历史版本缓存的批量结果）"""
+        code = ''
+        fee_total = 0.0
+        if data_manager is not None:
+            code = next((str(p.get('code', '')) for p in data_manager.get_positions()
+                         if p.get('name') == name or p.get('code') == name), '')
+            fees = buy_fee_totals(data_manager)
+            fee_total = fees.get(name, 0.0) or fees.get(code, 0.0)
+        return cls(name, code, quantity, cost_price, fee_total)
+    
+    @property
+    def cost_total(self) -> float:
+        return self.cost_price * self.quantity
+    
+    def sell_fees(self, prices) -> np.ndarray:
+        """按各价格全部卖出的费用"""
+        prices = np.asarray(prices, dtype=np.float64)
+        return DEFAULT_COMMISSION.calculate_batch(prices, np.full(len(prices), self.quantity),
+                                                  np.full(len(prices), '卖出'),
+                                                  np.full(len(prices), self.code or self.name))
+    
+    def ladder(self, prices):
+        """
+        价格 -> 盈亏阶梯（单次向量化计算）
+        
+        参数:
+            prices: 价格数组
+        
+        返回:
+            (卖出费用数组, 预计盈亏数组)
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        fees = self.sell_fees(prices)
+        return fees, prices * self.quantity - fees - self.cost_total
 
 
 class PlanDialog(QDialog):
+    # 输入停止后再重算分析，连续按键合并为一次
+    ANALYSIS_DEBOUNCE_MS = 120
+    # 盈亏阶梯的档数（成本价上下对称）
+    LADDER_STEPS = 21
+    # 按波动设置默认阈值：止损 2×ATR、止盈 3×ATR（以最近收盘价为基准）
+    ATR_STOP_MULT = 2.0
+    ATR_TAKE_MULT = 3.0
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("设置止盈止损计划")
-        self.setGeometry(200, 200, 500, 500)
+        self.setGeometry(200, 200, 560, 680)
         
         self._updating = False
-        self._cost_price = 0.0
-        self._quantity = 0.0
-        self._code_name = ""
-        self._buy_fee_total = 0.0
+        self._context = PlanContext()
+        self._analysis_timer = QTimer(self)
+        self._analysis_timer.setSingleShot(True)
+        self._analysis_timer.setInterval(self.ANALYSIS_DEBOUNCE_MS)
+        self._analysis_timer.timeout.connect(self._update_analysis)
+        # 用户改过任一输入后，不再用波动指标覆盖默认值
+        self._user_edited = False
+        self._indicator_signal = _IndicatorSignal(self)
+        self._indicator_signal.ready.connect(self._on_indicators_ready)
         
         # 创建布局
         layout = QVBoxLayout(self)
@@ -29,6 +103,11 @@ class PlanDialog(QDialog):
         self.cost_label.setStyleSheet("margin: 0 10px 10px 10px;")
         layout.addWidget(self.cost_label)
         
+        # 波动参考（ATR/波动率，后台载入）
+        self.volatility_label = QLabel("波动参考: -")
+        self.volatility_label.setStyleSheet("margin: 0 10px 10px 10px; color: #666;")
+        layout.addWidget(self.volatility_label)
+        
         # 止盈计划组（去掉触发方式，仅保留价格与百分比）
         take_profit_group = QGroupBox("止盈计划")
         take_profit_layout = QFormLayout(take_profit_group)
@@ -62,6 +141,15 @@ class PlanDialog(QDialog):
         self.analysis_label = QLabel("请完善参数后显示预计盈亏")
         analysis_layout.addWidget(self.analysis_label)
         
+        # 价格 -> 盈亏阶梯
+        self.ladder_table = QTableWidget(0, 5)
+        self.ladder_table.setHorizontalHeaderLabels(["卖出价", "较成本", "卖出费用", "预计盈亏", "收益率"])
+        self.ladder_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.ladder_table.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.ladder_table.verticalHeader().setVisible(False)
+        self.ladder_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        analysis_layout.addWidget(self.ladder_table)
+        
         layout.addWidget(analysis_group)
         
         # 事件连接：双向联动（价格 ↔ 百分比）
@@ -94,54 +182,38 @@ class PlanDialog(QDialog):
         except Exception:
             return None
     
-    def _calc_buy_fee_total(self, code_name: str) -> float:
-        dm = self._get_data_manager()
-        if not dm:
-            # 兜底：按聚合估算
-            est = self._cost_price * self._quantity * 0.00025
-            return 5.0 if est < 5.0 and self._quantity > 0 else est
-        fee_total = 0.0
-        try:
-            for h in dm.get_history():
-                if str(h.get('type', '')) != "买入":
-                    continue
-                if str(h.get('code', '')) != code_name:
-                    continue
-                price = float(h.get('price', 0) or 0)
-                qty = float(h.get('quantity', 0) or 0)
-                amount = price * qty
-                fee = amount * 0.00025
-                if fee < 5.0:
-                    fee = 5.0
-                fee_total += fee
-        except Exception:
-            pass
-        if fee_total == 0.0:
-            # 没有历史，退回估算
-            est = self._cost_price * self._quantity * 0.00025
-            if est < 5.0 and self._quantity > 0:
-                est = 5.0
-            return est
-        return fee_total
+    @property
+    def _code_name(self) -> str:
+        return self._context.name
+    
+    @property
+    def _quantity(self) -> float:
+        return self._context.quantity
+    
+    @property
+    def _cost_price(self) -> float:
+        return self._context.cost_price
+    
+    @property
+    def _buy_fee_total(self) -> float:
+        return self._context.buy_fee_total
     
     def prefill_from_position(self, name: str, quantity: str, cost_price: str):
         """根据选中持仓预填显示，并设置默认止盈6%/止损3%及对应价格；并载入买入手续费总额"""
-        self._code_name = name or ""
         self.info_label.setText(f"持仓股票: {name} ({quantity}股)")
         # 解析数据
         try:
-            self._quantity = float(str(quantity).replace(',', '') or 0)
+            qty = float(str(quantity).replace(',', '') or 0)
         except Exception:
-            self._quantity = 0.0
+            qty = 0.0
         try:
-            self._cost_price = float(cost_price or 0)
+            cost = float(cost_price or 0)
         except Exception:
-            self._cost_price = 0.0
+            cost = 0.0
+        # 持仓上下文只在打开时构建一次，之后的输入只做纯计算
+        self._context = PlanContext.from_position(self._get_data_manager(), name or "", qty, cost)
         self.cost_label.setText(f"当前成本价: {self._format_price(self._cost_price)}")
         
-        # 计算买入手续费总额
-        self._buy_fee_total = self._calc_buy_fee_total(self._code_name)
-        
         # 默认 6% / 3%
         self._updating = True
         try:
@@ -156,6 +228,61 @@ class PlanDialog(QDialog):
             self._updating = False
         
         self._update_analysis()
+        self._user_edited = False
+        self._load_indicators()
+    
+    def _load_indicators(self):
+        """后台取日线指标（共享指标引擎，经本地K线缓存），完成后给出按波动的默认阈值"""
+        code = self._context.code
+        if not code:
+            return
+        self.volatility_label.setText("波动参考: 载入中...")
+        signal = self._indicator_signal
+        
+        def work():
+            from utils.indicators import DEFAULT_ENGINE, load_daily
+            load_daily(code)
+            try:
+                signal.ready.emit(DEFAULT_ENGINE.snapshot(code))
+            except RuntimeError:
+                pass  # 对话框已关闭
+        
+        threading.Thread(target=work, daemon=True).start()
+    
+    def _on_indicators_ready(self, snap):
+        if not snap or not snap.get('atr') or not snap.get('close'):
+            self.volatility_label.setText("波动参考: 暂无行情数据，使用默认 6%/3%")
+            return
+        atr, close = snap['atr'], snap['close']
+        vol = snap.get('volatility')
+        vol_text = f"，20日波动率 {vol*100:.2f}%" if vol is not None else ""
+        self.volatility_label.setText(
+            f"波动参考: ATR(14) {self._format_price(atr)} ({atr/close*100:.2f}%){vol_text}，"
+            f"默认止损 {self.ATR_STOP_MULT:g}×ATR / 止盈 {self.ATR_TAKE_MULT:g}×ATR")
+        if self._user_edited or self._cost_price <= 0:
+            return
+        # 按波动给出的价位必须在成本同侧才有意义（止盈高于成本、止损低于成本），否则保留该侧的 6%/3% 默认值
+        cost = self._cost_price
+        tp_price = close + self.ATR_TAKE_MULT * atr
+        sl_price = close - self.ATR_STOP_MULT * atr
+        apply_tp = tp_price > cost
+        apply_sl = 0.0 < sl_price < cost
+        if not (apply_tp and apply_sl):
+            kept = "、".join(side for side, applied in (("止盈 6%", apply_tp), ("止损 3%", apply_sl)) if not applied)
+            self.volatility_label.setText(f"{self.volatility_label.text()}（按波动的价位与成本不符，{kept} 保持默认）")
+        if not (apply_tp or apply_sl):
+            return
+        self._updating = True
+        try:
+            if apply_tp:
+                self.take_profit_price_input.setText(self._format_price(tp_price))
+                self.take_profit_ratio_input.setText(self._format_ratio_number((tp_price - cost) / cost))
+            if apply_sl:
+                self.stop_loss_price_input.setText(self._format_price(sl_price))
+                self.stop_loss_ratio_input.setText(self._format_ratio_number((cost - sl_price) / cost))
+        finally:
+            self._updating = False
+        self._update_analysis()
     
     def _parse_ratio_percent(self, text: str) -> float:
         """解析百分比数字（如 '6' -> 0.06, '1' -> 0.01）"""
@@ -181,6 +308,7 @@ class PlanDialog(QDialog):
     def _on_take_profit_ratio_changed(self, _):
         if self._updating:
             return
+        self._user_edited = True
         self._updating = True
         try:
             r = self._parse_ratio_percent(self.take_profit_ratio_input.text())
@@ -188,11 +316,12 @@ class PlanDialog(QDialog):
             self.take_profit_price_input.setText(self._format_price(price))
         finally:
             self._updating = False
-        self._update_analysis()
+        self._schedule_analysis()
     
     def _on_take_profit_price_changed(self, _):
         if self._updating:
             return
+        self._user_edited = True
         self._updating = True
         try:
             p = self._parse_price(self.take_profit_price_input.text())
@@ -203,11 +332,12 @@ class PlanDialog(QDialog):
             self.take_profit_ratio_input.setText(self._format_ratio_number(r))
         finally:
             self._updating = False
-        self._update_analysis()
+        self._schedule_analysis()
     
     def _on_stop_loss_ratio_changed(self, _):
         if self._updating:
             return
+        self._user_edited = True
         self._updating = True
         try:
             r = self._parse_ratio_percent(self.stop_loss_ratio_input.text())
@@ -215,11 +345,12 @@ class PlanDialog(QDialog):
             self.stop_loss_price_input.setText(self._format_price(price))
         finally:
             self._updating = False
-        self._update_analysis()
+        self._schedule_analysis()
     
     def _on_stop_loss_price_changed(self, _):
         if self._updating:
             return
+        self._user_edited = True
         self._updating = True
         try:
             p = self._parse_price(self.stop_loss_price_input.text())
@@ -230,41 +361,68 @@ class PlanDialog(QDialog):
             self.stop_loss_ratio_input.setText(self._format_ratio_number(r))
         finally:
             self._updating = False
-        self._update_analysis()
+        self._schedule_analysis()
+    
+    def _schedule_analysis(self):
+        """重启防抖计时器；计时结束前的多次修改只触发一次分析"""
+        self._analysis_timer.start()
     
     def _calc_sell_fee(self, target_price: float) -> float:
-        amount = target_price * self._quantity
-        fee = amount * 0.00025
-        return 5.0 if fee < 5.0 and self._quantity > 0 else fee
+        return float(self._context.sell_fees([target_price])[0])
+    
+    def _ladder_prices(self, tp: float, sl: float) -> np.ndarray:
+        """阶梯价格：覆盖止损价到止盈价并向两侧留出余量，按成本价对称取档"""
+        span = max(abs(tp - self._cost_price), abs(self._cost_price - sl), self._cost_price * 0.05) * 1.2
+        return np.linspace(self._cost_price - span, self._cost_price + span, self.LADDER_STEPS)
     
     def _update_analysis(self):
-        """根据当前参数预估盈亏（含手续费）"""
+        """根据当前参数预估盈亏（含手续费），止盈/止损与阶梯在一次向量化调用中算出"""
+        self._analysis_timer.stop()
         if self._quantity <= 0 or self._cost_price <= 0:
             self.analysis_label.setText("请完善持仓数量与成本价")
+            self.ladder_table.setRowCount(0)
             return
-        # 止盈预估
         tp = self._parse_price(self.take_profit_price_input.text())
-        tp_sell_fee = self._calc_sell_fee(tp)
-        tp_cost = self._cost_price * self._quantity + self._buy_fee_total
-        tp_income = tp * self._quantity - tp_sell_fee
-        tp_profit = tp_income - tp_cost
-        # 止损预估
         sl = self._parse_price(self.stop_loss_price_input.text())
-        sl_sell_fee = self._calc_sell_fee(sl)
-        sl_cost = tp_cost
-        sl_income = sl * self._quantity - sl_sell_fee
-        sl_profit = sl_income - sl_cost
+        ladder = np.clip(self._ladder_prices(tp, sl), 0.0, None)
+        fees, profits = self._context.ladder(np.concatenate(([tp, sl], ladder)))
+        tp_sell_fee, sl_sell_fee = fees[0], fees[1]
+        tp_profit, sl_profit = profits[0], profits[1]
         self.analysis_label.setText(
             f"若达到止盈价: 预计盈亏 {tp_profit:+.2f}元 (含买费{self._buy_fee_total:.2f}、卖费{tp_sell_fee:.2f})\n"
             f"若达到止损价: 预计盈亏 {sl_profit:+.2f}元 (含买费{self._buy_fee_total:.2f}、卖费{sl_sell_fee:.2f})"
         )
+        self._fill_ladder(ladder, fees[2:], profits[2:])
+    
+    def _fill_ladder(self, prices, fees, profits):
+        cost_total = self._context.cost_total
+        self.ladder_table.setUpdatesEnabled(False)
+        try:
+            self.ladder_table.setRowCount(len(prices))
+            for row, (price, fee, profit) in enumerate(zip(prices, fees, profits)):
+                change = (price - self._cost_price) / self._cost_price
+                ratio = profit / cost_total if cost_total > 0 else 0.0
+                texts = [self._format_price(price), f"{change*100:+.2f}%", f"{fee:.2f}",
+                         f"{profit:+.2f}", f"{ratio*100:+.2f}%"]
+                color = QColor("#FF0000") if profit > 0 else (QColor("#008000") if profit < 0 else None)
+                for col, text in enumerate(texts):
+                    item = QTableWidgetItem(text)
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    if color is not None and col >= 3:
+                        item.setForeground(color)
+                    self.ladder_table.setItem(row, col, item)
+        finally:
+            self.ladder_table.setUpdatesEnabled(True)
     
     def accept(self):
         """保存计划：写入 DataManager plans 简化版（按名称聚合）"""
+        if self._analysis_timer.isActive():
+            self._update_analysis()
         dm = self._get_data_manager()
         if dm:
             plan = {
                 'id': f'plan-{self._code_name}',
+                'code': self._context.code,
                 'name': self._code_name,
                 'quantity': self._quantity,
                 'cost_price': self._cost_price,
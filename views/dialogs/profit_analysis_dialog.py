@@ -1,14 +1,25 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, 
                              QPushButton, QGroupBox, QTableWidget, QTableWidgetItem,
-                             QAbstractItemView, QHeaderView)
-from PyQt6.QtCore import Qt
+                             QAbstractItemView, QHeaderView, QComboBox)
+from PyQt6.QtCore import Qt, QObject, pyqtSignal
+import threading
+from views.components.line_chart import LineChart
+
+
+class _CloseSignal(QObject):
+    """后台线程更新日线缓存后回到界面线程"""
+    ready = pyqtSignal()
 
 
 class ProfitAnalysisDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("盈利分析报告")
-        self.setGeometry(150, 150, 600, 500)
+        self.setGeometry(150, 150, 760, 940)
+        self.data_manager = None
+        self._close_signal = _CloseSignal(self)
+        self._close_signal.ready.connect(self._update_equity_curve)
+        self._close_signal.ready.connect(self._update_risk)
         
         # 创建布局
         layout = QVBoxLayout(self)
@@ -48,16 +59,52 @@ class ProfitAnalysisDialog(QDialog):
         position_layout.addWidget(self.position_table)
         layout.addWidget(self.position_group)
         
+        # 权益曲线：逐日重建持仓 × 日线收盘价
+        self.curve_group = QGroupBox("📉 权益曲线")
+        curve_layout = QVBoxLayout(self.curve_group)
+        self.curve_summary_label = QLabel("暂无交易历史")
+        self.pnl_chart = LineChart("累计盈亏（已实现 / 浮动 / 合计）")
+        self.drawdown_chart = LineChart("自高点回撤")
+        curve_layout.addWidget(self.curve_summary_label)
+        curve_layout.addWidget(self.pnl_chart)
+        curve_layout.addWidget(self.drawdown_chart)
+        layout.addWidget(self.curve_group)
+        
+        # 已实现盈亏：读物化的逐日表，按月/按年汇总
+        self.realised_group = QGroupBox("📅 已实现盈亏")
+        realised_layout = QVBoxLayout(self.realised_group)
+        realised_top = QHBoxLayout()
+        self.realised_summary_label = QLabel("暂无交易历史")
+        self.realised_period_combo = QComboBox()
+        self.realised_period_combo.addItems(["按月", "按年"])
+        self.realised_period_combo.currentIndexChanged.connect(self._update_realised_table)
+        realised_top.addWidget(self.realised_summary_label, 1)
+        realised_top.addWidget(self.realised_period_combo)
+        realised_layout.addLayout(realised_top)
+        self.realised_table = QTableWidget()
+        self.realised_table.setColumnCount(5)
+        self.realised_table.setHorizontalHeaderLabels(["期间", "已实现盈亏", "费用", "成交额", "笔数"])
+        self.realised_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.realised_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.realised_table.setMaximumHeight(180)
+        header = self.realised_table.horizontalHeader()
+        if header:
+            header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        realised_layout.addWidget(self.realised_table)
+        layout.addWidget(self.realised_group)
+        
         # 计划分析（占位）
         self.plan_group = QGroupBox("📋 计划分析")
         plan_layout = QVBoxLayout(self.plan_group)
         plan_layout.addWidget(QLabel("尚未接入计划数据"))
         layout.addWidget(self.plan_group)
         
-        # 风险评估（简易占位）
+        # 风险评估：当前持仓按缓存日线回看
         self.risk_group = QGroupBox("📊 风险评估")
         risk_layout = QVBoxLayout(self.risk_group)
-        risk_layout.addWidget(QLabel("基于当前持仓简单估算"))
+        self.risk_label = QLabel("基于当前持仓与已缓存日线估算")
+        self.risk_label.setWordWrap(True)
+        risk_layout.addWidget(self.risk_label)
         layout.addWidget(self.risk_group)
         
         # 创建按钮
@@ -68,29 +115,10 @@ class ProfitAnalysisDialog(QDialog):
         button_layout.addWidget(self.close_button)
         layout.addLayout(button_layout)
     
-    def _build_buy_commission_map(self, history):
-        code_to_fee = {}
-        for h in history:
-            try:
-                if str(h.get('type', '')) != "买入":
-                    continue
-                code = str(h.get('code', ''))
-                price = float(h.get('price', 0) or 0)
-                quantity = float(h.get('quantity', 0) or 0)
-                amount = price * quantity
-                fee = amount * 0.00025
-                if fee < 5.0:
-                    fee = 5.0
-                code_to_fee[code] = code_to_fee.get(code, 0.0) + fee
-            except Exception:
-                continue
-        return code_to_fee
-    
     def load_from_data_manager(self, data_manager):
         """从 DataManager 载入数据并填充统计与表格（动态市值 + 交易级买入佣金）"""
+        self.data_manager = data_manager
         positions = data_manager.get_positions()
-        history = data_manager.get_history()
-        buy_fee_map = self._build_buy_commission_map(history)
         
         total_invest = 0.0
         total_market = 0.0
@@ -104,8 +132,8 @@ class ProfitAnalysisDialog(QDialog):
                 cost_price = float(p.get('cost_price', 0) or 0)
                 current_price = float(p.get('current_price', 0) or 0)
                 market_value = current_price * quantity
-                fee_total = buy_fee_map.get(name, 0.0)
-                cost_total = cost_price * quantity + fee_total
+                # 成本价已含买入费用（持仓由交易历史投影得出）
+                cost_total = cost_price * quantity
                 profit = market_value - cost_total
                 
                 total_invest += cost_total
@@ -126,4 +154,124 @@ class ProfitAnalysisDialog(QDialog):
         self.total_market_value_label.setText(f"当前总市值: ¥{total_market:.2f}")
         ratio = (total_profit / total_invest * 100.0) if total_invest>0 else 0.0
         sign = "+" if total_profit>0 else ("-" if total_profit<0 else "")
-        self.total_profit_label.setText(f"总盈利: ¥{sign}{abs(total_profit):.2f} ({sign}{abs(ratio):.2f}%)")
\ No newline at end of file
+        self.total_profit_label.setText(f"总盈利: ¥{sign}{abs(total_profit):.2f} ({sign}{abs(ratio):.2f}%)")
+        
+        self._update_realised_table()
+        self._update_equity_curve()
+        self._update_risk()
+        self._refresh_closes()
+    
+    def _latest_prices(self):
+        """最新价：最近价格缓存优先，没有时才用持仓记录的现价（与主界面一致）"""
+        from utils.valuation import position_price
+        last_prices = self.data_manager.get_last_prices()
+        prices = dict(last_prices)
+        for p in self.data_manager.get_positions():
+            try:
+                price = position_price(p, last_prices)
+            except (TypeError, ValueError):
+                continue
+            if price > 0:
+                prices[str(p.get('code', ''))] = price
+        return prices
+    
+    def _update_realised_table(self):
+        """按月/按年列出已实现盈亏（新的期间在上）"""
+        if self.data_manager is None:
+            return
+        from utils.daily_pnl import DailyPnlTable
+        table = DailyPnlTable.shared(self.data_manager)
+        period = 'Y' if self.realised_period_combo.currentIndex() == 1 else 'M'
+        summary = table.aggregate(period).iloc[::-1]
+        totals = table.totals()
+        self.realised_table.setRowCount(0)
+        if not totals['trades']:
+            self.realised_summary_label.setText("暂无交易历史")
+            return
+        self.realised_summary_label.setText(
+            f"累计已实现 ¥{totals['realised']:,.2f}  费用 ¥{totals['fees']:,.2f}  "
+            f"成交额 ¥{totals['turnover']:,.2f}  共 {int(totals['trades'])} 笔")
+        self.realised_table.setRowCount(len(summary))
+        for row, (label, values) in enumerate(summary.iterrows()):
+            realised = values['realised']
+            sign = "+" if realised > 0 else ("-" if realised < 0 else "")
+            self.realised_table.setItem(row, 0, QTableWidgetItem(str(label)))
+            self.realised_table.setItem(row, 1, QTableWidgetItem(f"{sign}{abs(realised):,.2f}"))
+            self.realised_table.setItem(row, 2, QTableWidgetItem(f"{values['fees']:,.2f}"))
+            self.realised_table.setItem(row, 3, QTableWidgetItem(f"{values['turnover']:,.2f}"))
+            self.realised_table.setItem(row, 4, QTableWidgetItem(f"{int(values['trades'])}"))
+    
+    def _update_equity_curve(self):
+        """用已缓存的日线收盘价计算逐日权益曲线并绘制（不访问网络）"""
+        from utils.equity_curve import PointInTimeEngine, default_close_cache
+        engine = PointInTimeEngine.from_data_manager(self.data_manager)
+        if not len(engine):
+            self.curve_summary_label.setText("暂无交易历史")
+            self.pnl_chart.clear()
+            self.drawdown_chart.clear()
+            return
+        closes = default_close_cache(self.data_manager).cached(str(c) for c in engine.codes)
+        curve = engine.daily_curve(closes, latest_prices=self._latest_prices())
+        if curve.empty:
+            return
+        labels = [d.strftime('%Y-%m-%d') for d in curve.index]
+        self.pnl_chart.set_data(labels, [
+            ("已实现", curve['realised'].to_numpy(), '#1E88E5'),
+            ("浮动", curve['unrealised'].to_numpy(), '#FB8C00'),
+            ("合计", curve['pnl'].to_numpy(), '#D32F2F'),
+        ])
+        self.drawdown_chart.set_data(labels, [("回撤", curve['drawdown'].to_numpy(), '#2E7D32')], fill_index=0)
+        worst = int(curve['drawdown'].to_numpy().argmin())
+        last = curve.iloc[-1]
+        self.curve_summary_label.setText(
+            f"{labels[0]} 至 {labels[-1]}（{len(curve)} 个交易日，已缓存日线 {len(closes)}/{len(engine.codes)} 只）  "
+            f"已实现 ¥{last['realised']:,.2f}  浮动 ¥{last['unrealised']:,.2f}  "
+            f"最大回撤 ¥{-curve['drawdown'].iloc[worst]:,.2f} ({-curve['drawdown_ratio'].iloc[worst]*100:.2f}%，{labels[worst]})")
+    
+    def _update_risk(self):
+        """当前持仓的波动率、VaR、最大回撤、Sharpe 与 Beta（只用已缓存日线）"""
+        from utils.risk_metrics import DEFAULT_YEARS, portfolio_risk_from_data_manager
+        risk = portfolio_risk_from_data_manager(self.data_manager)
+        if not risk['codes'] or risk['days'] < 3:
+            missing = f"（{len(risk['missing'])} 只待获取日线）" if risk['missing'] else ""
+            self.risk_label.setText(f"暂无足够的日线数据{missing}")
+            return
+        beta = risk['beta']
+        lines = [
+            f"样本 {risk['start']} 至 {risk['end']}（近 {DEFAULT_YEARS} 年，{risk['days']} 个交易日，"
+            f"{len(risk['codes'])} 只股票）  市值 ¥{risk['value']:,.2f}",
+            f"年化波动率 {risk['volatility'] * 100:.2f}%    Sharpe {risk['sharpe']:.2f}    "
+            f"Beta(上证指数) {'-' if beta != beta else f'{beta:.2f}'}",
+            f"一日 95% VaR：历史法 ¥{risk['var_historical']:,.2f}  参数法 ¥{risk['var_parametric']:,.2f}  "
+            f"尾部期望损失 ¥{risk['expected_shortfall']:,.2f}",
+            f"最大回撤 {risk['max_drawdown'] * 100:.2f}%（¥{risk['max_drawdown_amount']:,.2f}）",
+        ]
+        if len(risk['codes']) > 1:
+            top = max(range(len(risk['codes'])), key=lambda i: risk['contribution'][i])
+            lines.append(f"风险贡献最大：{risk['codes'][top]}（{risk['contribution'][top] * 100:.1f}%）")
+        if risk['missing']:
+            lines.append(f"缺少日线未计入：{', '.join(risk['missing'])}")
+        self.risk_label.setText("\n".join(lines))
+    
+    def _refresh_closes(self):
+        """后台补齐当天尚未更新的日线（交易历史涉及的股票、当前持仓与基准），完成后重绘"""
+        from utils.equity_curve import PointInTimeEngine, default_close_cache
+        from utils.risk_metrics import lookback_start, required_codes
+        engine = PointInTimeEngine.from_data_manager(self.data_manager)
+        cache = default_close_cache(self.data_manager)
+        codes = [str(c) for c in engine.codes]
+        since = str(engine.first_day) if len(engine) else None
+        risk_codes = required_codes(self.data_manager)
+        risk_since = str(lookback_start())
+        signal = self._close_signal
+        
+        def work():
+            updated = cache.refresh(codes, since=since) if codes else 0
+            updated += cache.refresh(risk_codes, since=risk_since)
+            if updated:
+                cache.save()
+                try:
+                    signal.ready.emit()
+                except RuntimeError:
+                    pass  # 对话框已关闭
+        threading.Thread(target=work, daemon=True).start()
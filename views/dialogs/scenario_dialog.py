@@ -0,0 +1,170 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, QPushButton, QGroupBox,
+                             QFormLayout, QComboBox, QDoubleSpinBox, QSpinBox, QTableWidget,
+                             QTableWidgetItem, QAbstractItemView, QHeaderView)
+import time
+import numpy as np
+from views.components.line_chart import LineChart
+
+
+class ScenarioDialog(QDialog):
+    """持仓情景分析：对全部持仓施加一组价格冲击，按清仓口径（含卖出费用）估算盈亏"""
+
+    MODES = [("统一涨跌", 'uniform'), ("指数涨跌 × Beta", 'beta'), ("按相关性随机抽样", 'random')]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("情景分析")
+        self.setGeometry(150, 150, 920, 720)
+        self.data_manager = None
+
+        # 创建布局
+        layout = QVBoxLayout(self)
+
+        # 标题
+        title_label = QLabel("情景分析")
+        title_label.setStyleSheet("font-size: 16px; font-weight: bold; margin: 10px;")
+        layout.addWidget(title_label)
+
+        # 参数
+        params_group = QGroupBox("冲击设置")
+        params_layout = QFormLayout(params_group)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems([label for label, _ in self.MODES])
+        self.mode_combo.currentIndexChanged.connect(self._on_mode_changed)
+        self.low_spin = QDoubleSpinBox()
+        self.low_spin.setRange(-100.0, 0.0)
+        self.low_spin.setValue(-10.0)
+        self.low_spin.setSuffix(" %")
+        self.high_spin = QDoubleSpinBox()
+        self.high_spin.setRange(0.0, 500.0)
+        self.high_spin.setValue(10.0)
+        self.high_spin.setSuffix(" %")
+        self.steps_spin = QSpinBox()
+        self.steps_spin.setRange(2, 10001)
+        self.steps_spin.setValue(21)
+        self.scenarios_spin = QSpinBox()
+        self.scenarios_spin.setRange(100, 100000)
+        self.scenarios_spin.setSingleStep(1000)
+        self.scenarios_spin.setValue(10000)
+        self.horizon_spin = QSpinBox()
+        self.horizon_spin.setRange(1, 250)
+        self.horizon_spin.setValue(5)
+        self.horizon_spin.setSuffix(" 天")
+        params_layout.addRow("冲击方式:", self.mode_combo)
+        range_layout = QHBoxLayout()
+        range_layout.addWidget(self.low_spin)
+        range_layout.addWidget(QLabel("至"))
+        range_layout.addWidget(self.high_spin)
+        range_layout.addWidget(QLabel("档数:"))
+        range_layout.addWidget(self.steps_spin)
+        params_layout.addRow("涨跌范围:", range_layout)
+        random_layout = QHBoxLayout()
+        random_layout.addWidget(self.scenarios_spin)
+        random_layout.addWidget(QLabel("持有:"))
+        random_layout.addWidget(self.horizon_spin)
+        params_layout.addRow("随机情景数:", random_layout)
+        layout.addWidget(params_group)
+
+        self.summary_label = QLabel("-")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+        self.chart = LineChart("清仓盈亏变化")
+        layout.addWidget(self.chart)
+
+        self.scenario_table = QTableWidget()
+        self.scenario_table.setColumnCount(5)
+        self.scenario_table.setHorizontalHeaderLabels(["平均冲击", "市值", "卖出费用", "清仓盈亏", "变化"])
+        self.position_table = QTableWidget()
+        self.position_table.setColumnCount(5)
+        self.position_table.setHorizontalHeaderLabels(["股票", "数量", "现价", "当前盈亏", "最差情景盈亏"])
+        for table in (self.scenario_table, self.position_table):
+            table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+            table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+            header = table.horizontalHeader()
+            if header:
+                header.setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        tables_layout = QHBoxLayout()
+        tables_layout.addWidget(self.scenario_table)
+        tables_layout.addWidget(self.position_table)
+        layout.addLayout(tables_layout, 1)
+
+        # 创建按钮
+        button_layout = QHBoxLayout()
+        self.run_button = QPushButton("计算")
+        self.run_button.clicked.connect(self.run)
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.run_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+        self._on_mode_changed()
+
+    def _mode(self) -> str:
+        return self.MODES[self.mode_combo.currentIndex()][1]
+
+    def _on_mode_changed(self):
+        random_mode = self._mode() == 'random'
+        for widget in (self.low_spin, self.high_spin, self.steps_spin):
+            widget.setEnabled(not random_mode)
+        for widget in (self.scenarios_spin, self.horizon_spin):
+            widget.setEnabled(random_mode)
+
+    def load_from_data_manager(self, data_manager):
+        self.data_manager = data_manager
+        self.run()
+
+    def run(self):
+        """生成冲击网格并一次广播估值全部持仓"""
+        if self.data_manager is None:
+            return
+        from utils.scenario import Book, build_shocks, evaluate, summarize
+        start = time.perf_counter()
+        book = Book.from_data_manager(self.data_manager)
+        mode = self._mode()
+        shocks = build_shocks(self.data_manager, book, mode, self.low_spin.value() / 100,
+                              self.high_spin.value() / 100, self.steps_spin.value(),
+                              self.scenarios_spin.value(), self.horizon_spin.value())
+        result = evaluate(book, shocks)
+        elapsed = time.perf_counter() - start
+        stats = summarize(result)
+        if not len(book) or (mode == 'random' and not shocks.any()):
+            self.summary_label.setText("当前没有持仓" if not len(book) else
+                                       "尚无已缓存的日线，无法估计协方差（可在“持仓相关性”中更新日线）")
+            self.chart.clear()
+            self.scenario_table.setRowCount(0)
+            self.position_table.setRowCount(0)
+            return
+        self.summary_label.setText(
+            f"{len(book)} 个持仓 × {len(shocks)} 个情景，耗时 {elapsed:.2f}s；当前清仓盈亏 ¥{result['base']:,.2f}  "
+            f"最差变化 ¥{stats['worst']:,.2f}  最好 ¥{stats['best']:,.2f}  95% 分位损失 ¥{stats['loss_quantile']:,.2f}")
+
+        mean_shock = shocks.mean(axis=1)
+        if mode == 'random':
+            # 随机情景按盈亏变化排序，图为分布曲线，表中取等距分位
+            order = np.argsort(result['change'])
+            labels = [f"{q:.0f}%" for q in np.linspace(0, 100, len(order))]
+            picks = order[np.linspace(0, len(order) - 1, min(21, len(order))).astype(int)]
+        else:
+            order = np.arange(len(shocks))
+            labels = [f"{s * 100:.1f}%" for s in mean_shock]
+            picks = order if len(order) <= 201 else order[np.linspace(0, len(order) - 1, 201).astype(int)]
+        self.chart.set_data(labels, [("变化", result['change'][order], '#D32F2F')])
+
+        self.scenario_table.setRowCount(len(picks))
+        for row, i in enumerate(picks):
+            change = result['change'][i]
+            sign = "+" if change > 0 else ("-" if change < 0 else "")
+            self.scenario_table.setItem(row, 0, QTableWidgetItem(f"{mean_shock[i] * 100:+.2f}%"))
+            self.scenario_table.setItem(row, 1, QTableWidgetItem(f"{result['value'][i]:,.2f}"))
+            self.scenario_table.setItem(row, 2, QTableWidgetItem(f"{result['fees'][i]:,.2f}"))
+            self.scenario_table.setItem(row, 3, QTableWidgetItem(f"{result['pnl'][i]:,.2f}"))
+            self.scenario_table.setItem(row, 4, QTableWidgetItem(f"{sign}{abs(change):,.2f}"))
+
+        current = evaluate(book, np.zeros((1, 1)), keep_matrix=True)['matrix'][0]
+        self.position_table.setRowCount(len(book))
+        for row in range(len(book)):
+            self.position_table.setItem(row, 0, QTableWidgetItem(book.names[row]))
+            self.position_table.setItem(row, 1, QTableWidgetItem(f"{book.quantities[row]:.0f}"))
+            self.position_table.setItem(row, 2, QTableWidgetItem(f"{book.prices[row]:.3f}"))
+            self.position_table.setItem(row, 3, QTableWidgetItem(f"{current[row]:,.2f}"))
+            self.position_table.setItem(row, 4, QTableWidgetItem(f"{result['worst_position'][row]:,.2f}"))
@@ -1,5 +1,8 @@
 import sys
 import os
+import time
+# 进程启动计时起点，用于统计首屏耗时
+_STARTED_AT = time.perf_counter()
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -10,35 +13,56 @@ from views.components.toolbar import Toolbar
 from views.components.main_content import MainContent
 from views.components.status_bar import StatusBar
 from utils.data_manager import DataManager
-from utils.Ashare import get_price
+from utils.quote_scheduler import QuoteScheduler
+from utils.price_board import PriceBoard, STALE_POLLS
+from utils.view_snapshot import ViewSnapshot
+from utils.valuation import value_position, position_price
 import datetime
 
 
+class DataLoaderThread(QThread):
+    """后台解析数据文件，避免阻塞首屏绘制"""
+    loaded = pyqtSignal(object)
+
+    def run(self):
+        # 归档分区不在此解压，交易历史表按需打开可见行所在的分区
+        self.loaded.emit(DataManager())
+
+
 class PriceLoaderThread(QThread):
-    loaded = pyqtSignal(dict)   # code -> live_price
+    # code -> live_price, code -> prev_close, code -> 最近一分钟成交量
+    # 成交量随信号交回界面线程，由界面线程统一写入行情记录器（记录器只有一个写者）
+    loaded = pyqtSignal(dict, dict, dict)
     failed = pyqtSignal(str)
 
-    def __init__(self, data_manager: DataManager, parent=None):
+    def __init__(self, data_manager: DataManager, codes=None, parent=None):
         super().__init__(parent)
         self.data_manager = data_manager
+        # codes 为空时拉取全部持仓
+        self.codes = list(codes) if codes else None
 
     def run(self):
+        # 行情接口依赖 pandas，导入较慢，放到后台线程首次使用时再加载
+        from utils.bar_resampler import get_price
         try:
-            positions = self.data_manager.get_positions()
+            if self.codes is None:
+                self.codes = [str(p.get('code', '')) for p in self.data_manager.get_positions()]
             result = {}
-            for p in positions:
-                code = str(p.get('code', ''))
-                fallback = float(p.get('current_price', 0) or 0)
+            prev_result = {}
+            volumes = {}
+            for code in self.codes:
                 if not code:
                     continue
                 try:
                     df = get_price(code, frequency='1m', count=2)
                     live = float(df['close'].iloc[-1])
                     result[code] = live
+                    prev_result[code] = float(df['close'].iloc[-2]) if len(df) >= 2 else live
+                    volumes[code] = float(df['volume'].iloc[-1]) if 'volume' in df else 0.0
                 except Exception:
                     # 留空，稍后由主线程用缓存兜底
                     pass
-            self.loaded.emit(result)
+            self.loaded.emit(result, prev_result, volumes)
         except Exception as e:
             self.failed.emit(str(e))
 
@@ -49,8 +73,25 @@ class StockTradingUI(QMainWindow):
         self.setWindowTitle("股票交易记录系统 v1.0")
         self.setGeometry(100, 100, 1200, 800)
         
-        # 数据管理器
-        self.data_manager = DataManager()
+        # 数据管理器（后台载入，载入前先按快照绘制界面）
+        self.data_manager = None
+        self.snapshot_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                          'data', 'view_snapshot.bin')
+        self.first_paint_ms = None
+        self.data_ready_ms = None
+        self._status_summary = (0, 0.0)
+        
+        # 行情调度：临近止盈止损阈值的股票高频轮询，远离阈值的低频轮询
+        self.scheduler = QuoteScheduler()
+        self._last_price_save = 0.0
+        # 本机已运行共享行情进程（python -m utils.price_board）时直接读看板，不再各自请求网络
+        # 看板写者退出后回退到本进程拉取，并每隔 board_retry_interval 秒重新尝试连接
+        self.price_board = PriceBoard.attach()
+        self._board_seqs = {}
+        self.board_retry_interval = 10.0
+        self._board_retry_at = 0.0
+        # 盘中行情记录器，数据就绪后打开；另一个窗口已在记录时为 None
+        self.tick_recorder = None
         
         # 创建中央部件
         self.central_widget = QWidget()
@@ -63,8 +104,11 @@ class StockTradingUI(QMainWindow):
         # 创建界面组件
         self.create_components()
         
-        # 初始化数据（异步加载）
-        self.init_data()
+        # 先绘制上次保存的视图快照，再在后台载入数据并校正
+        self.paint_snapshot()
+        self.data_loader = DataLoaderThread(self)
+        self.data_loader.loaded.connect(self.on_data_loaded)
+        self.data_loader.start()
     
     def create_components(self):
         """创建界面组件"""
@@ -84,6 +128,60 @@ class StockTradingUI(QMainWindow):
         self.status_bar = StatusBar(self)
         self.setStatusBar(self.status_bar)
     
+    def paint_snapshot(self) -> bool:
+        """按上次保存的视图快照绘制界面；数据载入前菜单与新增按钮不可用"""
+        self.menu_bar.setEnabled(False)
+        self.toolbar.add_button.setEnabled(False)
+        snap = ViewSnapshot.load(self.snapshot_file)
+        if snap is None:
+            self.status_bar.show_message("正在加载数据...")
+            return False
+        self.main_content.paint_snapshot(snap)
+        self.status_bar.update_status(snap.position_count, snap.status_profit, 0)
+        return True
+    
+    def save_snapshot(self) -> bool:
+        """保存当前界面的视图快照，下次启动时直接绘制"""
+        if self.data_manager is None:
+            return False
+        snap = self.main_content.capture_snapshot()
+        snap.position_count, snap.status_profit = self._status_summary
+        return snap.save(self.snapshot_file)
+    
+    def mark_first_paint(self):
+        """记录首屏耗时（从进程导入本模块到第一次事件循环完成绘制）"""
+        if self.first_paint_ms is None:
+            self.first_paint_ms = (time.perf_counter() - _STARTED_AT) * 1000.0
+    
+    def on_data_loaded(self, data_manager):
+        """数据文件解析完成：替换快照，开始正常刷新与行情轮询"""
+        self.data_manager = data_manager
+        self.data_ready_ms = (time.perf_counter() - _STARTED_AT) * 1000.0
+        self.menu_bar.setEnabled(True)
+        self.toolbar.add_button.setEnabled(True)
+        self._open_tick_recorder()
+        self.init_data()
+        if self.first_paint_ms is not None:
+            self.status_bar.show_message(
+                f"首屏 {self.first_paint_ms:.0f}ms，数据就绪 {self.data_ready_ms:.0f}ms，正在获取实时价格...")
+    
+    def _open_tick_recorder(self):
+        """打开盘中行情记录器（按天的环形缓冲文件，供走势图、盘后分析与计划回放）"""
+        from utils.tick_recorder import TickRecorder, default_tick_directory
+        try:
+            self.tick_recorder = TickRecorder.open(default_tick_directory(self.data_manager))
+        except OSError:
+            self.tick_recorder = None
+    
+    def closeEvent(self, event):
+        self.save_snapshot()
+        if hasattr(self, 'loader') and self.loader.isRunning():
+            self.loader.wait()
+        if self.tick_recorder is not None:
+            self.tick_recorder.close()
+            self.tick_recorder = None
+        super().closeEvent(event)
+    
     def _in_trading_time(self) -> bool:
         """交易时段 09:15~15:00 内返回 True"""
         now = datetime.datetime.now().time()
@@ -96,71 +194,148 @@ class StockTradingUI(QMainWindow):
         self.status_bar.show_message("正在加载数据...")
         # 先用现有JSON同步渲染一版（用fallback和缓存）
         self.refresh_data(use_cache_only=True)
-        # 异步拉实时价
-        self.loader = PriceLoaderThread(self.data_manager)
-        self.loader.loaded.connect(self.on_prices_loaded)
-        self.loader.failed.connect(self.on_prices_failed)
-        self.loader.start()
-        # 定时刷新：仅交易时段内，每59秒触发
+        self.scheduler.seed_prices(self.data_manager.get_last_prices())
+        # 异步拉取全部持仓的实时价；看板没有的或过旧的代码仍由本进程拉取
+        self._check_price_board()
+        if self.price_board is not None:
+            stale = self._poll_price_board()
+            if stale:
+                self._start_loader(stale)
+        else:
+            self._start_loader()
+        # 定时调度：仅交易时段内，每秒检查一次哪些代码到期需要轮询
         self.refresh_timer = QTimer(self)
-        self.refresh_timer.setInterval(59 * 1000)
+        self.refresh_timer.setInterval(1000)
         self.refresh_timer.timeout.connect(self.on_refresh_timer)
         self.refresh_timer.start()
     
+    def _start_loader(self, codes=None):
+        self.loader = PriceLoaderThread(self.data_manager, codes)
+        self.loader.loaded.connect(self.on_prices_loaded)
+        self.loader.failed.connect(self.on_prices_failed)
+        self.loader.start()
+    
+    def _check_price_board(self):
+        """看板写者已退出时断开并回退到本进程拉取；没有看板时按间隔重新尝试连接"""
+        now = time.time()
+        if self.price_board is not None:
+            if self.price_board.writer_alive():
+                return
+            self.price_board.close()
+            self.price_board = None
+            self._board_seqs = {}
+            self._board_retry_at = now + self.board_retry_interval
+            return
+        if now < self._board_retry_at:
+            return
+        self._board_retry_at = now + self.board_retry_interval
+        board = PriceBoard.attach()
+        if board is not None and not board.writer_alive():
+            board.close()
+            board = None
+        self.price_board = board
+    
     def on_refresh_timer(self):
         if not self._in_trading_time():
             return
+        self._check_price_board()
+        stale = None
+        if self.price_board is not None:
+            stale = self._poll_price_board()
+            if not stale:
+                return
         # 避免与正在运行的加载线程重叠
         if hasattr(self, 'loader') and self.loader.isRunning():
             return
-        self.status_bar.show_message("自动刷新实时价格...")
-        self.loader = PriceLoaderThread(self.data_manager)
-        self.loader.loaded.connect(self.on_prices_loaded)
-        self.loader.failed.connect(self.on_prices_failed)
-        self.loader.start()
+        due = self.scheduler.due_codes()
+        if stale is not None:
+            due = [c for c in due if c in stale]
+        if not due:
+            return
+        self._start_loader(due)
+    
+    def on_prices_loaded(self, price_map: dict, prev_map: dict, volumes: dict):
+        now = time.time()
+        if self.tick_recorder is not None and price_map:
+            codes = list(price_map)
+            self.tick_recorder.append_many(codes, [price_map[c] for c in codes], [volumes.get(c, 0.0) for c in codes])
+        for code in self.loader.codes or []:
+            if code in price_map:
+                self.scheduler.observe(code, price_map[code], now)
+            else:
+                self.scheduler.mark_failed(code, now)
+        self._apply_prices(price_map, prev_map)
+    
+    def _poll_price_board(self) -> list:
+        """
+        从共享行情看板读取持仓价格，仅在序号变化时刷新界面
+
+        返回:
+            list: 看板中没有或超过 STALE_POLLS 个最长轮询间隔未更新的代码
+        """
+        codes = [str(p.get('code', '')) for p in self.data_manager.get_positions()]
+        changed = {}
+        fresh = self.price_board.read_many(codes, max_age=STALE_POLLS * self.scheduler.max_interval)
+        for code, (last, prev, _ts, seq) in fresh.items():
+            if self._board_seqs.get(code) != seq:
+                self._board_seqs[code] = seq
+                changed[code] = (last, prev)
+        if changed and self.tick_recorder is not None:
+            self.tick_recorder.append_many(list(changed), [v[0] for v in changed.values()])
+        if changed:
+            self._apply_prices({c: v[0] for c, v in changed.items()},
+                               {c: v[1] for c, v in changed.items()})
+        return [c for c in codes if c and c not in fresh]
     
-    def on_prices_loaded(self, price_map: dict):
-        # 合并并缓存成功的价格
+    def _apply_prices(self, price_map: dict, prev_map: dict):
+        now = time.time()
+        # 合并缓存成功的价格；高频轮询时每分钟最多落盘一次（视图快照同频保存）
+        save = False
         if price_map:
-            self.data_manager.update_last_prices(price_map)
-        self.status_bar.show_message("实时价格已更新，正在刷新界面...")
-        self.refresh_data()
+            save = now - self._last_price_save >= 59
+            self.data_manager.update_last_prices(price_map, save=save)
+            if save:
+                self._last_price_save = now
+        self.main_content.prev_closes.update(prev_map)
+        self.status_bar.show_message(f"实时价格已更新（{len(price_map)}只）")
+        # 只改写变化的价格单元格与汇总；表格与持仓不一致时才完整重载
+        if not self.main_content.update_prices(list(price_map)):
+            self.refresh_data(use_cache_only=True)
+            return
+        self._update_status()
+        if save:
+            self.save_snapshot()
     
     def on_prices_failed(self, err: str):
+        for code in getattr(self.loader, 'codes', None) or []:
+            self.scheduler.mark_failed(code)
         self.status_bar.show_message("实时价格获取失败，使用缓存数据")
-        self.refresh_data(use_cache_only=True)
     
     def refresh_data(self, use_cache_only: bool = False):
         """刷新数据。use_cache_only=True 时仅使用缓存/JSON价，不请求网络。"""
         # 将缓存传递给主内容用于兜底
         self.main_content.load_data_from_json_with_cache(use_cache_only)
 
-        # 汇总状态数据（保持不变）
+        self.scheduler.set_universe(self.data_manager.get_positions(), self.data_manager.get_plans())
+        self._update_status()
+        self.save_snapshot()
+    
+    def _update_status(self):
+        """按缓存/JSON价汇总状态栏的持仓数与总盈亏"""
         positions = self.data_manager.get_positions()
         position_count = len(positions)
         
-        history = self.data_manager.get_history()
-        buy_fee_map = self.main_content._build_buy_commission_map(history)
-        
         total_profit = 0.0
+        # 使用缓存/JSON价作为刷新后的计算价
+        last_prices = self.data_manager.get_last_prices()
         for p in positions:
             try:
-                name = str(p.get('name', ''))
-                code = str(p.get('code', ''))
-                quantity = float(p.get('quantity', 0) or 0)
-                cost_price = float(p.get('cost_price', 0) or 0)
-                # 使用缓存/JSON价作为刷新后的计算价
-                last_prices = self.data_manager.get_last_prices()
-                current_price = float(last_prices.get(code, p.get('current_price', 0) or 0))
-                market_value = current_price * quantity
-                commission_total = buy_fee_map.get(code or name, 0.0)
-                cost_total = cost_price * quantity + commission_total
-                profit = market_value - cost_total
-                total_profit += profit
+                total_profit += value_position(p, position_price(p, last_prices))['profit']
             except Exception:
                 continue
         plan_count = 0
         self.status_bar.update_status(position_count, total_profit, plan_count)
+        self._status_summary = (position_count, total_profit)
 
 
 
@@ -174,6 +349,8 @@ def main():
     # 创建并显示主窗口
     window = StockTradingUI()
     window.show()
+    # 首个事件循环周期完成即已绘制快照
+    QTimer.singleShot(0, window.mark_first_paint)
     
     sys.exit(app.exec())
 